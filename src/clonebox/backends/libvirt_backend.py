@@ -1,8 +1,5 @@
 """libvirt hypervisor backend implementation."""
 
-import base64
-import json
-import time
 from typing import Any, Dict, List, Optional
 
 try:
@@ -11,6 +8,7 @@ except ImportError:
     libvirt = None
 
 from ..interfaces.hypervisor import HypervisorBackend, VMInfo
+from ..qga import get_qga_executor
 
 
 class LibvirtBackend(HypervisorBackend):
@@ -158,43 +156,7 @@ class LibvirtBackend(HypervisorBackend):
         timeout: int = 30,
     ) -> Optional[str]:
         """Execute command in VM via QEMU Guest Agent."""
-        domain = self.conn.lookupByName(name)
-
-        # Build QGA guest-exec command
-        qga_cmd = {
-            "execute": "guest-exec",
-            "arguments": {
-                "path": "/bin/bash",
-                "arg": ["-c", command],
-                "capture-output": True,
-            },
-        }
-
-        try:
-            result_json = domain.qemuAgentCommand(json.dumps(qga_cmd), timeout)
-            result_data = json.loads(result_json)
-            pid = result_data["return"]["pid"]
-
-            # Poll for completion
-            status_cmd = {"execute": "guest-exec-status", "arguments": {"pid": pid}}
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                status_json = domain.qemuAgentCommand(json.dumps(status_cmd), timeout)
-                status_data = json.loads(status_json)
-
-                if status_data["return"]["exited"]:
-                    if "out-data" in status_data["return"]:
-                        return base64.b64decode(status_data["return"]["out-data"]).decode(
-                            "utf-8", errors="replace"
-                        )
-                    return ""
-
-                time.sleep(0.5)
-
-            return None  # Timeout
-
-        except Exception:
-            return None
+        return get_qga_executor(self.uri).exec_output(name, command, timeout=timeout, shell="/bin/bash")
 
     def _get_ip_addresses(self, domain) -> List[str]:
         """Get IP addresses from domain via guest agent or lease."""
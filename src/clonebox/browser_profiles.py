@@ -8,9 +8,12 @@ import os
 import logging
 import shutil
 import subprocess
+import tempfile
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from clonebox.delta_sync import sync_to_guest
 from clonebox.ssh import ssh_run as _ssh_run, build_ssh_command as _build_ssh_cmd
 
 log = logging.getLogger(__name__)
@@ -53,6 +56,22 @@ VM_BROWSER_PROFILE_PATHS = {
     "opera": "/home/ubuntu/.config/opera",
 }
 
+# Reflink clones of live profiles; must share a filesystem with the profiles
+PROFILE_CLONE_DIR = Path.home() / ".cache" / "clonebox" / "profile-clones"
+
+# Cache directories inside profiles, skipped when streaming with skip_cache
+PROFILE_CACHE_DIRS = frozenset({
+    "Cache",
+    "Code Cache",
+    "GPUCache",
+    "ShaderCache",
+    "GrShaderCache",
+    "DawnCache",
+    "CacheStorage",
+    "cache2",
+    "startupCache",
+})
+
 
 def _resolve_host_profile_paths(browser: str) -> Dict[str, Path]:
     paths = BROWSER_PROFILE_PATHS[browser].copy()
@@ -184,6 +203,88 @@ def copy_browser_profile(
     return profile_stage_dir
 
 
+def resolve_browser_profiles(requested_browsers: List[str]) -> Dict[str, Path]:
+    """Map requested browsers (or ``['all']``) to their host profile directory.
+
+    Only browsers whose profile exists on the host are returned.
+    """
+    detected = detect_browser_profiles()
+    if "all" in requested_browsers:
+        browsers = list(detected.keys())
+    else:
+        browsers = [b for b in requested_browsers if b in detected]
+    profiles = {}
+    for browser in browsers:
+        config = detected[browser].get("config")
+        if config is None:
+            log.info(f"Browser profile '{browser}' not found on host, skipping")
+            continue
+        profiles[browser] = config
+    return profiles
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_clones() -> None:
+    """Remove clones in :data:`PROFILE_CLONE_DIR` left by dead processes."""
+    for clone in PROFILE_CLONE_DIR.glob("*.clonebox-*"):
+        pid = clone.name.rpartition(".clonebox-")[2]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            log.debug(f"Removing stale profile clone {clone}")
+            shutil.rmtree(clone, ignore_errors=True)
+
+
+@contextmanager
+def point_in_time_view(path: Path) -> Iterator[Path]:
+    """Yield a consistent view of *path* if the filesystem can make one for free.
+
+    On reflink-capable filesystems (btrfs, XFS, bcachefs) ``cp --reflink=always``
+    clones the tree into :data:`PROFILE_CLONE_DIR` by sharing extents, so a
+    running browser cannot change files under the reader.  Clones left by a
+    process that died are removed on the next call.  Elsewhere, or when the
+    clone directory is on another filesystem, the live directory itself is
+    yielded and read as-is.
+    """
+    try:
+        PROFILE_CLONE_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+        _remove_stale_clones()
+        same_fs = PROFILE_CLONE_DIR.stat().st_dev == path.stat().st_dev
+    except OSError:
+        same_fs = False
+    if not same_fs:
+        yield path
+        return
+    scratch = Path(tempfile.mkdtemp(
+        prefix=f"{path.name}.", suffix=f".clonebox-{os.getpid()}", dir=PROFILE_CLONE_DIR
+    ))
+    clone = scratch / path.name
+    try:
+        subprocess.run(
+            ["cp", "-a", "--reflink=always", str(path), str(clone)],
+            check=True,
+            capture_output=True,
+            timeout=300,
+        )
+    except (OSError, subprocess.SubprocessError):
+        # Not supported here: cp stops at the first file, drop what it made
+        shutil.rmtree(scratch, ignore_errors=True)
+        yield path
+        return
+    log.debug(f"Reading {path} from reflink clone {clone}")
+    try:
+        yield clone
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
 def stage_browser_profiles(
     requested_browsers: List[str],
     vm_dir: Path,
@@ -272,6 +373,91 @@ def generate_browser_profile_setup_script(
     return "\n".join(script_lines)
 
 
+def _resolve_guest_profile_path(
+    browser: str,
+    ssh_port: int,
+    ssh_key: Optional[Path],
+    vm_username: str,
+) -> str:
+    """Profile directory of *browser* in the VM (snap builds use ~/snap)."""
+    if browser in ("chromium", "firefox"):
+        probe = _ssh_run(
+            port=ssh_port, key=ssh_key, username=vm_username, connect_timeout=10,
+            command=f"snap list {browser} >/dev/null 2>&1 && echo SNAP || echo NOSNAP",
+        )
+        if "NOSNAP" not in (probe.stdout or "") and "SNAP" in (probe.stdout or ""):
+            if browser == "chromium":
+                return f"/home/{vm_username}/snap/chromium/common/chromium"
+            return f"/home/{vm_username}/snap/firefox/common/.mozilla/firefox"
+    dest = VM_BROWSER_PROFILE_PATHS.get(browser, "")
+    return dest.replace("/home/ubuntu/", f"/home/{vm_username}/", 1)
+
+
+def stream_profiles_to_vm_via_ssh(
+    profiles: Dict[str, Path],
+    ssh_port: int,
+    ssh_key: Optional[Path],
+    vm_username: str = "ubuntu",
+    skip_cache: bool = True,
+    manifest_path: Optional[Path] = None,
+) -> bool:
+    """Stream live host profiles straight into the running VM.
+
+    Unlike :func:`stage_browser_profiles` + :func:`copy_profiles_to_vm_via_ssh`
+    nothing is copied to the VM directory first: each profile is read (from a
+    :func:`point_in_time_view`) directly into one tar stream, dropping lock
+    files and, with *skip_cache*, the cache directories inside the profile.
+    With *manifest_path* only changes since the last sync are sent.
+
+    Args:
+        profiles: Dictionary of {browser_name: host profile directory}
+        ssh_port: SSH port for VM
+        ssh_key: Path to SSH key
+        vm_username: VM username
+        skip_cache: Skip cache directories inside the profiles
+        manifest_path: Sync manifest of the VM (see clonebox.delta_sync)
+
+    Returns:
+        True if all profiles copied successfully
+    """
+    copy_paths = {}
+    for browser, host_path in profiles.items():
+        dest = _resolve_guest_profile_path(browser, ssh_port, ssh_key, vm_username)
+        if dest:
+            copy_paths[str(host_path)] = dest
+            log.info(f"Streaming {browser} profile to VM: {dest}")
+    if not copy_paths:
+        return True
+
+    with ExitStack() as stack:
+        read_from = {
+            dest: stack.enter_context(point_in_time_view(Path(host_path)))
+            for host_path, dest in copy_paths.items()
+        }
+        try:
+            result = sync_to_guest(
+                copy_paths,
+                ssh_port,
+                ssh_key,
+                vm_username,
+                manifest_path=manifest_path,
+                exclude_dirs=PROFILE_CACHE_DIRS if skip_cache else frozenset(),
+                read_from=read_from,
+            )
+        except Exception as e:
+            log.warning(f"Failed to stream browser profiles: {e}")
+            return False
+
+    if result.ok:
+        log.info(
+            f"Browser profiles copied: {result.files} file(s), "
+            f"{result.bytes / (1024 * 1024):.1f} MB"
+        )
+    else:
+        log.warning("Failed to copy browser profiles")
+    return result.ok
+
+
 def copy_profiles_to_vm_via_ssh(
     staged_profiles: Dict[str, Path],
     ssh_port: int,
@@ -363,6 +549,7 @@ def copy_profiles_to_vm_via_ssh(
         ssh_cmd = _build_ssh_cmd(
             port=ssh_port, key=ssh_key,
             username=vm_username, connect_timeout=10,
+            multiplex=True,
         ) + [remote_cmd]
 
         try:
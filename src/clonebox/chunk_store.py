@@ -0,0 +1,281 @@
+"""
+Content-addressed chunk store for deduplicated VM exports.
+
+A chunked export does not carry whole disk images.  Each disk is cut into
+variable-sized chunks whose boundaries depend on the data itself, every
+chunk is stored once under its sha256, and the disk is described by a
+small index (the ordered list of chunk hashes).  Exporting the same VM a
+week later, or a sibling VM layered on the same base image, produces
+mostly the same chunks, so only the new ones are written to the store and
+put into the export archive.
+
+Boundaries are only considered at 4 KiB block edges: a disk image changes
+in place and qcow2 moves data around in whole clusters, so byte-granular
+rolling hashes buy nothing here.  A chunk ends after a block whose crc32
+matches :data:`BOUNDARY_MASK`, once it is at least :data:`MIN_CHUNK` long
+(and always at :data:`MAX_CHUNK`).  All-zero chunks are recorded in the
+index without data and restored as holes.
+
+Layout under the store root (``<images>/chunks`` unless
+``CLONEBOX_CHUNK_STORE`` is set)::
+
+    objects/<sha[:2]>/<sha>     zlib-compressed chunk data
+
+Objects are never removed implicitly; :meth:`ChunkStore.gc` deletes those
+that none of the indexes still wanted references (``clonebox chunks gc``).
+Storing a chunk that is already present refreshes its mtime, so an export
+still writing its index keeps the chunks it reuses for the gc grace period.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import structlog
+
+from clonebox import paths as _paths
+
+log = structlog.get_logger(__name__)
+
+BLOCK_SIZE = 4096
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+# One block in 128 ends a chunk: ~512 KiB average past the minimum.
+BOUNDARY_MASK = 0x7F
+
+# Objects written or reused more recently survive gc: an export or transfer may still be writing its index
+GC_GRACE = 3600.0
+
+INDEX_SUFFIX = ".chunks.json"
+INDEX_VERSION = 1
+# Index entry digest for a chunk of zeros; nothing is stored for it.
+ZERO = None
+
+_READ_SIZE = 8 * 1024 * 1024
+_ZEROS = bytes(MAX_CHUNK)
+
+
+class ChunkMissingError(RuntimeError):
+    """A disk index references a chunk that is not in the store."""
+
+
+class ChunkIntegrityError(RuntimeError):
+    """Stored chunk data does not match its address."""
+
+
+def iter_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """Yield the content-defined chunks of *stream*."""
+    pending = bytearray()
+    carry = b""
+    while True:
+        data = stream.read(_READ_SIZE)
+        if not data:
+            break
+        if carry:
+            data = carry + data
+        view = memoryview(data)
+        usable = len(data) - len(data) % BLOCK_SIZE
+        for offset in range(0, usable, BLOCK_SIZE):
+            block = view[offset:offset + BLOCK_SIZE]
+            pending += block
+            if len(pending) >= MAX_CHUNK or (
+                len(pending) >= MIN_CHUNK
+                and zlib.crc32(block) & BOUNDARY_MASK == BOUNDARY_MASK
+            ):
+                yield bytes(pending)
+                pending.clear()
+        carry = bytes(view[usable:])
+    pending += carry
+    if pending:
+        yield bytes(pending)
+
+
+def referenced(index: Dict[str, Any]) -> List[str]:
+    """Distinct stored chunks of a disk index, in first-use order."""
+    return list(dict.fromkeys(d for d, _ in index["chunks"] if d is not ZERO))
+
+
+def _is_zero(chunk: bytes) -> bool:
+    return chunk == _ZEROS[:len(chunk)]
+
+
+def pack_chunk(chunk: bytes) -> bytes:
+    """Object bytes for *chunk*, as stored and shipped between stores."""
+    return zlib.compress(chunk, 1)
+
+
+def index_stream(
+    stream: BinaryIO, name: str, sink: Callable[[str, bytes], None]
+) -> Dict[str, Any]:
+    """Chunk index of the disk image on *stream*.
+
+    *sink* gets each non-zero chunk with its digest as soon as it is cut,
+    so the chunks can be stored or sent in the same pass.
+    """
+    entries: List[list] = []
+    size = 0
+    for chunk in iter_chunks(stream):
+        size += len(chunk)
+        if _is_zero(chunk):
+            entries.append([ZERO, len(chunk)])
+            continue
+        digest = hashlib.sha256(chunk).hexdigest()
+        sink(digest, chunk)
+        entries.append([digest, len(chunk)])
+    return {"version": INDEX_VERSION, "name": name, "size": size, "chunks": entries}
+
+
+class ChunkStore:
+    """Chunks addressed by the sha256 of their uncompressed data."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+
+    @classmethod
+    def default(cls, user_session: bool = True) -> "ChunkStore":
+        root = os.getenv("CLONEBOX_CHUNK_STORE")
+        return cls(Path(root) if root else _paths.images_dir(user_session) / "chunks")
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.object_path(digest).exists()
+
+    def _touch(self, digest: str) -> bool:
+        """Refresh an existing object's mtime so gc treats it as just written."""
+        try:
+            os.utime(self.object_path(digest))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _write_object(self, digest: str, blob: bytes) -> None:
+        path = self.object_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{digest}.{os.getpid()}.tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+
+    def _store(self, digest: str, chunk: bytes) -> bool:
+        if self._touch(digest):
+            return False
+        self._write_object(digest, pack_chunk(chunk))
+        return True
+
+    def put(self, chunk: bytes) -> Tuple[str, bool]:
+        """Store *chunk*; return ``(digest, newly_added)``."""
+        digest = hashlib.sha256(chunk).hexdigest()
+        return digest, self._store(digest, chunk)
+
+    def put_object(self, digest: str, blob: bytes) -> bool:
+        """Add a compressed object copied from another store."""
+        if self._touch(digest):
+            return False
+        if hashlib.sha256(zlib.decompress(blob)).hexdigest() != digest:
+            raise ChunkIntegrityError(f"Chunk {digest} does not match its content")
+        self._write_object(digest, blob)
+        return True
+
+    def get(self, digest: str) -> bytes:
+        path = self.object_path(digest)
+        try:
+            chunk = zlib.decompress(path.read_bytes())
+        except FileNotFoundError:
+            raise ChunkMissingError(f"Chunk {digest} is not in {self.root}") from None
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise ChunkIntegrityError(f"Chunk {digest} is corrupt: {path}")
+        return chunk
+
+    def digests(self) -> Iterator[str]:
+        """Digests of the stored objects."""
+        if not self.objects_dir.is_dir():
+            return
+        for path in self.objects_dir.glob("*/*"):
+            if not path.name.startswith("."):  # in-flight temp files
+                yield path.name
+
+    def missing(self, index: Dict[str, Any]) -> List[str]:
+        """Digests referenced by *index* that are not stored."""
+        return sorted({d for d in referenced(index) if not self.has(d)})
+
+    def read_object(self, digest: str) -> bytes:
+        """Compressed object bytes, as shipped between stores."""
+        try:
+            return self.object_path(digest).read_bytes()
+        except FileNotFoundError:
+            raise ChunkMissingError(f"Chunk {digest} is not in {self.root}") from None
+
+    def add_file(self, path: Path) -> Tuple[Dict[str, Any], List[str]]:
+        """Chunk *path* into the store.
+
+        Returns the disk index and the digests that were not stored before,
+        in first-use order.
+        """
+        with open(path, "rb") as f:
+            index, new = self.add_stream(f, path.name)
+        log.info("disk_chunked", path=str(path), size=index["size"],
+                 chunks=len(index["chunks"]), new=len(new))
+        return index, new
+
+    def add_stream(self, stream: BinaryIO, name: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Like :meth:`add_file` for a disk image read from *stream*."""
+        new: List[str] = []
+
+        def store(digest: str, chunk: bytes) -> None:
+            if self._store(digest, chunk):
+                new.append(digest)
+
+        return index_stream(stream, name, store), new
+
+    def restore_file(self, index: Dict[str, Any], dest: Path) -> Path:
+        """Reassemble the disk described by *index* at *dest* (sparse)."""
+        missing = self.missing(index)
+        if missing:
+            raise ChunkMissingError(
+                f"{len(missing)} chunk(s) of {index['name']} are not in {self.root}; "
+                "import the earlier exports of this VM first or re-export with all chunks"
+            )
+        with open(dest, "wb") as out:
+            for digest, length in index["chunks"]:
+                if digest is ZERO:
+                    out.seek(length, os.SEEK_CUR)
+                else:
+                    out.write(self.get(digest))
+            out.truncate(index["size"])
+        return dest
+
+    def gc(
+        self, keep_indexes: Iterable[Dict[str, Any]], grace: float = GC_GRACE, dry_run: bool = False
+    ) -> Tuple[int, int]:
+        """Delete objects that no index in *keep_indexes* references.
+
+        Objects (and leftover temp files) modified within the last *grace*
+        seconds are kept.  Returns ``(objects, bytes)`` removed, or that
+        would be removed with *dry_run*.
+        """
+        keep = {digest for index in keep_indexes for digest in referenced(index)}
+        cutoff = time.time() - grace
+        removed = freed = 0
+        if not self.objects_dir.is_dir():
+            return 0, 0
+        for path in self.objects_dir.glob("*/*"):
+            if path.name in keep:
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if st.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                path.unlink(missing_ok=True)
+            removed += 1
+            freed += st.st_size
+        log.info("chunk_store_gc", root=str(self.root), kept=len(keep), removed=removed,
+                 freed=freed, dry_run=dry_run)
+        return removed, freed
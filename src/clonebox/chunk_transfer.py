@@ -0,0 +1,297 @@
+"""
+Chunk-level VM transfer between workstations.
+
+A VM crosses the wire as two parts: a small *index archive* (domain XML,
+per-disk chunk indexes, user/app data) and the set of chunk-store objects
+the indexes reference.  Chunks are content-addressed, so:
+
+* only chunks the receiving store lacks are sent — a second transfer of
+  the same VM, or of a sibling on the same base, moves only new data;
+* every chunk is verified against its sha256 as it is stored, and is
+  committed atomically, so an interrupted pull resumes from the chunks
+  that already arrived;
+* pushed chunks can be split over several SSH streams.
+
+A pull keeps nothing on the peer: ``clonebox export --chunk-stream`` cuts
+the disks and sends every chunk the receiver does not list as it is cut,
+followed by the indexes.  A push lands in a chunk store scoped to the
+transfer, which is removed once the import there has finished or failed.
+
+Chunk streams are plain tar streams of ``<digest>`` members holding the
+compressed object bytes (see :class:`clonebox.chunk_store.ChunkStore`).
+
+Transfer state is private to the user: index archives and partial outputs
+are created ``0600``.  For encrypted transfers the index archive is kept
+encrypted at rest and the decrypted chunks go to a store of their own that
+is deleted with the transfer state, never to the shared chunk store.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import structlog
+
+from clonebox.chunk_store import INDEX_SUFFIX, ChunkStore, referenced
+from clonebox.compression import archive_decompressor
+from clonebox.crypto_stream import DecryptingReader, EncryptingWriter
+from clonebox.disk_export import BASE_REF_SUFFIX
+
+log = structlog.get_logger(__name__)
+
+DEFAULT_STREAMS = 4
+
+
+def open_private(path: Path) -> BinaryIO:
+    """Open *path* for writing, truncated and readable by the owner only."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)  # it may have existed with wider permissions
+    return os.fdopen(fd, "wb")
+
+
+def _open_index(index: Union[Path, BinaryIO]) -> tarfile.TarFile:
+    if isinstance(index, (str, Path)):
+        return tarfile.open(index)
+    return tarfile.open(fileobj=index, mode="r|")
+
+
+def _is_disk_image(member: tarfile.TarInfo) -> bool:
+    return (
+        member.isfile()
+        and member.name.startswith("disks/")
+        and not member.name.endswith((INDEX_SUFFIX, BASE_REF_SUFFIX))
+    )
+
+
+def split_archive(src: BinaryIO, store: ChunkStore, out: BinaryIO) -> List[str]:
+    """Turn any export archive on *src* into an index archive on *out*.
+
+    Disk images are chunked into *store*, chunks the archive carries are
+    added to it, and everything else is copied.  Returns the chunks the
+    index archive references, in first-use order.
+    """
+    digests: Dict[str, None] = {}
+    with archive_decompressor(src) as (stream, mode), \
+            tarfile.open(fileobj=stream, mode=mode) as tar_in, \
+            tarfile.open(fileobj=out, mode="w|") as tar_out:
+        for member in tar_in:
+            if member.isfile() and member.name.startswith("chunks/"):
+                store.put_object(Path(member.name).name, tar_in.extractfile(member).read())
+                continue
+            if _is_disk_image(member):
+                index, _ = store.add_stream(tar_in.extractfile(member), Path(member.name).name)
+                blob = json.dumps(index, separators=(",", ":")).encode()
+                info = tarfile.TarInfo(f"{member.name}{INDEX_SUFFIX}")
+                info.size, info.mtime, info.mode = len(blob), member.mtime, 0o644
+                tar_out.addfile(info, io.BytesIO(blob))
+                digests.update(dict.fromkeys(referenced(index)))
+                continue
+            data = tar_in.extractfile(member) if member.isfile() else None
+            if member.name.endswith(INDEX_SUFFIX) and data is not None:
+                blob = data.read()
+                digests.update(dict.fromkeys(referenced(json.loads(blob))))
+                data = io.BytesIO(blob)
+            tar_out.addfile(member, data)
+    return list(digests)
+
+
+def read_index_archive(path: Union[Path, BinaryIO]) -> Tuple[Optional[str], List[str]]:
+    """VM name and referenced chunks of the index archive at *path* (or on a stream)."""
+    vm_name = None
+    digests: Dict[str, None] = {}
+    with _open_index(path) as tar:
+        for member in tar:
+            if "/" not in member.name and member.name.endswith(".xml"):
+                vm_name = member.name[:-len(".xml")]
+            elif member.isfile() and member.name.endswith(INDEX_SUFFIX):
+                digests.update(dict.fromkeys(referenced(json.load(tar.extractfile(member)))))
+    return vm_name, list(digests)
+
+
+def archive_indexes(path: Path) -> List[Dict[str, Any]]:
+    """Chunk indexes in an export or index archive, or of a bare index file."""
+    path = Path(path)
+    if path.name.endswith(INDEX_SUFFIX):
+        return [json.loads(path.read_text())]
+    indexes = []
+    with open(path, "rb") as src, archive_decompressor(src) as (stream, mode), \
+            tarfile.open(fileobj=stream, mode=mode) as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(INDEX_SUFFIX):
+                indexes.append(json.load(tar.extractfile(member)))
+    return indexes
+
+
+def assemble_archive(
+    index_archive: Union[Path, BinaryIO], store: ChunkStore, digests: Iterable[str], out: BinaryIO
+) -> None:
+    """Write a self-contained chunked archive: the chunks, then the index archive."""
+    with tarfile.open(fileobj=out, mode="w|") as tar_out:
+        for digest in digests:
+            blob = store.read_object(digest)
+            store.get(digest)  # verify before it leaves the store
+            info = tarfile.TarInfo(f"chunks/{digest}")
+            info.size, info.mtime, info.mode = len(blob), int(time.time()), 0o644
+            tar_out.addfile(info, io.BytesIO(blob))
+        with _open_index(index_archive) as tar_in:
+            for member in tar_in:
+                tar_out.addfile(member, tar_in.extractfile(member) if member.isfile() else None)
+
+
+def write_chunk_stream(store: ChunkStore, digests: Iterable[str], out: BinaryIO) -> int:
+    """Send the objects for *digests* as a tar stream; returns the count."""
+    count = 0
+    with tarfile.open(fileobj=out, mode="w|") as tar:
+        for digest in digests:
+            blob = store.read_object(digest)
+            info = tarfile.TarInfo(digest)
+            info.size, info.mode = len(blob), 0o644
+            tar.addfile(info, io.BytesIO(blob))
+            count += 1
+    return count
+
+
+def read_chunk_stream(src: BinaryIO, store: ChunkStore) -> int:
+    """Verify and store every object of a chunk stream; returns the count."""
+    count = 0
+    with tarfile.open(fileobj=src, mode="r|") as tar:
+        for member in tar:
+            if member.isfile():
+                store.put_object(Path(member.name).name, tar.extractfile(member).read())
+                count += 1
+    return count
+
+
+def _split(digests: Sequence[str], streams: int) -> List[List[str]]:
+    groups: List[List[str]] = [[] for _ in range(max(1, min(streams, len(digests))))]
+    for i, digest in enumerate(digests):
+        groups[i % len(groups)].append(digest)
+    return groups
+
+
+def _check(proc: subprocess.Popen, stderr: BinaryIO) -> None:
+    if proc.wait() != 0:
+        stderr.seek(0)
+        message = stderr.read().decode(errors="replace").strip()
+        raise RuntimeError(f"chunk stream failed: {message or f'exit code {proc.returncode}'}")
+
+
+def _run_parallel(work: Callable[[List[str]], None], digests: Sequence[str], streams: int) -> List[str]:
+    """Run *work* on *streams* groups of *digests*; return error messages."""
+    errors: List[str] = []
+    groups = _split(digests, streams)
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        for future in [pool.submit(work, group) for group in groups]:
+            try:
+                future.result()
+            except Exception as exc:
+                errors.append(str(exc))
+    return errors
+
+
+def remote_missing(remote_cmd: Callable[[str], List[str]], digests: Sequence[str]) -> List[str]:
+    """Ask the remote store which of *digests* it lacks."""
+    result = subprocess.run(remote_cmd("clonebox chunks missing"),
+                            input="".join(f"{d}\n" for d in digests),
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Remote chunk query failed: {result.stderr.strip()}")
+    return result.stdout.split()
+
+
+def push_chunks(
+    remote_cmd: Callable[[str], List[str]],
+    digests: Sequence[str],
+    store: ChunkStore,
+    streams: int = DEFAULT_STREAMS,
+) -> int:
+    """Push the chunks in *digests* the remote store lacks."""
+    wanted = remote_missing(remote_cmd, digests)
+    if not wanted:
+        return 0
+
+    def work(group: List[str]) -> None:
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(remote_cmd("clonebox chunks receive"),
+                                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                write_chunk_stream(store, group, proc.stdin)
+            finally:
+                with contextlib.suppress(OSError):
+                    proc.stdin.close()
+                _check(proc, stderr)
+
+    errors = _run_parallel(work, wanted, streams)
+    if errors:
+        raise RuntimeError(f"Pushing chunks failed ({'; '.join(errors)}); re-run to resume")
+    log.info("chunks_pushed", count=len(wanted), streams=streams)
+    return len(wanted)
+
+
+class TransferManifest:
+    """Resume state of a transfer: the index archive and its chunk list.
+
+    Lives next to the transfer's output as ``<output>.transfer.json`` so an
+    interrupted run picks up the same snapshot of the VM.  With *key*, the
+    index archive is stored encrypted and :meth:`chunk_store` is private.
+    """
+
+    def __init__(self, output: Path, key: Optional[bytes] = None):
+        self.path = output.with_name(f"{output.name}.transfer.json")
+        self.index_path = output.with_name(f"{output.name}.index.tar")
+        self.chunks_dir = output.with_name(f".{output.name}.chunks")
+        self.key = key
+
+    def chunk_store(self, shared: ChunkStore) -> ChunkStore:
+        """Store for the transfer's chunks: *shared*, unless it is encrypted."""
+        if self.key is None:
+            return shared
+        self.chunks_dir.mkdir(mode=0o700, exist_ok=True)
+        return ChunkStore(self.chunks_dir)
+
+    @contextlib.contextmanager
+    def write_index(self) -> Iterator[BinaryIO]:
+        """Writable stream that becomes the (owner-only) index archive."""
+        with open_private(self.index_path) as out:
+            if self.key is None:
+                yield out
+            else:
+                with EncryptingWriter(out, self.key) as writer:
+                    yield writer
+
+    @contextlib.contextmanager
+    def read_index(self) -> Iterator[BinaryIO]:
+        """The index archive as a plaintext stream."""
+        with open(self.index_path, "rb") as src:
+            yield src if self.key is None else DecryptingReader(src, self.key)
+
+    def load(self, **identity: Any) -> Optional[List[str]]:
+        """Chunk list of a matching unfinished transfer, if there is one."""
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("identity") != identity or not self.index_path.exists():
+            return None
+        return data["chunks"]
+
+    def save(self, chunks: List[str], **identity: Any) -> None:
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"identity": identity, "chunks": chunks,
+                                   "created_at": time.time()}))
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        for path in (self.path, self.index_path):
+            path.unlink(missing_ok=True)
+        shutil.rmtree(self.chunks_dir, ignore_errors=True)
+
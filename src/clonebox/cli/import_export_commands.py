@@ -3,23 +3,29 @@
 Import/Export commands for CloneBox CLI.
 """
 
+import contextlib
 import os
+import subprocess
+import sys
 from pathlib import Path
 from typing import Optional
 
-import questionary
-
 from clonebox.exporter import SecureExporter, VMExporter
 from clonebox.importer import SecureImporter, VMImporter
-from clonebox.cli.utils import console, custom_style, load_clonebox_config, CLONEBOX_CONFIG_FILE, resolve_vm_name
+from clonebox.cli.utils import console, load_clonebox_config, CLONEBOX_CONFIG_FILE, resolve_vm_name
 
 
 def cmd_export(args):
     """Export VM configuration and data."""
     vm_name = resolve_vm_name(args.name)
-    output_path = Path(args.output)
+    to_stdout = args.output == "-"
     user_session = getattr(args, "user", False)
+    if to_stdout:
+        # stdout carries the archive; messages go to stderr
+        console.file = sys.stderr
     if not vm_name:
+        if to_stdout:
+            raise RuntimeError("No VM name specified")
         console.print("[red]❌ No VM name specified[/]")
         return
     
@@ -29,45 +35,142 @@ def cmd_export(args):
     vms = cloner.list_vms()
     
     if not any(vm["name"] == vm_name for vm in vms):
+        if to_stdout:
+            raise RuntimeError(f"VM '{vm_name}' not found")
         console.print(f"[red]❌ VM '{vm_name}' not found[/]")
         return
     
     # Export VM
-    exporter = VMExporter(user_session=user_session)
-    export_path = exporter.export_vm(
-        vm_name=vm_name,
-        output_path=output_path,
-        include_disk=args.include_disk,
-        include_memory=args.include_memory,
-        compress=args.compress,
-        console=console,
+    from clonebox import paths as _paths
+    from clonebox.chunk_store import ChunkStore
+
+    chunk_store = ChunkStore.default(user_session) if getattr(args, "chunked", False) else None
+    if getattr(args, "index_only", False) and chunk_store is None:
+        raise RuntimeError("--index-only requires --chunked")
+    chunk_stream = getattr(args, "chunk_stream", False)
+    if chunk_stream and chunk_store is not None:
+        raise RuntimeError("--chunk-stream cannot be combined with --chunked")
+    # The receiver lists the chunks it already has on stdin
+    known_chunks = set(sys.stdin.read().split()) if chunk_stream and not sys.stdin.isatty() else set()
+    options = dict(
+        include_user_data=getattr(args, "include_user_data", False),
+        include_app_data=getattr(args, "include_app_data", False),
+        chunk_store=chunk_store,
+        all_chunks=getattr(args, "all_chunks", False),
+        index_only=getattr(args, "index_only", False),
+        disk_mode=getattr(args, "disk_mode", "auto"),
+        compression=getattr(args, "compression", None),
+        chunk_stream=chunk_stream,
+        known_chunks=known_chunks,
     )
+    exporter = VMExporter(_paths.conn_uri(user_session))
+    try:
+        if to_stdout:
+            with os.fdopen(os.dup(sys.stdout.fileno()), "wb") as out, \
+                    contextlib.redirect_stdout(sys.stderr):
+                exporter.write_archive(vm_name, out, **options)
+            return
+        export_path = exporter.export_vm(vm_name=vm_name, output_path=Path(args.output), **options)
+    finally:
+        exporter.close()
     
     console.print(f"[green]✅ VM exported to: {export_path}[/]")
 
 
 def cmd_import(args):
     """Import VM from exported archive."""
+    from_stdin = args.import_path == "-"
     import_path = Path(args.import_path)
     new_name = args.name
     user_session = getattr(args, "user", False)
     
-    if not import_path.exists():
+    if not from_stdin and not import_path.exists():
         console.print(f"[red]❌ Import file not found: {import_path}[/]")
         return
     
     # Import VM
-    importer = VMImporter(user_session=user_session)
-    vm_name = importer.import_vm(
-        import_path=import_path,
+    from clonebox import paths as _paths
+
+    options = dict(
         new_name=new_name,
-        start=args.start,
-        console=console,
+        import_user_data=getattr(args, "include_user_data", False),
+        import_app_data=getattr(args, "include_app_data", False),
+        disk_dir=_paths.images_dir(user_session),
     )
+    importer = VMImporter(_paths.conn_uri(user_session))
+    try:
+        if from_stdin:
+            vm_name = importer.import_stream(sys.stdin.buffer, **options)
+        else:
+            vm_name = importer.import_vm(archive_path=import_path, **options)
+    finally:
+        importer.close()
     
     console.print(f"[green]✅ VM imported as: {vm_name}[/]")
 
 
+def cmd_chunks(args):
+    """Chunk-store plumbing for P2P transfers (digests on stdin), and its gc."""
+    from clonebox.chunk_store import ChunkStore
+    from clonebox.chunk_transfer import read_chunk_stream
+
+    store = ChunkStore.default(getattr(args, "user", False))
+    if args.action == "gc":
+        _chunks_gc(store, args)
+        return
+    if args.action == "receive":
+        read_chunk_stream(sys.stdin.buffer, store)
+        return
+    digests = sys.stdin.read().split()
+    sys.stdout.write("".join(f"{d}\n" for d in digests if not store.has(d)))
+
+
+def _chunks_gc(store, args) -> None:
+    from clonebox.chunk_transfer import archive_indexes
+
+    keep = getattr(args, "keep", None) or []
+    if not keep and not getattr(args, "all", False):
+        raise ValueError("chunks gc needs the exports to keep (or --all to empty the store)")
+    indexes = [index for path in keep for index in archive_indexes(path)]
+    dry_run = getattr(args, "dry_run", False)
+    removed, freed = store.gc(indexes, dry_run=dry_run)
+    verb = "Would delete" if dry_run else "Deleted"
+    console.print(
+        f"[green]🧹 {verb} {removed} chunk(s), {freed / 1024**2:.1f} MiB "
+        f"(kept chunks of {len(indexes)} disk(s))[/]"
+    )
+
+
+def cmd_replicate(args):
+    """Send the changes of a VM since the last sync to its replica on a peer."""
+    from clonebox import paths as _paths
+    from clonebox.p2p import P2PManager
+
+    vm_name = resolve_vm_name(args.name)
+    if not vm_name:
+        console.print("[red]❌ No VM name specified[/]")
+        return
+    user_session = getattr(args, "user", False)
+    P2PManager(user_session=user_session).replicate(
+        args.host, vm_name, conn_uri=_paths.conn_uri(user_session), full=args.full
+    )
+
+
+def cmd_replica(args):
+    """Replica plumbing for replication (stream on stdin)."""
+    import json
+
+    from clonebox.replication import receive_replica, replica_status
+
+    user_session = getattr(args, "user", False)
+    if args.action == "receive":
+        receive_replica(sys.stdin.buffer, user_session)
+        return
+    if not args.name:
+        raise ValueError("replica status needs a VM name")
+    sys.stdout.write(json.dumps(replica_status(args.name, user_session)) + "\n")
+
+
 def cmd_export_encrypted(args):
     """Export VM with encryption."""
     vm_name = args.name
@@ -78,30 +181,22 @@ def cmd_export_encrypted(args):
         console.print("[red]❌ No VM name specified[/]")
         return
     
-    # Get encryption password
-    if args.password:
-        password = args.password
-    else:
-        password = questionary.password(
-            "Enter encryption password:", style=custom_style
-        ).ask()
-        
-        if not password:
-            console.print("[red]❌ No password provided[/]")
-            return
-        
-        if not questionary.confirm("Confirm password?", style=custom_style).ask():
-            return
-    
-    # Export with encryption
-    exporter = SecureExporter(user_session=user_session)
-    export_path = exporter.export_encrypted(
-        vm_name=vm_name,
-        output_path=output_path,
-        password=password,
-        include_disk=args.include_disk,
-        console=console,
-    )
+    # Export with encryption (team key from ~/.clonebox.key)
+    from clonebox import paths as _paths
+
+    exporter = SecureExporter(_paths.conn_uri(user_session))
+    try:
+        export_path = exporter.export_encrypted(
+            vm_name=vm_name,
+            output_path=output_path,
+            disk_mode=getattr(args, "disk_mode", "auto"),
+            compression=getattr(args, "compression", None),
+        )
+    except FileNotFoundError as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+    finally:
+        exporter.close()
     
     console.print(f"[green]✅ VM exported encrypted to: {export_path}[/]")
 
@@ -116,100 +211,68 @@ def cmd_import_encrypted(args):
         console.print(f"[red]❌ Import file not found: {import_path}[/]")
         return
     
-    # Get decryption password
-    if args.password:
-        password = args.password
-    else:
-        password = questionary.password(
-            "Enter decryption password:", style=custom_style
-        ).ask()
-        
-        if not password:
-            console.print("[red]❌ No password provided[/]")
-            return
-    
-    # Import with decryption
-    importer = SecureImporter(user_session=user_session)
-    vm_name = importer.import_encrypted(
-        import_path=import_path,
-        password=password,
-        new_name=new_name,
-        start=args.start,
-        console=console,
-    )
+    # Import with decryption (team key from ~/.clonebox.key)
+    from clonebox import paths as _paths
+
+    importer = SecureImporter(_paths.conn_uri(user_session))
+    try:
+        vm_name = importer.import_decrypted(
+            encrypted_path=import_path,
+            new_name=new_name,
+        )
+    except FileNotFoundError as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+    finally:
+        importer.close()
     
     console.print(f"[green]✅ VM imported as: {vm_name}[/]")
 
 
 def cmd_export_remote(args):
-    """Export VM to remote host."""
-    vm_name = args.name
-    remote_host = args.remote_host
-    remote_path = args.remote_path
-    user_session = getattr(args, "user", False)
-    
-    vm_name = resolve_vm_name(vm_name)
-    if not vm_name:
-        console.print("[red]❌ No VM name specified[/]")
-        return
-    
-    # Export locally first
-    from clonebox.exporter import VMExporter
-    exporter = VMExporter(user_session=user_session)
-    
-    with tempfile.TemporaryDirectory() as tmpdir:
-        local_path = Path(tmpdir) / f"{vm_name}.tar.gz"
-        exporter.export_vm(
-            vm_name=vm_name,
-            output_path=local_path,
-            include_disk=args.include_disk,
-            compress=True,
-            console=console,
+    """Pull a VM from a remote host into a local archive (resumable chunk transfer)."""
+    from clonebox.p2p import P2PManager
+
+    p2p = P2PManager(user_session=getattr(args, "user", False))
+    try:
+        output = p2p.export_remote(
+            args.host,
+            args.vm_name,
+            Path(args.output),
+            encrypted=args.encrypted,
+            include_user_data=args.include_user_data,
+            include_app_data=args.include_app_data,
         )
-        
-        # Transfer to remote host
-        console.print(f"[cyan]Transferring to {remote_host}...[/]")
-        
-        cmd = ["scp", str(local_path), f"{remote_host}:{remote_path}"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            console.print(f"[green]✅ VM exported to {remote_host}:{remote_path}[/]")
-        else:
-            console.print(f"[red]❌ Transfer failed: {result.stderr}[/]")
+    except (FileNotFoundError, RuntimeError) as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+
+    console.print(f"[green]✅ VM {args.vm_name} from {args.host} saved to: {output}[/]")
 
 
 def cmd_import_remote(args):
-    """Import VM from remote host."""
-    remote_host = args.remote_host
-    remote_path = args.remote_path
-    new_name = args.name
-    user_session = getattr(args, "user", False)
-    
-    # Download from remote host
-    with tempfile.TemporaryDirectory() as tmpdir:
-        local_path = Path(tmpdir) / Path(remote_path).name
-        
-        console.print(f"[cyan]Downloading from {remote_host}...[/]")
-        
-        cmd = ["scp", f"{remote_host}:{remote_path}", str(local_path)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            console.print(f"[red]❌ Download failed: {result.stderr}[/]")
-            return
-        
-        # Import locally
-        from clonebox.importer import VMImporter
-        importer = VMImporter(user_session=user_session)
-        vm_name = importer.import_vm(
-            import_path=local_path,
-            new_name=new_name,
-            start=args.start,
-            console=console,
+    """Push a local archive to a remote host and import it there."""
+    from clonebox.p2p import P2PManager
+
+    archive_path = Path(args.archive)
+    if not archive_path.exists():
+        console.print(f"[red]❌ Archive not found: {archive_path}[/]")
+        return
+
+    p2p = P2PManager(streams=args.streams, user_session=getattr(args, "user", False))
+    try:
+        vm_name = p2p.import_remote(
+            args.host,
+            archive_path,
+            encrypted=args.encrypted,
+            import_user_data=args.include_user_data,
+            new_name=args.name,
         )
-        
-        console.print(f"[green]✅ VM imported as: {vm_name}[/]")
+    except (FileNotFoundError, RuntimeError) as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+
+    console.print(f"[green]✅ VM imported on {args.host} as: {vm_name}[/]")
 
 
 def cmd_sync_key(args):
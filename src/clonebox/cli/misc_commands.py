@@ -13,7 +13,7 @@ from typing import Dict, List, Optional, Tuple
 import questionary
 
 from clonebox.detector import SystemDetector
-from clonebox.cli.utils import console, custom_style, load_clonebox_config, CLONEBOX_CONFIG_FILE, _resolve_vm_name_and_config_file, resolve_vm_name
+from clonebox.cli.utils import console, custom_style, load_clonebox_config, CLONEBOX_CONFIG_FILE, _resolve_vm_name_and_config_file, resolve_vm_name, _qga_ping
 from clonebox import paths as _paths
 from clonebox.ssh import ssh_exec as _ssh_exec, build_ssh_command as _build_ssh_cmd
 
@@ -420,7 +420,13 @@ def cmd_dashboard(args):
         webbrowser.open(f"http://localhost:{args.port}")
     
     # Start dashboard server
-    create_dashboard(host=args.host, port=args.port, debug=args.debug)
+    create_dashboard(
+        host=args.host,
+        port=args.port,
+        debug=args.debug,
+        user_session=getattr(args, "user", False),
+        compose_files=getattr(args, "compose", None) or (),
+    )
 
 
 def cmd_status(args):
@@ -577,13 +583,7 @@ def run_vm_diagnostics(
         # Check 3: QEMU Guest Agent
         console.print("\n[dim]Checking QEMU Guest Agent...[/]")
         try:
-            result = subprocess.run(
-                ["virsh", "--connect", conn_uri, "qemu-agent-command", vm_name, '{"execute": "guest-ping"}'],
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-            if result.returncode == 0:
+            if _qga_ping(vm_name, conn_uri):
                 diagnostics["checks"]["guest_agent"] = {"status": "PASS", "message": "QEMU Guest Agent responding"}
                 diagnostics["summary"]["passed"] += 1
                 console.print("[green]✅ QEMU Guest Agent is responding[/]")
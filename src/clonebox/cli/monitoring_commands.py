@@ -3,6 +3,7 @@
 Monitoring and health check commands for CloneBox CLI.
 """
 
+import json
 import time
 from pathlib import Path
 from typing import Optional
@@ -11,6 +12,7 @@ from rich.table import Table
 from rich.live import Live
 
 from clonebox.monitor import ResourceMonitor, format_bytes
+from clonebox.metrics_store import MetricsStore
 from clonebox.health import HealthCheckManager, ProbeConfig, ProbeType
 from clonebox.cli.utils import console, load_clonebox_config, CLONEBOX_CONFIG_FILE, _qga_ping, _qga_exec, resolve_vm_name
 from clonebox.validation.validator import VMValidator
@@ -25,7 +27,7 @@ def cmd_monitor(args):
         console.print("[red]❌ No VM name specified[/]")
         return
     
-    monitor = ResourceMonitor(user_session=user_session)
+    monitor = ResourceMonitor(user_session=user_session, store=MetricsStore.default())
     
     def generate_table():
         stats = monitor.get_stats(vm_name)
@@ -40,6 +42,11 @@ def cmd_monitor(args):
         # CPU
         cpu_percent = stats.get("cpu_percent", 0)
         table.add_row("CPU", f"{cpu_percent}%", _get_progress_bar(cpu_percent, 100))
+        now = time.time()
+        history = monitor.store.query("vm", vm_name, "cpu_percent", start=now - 60, end=now)
+        if history:
+            cpu_avg = sum(value for _, value in history) / len(history)
+            table.add_row("CPU (1 min avg)", f"{cpu_avg:.1f}%", "")
         
         # Memory
         memory_used = stats.get("memory_used", 0)
@@ -85,6 +92,54 @@ def cmd_monitor(args):
                 time.sleep(1)
     except KeyboardInterrupt:
         console.print("\n[yellow]Monitoring stopped[/]")
+    finally:
+        monitor.close()
+
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _parse_duration(value: str) -> float:
+    """Seconds in a duration like ``90``, ``15m``, ``6h`` or ``7d``."""
+    value = value.strip().lower()
+    if value and value[-1] in _DURATION_UNITS:
+        return float(value[:-1]) * _DURATION_UNITS[value[-1]]
+    return float(value)
+
+
+def cmd_metrics(args):
+    """Query recorded metrics history of a VM or container."""
+    kind = getattr(args, "kind", "vm")
+    name = args.name if kind == "container" else resolve_vm_name(args.name)
+    if not name:
+        console.print("[red]❌ No VM name specified[/]")
+        return
+    store = MetricsStore.default()
+    try:
+        since = _parse_duration(args.since)
+        step = _parse_duration(args.step) if args.step else None
+    except ValueError:
+        console.print("[red]❌ Durations look like 30s, 15m, 6h or 7d[/]")
+        return
+    end = time.time()
+    points = store.query(kind, name, args.metric, start=end - since, end=end, step=step, agg=args.agg)
+
+    if getattr(args, "json", False):
+        print(json.dumps([{"ts": ts, "value": value} for ts, value in points]))
+        return
+    if not points:
+        known = sorted({key.rsplit("/", 1)[1] for key in store.series(kind, name)})
+        console.print(f"[yellow]No {args.metric} history for {kind} {name}[/]")
+        if known:
+            console.print(f"[dim]Recorded metrics: {', '.join(known)}[/]")
+        return
+
+    table = Table(title=f"{args.metric} ({args.agg}) - {name}, last {args.since}")
+    table.add_column("Time", style="cyan")
+    table.add_column("Value", style="green")
+    for ts, value in points:
+        table.add_row(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)), f"{value:.2f}")
+    console.print(table)
 
 
 def cmd_health(args):
@@ -169,6 +224,7 @@ def cmd_validate(args):
     smoke_test = getattr(args, "smoke_test", False)
     require_running_apps = getattr(args, "require_running_apps", False)
     browsers_only = getattr(args, "browsers_only", False)
+    jobs = getattr(args, "jobs", 1) or 1
 
     conn_uri = _paths.conn_uri(user_session)
 
@@ -213,6 +269,7 @@ def cmd_validate(args):
         console=console,
         require_running_apps=require_running_apps,
         smoke_test=smoke_test,
+        jobs=jobs,
     )
 
     validator.validate_all()
@@ -9,6 +9,8 @@ import sys
 from rich.console import Console
 
 from clonebox import __version__
+from clonebox.chunk_transfer import DEFAULT_STREAMS
+from clonebox.metrics_store import AGGREGATES
 from clonebox.cli.utils import console, custom_style
 from clonebox.cli.interactive import interactive_mode
 
@@ -16,6 +18,7 @@ from clonebox.cli.interactive import interactive_mode
 from clonebox.cli.vm_commands import *
 from clonebox.cli.container_commands import *
 from clonebox.cli.snapshot_commands import *
+from clonebox.cli.pool_commands import *
 from clonebox.cli.monitoring_commands import *
 from clonebox.cli.import_export_commands import *
 from clonebox.cli.remote_commands import *
@@ -71,6 +74,16 @@ def main():
     )
     create_parser.add_argument("--base-image", help="Path to base qcow2 image")
     create_parser.add_argument("--no-gui", action="store_true", help="Disable SPICE graphics")
+    create_parser.add_argument(
+        "--golden",
+        action="store_true",
+        help="Reuse a cached pre-provisioned base image (built on first use)",
+    )
+    create_parser.add_argument(
+        "--memory-snapshot",
+        action="store_true",
+        help="Save a memory-state snapshot after setup (resume with 'start --resume')",
+    )
     create_parser.add_argument("--start", "-s", action="store_true", help="Start VM after creation")
     create_parser.set_defaults(func=cmd_create)
 
@@ -81,6 +94,14 @@ def main():
     )
     start_parser.add_argument("--no-viewer", action="store_true", help="Don't open virt-viewer")
     start_parser.add_argument("--viewer", action="store_true", help="Open virt-viewer GUI")
+    start_parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="SNAPSHOT",
+        help="Resume from a memory-state snapshot (default: latest) instead of booting",
+    )
     start_parser.add_argument(
         "-u",
         "--user",
@@ -224,6 +245,11 @@ def main():
         action="store_true",
         help="Include cache paths (can be large)",
     )
+    sync_data_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Resend everything instead of only changes since the last sync",
+    )
     sync_data_parser.set_defaults(func=cmd_sync_data)
 
     # Container command
@@ -321,6 +347,18 @@ def main():
     dashboard_parser.add_argument("--port", type=int, default=8080, help="Port to bind to")
     dashboard_parser.add_argument("--browser", action="store_true", help="Open in browser")
     dashboard_parser.add_argument("--debug", action="store_true", help="Enable debug mode")
+    dashboard_parser.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    dashboard_parser.add_argument(
+        "--compose",
+        action="append",
+        metavar="FILE",
+        help="Compose file whose VMs to report on /metrics (repeatable)",
+    )
     dashboard_parser.set_defaults(func=cmd_dashboard)
 
     # Diagnose command
@@ -354,10 +392,51 @@ def main():
     # Export command
     export_parser = subparsers.add_parser("export", help="Export VM")
     export_parser.add_argument("name", help="VM name")
-    export_parser.add_argument("output", help="Output file path")
+    export_parser.add_argument("output", help="Output file path ('-' for stdout)")
     export_parser.add_argument("--include-disk", action="store_true", help="Include disk image")
     export_parser.add_argument("--include-memory", action="store_true", help="Include memory state")
     export_parser.add_argument("--compress", action="store_true", help="Compress export")
+    export_parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="Deduplicate disks through the local chunk store; the archive only carries new chunks",
+    )
+    export_parser.add_argument(
+        "--all-chunks",
+        action="store_true",
+        help="With --chunked, put every referenced chunk in the archive (self-contained export)",
+    )
+    export_parser.add_argument(
+        "--index-only",
+        action="store_true",
+        help="With --chunked, put no chunks in the archive (they are fetched separately)",
+    )
+    export_parser.add_argument(
+        "--chunk-stream",
+        action="store_true",
+        help="Chunk disks without a chunk store, sending each chunk as it is cut except "
+        "those listed on stdin (the peer side of export-remote)",
+    )
+    export_parser.add_argument(
+        "--include-user-data", action="store_true", help="Include ~/.ssh, ~/.gitconfig and shell rc files"
+    )
+    export_parser.add_argument(
+        "--include-app-data", action="store_true", help="Include common application data directories"
+    )
+    export_parser.add_argument(
+        "--disk-mode",
+        choices=["auto", "file", "flatten", "overlay"],
+        default="auto",
+        help="Disk export: raw file copy, compacted standalone qcow2 (flatten), "
+        "changed clusters plus a base-image reference (overlay), or overlay "
+        "for backed disks and file otherwise (auto, default)",
+    )
+    export_parser.add_argument(
+        "--compression",
+        choices=["none", "gzip", "zstd"],
+        help="Archive compression: gzip (parallel via pigz when installed) or "
+        "multi-threaded zstd; default gzip, none for flatten/overlay disks",
+    )
     export_parser.add_argument(
         "-u",
         "--user",
@@ -368,8 +447,14 @@ def main():
 
     # Import command
     import_parser = subparsers.add_parser("import", help="Import VM")
-    import_parser.add_argument("import_path", help="Path to exported VM")
+    import_parser.add_argument("import_path", help="Path to exported VM ('-' for stdin)")
     import_parser.add_argument("--name", help="New VM name")
+    import_parser.add_argument(
+        "--include-user-data", action="store_true", help="Restore user data from the archive"
+    )
+    import_parser.add_argument(
+        "--include-app-data", action="store_true", help="Restore application data from the archive"
+    )
     import_parser.add_argument("--start", action="store_true", help="Start VM after import")
     import_parser.add_argument(
         "-u",
@@ -379,6 +464,67 @@ def main():
     )
     import_parser.set_defaults(func=cmd_import)
 
+    # Chunk-store plumbing (remote side of P2P transfers)
+    chunks_parser = subparsers.add_parser(
+        "chunks", help="Receive chunk-store objects over stdio, or garbage-collect the store"
+    )
+    chunks_parser.add_argument(
+        "action",
+        choices=["receive", "missing", "gc"],
+        help="receive: objects on stdin; "
+        "missing: print the digests from stdin that are not stored; "
+        "gc: delete objects the given exports do not reference",
+    )
+    chunks_parser.add_argument(
+        "keep", nargs="*",
+        help="gc: export archives, index archives or .chunks.json files whose chunks to keep",
+    )
+    chunks_parser.add_argument(
+        "--all", action="store_true", help="gc: keep nothing (empties the store)"
+    )
+    chunks_parser.add_argument(
+        "--dry-run", action="store_true", help="gc: only report what would be deleted"
+    )
+    chunks_parser.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    chunks_parser.set_defaults(func=cmd_chunks)
+
+    # Replication commands
+    replicate_parser = subparsers.add_parser(
+        "replicate", help="Send the blocks a VM changed since the last sync to a standby replica"
+    )
+    replicate_parser.add_argument("name", help="VM name or '.' to use .clonebox.yaml")
+    replicate_parser.add_argument("host", help="Peer host (user@hostname)")
+    replicate_parser.add_argument(
+        "--full", action="store_true", help="Resend all allocated data instead of the changes"
+    )
+    replicate_parser.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    replicate_parser.set_defaults(func=cmd_replicate)
+
+    replica_parser = subparsers.add_parser("replica", help="Receive/inspect replica disks over stdio")
+    replica_parser.add_argument(
+        "action",
+        choices=["receive", "status"],
+        help="receive: apply a replication stream from stdin; status: print replica state as JSON",
+    )
+    replica_parser.add_argument("name", nargs="?", help="VM name (status)")
+    replica_parser.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    replica_parser.set_defaults(func=cmd_replica)
+
     # Test command
     test_parser = subparsers.add_parser("test", help="Run CloneBox self-test")
     test_parser.add_argument("--base-image", help="Path to base image to test")
@@ -410,6 +556,13 @@ def main():
         action="store_true",
         help="Validate browsers only (firefox/chromium/chrome) + related logs",
     )
+    validate_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Run independent validation phases and checks on N parallel guest execs (default: 1)",
+    )
     validate_parser.set_defaults(func=cmd_validate)
 
     # Clone command
@@ -493,6 +646,27 @@ def main():
     )
     monitor_parser.set_defaults(func=cmd_monitor)
 
+    # Metrics command
+    metrics_parser = subparsers.add_parser("metrics", help="Query recorded resource history")
+    metrics_parser.add_argument(
+        "name", nargs="?", default=None, help="VM/container name or '.' to use .clonebox.yaml"
+    )
+    metrics_parser.add_argument(
+        "--kind", choices=["vm", "container"], default="vm", help="Series kind (default: vm)"
+    )
+    metrics_parser.add_argument(
+        "--metric", default="cpu_percent", help="Metric name (default: cpu_percent)"
+    )
+    metrics_parser.add_argument(
+        "--since", default="1h", help="How far back to query, e.g. 15m, 6h, 7d (default: 1h)"
+    )
+    metrics_parser.add_argument("--step", help="Re-bucket to this step, e.g. 5m")
+    metrics_parser.add_argument(
+        "--agg", choices=list(AGGREGATES), default="avg", help="Aggregate (default: avg)"
+    )
+    metrics_parser.add_argument("--json", action="store_true", help="Output JSON")
+    metrics_parser.set_defaults(func=cmd_metrics)
+
     # Watch command
     watch_parser = subparsers.add_parser("watch", help="Watch VM status")
     watch_parser.add_argument(
@@ -583,6 +757,9 @@ def main():
     snapshot_restore = snapshot_sub.add_parser("restore", help="Restore snapshot")
     snapshot_restore.add_argument("vm_name", help="VM name")
     snapshot_restore.add_argument("snapshot_id", help="Snapshot ID")
+    snapshot_restore.add_argument(
+        "-f", "--force", action="store_true", help="Restore even if the VM is running"
+    )
     snapshot_restore.add_argument(
         "-u",
         "--user",
@@ -602,6 +779,58 @@ def main():
     )
     snapshot_delete.set_defaults(func=cmd_snapshot_delete)
 
+    # Pool commands
+    pool_parser = subparsers.add_parser("pool", help="Manage pre-warmed VM pools")
+    pool_parser.set_defaults(func=lambda args, p=pool_parser: p.print_help())
+    pool_sub = pool_parser.add_subparsers(dest="pool_command", help="Pool commands")
+
+    pool_create = pool_sub.add_parser("create", help="Create or resize a pool for a config")
+    pool_create.add_argument(
+        "config", nargs="?", default=".", help="Path to .clonebox.yaml or its directory"
+    )
+    pool_create.add_argument("--size", "-n", type=int, default=2, help="VMs to keep warm")
+    pool_create.add_argument(
+        "--wait", action="store_true", help="Warm VMs in the foreground instead of background"
+    )
+    pool_create.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    pool_create.set_defaults(func=cmd_pool_create)
+
+    pool_list = pool_sub.add_parser("list", aliases=["ls"], help="List pools")
+    pool_list.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    pool_list.set_defaults(func=cmd_pool_list)
+
+    pool_refill = pool_sub.add_parser("refill", help="Warm VMs until pools are full")
+    pool_refill.add_argument(
+        "--watch", type=int, default=0, metavar="SECONDS", help="Keep refilling at this interval"
+    )
+    pool_refill.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    pool_refill.set_defaults(func=cmd_pool_refill)
+
+    pool_drain = pool_sub.add_parser("drain", help="Delete a pool and its idle VMs")
+    pool_drain.add_argument("pool", help="Pool key or path to its .clonebox.yaml")
+    pool_drain.add_argument(
+        "-u",
+        "--user",
+        action="store_true",
+        help="Use user session (qemu:///session) - no root required",
+    )
+    pool_drain.set_defaults(func=cmd_pool_drain)
+
     # Health command
     health_parser = subparsers.add_parser("health", help="Run VM health check")
     health_parser.add_argument(
@@ -628,8 +857,21 @@ def main():
     export_enc_parser = subparsers.add_parser("export-encrypted", help="Export VM with encryption")
     export_enc_parser.add_argument("name", help="VM name")
     export_enc_parser.add_argument("output", help="Output file path")
-    export_enc_parser.add_argument("--password", help="Encryption password")
     export_enc_parser.add_argument("--include-disk", action="store_true", help="Include disk image")
+    export_enc_parser.add_argument(
+        "--disk-mode",
+        choices=["auto", "file", "flatten", "overlay"],
+        default="auto",
+        help="Disk export: raw file copy, compacted standalone qcow2 (flatten), "
+        "changed clusters plus a base-image reference (overlay), or overlay "
+        "for backed disks and file otherwise (auto, default)",
+    )
+    export_enc_parser.add_argument(
+        "--compression",
+        choices=["none", "gzip", "zstd"],
+        help="Archive compression: gzip (parallel via pigz when installed) or "
+        "multi-threaded zstd; default gzip, none for flatten/overlay disks",
+    )
     export_enc_parser.add_argument(
         "-u",
         "--user",
@@ -642,7 +884,6 @@ def main():
     import_enc_parser = subparsers.add_parser("import-encrypted", help="Import encrypted VM")
     import_enc_parser.add_argument("import_path", help="Path to encrypted export")
     import_enc_parser.add_argument("--name", help="New VM name")
-    import_enc_parser.add_argument("--password", help="Decryption password")
     import_enc_parser.add_argument("--start", action="store_true", help="Start VM after import")
     import_enc_parser.add_argument(
         "-u",
@@ -653,11 +894,21 @@ def main():
     import_enc_parser.set_defaults(func=cmd_import_encrypted)
 
     # Export remote command
-    export_remote_parser = subparsers.add_parser("export-remote", help="Export VM to remote host")
-    export_remote_parser.add_argument("name", help="VM name")
-    export_remote_parser.add_argument("remote_host", help="Remote host (user@hostname)")
-    export_remote_parser.add_argument("remote_path", help="Remote path")
-    export_remote_parser.add_argument("--include-disk", action="store_true", help="Include disk image")
+    export_remote_parser = subparsers.add_parser(
+        "export-remote", help="Pull a VM from a remote host into a local archive"
+    )
+    export_remote_parser.add_argument("host", help="Remote host (user@hostname)")
+    export_remote_parser.add_argument("vm_name", help="VM name on the remote host")
+    export_remote_parser.add_argument("-o", "--output", required=True, help="Local archive path")
+    export_remote_parser.add_argument(
+        "--encrypted", action="store_true", help="Encrypt the local archive with the team key"
+    )
+    export_remote_parser.add_argument(
+        "--include-user-data", action="store_true", help="Include user data"
+    )
+    export_remote_parser.add_argument(
+        "--include-app-data", action="store_true", help="Include app data"
+    )
     export_remote_parser.add_argument(
         "-u",
         "--user",
@@ -667,11 +918,22 @@ def main():
     export_remote_parser.set_defaults(func=cmd_export_remote)
 
     # Import remote command
-    import_remote_parser = subparsers.add_parser("import-remote", help="Import VM from remote host")
-    import_remote_parser.add_argument("remote_host", help="Remote host (user@hostname)")
-    import_remote_parser.add_argument("remote_path", help="Remote path")
+    import_remote_parser = subparsers.add_parser(
+        "import-remote", help="Push a local archive to a remote host and import it there"
+    )
+    import_remote_parser.add_argument("archive", help="Local export archive")
+    import_remote_parser.add_argument("host", help="Remote host (user@hostname)")
     import_remote_parser.add_argument("--name", help="New VM name")
-    import_remote_parser.add_argument("--start", action="store_true", help="Start VM after import")
+    import_remote_parser.add_argument(
+        "--encrypted", action="store_true", help="Archive is encrypted with the team key"
+    )
+    import_remote_parser.add_argument(
+        "--include-user-data", action="store_true", help="Import user data"
+    )
+    import_remote_parser.add_argument(
+        "--streams", type=int, default=DEFAULT_STREAMS,
+        help=f"Parallel SSH streams for chunks (default: {DEFAULT_STREAMS})",
+    )
     import_remote_parser.add_argument(
         "-u",
         "--user",
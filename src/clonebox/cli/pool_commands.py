@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Pre-warmed VM pool commands for CloneBox CLI.
+"""
+
+import time
+from pathlib import Path
+
+from rich.table import Table
+
+from clonebox.pool import VMPool, pool_key, spawn_refiller
+from clonebox.cli.utils import console, load_clonebox_config, vm_config_from_dict
+
+
+def _make_config(user_session):
+    return lambda config, name: vm_config_from_dict(config, user_session, name=name)
+
+
+def cmd_pool_create(args):
+    """Create or resize the pool for a .clonebox.yaml."""
+    user_session = getattr(args, "user", False)
+    config = load_clonebox_config(Path(args.config).expanduser().resolve())
+    pool = VMPool(user_session=user_session)
+    key = pool.register(config, args.size)
+    console.print(f"[green]✅ Pool {key}: {args.size} VM(s) of '{config['vm']['name']}'[/]")
+
+    if args.wait:
+        console.print("[cyan]Warming VMs (this takes one full provisioning per VM)...[/]")
+        warmed = pool.refill(_make_config(user_session), key=key)
+        console.print(f"[green]✅ Warmed {warmed} VM(s)[/]")
+    else:
+        spawn_refiller(user_session)
+        console.print("[dim]Warming in the background; check with 'clonebox pool list'[/]")
+
+
+def cmd_pool_list(args):
+    """List pools and their VMs."""
+    pool = VMPool(user_session=getattr(args, "user", False))
+    pools = pool.pools()
+    if not pools:
+        console.print("[dim]No VM pools configured[/]")
+        return
+
+    table = Table(title="VM pools")
+    table.add_column("Key", style="cyan")
+    table.add_column("Config VM", style="green")
+    table.add_column("Size", justify="right")
+    table.add_column("Ready", justify="right", style="green")
+    table.add_column("Warming", justify="right", style="yellow")
+    table.add_column("RAM (MB)", justify="right")
+    for key, entry in pools.items():
+        states = [v.get("state") for v in entry["vms"].values()]
+        table.add_row(
+            key,
+            entry["config"].get("vm", {}).get("name", "?"),
+            str(entry["size"]),
+            str(states.count("ready")),
+            str(states.count("warming")),
+            str(entry.get("ram_mb", "?")),
+        )
+    console.print(table)
+
+
+def cmd_pool_refill(args):
+    """Warm VMs until every pool is full (optionally forever)."""
+    user_session = getattr(args, "user", False)
+    pool = VMPool(user_session=user_session)
+    while True:
+        warmed = pool.refill(_make_config(user_session))
+        if warmed:
+            console.print(f"[green]✅ Warmed {warmed} VM(s)[/]")
+        if not args.watch:
+            return
+        time.sleep(args.watch)
+
+
+def cmd_pool_drain(args):
+    """Delete a pool and its idle VMs."""
+    user_session = getattr(args, "user", False)
+    pool = VMPool(user_session=user_session)
+    key = args.pool
+    if key not in pool.pools():
+        # Accept a config path as well as a pool key
+        path = Path(key).expanduser().resolve()
+        if path.exists():
+            key = pool_key(load_clonebox_config(path), user_session)
+    removed = pool.drain(key)
+    console.print(f"[green]✅ Pool {key} drained ({len(removed)} VM(s) deleted)[/]")
@@ -3,67 +3,77 @@
 Snapshot commands for CloneBox CLI.
 """
 
-from pathlib import Path
-from typing import Optional
-
+from clonebox import paths as _paths
 from clonebox.snapshots import SnapshotManager, SnapshotType
-from clonebox.cli.utils import console, load_clonebox_config, CLONEBOX_CONFIG_FILE, resolve_vm_name
+from clonebox.cli.utils import console, resolve_vm_name
+
+
+def _manager(args) -> SnapshotManager:
+    return SnapshotManager(_paths.conn_uri(getattr(args, "user", False)))
 
 
 def cmd_snapshot_create(args):
     """Create a VM snapshot."""
-    vm_name = resolve_vm_name(args.name)
-    user_session = getattr(args, "user", False)
+    vm_name = resolve_vm_name(getattr(args, "vm", None))
     if not vm_name:
         console.print("[red]❌ No VM name specified[/]")
         return
-    
-    snapshot_type = SnapshotType.DISK if args.type == "disk" else SnapshotType.MEMORY
-    
-    manager = SnapshotManager(user_session=user_session)
-    snapshot_id = manager.create_snapshot(
-        vm_name=vm_name,
-        name=args.name,
-        description=args.description,
-        snapshot_type=snapshot_type,
-        console=console,
-    )
-    
-    console.print(f"[green]✅ Snapshot created: {snapshot_id}[/]")
+
+    # "memory" snapshots save RAM to an external file and freeze the disk
+    # under an overlay, so they can be resumed with `clonebox start --resume`.
+    snapshot_type = SnapshotType.DISK_ONLY if args.type == "disk" else SnapshotType.EXTERNAL
+
+    manager = _manager(args)
+    try:
+        snapshot = manager.create(
+            vm_name=vm_name,
+            name=args.name,
+            description=args.description,
+            snapshot_type=snapshot_type,
+        )
+    except RuntimeError as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+    finally:
+        manager.close()
+
+    console.print(f"[green]✅ Snapshot created: {snapshot.name}[/]")
 
 
 def cmd_snapshot_list(args):
     """List VM snapshots."""
-    vm_name = resolve_vm_name(args.name)
-    user_session = getattr(args, "user", False)
+    vm_name = resolve_vm_name(getattr(args, "vm", None))
     if not vm_name:
         console.print("[red]❌ No VM name specified[/]")
         return
-    
-    manager = SnapshotManager(user_session=user_session)
-    snapshots = manager.list_snapshots(vm_name)
-    
+
+    manager = _manager(args)
+    try:
+        snapshots = manager.list(vm_name)
+    finally:
+        manager.close()
+
     if not snapshots:
         console.print(f"[dim]No snapshots found for VM '{vm_name}'[/]")
         return
-    
+
     from rich.table import Table
     table = Table(title=f"Snapshots for {vm_name}")
-    table.add_column("ID", style="cyan")
     table.add_column("Name", style="green")
     table.add_column("Type", style="yellow")
     table.add_column("Created", style="blue")
+    table.add_column("Size", justify="right")
     table.add_column("Description", style="magenta")
-    
+
     for snapshot in snapshots:
         table.add_row(
-            snapshot["id"],
-            snapshot["name"],
-            snapshot["type"],
-            snapshot["created"],
-            snapshot.get("description", ""),
+            snapshot.name,
+            "memory" if snapshot.snapshot_type == SnapshotType.EXTERNAL else snapshot.snapshot_type.value,
+            snapshot.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            f"{snapshot.size_bytes / 1024 ** 2:.0f} MB" if snapshot.size_bytes else "",
+            snapshot.description or "",
         )
-    
+
     console.print(table)
 
 
@@ -71,15 +81,16 @@ def cmd_snapshot_restore(args):
     """Restore a VM snapshot."""
     vm_name = args.vm_name
     snapshot_id = args.snapshot_id
-    user_session = getattr(args, "user", False)
-    
-    manager = SnapshotManager(user_session=user_session)
-    manager.restore_snapshot(
-        vm_name=vm_name,
-        snapshot_id=snapshot_id,
-        console=console,
-    )
-    
+
+    manager = _manager(args)
+    try:
+        manager.restore(vm_name, snapshot_id, force=getattr(args, "force", False))
+    except RuntimeError as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+    finally:
+        manager.close()
+
     console.print(f"[green]✅ Snapshot {snapshot_id} restored[/]")
 
 
@@ -87,13 +98,14 @@ def cmd_snapshot_delete(args):
     """Delete a VM snapshot."""
     vm_name = args.vm_name
     snapshot_id = args.snapshot_id
-    user_session = getattr(args, "user", False)
-    
-    manager = SnapshotManager(user_session=user_session)
-    manager.delete_snapshot(
-        vm_name=vm_name,
-        snapshot_id=snapshot_id,
-        console=console,
-    )
-    
+
+    manager = _manager(args)
+    try:
+        manager.delete(vm_name, snapshot_id)
+    except RuntimeError as e:
+        console.print(f"[red]❌ {e}[/]")
+        return
+    finally:
+        manager.close()
+
     console.print(f"[green]✅ Snapshot {snapshot_id} deleted[/]")
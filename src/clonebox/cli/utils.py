@@ -16,12 +16,14 @@ from questionary import Style
 from rich.console import Console
 from rich.live import Live
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn
 from rich.table import Table
 
 from clonebox import __version__
 from clonebox.cloner import SelectiveVMCloner
 from clonebox.models import VMConfig
+from clonebox.pool import VMPool, pool_key, spawn_refiller
+from clonebox.qga import get_qga_executor
 from clonebox.profiles import merge_with_profile
 
 # Custom questionary style
@@ -97,72 +99,12 @@ def _resolve_vm_name_and_config_file(name: Optional[str]) -> Tuple[str, Optional
 
 def _qga_ping(vm_name: str, conn_uri: str) -> bool:
     """Check if QEMU Guest Agent is responding."""
-    import subprocess
-    
-    try:
-        result = subprocess.run(
-            ["virsh", "--connect", conn_uri, "qemu-agent-command", vm_name, '{"execute": "guest-ping"}'],
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        return result.returncode == 0
-    except:
-        return False
+    return get_qga_executor(conn_uri).ping(vm_name)
 
 
 def _qga_exec(vm_name: str, conn_uri: str, command: str, timeout: int = 10) -> Optional[str]:
     """Execute command in VM via QEMU Guest Agent."""
-    import subprocess
-    import json
-    
-    try:
-        cmd = json.dumps({"execute": "guest-exec", "arguments": {
-            "path": "/bin/sh",
-            "arg": ["-c", command],
-            "capture-output": True
-        }})
-        
-        result = subprocess.run(
-            ["virsh", "--connect", conn_uri, "qemu-agent-command", vm_name, cmd],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-        
-        if result.returncode != 0:
-            return None
-            
-        response = json.loads(result.stdout)
-        pid = response.get("return", {}).get("pid")
-        if not pid:
-            return None
-            
-        # Wait for command to complete
-        time.sleep(0.5)
-        cmd = json.dumps({"execute": "guest-exec-status", "arguments": {"pid": pid}})
-        
-        result = subprocess.run(
-            ["virsh", "--connect", conn_uri, "qemu-agent-command", vm_name, cmd],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-        
-        if result.returncode != 0:
-            return None
-            
-        response = json.loads(result.stdout)
-        if response.get("return", {}).get("exited"):
-            output = response["return"].get("out-data", "")
-            if output:
-                import base64
-                return base64.b64decode(output).decode("utf-8", errors="ignore")
-                
-    except:
-        pass
-        
-    return None
+    return get_qga_executor(conn_uri).exec_output(vm_name, command, timeout=timeout)
 
 
 def load_env_file(env_path: Path) -> dict:
@@ -528,9 +470,21 @@ def _exec_in_vm_qga(vm_name: str, conn_uri: str, command: str) -> Optional[str]:
     return None
 
 
-def monitor_cloud_init_status(vm_name: str, user_session: bool = False, timeout: int = 1800):
-    """Monitor cloud-init status in the VM."""
+def monitor_cloud_init_status(
+    vm_name: str, user_session: bool = False, timeout: int = 1800, log_offset: Optional[int] = None
+):
+    """Monitor cloud-init status in the VM.
+
+    Progress is read from the VM serial log when it is available; the guest
+    agent is only polled as a fallback.  The log keeps earlier boots, so
+    only lines after *log_offset* (its size before the VM was started) are
+    read; without it, only lines written from now on.
+    """
     from clonebox import paths as _paths
+    serial_log = _paths.serial_log_path(vm_name, user_session)
+    if serial_log.exists():
+        return _monitor_cloud_init_serial(serial_log, timeout, log_offset)
+
     conn_uri = _paths.conn_uri(user_session)
     start_time = time.time()
     
@@ -561,8 +515,42 @@ def monitor_cloud_init_status(vm_name: str, user_session: bool = False, timeout:
     return False
 
 
-def create_vm_from_config(config, start=False, user_session=False, replace=False, approved=False):
-    """Create VM from configuration dictionary."""
+def _monitor_cloud_init_serial(serial_log: Path, timeout: int, log_offset: Optional[int] = None) -> bool:
+    """Show cloud-init progress parsed from the serial console log."""
+    from clonebox.serial_progress import follow_progress
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.fields[detail]}"),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Waiting for cloud-init to complete...", total=100, detail="")
+        warnings = 0
+        for event in follow_progress(serial_log, timeout=timeout, from_end=True, offset=log_offset):
+            if event.kind == "warning":
+                warnings += 1
+            if event.kind == "done":
+                progress.update(task, description="✅ cloud-init completed successfully", completed=100, detail="")
+                if warnings:
+                    console.print(f"[yellow]cloud-init reported {warnings} warning(s) - see 'clonebox logs'[/]")
+                return True
+            detail = event.package or (event.message[:60] if event.kind != "step" else "")
+            progress.update(
+                task,
+                description=event.stage or "Provisioning",
+                completed=event.percent or 0,
+                detail=detail,
+            )
+
+        progress.update(task, description="⏱️ Timeout waiting for cloud-init", detail="")
+    console.print(f"\n[yellow]cloud-init did not complete within {timeout} seconds[/]")
+    return False
+
+
+def vm_config_from_dict(config, user_session=False, name=None):
+    """Build a :class:`VMConfig` from a ``.clonebox.yaml`` dictionary."""
     # Map new-style app_data_paths to legacy copy_paths.
     # app_data_paths are intended to be copied (not mounted) into the VM.
     copy_paths = config.get("copy_paths", {}) or config.get("app_data_paths", {}) or {}
@@ -583,13 +571,19 @@ def create_vm_from_config(config, start=False, user_session=False, replace=False
     except Exception:
         pass
 
-    vm_config = VMConfig(
-        name=config["vm"]["name"],
+    return VMConfig(
+        name=name or config["vm"]["name"],
         ram_mb=config["vm"].get("ram_mb", 4096),
         vcpus=config["vm"].get("vcpus", 4),
         disk_size_gb=config["vm"]["disk_size_gb"],
         gui=config["vm"].get("gui", True),
         base_image=config["vm"].get("base_image"),
+        golden_image=config["vm"].get(
+            "golden_image", os.getenv("VM_GOLDEN_IMAGE", "false").lower() == "true"
+        ),
+        memory_snapshot=config["vm"].get(
+            "memory_snapshot", os.getenv("VM_MEMORY_SNAPSHOT", "false").lower() == "true"
+        ),
         network_mode=config["vm"].get("network_mode", "auto"),
         username=config["vm"].get("username", "ubuntu"),
         password=config["vm"].get("password", "ubuntu"),
@@ -606,15 +600,41 @@ def create_vm_from_config(config, start=False, user_session=False, replace=False
         shutdown_after_setup=config.get("shutdown_after_setup", False),
         browser_profiles=config.get("browser_profiles", []),
     )
-    
+
+
+def create_vm_from_config(config, start=False, user_session=False, replace=False, approved=False):
+    """Create VM from configuration dictionary.
+
+    When started, a pre-warmed VM from ``clonebox pool`` is claimed if one
+    is ready for this config; the pool is then refilled in the background.
+    """
+    vm_config = vm_config_from_dict(config, user_session)
     cloner = SelectiveVMCloner(user_session=user_session)
+
+    if start:
+        pool = VMPool(user_session=user_session, cloner=cloner)
+        key = pool_key(config, user_session)
+        if pool.ready_count(key):
+            if not approved and cloner.policy_engine is not None:
+                cloner.policy_engine.validate_vm_creation(vm_config)
+            if replace:
+                cloner.delete_vm(vm_config.name, delete_storage=True, approved=approved)
+            vm_uuid = pool.claim(key, vm_config.name)
+            if vm_uuid:
+                console.print(f"[green]⚡ Claimed pre-warmed VM from pool {key}[/]")
+                spawn_refiller(user_session)
+                return vm_uuid
+
     vm_uuid = cloner.create_vm(vm_config, replace=replace, approved=approved, console=console)
     
     if start:
+        from clonebox import paths as _paths
+        serial_log = _paths.serial_log_path(vm_config.name, user_session)
+        log_offset = serial_log.stat().st_size if serial_log.exists() else 0
         cloner.start_vm(vm_config.name, console=console, config=vm_config)
         
         # Monitor cloud-init if it's a fresh VM
         if not replace:
-            monitor_cloud_init_status(vm_config.name, user_session)
+            monitor_cloud_init_status(vm_config.name, user_session, log_offset=log_offset)
     
     return vm_uuid
@@ -15,6 +15,7 @@ from rich.console import Console
 from rich.table import Table
 
 from clonebox.cloner import SelectiveVMCloner
+from clonebox.delta_sync import MANIFEST_FILE as SYNC_MANIFEST_FILE
 from clonebox.models import VMConfig
 from clonebox.detector import SystemDetector
 from clonebox.cli.utils import console, custom_style, CLONEBOX_CONFIG_FILE, load_clonebox_config, create_vm_from_config, _resolve_vm_name_and_config_file
@@ -84,6 +85,10 @@ def cmd_create(args):
         packages=config_data.get("packages", []),
         services=config_data.get("services", []),
     )
+    if getattr(args, "golden", False):
+        config.golden_image = True
+    if getattr(args, "memory_snapshot", False):
+        config.memory_snapshot = True
 
     cloner = SelectiveVMCloner()
     vm_uuid = cloner.create_vm(config, console=console)
@@ -124,7 +129,12 @@ def cmd_start(args):
             existing_vms = [v["name"] for v in cloner.list_vms()]
             if vm_name in existing_vms:
                 console.print(f"[cyan]VM '{vm_name}' exists, starting...[/]")
-                cloner.start_vm(vm_name, open_viewer=not args.no_viewer, console=console)
+                cloner.start_vm(
+                    vm_name,
+                    open_viewer=not args.no_viewer,
+                    console=console,
+                    **_resume_kwargs(args),
+                )
                 return
         except:
             pass
@@ -160,7 +170,15 @@ def cmd_start(args):
 
     cloner = SelectiveVMCloner(user_session=getattr(args, "user", False))
     open_viewer = getattr(args, "viewer", False) or not getattr(args, "no_viewer", False)
-    cloner.start_vm(name, open_viewer=open_viewer, console=console)
+    cloner.start_vm(name, open_viewer=open_viewer, console=console, **_resume_kwargs(args))
+
+
+def _resume_kwargs(args) -> dict:
+    """``start_vm`` arguments for ``--resume [SNAPSHOT]``."""
+    snapshot = getattr(args, "resume", None)
+    if snapshot is None:
+        return {}
+    return {"resume": True, "snapshot": snapshot or None}
 
 
 def cmd_sync_data(args):
@@ -234,12 +252,18 @@ def cmd_sync_data(args):
     console.print(f"[dim]Config: {config_file}[/]")
     console.print(f"[dim]SSH: localhost:{ssh_port}[/]")
 
+    # Only changes since the last sync are shipped; --full starts over
+    manifest_path = vm_dir / SYNC_MANIFEST_FILE
+    if getattr(args, "full", False):
+        manifest_path.unlink(missing_ok=True)
+
     ok = cloner._copy_paths_to_vm_via_ssh(
         copy_paths=copy_paths,
         ssh_port=ssh_port,
         ssh_key=ssh_key if ssh_key.exists() else None,
         vm_username=vm_username,
         skip_cache=not include_cache,
+        manifest_path=manifest_path,
     )
 
     if ok:
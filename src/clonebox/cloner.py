@@ -4,6 +4,7 @@ SelectiveVMCloner - Creates isolated VMs with only selected apps/paths/services.
 """
 
 import base64
+import contextlib
 import hashlib
 import json
 import logging
@@ -20,13 +21,17 @@ import urllib.request
 import uuid
 import xml.etree.ElementTree as ET
 import signal
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace as dataclass_replace
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 from clonebox import paths as _paths
-from clonebox.ssh import ssh_exec as _ssh_exec_shared, build_ssh_command as _build_ssh_cmd
+from clonebox.ssh import (
+    ssh_exec as _ssh_exec_shared,
+    build_ssh_command as _build_ssh_cmd,
+    get_session_pool as _get_ssh_session_pool,
+)
 
 try:
     import libvirt
@@ -45,17 +50,43 @@ from clonebox.rollback import vm_creation_transaction
 from clonebox.secrets import SecretsManager, SSHKeyPair
 from clonebox.audit import get_audit_logger, AuditEventType, AuditOutcome
 from clonebox.models import VMConfig
-from clonebox.cloud_init import generate_cloud_init_config
+from clonebox.cloud_init import (
+    CLOUD_INIT_TEMPLATE_VERSION,
+    MODE_FULL,
+    MODE_GOLDEN,
+    MODE_GOLDEN_BUILD,
+    generate_cloud_init_config,
+)
+from clonebox.image_cache import (
+    GOLDEN_BUILD_TIMEOUT,
+    GOLDEN_DISK_SIZE_GB,
+    GoldenImageCache,
+    golden_inputs,
+    golden_key,
+)
 from clonebox.vm_xml import generate_vm_xml
 from clonebox.browser_profiles import (
     detect_browser_profiles,
-    stage_browser_profiles,
-    copy_profiles_to_vm_via_ssh,
+    resolve_browser_profiles,
+    stream_profiles_to_vm_via_ssh,
 )
 from clonebox.post_install_repair import run_post_install_repairs
+from clonebox.delta_sync import MANIFEST_FILE as SYNC_MANIFEST_FILE, sync_to_guest
+from clonebox.disk_export import backing_file
+from clonebox.readiness import ReadinessWatcher, Stage
+from clonebox.snapshots import SnapshotManager, SnapshotType
+from clonebox.snapshots.memory import (
+    SETUP_SNAPSHOT_NAME,
+    MemorySnapshotStore,
+    SnapshotIntegrityError,
+    SnapshotNotFoundError,
+)
 
 log = get_logger(__name__)
 
+# How often a serial-console wait also asks ``cloud-init status`` over SSH
+CLOUD_INIT_SSH_FALLBACK_INTERVAL = 60
+
 
 class SelectiveVMCloner:
     """
@@ -80,6 +111,8 @@ class SelectiveVMCloner:
         self.disk = disk_manager or self.container.resolve(DiskManager)
         self.network = network_manager or self.container.resolve(NetworkManager)
         self.secrets = secrets_manager or self.container.resolve(SecretsManager)
+        # Claim pooled SSH masters used while this cloner lives, for close()
+        _get_ssh_session_pool().watch(self)
         # Load policy engine from filesystem if available
         from .policies import PolicyEngine
         self.policy_engine = PolicyEngine.load_effective()
@@ -150,16 +183,26 @@ class SelectiveVMCloner:
             # Generate VM UUID
             vm_uuid = str(uuid.uuid4())
             
+            # Boot stages come from libvirt events and the serial log
+            watcher = self._readiness_watcher(config.name) if start else contextlib.nullcontext()
+
             # Create transaction for rollback
-            with vm_creation_transaction(self, config, console) as ctx:
+            with vm_creation_transaction(self, config, console) as ctx, watcher as readiness:
+                # Reuse (or build once) a pre-provisioned golden image
+                golden = self._prepare_golden_image(config) if config.golden_image else None
+                
                 # Create base disk
                 log.info("Step 1/5: Creating VM disk...")
-                disk_path = self._create_vm_disk(config)
+                disk_path = self._create_vm_disk(config, golden_key=golden)
                 log.info(f"  Disk created: {disk_path}")
+                if golden:
+                    self._golden_cache().acquire(golden, config.name, disk_path)
                 
                 # Generate cloud-init ISO
                 log.info("Step 2/5: Generating cloud-init ISO...")
-                cloud_init_path = self._generate_cloud_init(config)
+                cloud_init_path = self._generate_cloud_init(
+                    config, mode=MODE_GOLDEN if golden else MODE_FULL
+                )
                 log.info(f"  Cloud-init ISO created: {cloud_init_path}")
                 
                 # Allocate SSH port for user session
@@ -195,8 +238,8 @@ class SelectiveVMCloner:
                     vm.create()
                     log.info(f"VM '{config.name}' started successfully")
                     
-                    # Brief pause to let QEMU initialize
-                    time.sleep(2)
+                    # Let QEMU initialize (returns on the STARTED lifecycle event)
+                    readiness.wait_for(Stage.STARTED, timeout=2)
                     
                     # Run comprehensive diagnostics
                     checks = self._check_vm_processes(config.name, config=config)
@@ -215,8 +258,8 @@ class SelectiveVMCloner:
                 
                 # Wait for IP address (shorter timeout since we have diagnostics)
                 if start:
-                    log.info("Waiting for VM to boot (checking every 10s)...")
-                    ip = self._wait_for_ip(vm, timeout=30)
+                    log.info("Waiting for VM to boot...")
+                    ip = self._wait_for_ip(vm, timeout=30, readiness=readiness)
                     if ip:
                         log.info(f"VM '{config.name}' IP: {ip}")
                     else:
@@ -224,7 +267,7 @@ class SelectiveVMCloner:
                     
                     # Test SSH connectivity
                     log.info("Testing SSH connectivity (cloud-init may take 2-3 minutes)...")
-                    ssh_ok = self._test_ssh_connectivity(config.name, timeout=180)
+                    ssh_ok = self._test_ssh_connectivity(config.name, timeout=180, readiness=readiness)
                     cloud_init_ok = False
                     
                     # Wait for cloud-init to complete (especially important for GUI mode)
@@ -234,7 +277,10 @@ class SelectiveVMCloner:
                             # Extended timeout for all setups - cloud-init can take time
                             cloud_init_timeout = 1200  # 20 minutes max
                             log.info(f"Config: gui={config.gui}, packages={len(config.packages)}, snaps={len(config.snap_packages)}")
-                            cloud_init_ok = self._wait_for_cloud_init(config.name, ssh_port, timeout=cloud_init_timeout, gui_mode=config.gui, config=config)
+                            cloud_init_ok = self._wait_for_cloud_init(
+                                config.name, ssh_port, timeout=cloud_init_timeout,
+                                gui_mode=config.gui, config=config, readiness=readiness,
+                            )
                             
                             if not cloud_init_ok:
                                 log.warning("=" * 60)
@@ -251,12 +297,12 @@ class SelectiveVMCloner:
                             log.info("GUI mode enabled - waiting for VM to finish setup and reboot...")
                             log.info("  (This may take 10-15 minutes for full desktop installation)")
                             
-                            # Give some time for reboot to happen if it was triggered
-                            time.sleep(30)
+                            # Give the reboot time to happen if cloud-init triggered one
+                            self._wait_for_gui_reboot(readiness, timeout=30)
                             
                             # Re-check SSH after potential reboot
                             log.info("Re-checking SSH after potential reboot...")
-                            self._test_ssh_connectivity(config.name, timeout=60)
+                            self._test_ssh_connectivity(config.name, timeout=60, readiness=readiness)
 
                         # Copy app data paths (copy_paths/app_data_paths) if configured
                         if cloud_init_ok and ssh_ok and config.copy_paths:
@@ -276,6 +322,7 @@ class SelectiveVMCloner:
                                     ssh_key=ssh_key if ssh_key.exists() else None,
                                     vm_username=config.username,
                                     skip_cache=True,
+                                    manifest_path=vm_dir / SYNC_MANIFEST_FILE,
                                 )
                                 self._verify_copied_paths_in_vm(
                                     copy_paths=config.copy_paths,
@@ -298,27 +345,24 @@ class SelectiveVMCloner:
                             ssh_port = self._get_saved_ssh_port(config.name)
                             ssh_key = vm_dir / "ssh_key"
                             
-                            # Stage profiles on host
-                            staged = stage_browser_profiles(
-                                config.browser_profiles,
-                                vm_dir,
-                                skip_cache=True,  # Don't copy cache to save space/time
-                            )
+                            profiles = resolve_browser_profiles(config.browser_profiles)
                             
-                            if staged:
-                                copied_browsers = sorted(staged.keys())
+                            if profiles:
+                                copied_browsers = sorted(profiles.keys())
                                 self._ensure_browsers_installed_in_vm(
                                     browsers=copied_browsers,
                                     ssh_port=ssh_port,
                                     ssh_key=ssh_key,
                                     vm_username=config.username,
                                 )
-                                # Copy to VM via SSH
-                                copy_profiles_to_vm_via_ssh(
-                                    staged,
+                                # Stream live profiles to the VM (no host staging copy)
+                                stream_profiles_to_vm_via_ssh(
+                                    profiles,
                                     ssh_port,
                                     ssh_key,
                                     config.username,
+                                    skip_cache=True,  # Don't copy cache to save space/time
+                                    manifest_path=vm_dir / SYNC_MANIFEST_FILE,
                                 )
                                 self._verify_browser_profiles_in_vm(
                                     browsers=copied_browsers,
@@ -352,6 +396,9 @@ class SelectiveVMCloner:
                             host_username=os.getenv("USER"),
                         )
 
+                        if cloud_init_ok and config.memory_snapshot:
+                            self._take_setup_snapshot(config.name)
+
                     # Final status message
                     if ssh_ok and cloud_init_ok:
                         log.info(f"VM '{config.name}' created successfully - READY FOR USE!")
@@ -368,10 +415,13 @@ class SelectiveVMCloner:
         ssh_key: Optional[Path],
         vm_username: str = "ubuntu",
         skip_cache: bool = True,
+        manifest_path: Optional[Path] = None,
     ) -> bool:
         """Copy host paths into the VM via SSH (no mounts).
 
-        Uses a tar stream to avoid temporary archives on disk.
+        All paths go to the guest in a single tar stream, without temporary
+        archives on disk.  With ``manifest_path`` only the changes since the
+        sync recorded there are shipped (see :mod:`clonebox.delta_sync`).
         """
         if not copy_paths:
             return True
@@ -389,126 +439,51 @@ class SelectiveVMCloner:
                 return True
             return False
 
-        base_ssh = _build_ssh_cmd(
-            port=ssh_port, key=ssh_key, username=vm_username,
-            host="127.0.0.1", connect_timeout=10,
-        )
-
+        selected = {
+            host_path: guest_path
+            for host_path, guest_path in (copy_paths or {}).items()
+            if host_path and guest_path
+            and not (skip_cache and (_is_cache_path(host_path) or _is_cache_path(guest_path)))
+        }
+        total = len(selected)
         copied = 0
-        total = 0
-        for host_path, guest_path in (copy_paths or {}).items():
-            if not host_path or not guest_path:
-                continue
-            if skip_cache and (_is_cache_path(host_path) or _is_cache_path(guest_path)):
-                continue
-            total += 1
 
         if total == 0:
             log.info("No non-cache app data paths to copy")
             return True
 
         all_success = True
-        for host_path, guest_path in (copy_paths or {}).items():
-            if not host_path or not guest_path:
-                continue
-            if skip_cache and (_is_cache_path(host_path) or _is_cache_path(guest_path)):
-                continue
-
+        present = {}
+        for host_path, guest_path in selected.items():
             src = Path(host_path).expanduser()
             if not src.exists():
                 log.warning(f"  ❌ Host path not found, skipping: {src}")
                 all_success = False
                 continue
-
             copied += 1
-            log.info(f"  [{copied}/{total}] Copying: {src} -> {guest_path}")
-
-            exclude_args = [
-                "--exclude=SingletonLock",
-                "--exclude=SingletonSocket",
-                "--exclude=SingletonCookie",
-                "--exclude=parent.lock",
-                "--exclude=.parentlock",
-                "--exclude=lock",
-            ]
+            log.info(f"  [{copied}/{total}] {src} -> {guest_path}")
+            present[host_path] = guest_path
+        if not present:
+            return all_success
 
-            if src.is_dir():
-                tar_cmd = ["tar", "-C", str(src)] + exclude_args + ["-cf", "-", "."]
-                remote_cmd = (
-                    f"sudo mkdir -p '{guest_path}' && sudo tar -C '{guest_path}' -xpf -"
-                )
-            else:
-                src_parent = str(src.parent)
-                src_name = src.name
-                guest_parent = str(Path(guest_path).parent)
-                tar_cmd = ["tar", "-C", src_parent] + exclude_args + ["-cf", "-", src_name]
-                if str(Path(guest_path).name) == src_name:
-                    remote_cmd = (
-                        f"sudo mkdir -p '{guest_parent}' && sudo tar -C '{guest_parent}' -xpf -"
-                    )
-                else:
-                    remote_cmd = (
-                        f"sudo mkdir -p '{guest_parent}' && "
-                        f"sudo tar -C '{guest_parent}' -xpf - && "
-                        f"sudo mv -f '{Path(guest_parent) / src_name}' '{guest_path}'"
-                    )
-
-            ssh_cmd = base_ssh + [f"{vm_username}@127.0.0.1", remote_cmd]
-
-            try:
-                tar_proc = subprocess.Popen(tar_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                ssh_proc = subprocess.Popen(
-                    ssh_cmd,
-                    stdin=tar_proc.stdout,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                if tar_proc.stdout is not None:
-                    tar_proc.stdout.close()
-
-                ssh_out, ssh_err = ssh_proc.communicate()
-                tar_err = tar_proc.stderr.read().decode(errors="replace") if tar_proc.stderr else ""
-                tar_rc = tar_proc.wait()
-
-                if tar_rc != 0 or ssh_proc.returncode != 0:
-                    log.warning(f"    ❌ Copy failed: {src} -> {guest_path}")
-                    if tar_err.strip():
-                        log.debug(f"    tar stderr: {tar_err.strip()[:400]}")
-                    if ssh_err and ssh_err.strip():
-                        log.debug(f"    ssh stderr: {ssh_err.strip()[:400]}")
-                    all_success = False
-                    continue
-
-                # Fix ownership for user home paths
-                if guest_path.startswith(f"/home/{vm_username}/"):
-                    chown_cmd = base_ssh + [
-                        f"{vm_username}@127.0.0.1",
-                        f"sudo chown -R {vm_username}:{vm_username} '{guest_path}' || true",
-                    ]
-                    subprocess.run(chown_cmd, capture_output=True, text=True, timeout=120)
-
-                    # Fix snap parent directories (snap runtime needs
-                    # /home/<user>/snap/<app> owned by the user, not root)
-                    if f"/home/{vm_username}/snap/" in guest_path:
-                        import re as _re
-                        m = _re.match(
-                            rf"(/home/{_re.escape(vm_username)}/snap/[^/]+)",
-                            guest_path,
-                        )
-                        if m:
-                            snap_chown = base_ssh + [
-                                f"{vm_username}@127.0.0.1",
-                                f"sudo chown -R {vm_username}:{vm_username} '{m.group(1)}' || true",
-                            ]
-                            subprocess.run(snap_chown, capture_output=True, text=True, timeout=120)
-
-                log.info("    ✓ Copied")
-            except Exception as e:
-                log.warning(f"    ❌ Copy error: {e}")
-                all_success = False
+        # One archive stream carries every path (see clonebox.delta_sync)
+        try:
+            result = sync_to_guest(present, ssh_port, ssh_key, vm_username, manifest_path)
+        except Exception as e:
+            log.warning(f"    ❌ Copy error: {e}")
+            return False
 
-        return all_success
+        if not result.ok:
+            log.warning("    ❌ Copy failed")
+        elif result.files or result.deleted:
+            mode = "full" if result.full else "delta"
+            log.info(
+                f"    ✓ Copied {result.files} file(s), {result.bytes / 1024 ** 2:.1f} MB, "
+                f"{result.deleted} deletion(s) ({mode}, compression: {result.codec})"
+            )
+        else:
+            log.info("    ✓ Already up to date")
+        return all_success and result.ok
 
     def _ssh_exec(self, ssh_port: int, ssh_key: Optional[Path], vm_username: str, command: str, timeout: int = 20) -> Optional[str]:
         return _ssh_exec_shared(
@@ -903,8 +878,21 @@ class SelectiveVMCloner:
                     ["google-chrome", "google-chrome-stable"],
                 )
 
-    def start_vm(self, vm_name: str, open_viewer: bool = False, console: Any = None, config: VMConfig = None) -> None:
-        """Start an existing VM."""
+    def start_vm(
+        self,
+        vm_name: str,
+        open_viewer: bool = False,
+        console: Any = None,
+        config: VMConfig = None,
+        resume: bool = False,
+        snapshot: Optional[str] = None,
+    ) -> None:
+        """Start an existing VM.
+
+        With ``resume``, the VM is restored from a memory-state snapshot
+        (``snapshot`` or the latest one) instead of cold-booting; it falls
+        back to a normal boot if no intact snapshot exists.
+        """
         
         # Try to load config from YAML if not provided
         if config is None:
@@ -942,6 +930,7 @@ class SelectiveVMCloner:
             except Exception as e:
                 log.debug(f"Could not load config from YAML: {e}")
         
+        readiness = None
         try:
             log.info(f"Looking up VM '{vm_name}'...")
             vm = self.conn.lookupByName(vm_name)
@@ -952,12 +941,15 @@ class SelectiveVMCloner:
                 self._check_vm_processes(vm_name)
                 return
             
-            log.info(f"Starting VM '{vm_name}'...")
-            vm.create()
-            log.info(f"VM '{vm_name}' started successfully")
-            
-            # Brief pause to let QEMU initialize
-            time.sleep(2)
+            readiness = self._readiness_watcher(vm_name).start()
+            resumed = resume and self._resume_from_snapshot(vm_name, snapshot)
+            if not resumed:
+                log.info(f"Starting VM '{vm_name}'...")
+                vm.create()
+                log.info(f"VM '{vm_name}' started successfully")
+
+                # Let QEMU initialize (returns on the STARTED lifecycle event)
+                readiness.wait_for(Stage.STARTED, timeout=2)
             
             # Run comprehensive diagnostics
             checks = self._check_vm_processes(vm_name, config=config)
@@ -972,10 +964,15 @@ class SelectiveVMCloner:
             if open_viewer:
                 log.info("Opening VM viewer...")
                 self._open_viewer(vm_name)
+
+            if resumed:
+                # Setup, data copy and repairs are part of the saved state
+                log.info(f"VM '{vm_name}' resumed - READY FOR USE!")
+                return
             
             # Wait for IP address (short timeout)
-            log.info("Waiting for VM to boot (checking every 10s)...")
-            ip = self._wait_for_ip(vm, timeout=30)
+            log.info("Waiting for VM to boot...")
+            ip = self._wait_for_ip(vm, timeout=30, readiness=readiness)
             if ip:
                 log.info(f"VM '{vm_name}' IP: {ip}")
             else:
@@ -983,7 +980,7 @@ class SelectiveVMCloner:
             
             # Test SSH connectivity
             log.info("Testing SSH connectivity (cloud-init may take 2-3 minutes)...")
-            ssh_ok = self._test_ssh_connectivity(vm_name, timeout=180)
+            ssh_ok = self._test_ssh_connectivity(vm_name, timeout=180, readiness=readiness)
             
             # Wait for cloud-init to complete if this is a fresh boot
             cloud_init_ok = False
@@ -1012,6 +1009,7 @@ class SelectiveVMCloner:
                         timeout=cloud_init_timeout,
                         gui_mode=gui_mode,
                         config=config,
+                        readiness=readiness,
                     )
 
             if ssh_ok and cloud_init_ok and config is not None:
@@ -1024,6 +1022,7 @@ class SelectiveVMCloner:
                         ssh_key=ssh_key if ssh_key.exists() else None,
                         vm_username=config.username,
                         skip_cache=True,
+                        manifest_path=vm_dir / SYNC_MANIFEST_FILE,
                     )
                     self._verify_copied_paths_in_vm(
                         copy_paths=config.copy_paths,
@@ -1036,24 +1035,22 @@ class SelectiveVMCloner:
                 if config.browser_profiles:
                     vm_dir = self.get_images_dir() / vm_name
                     ssh_key = vm_dir / "ssh_key"
-                    staged = stage_browser_profiles(
-                        config.browser_profiles,
-                        vm_dir,
-                        skip_cache=True,
-                    )
-                    if staged:
-                        copied_browsers = sorted(staged.keys())
+                    profiles = resolve_browser_profiles(config.browser_profiles)
+                    if profiles:
+                        copied_browsers = sorted(profiles.keys())
                         self._ensure_browsers_installed_in_vm(
                             browsers=copied_browsers,
                             ssh_port=ssh_port,
                             ssh_key=ssh_key,
                             vm_username=config.username,
                         )
-                        copy_profiles_to_vm_via_ssh(
-                            staged,
+                        stream_profiles_to_vm_via_ssh(
+                            profiles,
                             ssh_port,
                             ssh_key,
                             config.username,
+                            skip_cache=True,
+                            manifest_path=vm_dir / SYNC_MANIFEST_FILE,
                         )
                         self._verify_browser_profiles_in_vm(
                             browsers=copied_browsers,
@@ -1093,6 +1090,43 @@ class SelectiveVMCloner:
         except libvirt.libvirtError as e:
             log.error(f"Failed to start VM '{vm_name}': {e}")
             raise
+        finally:
+            if readiness is not None:
+                readiness.close()
+
+    def _take_setup_snapshot(self, vm_name: str) -> None:
+        """Save RAM + disk right after setup so ``start --resume`` skips the boot."""
+        manager = SnapshotManager(self.conn_uri)
+        try:
+            log.info("Saving memory-state snapshot of the ready VM...")
+            manager.create(
+                vm_name,
+                SETUP_SNAPSHOT_NAME,
+                description="State after first successful setup",
+                snapshot_type=SnapshotType.EXTERNAL,
+            )
+            log.info(f"Memory snapshot '{SETUP_SNAPSHOT_NAME}' saved (resume with: clonebox start --resume)")
+        except Exception as e:
+            log.warning(f"Could not save memory snapshot: {e}")
+        finally:
+            manager.close()
+
+    def _resume_from_snapshot(self, vm_name: str, name: Optional[str]) -> bool:
+        """Restore *vm_name* from a memory snapshot; False means cold-boot instead."""
+        manager = SnapshotManager(self.conn_uri)
+        try:
+            log.info(f"Resuming VM '{vm_name}' from memory snapshot...")
+            snapshot = manager.resume(vm_name, name)
+            log.info(f"VM '{vm_name}' resumed from snapshot '{snapshot.name}'")
+            return True
+        except SnapshotNotFoundError as e:
+            log.info(f"{e} - falling back to a normal boot")
+            return False
+        except SnapshotIntegrityError as e:
+            log.warning(f"{e} - falling back to a normal boot")
+            return False
+        finally:
+            manager.close()
 
     def stop_vm(self, vm_name: str, force: bool = False, console: Any = None) -> None:
         """Stop a VM."""
@@ -1155,10 +1189,15 @@ class SelectiveVMCloner:
                 
                 # Delete storage if requested
                 if delete_storage:
-                    for disk_path in disk_paths:
+                    for disk_path in self._owned_disk_chain(vm_name, disk_paths):
                         if os.path.exists(disk_path):
                             os.remove(disk_path)
                             log.info(f"Deleted disk: {disk_path}")
+                    snapshots_dir = MemorySnapshotStore(self.get_images_dir() / vm_name).root
+                    if snapshots_dir.is_dir():
+                        shutil.rmtree(snapshots_dir, ignore_errors=True)
+                        log.info(f"Deleted memory snapshots: {snapshots_dir}")
+                    self._golden_cache().release(vm_name)
                             
             except Exception as e:
                 if "no domain with matching name" in str(e):
@@ -1168,6 +1207,36 @@ class SelectiveVMCloner:
                     log.error(f"Failed to delete VM '{vm_name}': {e}")
                     raise
 
+    def _owned_disk_chain(self, vm_name: str, disk_paths: List[str]) -> List[str]:
+        """*disk_paths* plus the images below them that belong to *vm_name*.
+
+        A memory snapshot leaves the VM running on an overlay in its snapshot
+        directory, backed by the frozen ``<images>/<name>.qcow2``.  Images
+        outside the VM's own files (golden and downloaded base images) are
+        shared and stop the walk.
+        """
+        images_dir = self.get_images_dir()
+        own_disk = os.path.realpath(images_dir / f"{vm_name}.qcow2")
+        own_dir = os.path.realpath(images_dir / vm_name) + os.sep
+        owned: List[str] = []
+        for disk_path in disk_paths:
+            owned.append(disk_path)
+            path = Path(disk_path)
+            while True:
+                try:
+                    backing = backing_file(path)
+                except (OSError, ValueError, subprocess.CalledProcessError):
+                    break
+                if backing is None:
+                    break
+                real = os.path.realpath(backing)
+                if real != own_disk and not real.startswith(own_dir):
+                    break
+                if str(backing) not in owned:
+                    owned.append(str(backing))
+                path = backing
+        return owned
+
     @property
     def SYSTEM_IMAGES_DIR(self) -> Path:
         """Get the system images directory."""
@@ -1395,15 +1464,14 @@ class SelectiveVMCloner:
         return vms
 
     def close(self):
-        """Close the libvirt connection."""
+        """Close the pooled SSH sessions this cloner used and the libvirt connection."""
+        _get_ssh_session_pool().release(self)
         if hasattr(self, 'conn') and self.conn:
             self.conn.close()
             self.conn = None
 
-    def _create_vm_disk(self, config: VMConfig) -> str:
-        """Create the VM disk image."""
-        
-        # Get base image path
+    def _resolve_base_image(self, config: VMConfig) -> str:
+        """Return the base image for *config*, failing if it does not exist."""
         log.debug(f"Resolving base image for VM '{config.name}'...")
         if config.base_image:
             base_image = config.base_image
@@ -1426,6 +1494,26 @@ class SelectiveVMCloner:
         except Exception as e:
             log.warning(f"Could not check base image size: {e}")
         
+        return base_image
+
+    def _create_vm_disk(self, config: VMConfig, golden_key: Optional[str] = None) -> str:
+        """Create the VM disk image.
+        
+        With *golden_key* the disk is an overlay on that cached golden image
+        instead of the plain base image.
+        """
+        base_image = self._resolve_base_image(config)
+        size_gb = config.disk_size_gb
+        if golden_key:
+            base_image = str(self._golden_cache().path_for(golden_key))
+            if size_gb < GOLDEN_DISK_SIZE_GB:
+                log.warning(
+                    f"Disk size {size_gb}G is below the golden image size; "
+                    f"using {GOLDEN_DISK_SIZE_GB}G"
+                )
+                size_gb = GOLDEN_DISK_SIZE_GB
+            log.info(f"Using golden image: {base_image}")
+        
         # Create disk path
         disk_dir = self.get_images_dir()
         log.debug(f"Disk directory: {disk_dir}")
@@ -1460,7 +1548,7 @@ class SelectiveVMCloner:
             "-F", "qcow2",
             "-b", base_image,
             str(disk_path),
-            f"{config.disk_size_gb}G"
+            f"{size_gb}G"
         ]
         log.debug(f"Running: {' '.join(cmd)}")
         
@@ -1489,8 +1577,8 @@ class SelectiveVMCloner:
         
         return str(disk_path)
 
-    def _generate_cloud_init(self, config: VMConfig) -> str:
-        """Generate cloud-init ISO image."""
+    def _generate_cloud_init(self, config: VMConfig, mode: str = MODE_FULL) -> str:
+        """Generate cloud-init ISO image (see ``generate_cloud_init_config`` for *mode*)."""
         log.debug(f"Generating cloud-init for VM '{config.name}'...")
         log.debug(f"Auth method: {config.auth_method}")
         
@@ -1539,6 +1627,7 @@ class SelectiveVMCloner:
             user_data, meta_data, network_config = generate_cloud_init_config(
                 config=config,
                 user_session=self.user_session,
+                mode=mode,
             )
             log.debug(f"Cloud-init user-data generated ({len(user_data)} bytes)")
             log.debug(f"Cloud-init meta-data generated ({len(meta_data)} bytes)")
@@ -1649,8 +1738,159 @@ class SelectiveVMCloner:
         
         log.debug("Network setup complete (configuration in VM XML)")
 
-    def _wait_for_ip(self, vm, timeout: int = 60) -> Optional[str]:
-        """Wait for VM to get an IP address."""
+    def _golden_cache(self) -> GoldenImageCache:
+        return GoldenImageCache(self.get_images_dir() / "golden")
+
+    def _prepare_golden_image(self, config: VMConfig) -> Optional[str]:
+        """Return the golden image key for *config*, building the image on a miss.
+        
+        Returns ``None`` when the image cannot be built; the VM is then
+        provisioned from the plain base image as usual.
+        """
+        base_image = self._resolve_base_image(config)
+        inputs = golden_inputs(
+            base_image,
+            config.packages,
+            config.snap_packages,
+            config.gui,
+            config.username,
+            CLOUD_INIT_TEMPLATE_VERSION,
+        )
+        key = golden_key(inputs)
+        cache = self._golden_cache()
+        with cache.building(key):
+            if cache.lookup(key) is not None:
+                log.info(f"Golden image cache hit: {key[:12]}")
+                return key
+            log.info(f"Golden image cache miss: {key[:12]} - provisioning it once...")
+            try:
+                self._build_golden_image(config, key, base_image, inputs)
+            except Exception as e:
+                log.warning(f"Golden image build failed, provisioning from scratch: {e}")
+                return None
+        return key
+
+    def _build_golden_image(
+        self,
+        config: VMConfig,
+        key: str,
+        base_image: str,
+        inputs: Dict[str, Any],
+        timeout: int = GOLDEN_BUILD_TIMEOUT,
+    ) -> None:
+        """Provision a transient builder domain with the shared steps and seal its disk."""
+        cache = self._golden_cache()
+        builder = dataclass_replace(
+            config,
+            name=f"clonebox-golden-{key[:12]}",
+            disk_size_gb=GOLDEN_DISK_SIZE_GB,
+            paths={},
+            copy_paths={},
+            services=[],
+            post_commands=[],
+            web_services=[],
+            browser_profiles=[],
+            resources={},
+            autostart_apps=False,
+            auth_method="password",
+            ssh_public_key=None,
+        )
+        build_disk = cache.build_path(key)
+        builder_dir = self.get_images_dir() / builder.name
+        builder_dir.mkdir(parents=True, exist_ok=True)
+        iso_path = None
+        dom = None
+        try:
+            subprocess.run(
+                [
+                    "qemu-img", "create", "-f", "qcow2", "-F", "qcow2",
+                    "-b", base_image, str(build_disk), f"{GOLDEN_DISK_SIZE_GB}G",
+                ],
+                check=True, capture_output=True, text=True,
+            )
+            iso_path = self._generate_cloud_init(builder, mode=MODE_GOLDEN_BUILD)
+            vm_xml = generate_vm_xml(
+                config=builder,
+                vm_uuid=str(uuid.uuid4()),
+                disk_path=str(build_disk),
+                cdrom_path=iso_path,
+                user_session=self.user_session,
+            )
+            with self._readiness_watcher(builder.name) as readiness:
+                # Transient: the domain disappears once the guest powers off
+                dom = self.conn.createXML(vm_xml, 0)
+                if not self._wait_for_builder_shutdown(dom, readiness, timeout):
+                    raise TimeoutError(f"builder did not power off within {timeout}s")
+                # Powered off is not built: a crash or destroy also ends the domain
+                sealed = readiness.wait_for(Stage.SEALED, timeout=5)
+                if sealed is None or readiness.reached(Stage.PROVISION_FAILED):
+                    raise RuntimeError("builder powered off without sealing the image cleanly")
+            cache.seal(key, build_disk, inputs)
+        finally:
+            if dom is not None:
+                try:
+                    if dom.isActive():
+                        dom.destroy()
+                except Exception:
+                    pass
+            build_disk.unlink(missing_ok=True)
+            if iso_path:
+                Path(iso_path).unlink(missing_ok=True)
+            shutil.rmtree(builder_dir, ignore_errors=True)
+
+    def _wait_for_builder_shutdown(self, dom, readiness: ReadinessWatcher, timeout: float) -> bool:
+        """Wait for a golden image builder to power itself off, logging its progress."""
+        deadline = time.monotonic() + timeout
+        last_message = None
+        while time.monotonic() < deadline:
+            try:
+                if not dom.isActive():
+                    return True
+            except Exception:
+                return True  # transient domain already undefined
+            progress = readiness.progress
+            if progress is not None and progress.message != last_message:
+                last_message = progress.message
+                log.info(f"  [golden] {progress.message}")
+            readiness.pause(10, Stage.STOPPED)
+        return False
+
+    def _readiness_watcher(self, vm_name: str) -> ReadinessWatcher:
+        """Boot-stage watcher for *vm_name* (libvirt events + serial log)."""
+        return ReadinessWatcher(
+            vm_name,
+            self.conn_uri,
+            serial_log=_paths.serial_log_path(vm_name, self.user_session),
+        )
+
+    @staticmethod
+    def _pause(readiness: Optional[ReadinessWatcher], seconds: float, *stages: Stage) -> None:
+        """Sleep between polls, waking early when the guest reaches a new stage."""
+        if readiness is not None:
+            readiness.pause(seconds, *stages)
+        else:
+            time.sleep(seconds)
+
+    def _wait_for_gui_reboot(self, readiness: Optional[ReadinessWatcher], timeout: int = 30) -> None:
+        """Wait for the reboot cloud-init triggers at the end of a GUI install."""
+        if readiness is None or not readiness.serial_live:
+            time.sleep(timeout)
+            return
+        requested = readiness.last(Stage.REBOOTING)
+        if not requested:
+            log.debug("No reboot requested by cloud-init - not waiting")
+            return
+        if readiness.wait_for(Stage.REBOOTED, Stage.KERNEL, timeout=timeout, since=requested):
+            log.info("  VM rebooted into the desktop session")
+        else:
+            log.debug(f"Reboot not observed within {timeout}s")
+
+    def _wait_for_ip(self, vm, timeout: int = 60, readiness: Optional[ReadinessWatcher] = None) -> Optional[str]:
+        """Wait for VM to get an IP address.
+
+        With *readiness* the loop wakes on boot-stage events instead of a
+        fixed one-second poll.
+        """
         log.info(f"Waiting for VM IP address (timeout: {timeout}s)...")
         
         start_time = time.time()
@@ -1674,7 +1914,18 @@ class SelectiveVMCloner:
             except Exception as e:
                 log.debug(f"IP detection attempt {attempt} failed: {e}")
             
-            time.sleep(1)
+            # User-mode networking only learns the IP from the guest agent
+            if (
+                self.user_session
+                and readiness is not None
+                and readiness.events_live
+                and not readiness.reached(Stage.AGENT_CONNECTED)
+            ):
+                log.debug("Guest agent not connected yet - waiting for it")
+                readiness.pause(max(0.0, timeout - (time.time() - start_time)), Stage.AGENT_CONNECTED)
+                continue
+            
+            self._pause(readiness, 1)
         
         log.warning(f"Could not detect VM IP after {timeout}s - continuing without IP")
         log.warning("This is normal for user-mode networking - SSH port forwarding should still work")
@@ -1914,8 +2165,16 @@ class SelectiveVMCloner:
             return port
         return None
     
-    def _test_ssh_connectivity(self, vm_name: str, timeout: int = 120) -> bool:
-        """Test SSH connectivity to VM with multiple fallback methods."""
+    def _test_ssh_connectivity(
+        self,
+        vm_name: str,
+        timeout: int = 120,
+        readiness: Optional[ReadinessWatcher] = None,
+    ) -> bool:
+        """Test SSH connectivity to VM with multiple fallback methods.
+
+        Retries immediately when *readiness* reports a new boot stage.
+        """
         ssh_port = self._get_saved_ssh_port(vm_name)
         if not ssh_port:
             ssh_port = _paths.fallback_ssh_port(vm_name)
@@ -1967,7 +2226,7 @@ class SelectiveVMCloner:
             if not tcp_ok:
                 if attempt % 10 == 0:
                     log.info(f"  ... waiting for port {ssh_port} to accept connections ({elapsed:.0f}s elapsed)")
-                time.sleep(2)
+                self._pause(readiness, 2)
                 continue
             
             # Try SSH connection
@@ -2001,7 +2260,7 @@ class SelectiveVMCloner:
                 if last_error:
                     log.debug(f"    Last error: {last_error}")
             
-            time.sleep(3)
+            self._pause(readiness, 3)
         
         log.warning(f"  ✗ SSH connection not available after {timeout}s")
         log.warning("    Possible causes:")
@@ -2015,13 +2274,25 @@ class SelectiveVMCloner:
         log.warning(f"    Or check console: virsh --connect {self.conn_uri} console {vm_name}")
         return False
 
-    def _wait_for_cloud_init(self, vm_name: str, ssh_port: int, timeout: int = 1200, gui_mode: bool = False, config: VMConfig = None) -> bool:
+    def _wait_for_cloud_init(
+        self,
+        vm_name: str,
+        ssh_port: int,
+        timeout: int = 1200,
+        gui_mode: bool = False,
+        config: VMConfig = None,
+        readiness: Optional[ReadinessWatcher] = None,
+    ) -> bool:
         """Wait for cloud-init to complete, including GUI installation if enabled.
         
-        Checks every 20 seconds and reports detailed progress.
+        Checks every 20 seconds and reports detailed progress.  When
+        *readiness* is tailing the serial log, progress and completion are
+        read from the console instead, with no guest round trips.
         For GUI mode, also verifies desktop environment and applications are ready.
         """
         log.info(f"Waiting for cloud-init to complete (timeout: {timeout}s)...")
+        if readiness is not None and readiness.serial_live:
+            return self._follow_cloud_init_serial(vm_name, ssh_port, timeout, gui_mode, config, readiness)
         log.info(f"  Checking every 20 seconds for progress updates...")
         
         start_time = time.time()
@@ -2109,7 +2380,7 @@ class SelectiveVMCloner:
             except Exception as e:
                 log.debug(f"Cloud-init status check failed: {e}")
             
-            time.sleep(check_interval)
+            self._pause(readiness, check_interval, Stage.CLOUD_INIT_DONE)
         
         log.warning(f"  ✗ Cloud-init did not complete within {timeout}s")
         log.warning("  VM may still be usable but setup may be incomplete")
@@ -2121,6 +2392,67 @@ class SelectiveVMCloner:
         
         return False
 
+    def _follow_cloud_init_serial(
+        self,
+        vm_name: str,
+        ssh_port: int,
+        timeout: int,
+        gui_mode: bool,
+        config: Optional[VMConfig],
+        readiness: ReadinessWatcher,
+    ) -> bool:
+        """Serial-console variant of :meth:`_wait_for_cloud_init`.
+
+        Images that print no progress markers would leave nothing to follow,
+        so ``cloud-init status`` is still asked over SSH now and then.
+        """
+        log.info("  Following progress on the serial console...")
+        start_time = time.time()
+        last_message = None
+        last_ssh_check = start_time
+
+        while time.time() - start_time < timeout:
+            elapsed = time.time() - start_time
+            event = readiness.progress
+            if event is not None and event.message != last_message:
+                pct = f" ({event.percent}%)" if event.percent is not None else ""
+                log.info(f"  [{elapsed:.0f}s] {event.message[:80]}{pct}")
+                last_message = event.message
+
+            # Done for the current boot (a GUI install reboots before finishing)
+            done = readiness.last(Stage.CLOUD_INIT_DONE) > readiness.last(Stage.KERNEL)
+            if not done and time.time() - last_ssh_check >= CLOUD_INIT_SSH_FALLBACK_INTERVAL:
+                last_ssh_check = time.time()
+                status = self._ssh_cloud_init_status(ssh_port)
+                done = any(word in status for word in ("done", "disabled", "error"))
+            if done:
+                log.info(f"  ✓ Cloud-init completed after {elapsed:.0f}s")
+                if gui_mode:
+                    return self._verify_gui_ready(vm_name, ssh_port, config, timeout=int(timeout - elapsed))
+                return True
+
+            readiness.pause(5, Stage.CLOUD_INIT_DONE)
+
+        log.warning(f"  ✗ Cloud-init did not complete within {timeout}s")
+        log.warning("  VM may still be usable but setup may be incomplete")
+        if gui_mode:
+            log.info("  Checking current GUI status despite timeout...")
+            return self._verify_gui_ready(vm_name, ssh_port, config, timeout=60)
+        return False
+
+    def _ssh_cloud_init_status(self, ssh_port: int) -> str:
+        """Lower-cased ``cloud-init status`` output, or ``""`` if SSH is not up yet."""
+        try:
+            result = subprocess.run(
+                _build_ssh_cmd(port=ssh_port, host="localhost", connect_timeout=5, log_level="ERROR")
+                + ["cloud-init status 2>/dev/null || echo 'STATUS_UNKNOWN'"],
+                capture_output=True, text=True, timeout=15,
+            )
+        except (subprocess.TimeoutExpired, OSError) as e:
+            log.debug(f"Cloud-init status check failed: {e}")
+            return ""
+        return result.stdout.strip().lower()
+
     def _verify_gui_ready(self, vm_name: str, ssh_port: int, config: VMConfig, timeout: int = 300) -> bool:
         """Verify that GUI desktop and applications are fully ready."""
         log.info("Verifying GUI desktop environment is ready...")
@@ -9,15 +9,31 @@ from typing import Dict, List, Optional, Tuple
 
 from clonebox.models import VMConfig
 
+# Bump whenever the shared provisioning steps below change: it is part of
+# the golden image key (see clonebox.image_cache), so stale images are rebuilt.
+CLOUD_INIT_TEMPLATE_VERSION = 1
+
+# Cloud-init modes: a regular VM, a golden image builder, or a VM layered on
+# a golden image (shared provisioning already baked in).
+MODE_FULL = "full"
+MODE_GOLDEN_BUILD = "golden-build"
+MODE_GOLDEN = "golden"
+
 
 def generate_cloud_init_config(
     config: VMConfig,
     autostart_apps: List[Dict] = None,
     user_session: bool = False,
     bootcmd_extra: List = None,
+    mode: str = MODE_FULL,
 ) -> Tuple[str, str, str]:
     """Generate cloud-init configuration for VM.
     
+    ``mode`` selects which runcmd steps are emitted: ``MODE_FULL`` runs the
+    shared provisioning and the per-VM setup, ``MODE_GOLDEN_BUILD`` runs
+    only the shared provisioning, then seals the guest and powers it off,
+    and ``MODE_GOLDEN`` runs only the per-VM setup.
+    
     Returns:
         Tuple of (user_data, meta_data, network_config)
     """
@@ -29,6 +45,98 @@ def generate_cloud_init_config(
     runcmd_lines = [
         "echo '[clonebox] =========================================' > /dev/ttyS0",
         "echo '[clonebox] Starting VM setup (runcmd phase)...' > /dev/ttyS0",
+    ]
+    if mode == MODE_GOLDEN:
+        runcmd_lines.extend([
+            "echo '[clonebox] Using golden image - packages already installed' > /dev/ttyS0",
+            "systemctl start qemu-guest-agent 2>&1 | tee -a /var/log/cloud-init-output.log || echo '[clonebox] WARNING: Failed to start qemu-guest-agent' > /dev/ttyS0",
+        ])
+    else:
+        runcmd_lines.extend(_provisioning_runcmd(config))
+    
+    if mode == MODE_GOLDEN_BUILD:
+        runcmd_lines.extend(_seal_runcmd(config))
+    else:
+        runcmd_lines.extend(_instance_runcmd(config, autostart_apps, reboot=mode != MODE_GOLDEN))
+    
+    # Build cloud-config
+    cloud_config = {
+        "hostname": config.name,
+        "manage_etc_hosts": True,
+        "users": [
+            {
+                "name": config.username,
+                "groups": "sudo,adm,video,render",
+                "sudo": "ALL=(ALL) NOPASSWD:ALL",
+                "ssh_authorized_keys": [config.ssh_public_key] if config.ssh_public_key else [],
+                "lock_passwd": False,
+            }
+        ],
+        "ssh_pwauth": True if config.gui else config.auth_method in ["password", "one_time_password"],
+        "runcmd": runcmd_lines,
+        "bootcmd": [
+            ["sh", "-c", "echo '[clonebox] bootcmd - starting configuration' > /dev/ttyS0 || true"],
+            ["systemctl", "enable", "serial-getty@ttyS0.service"],
+        ],
+        "output": {"all": "| tee -a /var/log/cloud-init-output.log"},
+    }
+
+    if mode == MODE_GOLDEN_BUILD:
+        # Power off once cloud-init is done so the builder disk can be sealed
+        cloud_config["power_state"] = {"mode": "poweroff", "condition": True, "timeout": 60}
+
+    if config.gui or config.auth_method in ["password", "one_time_password"]:
+        cloud_config["chpasswd"] = {
+            "expire": False,
+            "list": f"{config.username}:{config.password}",
+        }
+    
+    # Generate network-config for user session (passt networking)
+    network_config = None
+    if user_session:
+        network_config = generate_network_config()
+    
+    # Add user session network setup if needed
+    if user_session:
+        net_setup_cmd = (
+            "NIC=$(ip -o link show | grep -E 'enp|ens|eth' | grep -v 'lo' | head -1 | awk -F': ' '{print $2}' | tr -d ' '); "
+            "if [ -n \"$NIC\" ]; then "
+            "  echo '[clonebox] Found NIC: $NIC' > /dev/ttyS0; "
+            "  ip addr show $NIC | grep -q 'inet ' || ( "
+            "    echo '[clonebox] Manual network config for $NIC' > /dev/ttyS0; "
+            "    ip addr add 10.0.2.15/24 dev $NIC 2>/dev/null; "
+            "    ip link set $NIC up; "
+            "    ip route add default via 10.0.2.2 2>/dev/null; "
+            "    echo nameserver 10.0.2.3 > /etc/resolv.conf "
+            "  ); "
+            "else "
+            "  echo '[clonebox] No NIC found for network setup' > /dev/ttyS0; "
+            "fi"
+        )
+        cloud_config["bootcmd"].extend([
+            ["sh", "-c", "echo '[clonebox] Running network fallback...' > /dev/ttyS0"],
+            ["sh", "-c", net_setup_cmd],
+        ])
+    
+    # Add extra bootcmd if provided
+    if bootcmd_extra:
+        cloud_config["bootcmd"].extend(bootcmd_extra)
+    
+    # Convert to YAML
+    cloud_config_yaml = yaml.dump(cloud_config, default_flow_style=False)
+    
+    # Add cloud-init header
+    user_data = "#cloud-config\n" + cloud_config_yaml
+    
+    # Meta-data
+    meta_data = f"instance-id: {config.name}\nlocal-hostname: {config.name}\n"
+    
+    return user_data, meta_data, network_config
+
+
+def _provisioning_runcmd(config: VMConfig) -> List[str]:
+    """Shared provisioning steps: guest agent, desktop, apt packages and snaps."""
+    runcmd_lines = [
         "echo '[clonebox] Step 1/10: Updating package lists...' > /dev/ttyS0",
         "apt-get update 2>&1 | tee -a /var/log/cloud-init-output.log || echo '[clonebox] WARNING: apt-get update failed' > /dev/ttyS0",
         "echo '[clonebox] Step 2/10: Installing qemu-guest-agent...' > /dev/ttyS0",
@@ -101,6 +209,13 @@ def generate_cloud_init_config(
                 # Regular snap
                 runcmd_lines.append(f"snap install {snap} 2>&1 | tee -a /var/log/cloud-init-output.log | while read line; do echo \"[clonebox] [snap-{snap}] $line\" > /dev/ttyS0; done || echo '[clonebox] WARNING: Failed to install {snap}' > /dev/ttyS0")
     
+    return runcmd_lines
+
+
+def _instance_runcmd(config: VMConfig, autostart_apps: List[Dict], reboot: bool = True) -> List[str]:
+    """Per-VM steps: mounts, services, apps, monitor and logs disk."""
+    runcmd_lines = []
+    
     # Create mount points with error handling
     if config.paths:
         runcmd_lines.append("echo '[clonebox] Setting up mount points...' > /dev/ttyS0")
@@ -263,82 +378,45 @@ done
         "mkdir -p /mnt/logs/var/log /mnt/logs/tmp",
     ])
     
-    # Reboot if GUI is enabled
-    if config.gui:
+    # Reboot if GUI is enabled (golden images already boot into the desktop)
+    if config.gui and reboot:
         runcmd_lines.extend([
             "echo '[clonebox] Rebooting in 10 seconds to start GUI...' > /dev/ttyS0",
             "sleep 10 && reboot",
         ])
     
-    # Build cloud-config
-    cloud_config = {
-        "hostname": config.name,
-        "manage_etc_hosts": True,
-        "users": [
-            {
-                "name": config.username,
-                "groups": "sudo,adm,video,render",
-                "sudo": "ALL=(ALL) NOPASSWD:ALL",
-                "ssh_authorized_keys": [config.ssh_public_key] if config.ssh_public_key else [],
-                "lock_passwd": False,
-            }
-        ],
-        "ssh_pwauth": True if config.gui else config.auth_method in ["password", "one_time_password"],
-        "runcmd": runcmd_lines,
-        "bootcmd": [
-            ["sh", "-c", "echo '[clonebox] bootcmd - starting configuration' > /dev/ttyS0 || true"],
-            ["systemctl", "enable", "serial-getty@ttyS0.service"],
-        ],
-        "output": {"all": "| tee -a /var/log/cloud-init-output.log"},
-    }
+    return runcmd_lines
 
-    if config.gui or config.auth_method in ["password", "one_time_password"]:
-        cloud_config["chpasswd"] = {
-            "expire": False,
-            "list": f"{config.username}:{config.password}",
-        }
-    
-    # Generate network-config for user session (passt networking)
-    network_config = None
-    if user_session:
-        network_config = generate_network_config()
-    
-    # Add user session network setup if needed
-    if user_session:
-        net_setup_cmd = (
-            "NIC=$(ip -o link show | grep -E 'enp|ens|eth' | grep -v 'lo' | head -1 | awk -F': ' '{print $2}' | tr -d ' '); "
-            "if [ -n \"$NIC\" ]; then "
-            "  echo '[clonebox] Found NIC: $NIC' > /dev/ttyS0; "
-            "  ip addr show $NIC | grep -q 'inet ' || ( "
-            "    echo '[clonebox] Manual network config for $NIC' > /dev/ttyS0; "
-            "    ip addr add 10.0.2.15/24 dev $NIC 2>/dev/null; "
-            "    ip link set $NIC up; "
-            "    ip route add default via 10.0.2.2 2>/dev/null; "
-            "    echo nameserver 10.0.2.3 > /etc/resolv.conf "
-            "  ); "
-            "else "
-            "  echo '[clonebox] No NIC found for network setup' > /dev/ttyS0; "
-            "fi"
+
+def _seal_runcmd(config: VMConfig) -> List[str]:
+    """Strip per-instance identity so a golden image can be cloned.
+
+    The piped apt/snap steps above cannot report their own failures, so the
+    installed packages are checked here; the host only caches the disk if
+    the sealed marker follows no ``WARNING``/``ERROR`` line.
+    """
+    checks = []
+    debs = list(config.packages) + (["ubuntu-desktop-minimal", "gdm3"] if config.gui else [])
+    if debs:
+        checks.append(
+            f"dpkg -s {' '.join(debs)} >/dev/null 2>&1 "
+            "|| echo '[clonebox] ERROR: golden image packages missing' > /dev/ttyS0"
         )
-        cloud_config["bootcmd"].extend([
-            ["sh", "-c", "echo '[clonebox] Running network fallback...' > /dev/ttyS0"],
-            ["sh", "-c", net_setup_cmd],
-        ])
-    
-    # Add extra bootcmd if provided
-    if bootcmd_extra:
-        cloud_config["bootcmd"].extend(bootcmd_extra)
-    
-    # Convert to YAML
-    cloud_config_yaml = yaml.dump(cloud_config, default_flow_style=False)
-    
-    # Add cloud-init header
-    user_data = "#cloud-config\n" + cloud_config_yaml
-    
-    # Meta-data
-    meta_data = f"instance-id: {config.name}\nlocal-hostname: {config.name}\n"
-    
-    return user_data, meta_data, network_config
+    if config.snap_packages:
+        checks.append(
+            f"snap list {' '.join(config.snap_packages)} >/dev/null 2>&1 "
+            "|| echo '[clonebox] ERROR: golden image snaps missing' > /dev/ttyS0"
+        )
+    return checks + [
+        "echo '[clonebox] Sealing golden image...' > /dev/ttyS0",
+        "apt-get clean",
+        f"passwd -d {config.username} >/dev/null 2>&1 || true",
+        "rm -f /etc/ssh/ssh_host_* /var/lib/dbus/machine-id",
+        "truncate -s 0 /etc/machine-id",
+        "cloud-init clean --logs || true",
+        "echo '[clonebox] Golden image sealed' > /dev/ttyS0",
+        "sync",
+    ]
 
 
 def generate_network_config() -> str:
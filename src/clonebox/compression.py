@@ -0,0 +1,261 @@
+"""
+Stream compression codecs for host → guest transfers and export archives.
+
+Whether compressing a stream pays off depends on how the link compares to
+the CPU: on a loopback port-forward ``none`` usually wins, over a real
+network ``zstd`` does, and ``lz4`` sits in between.  :func:`choose_codec`
+compresses a sample of the actual payload with each codec both sides
+support, and picks the one with the best effective throughput::
+
+    effective = min(compress_rate, link_rate * ratio)
+
+Set ``CLONEBOX_TRANSFER_COMPRESSION`` to ``none``, ``lz4`` or ``zstd`` to
+skip the measurement.
+
+Export archives are compressed by an external, multi-threaded process
+(``pigz`` for gzip-compatible output, ``zstd -T0``) that the tar writer
+pipes into; :func:`archive_compressor` sets that stage up and
+:func:`archive_decompressor` recognises the format from its magic bytes
+on import.  Without ``pigz``, gzip falls back to Python's ``zlib``.
+"""
+
+import contextlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+
+log = structlog.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Codec:
+    name: str
+    compress: Optional[List[str]]
+    decompress: Optional[List[str]]
+
+    @property
+    def binary(self) -> Optional[str]:
+        return self.compress[0] if self.compress else None
+
+
+CODECS: Dict[str, Codec] = {
+    "none": Codec("none", None, None),
+    "lz4": Codec("lz4", ["lz4", "-1", "-q", "-c"], ["lz4", "-d", "-q", "-c"]),
+    "zstd": Codec("zstd", ["zstd", "-1", "-T0", "-q", "-c"], ["zstd", "-d", "-q", "-c"]),
+}
+
+# Below this, a transfer is latency-bound and not worth measuring.
+MIN_NEGOTIATE_BYTES = 16 * 1024 * 1024
+
+
+def host_codecs() -> List[str]:
+    """Codecs whose compressor is installed on the host."""
+    return [name for name, codec in CODECS.items() if codec.binary is None or shutil.which(codec.binary)]
+
+
+def measure_codec(name: str, sample: bytes) -> Optional[tuple]:
+    """Return ``(bytes_per_second, ratio)`` of compressing *sample*."""
+    codec = CODECS[name]
+    if codec.compress is None or not sample:
+        return None
+    started = time.monotonic()
+    try:
+        result = subprocess.run(codec.compress, input=sample, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    elapsed = max(time.monotonic() - started, 1e-6)
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return len(sample) / elapsed, len(sample) / len(result.stdout)
+
+
+def choose_codec(
+    guest_codecs: Sequence[str],
+    sample: bytes,
+    link_bps: Optional[float],
+) -> str:
+    """Pick the codec with the best effective throughput for *sample*.
+
+    *link_bps* is the measured raw link rate; without it (or without a
+    sample) nothing is compressed.
+    """
+    forced = os.getenv("CLONEBOX_TRANSFER_COMPRESSION")
+    if forced in CODECS:
+        return forced
+
+    best, best_rate = "none", link_bps or 0.0
+    if not link_bps or not sample:
+        return best
+    for name in host_codecs():
+        if name == "none" or name not in guest_codecs:
+            continue
+        measured = measure_codec(name, sample)
+        if measured is None:
+            continue
+        rate, ratio = measured
+        effective = min(rate, link_bps * ratio)
+        log.debug("codec_measured", codec=name, rate=int(rate), ratio=round(ratio, 2),
+                  effective=int(effective))
+        if effective > best_rate * 1.1:  # must clearly beat the best so far
+            best, best_rate = name, effective
+    log.info("codec_chosen", codec=best, link_bps=int(link_bps), effective=int(best_rate))
+    return best
+
+
+# ── export archives ──────────────────────────────────────────────────────────
+
+ARCHIVE_COMPRESSIONS = ("none", "gzip", "zstd")
+DEFAULT_ARCHIVE_COMPRESSION = os.getenv("CLONEBOX_EXPORT_COMPRESSION", "gzip")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_PIPE_BLOCK = 1024 * 1024
+
+
+def _threads() -> str:
+    return str(os.cpu_count() or 1)
+
+
+def _archive_command(name: str, decompress: bool) -> Optional[List[str]]:
+    if name == "gzip":
+        if not shutil.which("pigz"):
+            return None
+        return ["pigz", "-d", "-c"] if decompress else ["pigz", "-p", _threads(), "-c"]
+    if name == "zstd":
+        if not shutil.which("zstd"):
+            raise RuntimeError("zstd compression requested but zstd is not installed")
+        return ["zstd", "-d", "-q", "-c"] if decompress else ["zstd", "-3", "-T0", "-q", "-c"]
+    return None
+
+
+def _pump(src: BinaryIO, dst: BinaryIO, errors: list) -> None:
+    """Copy *src* to *dst*; failures (other than a closed reader) go to *errors*."""
+    try:
+        for block in iter(lambda: src.read(_PIPE_BLOCK), b""):
+            dst.write(block)
+    except BrokenPipeError:
+        pass  # the consumer stopped; it reports its own error
+    except Exception as exc:  # re-raised by the owning context manager
+        errors.append(exc)
+    finally:
+        with contextlib.suppress(OSError):
+            dst.close()
+
+
+def _fileno(stream: BinaryIO) -> Optional[int]:
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def archive_compressor(out: BinaryIO, name: str) -> Iterator[Tuple[BinaryIO, str]]:
+    """Compression stage between a tar writer and *out*.
+
+    Yields ``(stream, tar_mode)``: write the archive with
+    ``tarfile.open(fileobj=stream, mode=tar_mode)``.
+    """
+    if name not in ARCHIVE_COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {name}")
+    cmd = _archive_command(name, decompress=False)
+    if cmd is None:
+        yield out, "w|gz" if name == "gzip" else "w|"
+        return
+
+    out.flush()
+    fd = _fileno(out)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                            stdout=fd if fd is not None else subprocess.PIPE)
+    errors: list = []
+    pump = None
+    if fd is None:
+        # e.g. an EncryptingWriter: copy the compressed output across
+        pump = threading.Thread(target=_pump, args=(proc.stdout, _Unclosable(out), errors),
+                                daemon=True)
+        pump.start()
+    log.debug("archive_compressor", cmd=cmd)
+    ok = False
+    try:
+        yield proc.stdin, "w|"
+        ok = True
+    finally:
+        with contextlib.suppress(OSError):
+            proc.stdin.close()
+        returncode = proc.wait()
+        if pump is not None:
+            pump.join()
+    if errors:
+        raise errors[0]
+    if ok and returncode != 0:
+        raise RuntimeError(f"{cmd[0]} failed with exit code {returncode}")
+
+
+@contextlib.contextmanager
+def archive_decompressor(src: BinaryIO) -> Iterator[Tuple[BinaryIO, str]]:
+    """Detect the compression of the archive on *src*.
+
+    Yields ``(stream, tar_mode)`` for ``tarfile.open``.
+    """
+    head = src.read(len(_ZSTD_MAGIC))
+    name = "zstd" if head == _ZSTD_MAGIC else "gzip" if head.startswith(_GZIP_MAGIC) else "none"
+    cmd = _archive_command(name, decompress=True)
+    if cmd is None:
+        yield _Prefixed(head, src), "r|gz" if name == "gzip" else "r|"
+        return
+
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    errors: list = []
+    feeder = threading.Thread(target=_pump, args=(_Prefixed(head, src), proc.stdin, errors),
+                              daemon=True)
+    feeder.start()
+    try:
+        yield proc.stdout, "r|"
+        # Drain trailing padding so the decompressor can finish
+        for _ in iter(lambda: proc.stdout.read(_PIPE_BLOCK), b""):
+            pass
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        feeder.join()
+        if errors:
+            # A failing source (e.g. a corrupt encrypted segment) is the root
+            # cause of whatever the tar reader ran into
+            raise errors[0]
+    if returncode != 0:
+        raise RuntimeError(f"{cmd[0]} failed with exit code {returncode}")
+
+
+class _Prefixed:
+    """Read *head* again before the rest of *src*."""
+
+    def __init__(self, head: bytes, src: BinaryIO):
+        self._head = head
+        self._src = src
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._src.read(size)
+        if size is None or size < 0:
+            data, self._head = self._head + self._src.read(), b""
+            return data
+        data, self._head = self._head[:size], self._head[size:]
+        if len(data) < size:
+            data += self._src.read(size - len(data))
+        return data
+
+
+class _Unclosable:
+    """Forwards writes; closing it leaves the wrapped stream open."""
+
+    def __init__(self, out: BinaryIO):
+        self.write = out.write
+
+    def close(self) -> None:
+        pass
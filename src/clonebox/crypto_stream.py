@@ -0,0 +1,197 @@
+"""
+Streaming authenticated encryption for VM export archives.
+
+The archive is encrypted in fixed-size segments with AES-256-GCM, so a
+40 GB export never has to fit in memory or exist in plaintext on disk::
+
+    MAGIC (8 bytes) | header length (4 bytes, BE) | header JSON
+    segment*        : ciphertext length (4 bytes, BE) | ciphertext + tag
+
+The header names the cipher, segment size, a random nonce prefix and the
+id of the key that was used, and is authenticated as associated data of
+every segment.  Segment nonces are ``prefix | counter | last-flag`` (the
+STREAM construction), so reordered, dropped or truncated segments fail
+authentication instead of yielding a shorter archive.
+
+The AES key is derived with HKDF from the team key file (the same
+``~/.clonebox.key`` used by older Fernet exports).
+"""
+
+import hashlib
+import json
+import os
+import struct
+from typing import BinaryIO, Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MAGIC = b"CBXGCM01"
+CIPHER = "AES-256-GCM"
+SEGMENT_SIZE = 1024 * 1024
+_NONCE_PREFIX_SIZE = 7
+_LEN = struct.Struct(">I")
+_TAG_SIZE = 16
+
+
+class DecryptionError(RuntimeError):
+    """Encrypted stream is corrupt, truncated or for a different key."""
+
+
+def key_id(key: bytes) -> str:
+    """Short public identifier of a team key."""
+    return hashlib.sha256(key.strip()).hexdigest()[:16]
+
+
+def _derive(key: bytes) -> AESGCM:
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"clonebox-export-v2")
+    return AESGCM(hkdf.derive(key.strip()))
+
+
+def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    return prefix + struct.pack(">I", counter) + (b"\x01" if last else b"\x00")
+
+
+def is_encrypted_stream(head: bytes) -> bool:
+    return head.startswith(MAGIC)
+
+
+class EncryptingWriter:
+    """Write-only file object that encrypts everything written to *out*.
+
+    ``close()`` writes the final segment; it does not close *out*.
+    """
+
+    def __init__(self, out: BinaryIO, key: bytes, segment_size: int = SEGMENT_SIZE):
+        self._out = out
+        self._aead = _derive(key)
+        self._segment_size = segment_size
+        self._prefix = os.urandom(_NONCE_PREFIX_SIZE)
+        self._counter = 0
+        self._buf = bytearray()
+        self.closed = False
+        header = json.dumps({
+            "cipher": CIPHER,
+            "key_id": key_id(key),
+            "segment_size": segment_size,
+            "nonce_prefix": self._prefix.hex(),
+        }, sort_keys=True).encode()
+        self._aad = MAGIC + _LEN.pack(len(header)) + header
+        out.write(self._aad)
+
+    def writable(self) -> bool:
+        return True
+
+    def _emit(self, plaintext: bytes, last: bool) -> None:
+        sealed = self._aead.encrypt(_nonce(self._prefix, self._counter, last), plaintext, self._aad)
+        self._out.write(_LEN.pack(len(sealed)))
+        self._out.write(sealed)
+        self._counter += 1
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed EncryptingWriter")
+        self._buf += data
+        while len(self._buf) > self._segment_size:
+            self._emit(bytes(self._buf[:self._segment_size]), last=False)
+            del self._buf[:self._segment_size]
+        return len(data)
+
+    def flush(self) -> None:
+        self._out.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._emit(bytes(self._buf), last=True)
+        self._buf.clear()
+        self.closed = True
+        self._out.flush()
+
+    def __enter__(self) -> "EncryptingWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+
+class DecryptingReader:
+    """Read-only file object yielding the plaintext of an encrypted stream."""
+
+    def __init__(self, src: BinaryIO, key: bytes):
+        self._src = src
+        magic = src.read(len(MAGIC))
+        if magic != MAGIC:
+            raise DecryptionError("Not a CloneBox encrypted export")
+        raw_len = src.read(_LEN.size)
+        if len(raw_len) != _LEN.size:
+            raise DecryptionError("Encrypted export is truncated")
+        (header_len,) = _LEN.unpack(raw_len)
+        raw_header = src.read(header_len)
+        try:
+            self.header = json.loads(raw_header)
+        except ValueError:
+            raise DecryptionError("Encrypted export header is corrupt") from None
+        if self.header.get("cipher") != CIPHER:
+            raise DecryptionError(f"Unsupported cipher: {self.header.get('cipher')}")
+        if self.header.get("key_id") != key_id(key):
+            raise DecryptionError(
+                f"Export was encrypted with key {self.header.get('key_id')}, "
+                f"the local key is {key_id(key)}"
+            )
+        self._aad = magic + raw_len + raw_header
+        self._aead = _derive(key)
+        self._prefix = bytes.fromhex(self.header["nonce_prefix"])
+        self._max_sealed = int(self.header["segment_size"]) + _TAG_SIZE
+        self._counter = 0
+        self._buf = b""
+        self._pos = 0
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_segment(self) -> None:
+        raw_len = self._src.read(_LEN.size)
+        if len(raw_len) != _LEN.size:
+            raise DecryptionError("Encrypted export is truncated")
+        (sealed_len,) = _LEN.unpack(raw_len)
+        if sealed_len > self._max_sealed:
+            raise DecryptionError("Encrypted export is corrupt (oversized segment)")
+        sealed = self._src.read(sealed_len)
+        if len(sealed) != sealed_len:
+            raise DecryptionError("Encrypted export is truncated")
+        # A segment is the last one iff it authenticates with the last-flag set
+        for last in (False, True):
+            try:
+                plain = self._aead.decrypt(_nonce(self._prefix, self._counter, last), sealed, self._aad)
+            except InvalidTag:
+                continue
+            self._done = last
+            break
+        else:
+            raise DecryptionError(f"Segment {self._counter} failed authentication")
+        self._counter += 1
+        self._buf, self._pos = plain, 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            parts = []
+            while True:
+                chunk = self.read(SEGMENT_SIZE)
+                if not chunk:
+                    return b"".join(parts)
+                parts.append(chunk)
+        while self._pos >= len(self._buf):
+            if self._done:
+                return b""
+            self._next_segment()
+        out = self._buf[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
+
+    def close(self) -> None:
+        pass
@@ -1,20 +1,48 @@
+import asyncio
+import hashlib
+import html
 import json
-import subprocess
-import sys
-from typing import Any, List
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 
-app = FastAPI(title="CloneBox Dashboard")
+from clonebox import paths as _paths
+from clonebox.openmetrics import CONTENT_TYPE, render, snapshot_families
+from clonebox.sampler import Sampler, Snapshot
 
+_sampler_options = {"conn_uri": _paths.conn_uri(user_session=False), "compose_files": ()}
+_sampler: Optional[Sampler] = None
+
+
+def configure_sampler(user_session: bool = False, compose_files: Sequence[Path] = ()) -> None:
+    """Set what the background sampler watches; call before the app starts."""
+    _sampler_options.update(conn_uri=_paths.conn_uri(user_session), compose_files=tuple(compose_files))
+
+
+def get_sampler() -> Sampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(**_sampler_options)
+        _sampler.start()
+    return _sampler
 
-def _run_clonebox(args: List[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(
-        [sys.executable, "-m", "clonebox"] + args,
-        capture_output=True,
-        text=True,
-    )
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    get_sampler()
+    yield
+    global _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+    _views.clear()
+    _live_rows.clear()
+
+
+app = FastAPI(title="CloneBox Dashboard", lifespan=_lifespan)
 
 
 def _render_table(title: str, headers: List[str], rows: List[List[str]]) -> str:
@@ -24,7 +52,7 @@ def _render_table(title: str, headers: List[str], rows: List[List[str]]) -> str:
     )
     body_html = "".join(
         '<tr class="hover:bg-gray-700 transition-colors">'
-        + "".join(f'<td class="px-4 py-3 whitespace-nowrap">{c}</td>' for c in row)
+        + "".join(f'<td class="px-4 py-3 whitespace-nowrap">{html.escape(c)}</td>' for c in row)
         + "</tr>"
         for row in rows
     )
@@ -49,11 +77,7 @@ async def dashboard() -> str:
   <meta charset="UTF-8">
   <meta name="viewport" content="width=device-width, initial-scale=1.0">
   <title>CloneBox Dashboard</title>
-  <script src="https://unpkg.com/htmx.org@1.9.10"></script>
   <script src="https://cdn.tailwindcss.com"></script>
-  <style>
-    .htmx-request { opacity: 0.5; transition: opacity 200ms ease-in; }
-  </style>
 </head>
 <body class="bg-gray-900 text-gray-100 min-h-screen">
   <div class="max-w-6xl mx-auto px-4 py-8">
@@ -62,23 +86,47 @@ async def dashboard() -> str:
         <span class="text-4xl">📦</span> CloneBox Dashboard
       </h1>
       <p class="text-gray-400 mt-2">
-        Auto-refresh every 3s &bull;
+        <span id="live">Connecting...</span> &bull;
         <code class="bg-gray-800 px-2 py-1 rounded text-sm">/api/vms.json</code>
         <code class="bg-gray-800 px-2 py-1 rounded text-sm ml-1">/api/containers.json</code>
+        <code class="bg-gray-800 px-2 py-1 rounded text-sm ml-1">/metrics</code>
       </p>
     </header>
 
     <div class="grid gap-6">
       <section class="bg-gray-800 rounded-lg p-6 shadow-lg">
-        <div id="vms" hx-get="/api/vms" hx-trigger="load, every 3s">
-          <div class="animate-pulse text-gray-500">Loading VMs...</div>
+        <h2 class="text-xl font-semibold text-cyan-400 mb-4">🖥️ VMs</h2>
+        <div class="overflow-x-auto">
+          <table class="min-w-full divide-y divide-gray-700">
+            <thead class="bg-gray-900"><tr>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Name</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">State</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">CPU</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">CPU history</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Memory</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">UUID</th>
+            </tr></thead>
+            <tbody id="vms-rows" class="divide-y divide-gray-700"></tbody>
+          </table>
         </div>
+        <p id="vms-empty" class="text-gray-500 italic mt-2">Loading VMs...</p>
       </section>
 
       <section class="bg-gray-800 rounded-lg p-6 shadow-lg">
-        <div id="containers" hx-get="/api/containers" hx-trigger="load, every 3s">
-          <div class="animate-pulse text-gray-500">Loading containers...</div>
+        <h2 class="text-xl font-semibold text-cyan-400 mb-4">🐳 Containers</h2>
+        <div class="overflow-x-auto">
+          <table class="min-w-full divide-y divide-gray-700">
+            <thead class="bg-gray-900"><tr>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Name</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Image</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Status</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">Ports</th>
+              <th class="px-4 py-3 text-left text-xs font-medium text-gray-400 uppercase">CPU</th>
+            </tr></thead>
+            <tbody id="containers-rows" class="divide-y divide-gray-700"></tbody>
+          </table>
         </div>
+        <p id="containers-empty" class="text-gray-500 italic mt-2">Loading containers...</p>
       </section>
     </div>
 
@@ -86,82 +134,367 @@ async def dashboard() -> str:
       CloneBox v1.1 &bull; <a href="https://github.com/wronai/clonebox" class="text-cyan-400 hover:underline">GitHub</a>
     </footer>
   </div>
+  <script>
+    const percent = (v) => (v == null ? "" : v.toFixed(1) + "%");
+    const views = {
+      vms: {
+        empty: "No VMs found.",
+        cells: (r) => [r.name, r.state, percent(r.cpu), r.state === "running" ? spark(sparks[r.id]) : "",
+                       `${r.memory_used} / ${r.memory} MiB`, r.uuid],
+        html: [3],
+      },
+      containers: {
+        empty: "No containers found.",
+        cells: (r) => [r.name, r.image, r.status, r.ports, percent(r.cpu)],
+        html: [],
+      },
+    };
+
+    function escapeHtml(value) {
+      const div = document.createElement("div");
+      div.textContent = value == null ? "" : String(value);
+      return div.innerHTML;
+    }
+
+    // vm -> CPU points, extended by each message (sampler.SPARKLINE_POINTS kept)
+    let sparks = {};
+    const SPARK_POINTS = 60;
+
+    function spark(points) {
+      if (!points || points.length < 2) return "";
+      const w = 120, h = 24, top = Math.max(100, ...points), dx = w / (points.length - 1);
+      const coords = points.map((v, i) => `${(i * dx).toFixed(1)},${(h - (v / top) * h).toFixed(1)}`);
+      return `<svg width="${w}" height="${h}"><polyline fill="none" stroke="#22d3ee" stroke-width="1.5" points="${coords.join(" ")}"/></svg>`;
+    }
+
+    function apply(name, diff) {
+      const view = views[name];
+      const body = document.getElementById(name + "-rows");
+      const rowById = (id) => [...body.children].find((tr) => tr.dataset.id === id);
+      if (diff.reset) body.innerHTML = "";
+      if (diff.reset && name === "vms") sparks = {};
+      for (const id of diff.remove || []) {
+        rowById(id)?.remove();
+        if (name === "vms") delete sparks[id];
+      }
+      for (const [id, points] of Object.entries(diff.spark || {})) {
+        sparks[id] = (sparks[id] || []).concat(points).slice(-SPARK_POINTS);
+      }
+      const upserted = new Set((diff.upsert || []).map((row) => row.id));
+      for (const id of Object.keys(diff.spark || {})) {
+        const cell = upserted.has(id) ? null : rowById(id)?.children[3];
+        if (cell) cell.innerHTML = spark(sparks[id]);
+      }
+      for (const row of diff.upsert || []) {
+        let tr = rowById(row.id);
+        if (!tr) {
+          tr = document.createElement("tr");
+          tr.dataset.id = row.id;
+          tr.className = "hover:bg-gray-700 transition-colors";
+          body.insertBefore(tr, [...body.children].find((el) => el.dataset.id > row.id) || null);
+        }
+        tr.innerHTML = view.cells(row).map((cell, i) =>
+          `<td class="px-4 py-3 whitespace-nowrap">${view.html.includes(i) ? cell : escapeHtml(cell)}</td>`
+        ).join("");
+      }
+      const empty = document.getElementById(name + "-empty");
+      if ("error" in diff) empty.dataset.error = diff.error || "";
+      empty.textContent = empty.dataset.error || view.empty;
+      empty.hidden = !empty.dataset.error && body.children.length > 0;
+    }
+
+    const live = document.getElementById("live");
+    const events = new EventSource("/api/events");
+    events.onopen = () => { live.textContent = "Live"; };
+    events.onerror = () => { live.textContent = "Reconnecting..."; };
+    for (const name of Object.keys(views)) {
+      events.addEventListener(name, (e) => apply(name, JSON.parse(e.data)));
+    }
+  </script>
 </body>
 </html>
 """
 
 
-@app.get("/api/vms", response_class=HTMLResponse)
-async def api_vms() -> str:
-    proc = _run_clonebox(["list", "--json"])
-    if proc.returncode != 0:
-        return f"<pre>clonebox list failed:\n{proc.stderr}</pre>"
+# ── data layer ───────────────────────────────────────────────────────────────
+#
+# Views are rendered from the sampler's in-memory snapshot, once per sampler
+# publication, and served with an ETag so that polling clients mostly get
+# 304 Not Modified.
 
-    try:
-        items: List[dict[str, Any]] = json.loads(proc.stdout or "[]")
-    except json.JSONDecodeError:
-        return f"<pre>Invalid JSON from clonebox list:\n{proc.stdout}</pre>"
+_views: Dict[str, Tuple[int, str, int, bytes]] = {}  # name -> (version, etag, status, body)
 
-    if not items:
-        return '<h2 class="text-xl font-semibold text-cyan-400 mb-4">🖥️ VMs</h2><p class="text-gray-500 italic">No VMs found.</p>'
 
-    rows = [
-        [str(i.get("name", "")), str(i.get("state", "")), str(i.get("uuid", ""))] for i in items
+def _respond(request: Request, name: str, media_type: str,
+             build: Callable[[Snapshot], Tuple[int, str]]) -> Response:
+    sampler = get_sampler()
+    entry = _views.get(name)
+    if entry is None or entry[0] != sampler.version:
+        snapshot = sampler.snapshot()
+        status, text = build(snapshot)
+        body = text.encode()
+        etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        entry = _views[name] = (snapshot.version, etag, status, body)
+    _version, etag, status, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if status == 200 and etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status, media_type=media_type, headers=headers)
+
+
+def _source_problem(snapshot: Snapshot, source: str) -> Optional[str]:
+    """Why *source* has no data to show yet, if it has none."""
+    status = snapshot.sources.get(source)
+    if status is None:
+        return "not sampled yet"
+    if status.last_success is None:
+        return status.error or "not sampled yet"
+    return None
+
+
+def vm_rows(snapshot: Snapshot) -> List[Dict[str, Any]]:
+    session = "user" if get_sampler().user_session else "system"
+    return [
+        {
+            "name": sample.name,
+            "state": sample.state,
+            "uuid": sample.uuid,
+            "memory": sample.memory_max_kb // 1024,
+            "vcpus": sample.vcpus,
+            "session": session,
+        }
+        for sample in sorted(snapshot.vms.values(), key=lambda s: s.name)
     ]
-    return _render_table("VMs", ["Name", "State", "UUID"], rows)
 
 
-@app.get("/api/containers", response_class=HTMLResponse)
-async def api_containers() -> str:
-    proc = _run_clonebox(["container", "ps", "--json", "-a"])
-    if proc.returncode != 0:
-        return f"<pre>clonebox container ps failed:\n{proc.stderr}</pre>"
+def container_rows(snapshot: Snapshot) -> List[Dict[str, Any]]:
+    return sorted(snapshot.container_list, key=lambda c: str(c.get("name", "")))
 
-    try:
-        items: List[dict[str, Any]] = json.loads(proc.stdout or "[]")
-    except json.JSONDecodeError:
-        return f"<pre>Invalid JSON from clonebox container ps:\n{proc.stdout}</pre>"
 
+def _vms_html(snapshot: Snapshot) -> Tuple[int, str]:
+    problem = _source_problem(snapshot, "vms")
+    if problem:
+        return 200, f"<pre>VM list unavailable:\n{html.escape(problem)}</pre>"
+    items = vm_rows(snapshot)
     if not items:
-        return '<h2 class="text-xl font-semibold text-cyan-400 mb-4">🐳 Containers</h2><p class="text-gray-500 italic">No containers found.</p>'
+        return 200, '<h2 class="text-xl font-semibold text-cyan-400 mb-4">🖥️ VMs</h2><p class="text-gray-500 italic">No VMs found.</p>'
+    rows = [[i["name"], i["state"], i["uuid"]] for i in items]
+    return 200, _render_table("VMs", ["Name", "State", "UUID"], rows)
 
+
+def _containers_html(snapshot: Snapshot) -> Tuple[int, str]:
+    problem = _source_problem(snapshot, "containers")
+    if problem:
+        return 200, f"<pre>Container list unavailable:\n{html.escape(problem)}</pre>"
+    items = container_rows(snapshot)
+    if not items:
+        return 200, '<h2 class="text-xl font-semibold text-cyan-400 mb-4">🐳 Containers</h2><p class="text-gray-500 italic">No containers found.</p>'
     rows = [
-        [
-            str(i.get("name", "")),
-            str(i.get("image", "")),
-            str(i.get("status", "")),
-            str(i.get("ports", "")),
-        ]
+        [str(i.get("name", "")), str(i.get("image", "")), str(i.get("status", "")), str(i.get("ports", ""))]
         for i in items
     ]
-    return _render_table("Containers", ["Name", "Image", "Status", "Ports"], rows)
+    return 200, _render_table("Containers", ["Name", "Image", "Status", "Ports"], rows)
 
 
-@app.get("/api/vms.json")
-async def api_vms_json() -> JSONResponse:
-    proc = _run_clonebox(["list", "--json"])
-    if proc.returncode != 0:
-        return JSONResponse({"error": proc.stderr, "stdout": proc.stdout}, status_code=500)
+def _json_view(source: str, rows: Callable[[Snapshot], List[Dict[str, Any]]]) -> Callable[[Snapshot], Tuple[int, str]]:
+    def build(snapshot: Snapshot) -> Tuple[int, str]:
+        problem = _source_problem(snapshot, source)
+        if problem:
+            return 503, json.dumps({"error": problem})
+        return 200, json.dumps(rows(snapshot), default=str)
 
-    try:
-        return JSONResponse(json.loads(proc.stdout or "[]"))
-    except json.JSONDecodeError:
-        return JSONResponse({"error": "invalid_json", "stdout": proc.stdout}, status_code=500)
+    return build
+
+
+@app.get("/api/vms", response_class=HTMLResponse)
+async def api_vms(request: Request) -> Response:
+    return _respond(request, "vms.html", "text/html", _vms_html)
+
+
+@app.get("/api/containers", response_class=HTMLResponse)
+async def api_containers(request: Request) -> Response:
+    return _respond(request, "containers.html", "text/html", _containers_html)
+
+
+@app.get("/api/vms.json")
+async def api_vms_json(request: Request) -> Response:
+    return _respond(request, "vms.json", "application/json", _json_view("vms", vm_rows))
 
 
 @app.get("/api/containers.json")
-async def api_containers_json() -> JSONResponse:
-    proc = _run_clonebox(["container", "ps", "--json", "-a"])
-    if proc.returncode != 0:
-        return JSONResponse({"error": proc.stderr, "stdout": proc.stdout}, status_code=500)
+async def api_containers_json(request: Request) -> Response:
+    return _respond(request, "containers.json", "application/json", _json_view("containers", container_rows))
+
+
+# ── live updates ─────────────────────────────────────────────────────────────
+#
+# /api/events is a Server-Sent Events stream.  It wakes up when the sampler
+# publishes (a libvirt lifecycle event makes the VM source publish at once)
+# and sends each view's rows that changed since its last message:
+# ``{"upsert": [rows], "remove": [ids]}``, plus ``"error"`` when a source
+# starts or stops failing.  The first message of a view has ``"reset": true``
+# and every row.  VM sparklines travel outside the rows, in ``"spark":
+# {vm: [points]}``: whole in the first message, then only the points added
+# since.  An idle stream only carries a comment line every KEEPALIVE seconds.
+
+KEEPALIVE = 25.0
+
+_live_rows: Dict[str, Tuple[int, Optional[str], Dict[str, Dict[str, Any]]]] = {}
+
+
+def live_vm_rows(snapshot: Snapshot) -> Dict[str, Dict[str, Any]]:
+    return {
+        sample.name: {
+            "id": sample.name,
+            "name": sample.name,
+            "state": sample.state,
+            "uuid": sample.uuid,
+            "cpu": round(sample.cpu_percent, 1) if sample.state == "running" else None,
+            "memory": sample.memory_max_kb // 1024,
+            "memory_used": sample.memory_used_kb // 1024,
+        }
+        for sample in snapshot.vms.values()
+    }
+
+
+def live_container_rows(snapshot: Snapshot) -> Dict[str, Dict[str, Any]]:
+    cpu = {stats.name: stats.cpu_percent for stats in snapshot.containers}
+    rows = {}
+    for item in snapshot.container_list:
+        name = str(item.get("name", ""))
+        rows[name] = {
+            "id": name,
+            "name": name,
+            "image": str(item.get("image", "")),
+            "status": str(item.get("status", "")),
+            "ports": str(item.get("ports", "")),
+            "cpu": cpu.get(name),
+        }
+    return rows
+
+
+_LIVE_VIEWS = {"vms": live_vm_rows, "containers": live_container_rows}
+
+
+def _view_state(snapshot: Snapshot, view: str) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """Problem and rows of *view*, built once per sampler publication."""
+    cached = _live_rows.get(view)
+    if cached is None or cached[0] != snapshot.version:
+        problem = _source_problem(snapshot, view)
+        cached = _live_rows[view] = (snapshot.version, problem, {} if problem else _LIVE_VIEWS[view](snapshot))
+    return cached[1], cached[2]
+
+
+def row_diff(
+    previous: Optional[Dict[str, Dict[str, Any]]], rows: Dict[str, Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """Message turning *previous* rows into *rows*; None when nothing changed."""
+    if previous is None:
+        return {"reset": True, "upsert": [rows[k] for k in sorted(rows)], "remove": []}
+    upsert = [rows[k] for k in sorted(rows) if previous.get(k) != rows[k]]
+    remove = sorted(k for k in previous if k not in rows)
+    if not upsert and not remove:
+        return None
+    return {"upsert": upsert, "remove": remove}
+
+
+def spark_points(snapshot: Snapshot, sent: Dict[str, int]) -> Dict[str, List[float]]:
+    """Sparkline points of running VMs not sent yet; *sent* is updated in place.
 
+    With an empty *sent* (a new stream) this is every VM's whole sparkline.
+    """
+    points = {}
+    for name, sample in snapshot.vms.items():
+        if sample.state != "running":
+            continue  # caught up, from where it left off, once it runs again
+        count = snapshot.sparkline_counts.get(name, 0)
+        new = count - sent.get(name, 0)
+        if new > 0:
+            points[name] = snapshot.sparklines.get(name, [])[-new:]
+        sent[name] = count
+    for name in [name for name in sent if name not in snapshot.vms]:
+        del sent[name]
+    return points
+
+
+def _sse(event: str, data: Dict[str, Any], event_id: int) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _event_stream(request: Request, sampler: Sampler) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def notify() -> None:
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:  # loop closed
+            pass
+
+    sampler.add_listener(notify)
+    sent: Dict[str, Tuple[Optional[str], Dict[str, Dict[str, Any]]]] = {}
+    spark_sent: Dict[str, int] = {}
+    version = None
     try:
-        return JSONResponse(json.loads(proc.stdout or "[]"))
-    except json.JSONDecodeError:
-        return JSONResponse({"error": "invalid_json", "stdout": proc.stdout}, status_code=500)
+        while not await request.is_disconnected():
+            changed.clear()
+            if sampler.version != version:
+                snapshot = sampler.snapshot()
+                version = snapshot.version
+                for view in _LIVE_VIEWS:
+                    problem, rows = _view_state(snapshot, view)
+                    last = sent.get(view)
+                    message = row_diff(last[1] if last else None, rows)
+                    if last is None or last[0] != problem:
+                        message = dict(message or {"upsert": [], "remove": []}, error=problem)
+                    if view == "vms" and not problem:
+                        # Whole sparklines once, then only the points appended since
+                        points = spark_points(snapshot, spark_sent)
+                        if points:
+                            message = dict(message or {"upsert": [], "remove": []}, spark=points)
+                    if message is not None:
+                        sent[view] = (problem, rows)
+                        yield _sse(view, message, version)
+            try:
+                await asyncio.wait_for(changed.wait(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        sampler.remove_listener(notify)
 
 
-def run_dashboard(port: int = 8080) -> None:
+@app.get("/api/events")
+async def api_events(request: Request) -> StreamingResponse:
+    """Server-Sent Events with row diffs of the VM and container views."""
+    return StreamingResponse(
+        _event_stream(request, get_sampler()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _metrics_text(snapshot: Snapshot) -> Tuple[int, str]:
+    return 200, render(snapshot_families(snapshot))
+
+
+@app.get("/metrics")
+async def metrics(request: Request) -> Response:
+    """OpenMetrics exposition of the latest sampler snapshot."""
+    return _respond(request, "metrics", CONTENT_TYPE, _metrics_text)
+
+
+def create_dashboard(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    debug: bool = False,
+    user_session: bool = False,
+    compose_files: Sequence[Path] = (),
+) -> None:
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=port)
+    configure_sampler(user_session=user_session, compose_files=compose_files)
+    uvicorn.run(app, host=host, port=port, log_level="debug" if debug else "info")
+
+
+def run_dashboard(port: int = 8080) -> None:
+    create_dashboard(port=port)
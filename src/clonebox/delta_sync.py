@@ -0,0 +1,522 @@
+"""
+Incremental host → guest sync for ``copy_paths``.
+
+A per-VM manifest (``<vm_dir>/sync-manifest.json``) records the size, mtime
+and SHA-256 of every file shipped by the last successful sync.  The next
+run walks the host trees, hashes only files whose size or mtime moved, and
+sends just the changed files, new directories and a list of deletions, in
+one tar stream over one SSH connection.  Unchanged trees cost a ``stat``
+per file and no transfer at all.
+
+Members are named by their absolute guest path and carry the guest owner,
+so however many ``copy_paths`` entries there are, the guest unpacks and
+fixes ownership with a single ``tar -C /``.  Large streams are compressed
+with the codec :func:`clonebox.compression.choose_codec` measures fastest.
+
+The guest keeps a sync token (``/var/lib/clonebox/sync-id``) that is
+rotated on every sync and mirrored in the manifest.  If they disagree (VM
+recreated, snapshot restored, guest files wiped) the manifest no longer
+describes the guest, and the run falls back to shipping everything.
+"""
+
+import hashlib
+import io
+import json
+import os
+import secrets
+import shlex
+import stat
+import subprocess
+import tarfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import AbstractSet, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from clonebox.compression import CODECS, MIN_NEGOTIATE_BYTES, choose_codec, host_codecs
+from clonebox.ssh import build_ssh_command, ssh_exec
+
+log = structlog.get_logger(__name__)
+
+MANIFEST_FILE = "sync-manifest.json"
+GUEST_TOKEN_PATH = "/var/lib/clonebox/sync-id"
+
+# Same names ``tar --exclude`` skipped for full copies: runtime locks of
+# running browsers/IDEs that must not be carried into the guest.
+EXCLUDE_NAMES = frozenset({
+    "SingletonLock",
+    "SingletonSocket",
+    "SingletonCookie",
+    "parent.lock",
+    ".parentlock",
+    "lock",
+})
+
+_DIR = "dir"
+_CHUNK = 1024 * 1024
+
+# (size, mtime_ns, digest) – digest is "dir", "link:<target>" or a SHA-256.
+FileState = List
+
+
+@dataclass
+class PathDelta:
+    """Changes of one ``host_path -> guest_path`` entry since the last sync."""
+
+    host_path: Path
+    guest_path: str
+    state: Dict[str, FileState]
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    source: Optional[Path] = None  # where files are read from, if not host_path
+
+    def guest_member(self, rel: str) -> str:
+        """Absolute guest path of manifest entry *rel* ("" is the root)."""
+        return self.guest_path if not rel else str(PurePosixPath(self.guest_path) / rel)
+
+    def host_file(self, rel: str) -> Path:
+        root = self.source or self.host_path
+        return root if not rel else root / rel
+
+
+@dataclass
+class SyncResult:
+    ok: bool
+    files: int = 0
+    bytes: int = 0
+    deleted: int = 0
+    full: bool = False
+    codec: str = "none"
+
+
+class SyncManifest:
+    """Host-side record of what the guest received, keyed by guest path."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        self.token: Optional[str] = data.get("token")
+        self.paths: Dict[str, dict] = data.get("paths", {})
+
+    def previous(self, guest_path: str, host_path: Path) -> Dict[str, FileState]:
+        entry = self.paths.get(guest_path) or {}
+        return entry.get("files", {}) if entry.get("host_path") == str(host_path) else {}
+
+    def known(self, guest_path: str) -> Dict[str, FileState]:
+        return (self.paths.get(guest_path) or {}).get("files", {})
+
+    def reset(self) -> None:
+        self.token = None
+        self.paths = {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"token": self.token, "paths": self.paths}))
+        os.replace(tmp, self.path)
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_state(path: Path, st: os.stat_result, previous: Optional[FileState]) -> Optional[FileState]:
+    """Manifest state of *path*; hashes only when size or mtime moved.
+
+    New files get an empty digest: they are shipped anyway and hashed while
+    streaming (see :class:`_HashingReader`).
+    """
+    if stat.S_ISDIR(st.st_mode):
+        return [0, 0, _DIR]
+    if stat.S_ISLNK(st.st_mode):
+        return [0, 0, "link:" + os.readlink(path)]
+    if not stat.S_ISREG(st.st_mode):
+        return None  # sockets, fifos, devices
+    if previous and previous[0] == st.st_size and previous[1] == st.st_mtime_ns and previous[2]:
+        return list(previous)
+    if not previous or not previous[2] or previous[2] == _DIR or previous[2].startswith("link:"):
+        return [st.st_size, st.st_mtime_ns, ""]
+    try:
+        return [st.st_size, st.st_mtime_ns, _hash_file(path)]
+    except OSError:
+        return [st.st_size, st.st_mtime_ns, ""]
+
+
+def scan_path(host_path: Path, guest_path: str, previous: Dict[str, FileState],
+              known: Dict[str, FileState], exclude_dirs: AbstractSet[str] = frozenset(),
+              read_from: Optional[Path] = None) -> PathDelta:
+    """Compare *host_path* against the manifest entries of the last sync.
+
+    *previous* is used to skip re-hashing (same host source); *known* is what
+    the guest holds and drives deletions.  Directories named in
+    *exclude_dirs* are skipped along with :data:`EXCLUDE_NAMES`.  Files are
+    read from *read_from* when given (a point-in-time copy of *host_path*).
+    """
+    host_path = Path(host_path)
+    # A symlinked root is shipped as its target's contents; links below it stay links
+    source = (Path(read_from) if read_from is not None else host_path).resolve()
+    state: Dict[str, FileState] = {}
+
+    root_st = source.stat()
+    root = _entry_state(source, root_st, previous.get(""))
+    if root is not None:
+        state[""] = root
+    if stat.S_ISDIR(root_st.st_mode):
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames[:] = [
+                d for d in dirnames if d not in EXCLUDE_NAMES and d not in exclude_dirs
+            ]
+            base = Path(dirpath)
+            for name in dirnames + [f for f in filenames if f not in EXCLUDE_NAMES]:
+                path = base / name
+                rel = path.relative_to(source).as_posix()
+                try:
+                    entry = _entry_state(path, path.lstat(), previous.get(rel))
+                except OSError:
+                    continue  # vanished while walking
+                if entry is not None:
+                    state[rel] = entry
+
+    delta = PathDelta(host_path=host_path, guest_path=guest_path, state=state, source=source)
+    for rel, entry in state.items():
+        old = known.get(rel)
+        # Directories are re-sent only when new; their mtime churns constantly.
+        # An empty digest means "not hashed yet": always ship.
+        if old is None or not entry[2] or entry[2] != old[2]:
+            delta.changed.append(rel)
+
+    removed = {rel for rel in known if rel not in state}
+    for rel in sorted(removed):
+        # Deleting a directory covers everything below it
+        if not any(str(parent) in removed for parent in PurePosixPath(rel).parents):
+            delta.deleted.append(rel)
+    delta.changed.sort()
+    return delta
+
+
+class _HashingReader:
+    """Reads exactly *size* bytes of *f*, hashing them on the way.
+
+    A file that shrinks while being streamed is padded with zeros so the tar
+    stream stays valid; its digest is then left empty, which makes the next
+    sync ship it again.
+    """
+
+    def __init__(self, f: BinaryIO, size: int):
+        self._f = f
+        self._left = size
+        self._digest = hashlib.sha256()
+        self.truncated = False
+
+    def read(self, n: int = -1) -> bytes:
+        if self._left <= 0:
+            return b""
+        n = self._left if n is None or n < 0 else min(n, self._left)
+        data = b"" if self.truncated else self._f.read(n)
+        if len(data) < n:
+            self.truncated = True
+            data += b"\0" * (n - len(data))
+        self._left -= len(data)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return "" if self.truncated else self._digest.hexdigest()
+
+
+def _owner_for(guest_path: str, username: str) -> Tuple[str, int]:
+    if guest_path.startswith(f"/home/{username}/"):
+        return username, 1000
+    return "root", 0
+
+
+def _home_ancestors(guest_path: str, username: str) -> List[str]:
+    """Directories between the user's home and *guest_path* (exclusive).
+
+    tar creates missing parents as root; the guest user must own them (snap
+    in particular refuses ``/home/<user>/snap/<app>`` owned by root).
+    """
+    home = PurePosixPath(f"/home/{username}")
+    path = PurePosixPath(guest_path)
+    if home not in path.parents:
+        return []
+    return [str(p) for p in reversed(path.parents) if home in p.parents]
+
+
+def write_delta_tar(deltas: List[PathDelta], out: BinaryIO, username: str,
+                    deletions_member: Optional[str]) -> Tuple[int, int]:
+    """Write changed entries (and the deletion list) as a tar stream.
+
+    Members are named by their absolute guest path (minus the leading "/")
+    so a single ``tar -C /`` extracts every destination.  Returns
+    ``(files, bytes)`` written and fills in digests of streamed files.
+    """
+    files = 0
+    total = 0
+    with tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        if deletions_member:
+            paths = [d.guest_member(rel) for d in deltas for rel in d.deleted]
+            data = b"\0".join(p.encode() for p in paths)
+            info = tarfile.TarInfo(deletions_member.lstrip("/"))
+            info.size = len(data)
+            info.mode = 0o600
+            tar.addfile(info, io.BytesIO(data))
+
+        for delta in deltas:
+            uname, uid = _owner_for(delta.guest_path, username)
+            for rel in delta.changed:
+                src = delta.host_file(rel)
+                try:
+                    info = tar.gettarinfo(str(src), delta.guest_member(rel).lstrip("/"))
+                except OSError:
+                    delta.state.pop(rel, None)  # vanished since the scan
+                    continue
+                info.uname = info.gname = uname
+                info.uid = info.gid = uid
+                if not info.isreg():
+                    tar.addfile(info)
+                    continue
+                try:
+                    f = open(src, "rb")
+                except OSError:
+                    delta.state.pop(rel, None)
+                    continue
+                with f:
+                    reader = _HashingReader(f, info.size)
+                    tar.addfile(info, reader)
+                entry = delta.state.get(rel)
+                if entry is not None:
+                    entry[2] = reader.hexdigest()
+                files += 1
+                total += info.size
+    return files, total
+
+
+def remote_apply_command(deltas: List[PathDelta], username: str,
+                         deletions_member: Optional[str], token: Optional[str],
+                         codec: str = "none") -> str:
+    """Guest shell command consuming the stream from :func:`write_delta_tar`."""
+    decompress = CODECS[codec].decompress
+    if decompress:
+        steps = [f"set -o pipefail; {' '.join(decompress)} | sudo tar -C / -xpf -"]
+    else:
+        steps = ["sudo tar -C / -xpf -"]
+    if deletions_member:
+        q = shlex.quote(deletions_member)
+        steps.append(f"sudo xargs -0 -r -a {q} rm -rf -- && sudo rm -f {q}")
+
+    owned = sorted({
+        p for d in deltas if d.changed for p in _home_ancestors(d.guest_path, username)
+    })
+    if owned:
+        quoted = " ".join(shlex.quote(p) for p in owned)
+        steps.append(f"(sudo chown {username}:{username} {quoted} || true)")
+
+    if token:
+        token_dir = str(PurePosixPath(GUEST_TOKEN_PATH).parent)
+        steps.append(
+            f"sudo mkdir -p {token_dir} && echo {token} | sudo tee {GUEST_TOKEN_PATH} >/dev/null"
+        )
+    return " && ".join(steps)
+
+
+def guest_probe_command() -> str:
+    """One round trip for the guest's sync token and installed decompressors."""
+    codecs = " ".join(name for name, codec in CODECS.items() if codec.decompress)
+    return (
+        f"echo token=$(cat {GUEST_TOKEN_PATH} 2>/dev/null); "
+        f"for c in {codecs}; do command -v $c >/dev/null 2>&1 && echo codec=$c; done; true"
+    )
+
+
+def parse_guest_probe(output: Optional[str]) -> Tuple[Optional[str], List[str]]:
+    """Parse :func:`guest_probe_command` output into ``(token, codecs)``."""
+    token, codecs = None, ["none"]
+    for line in (output or "").splitlines():
+        key, _, value = line.strip().partition("=")
+        if key == "token" and value:
+            token = value
+        elif key == "codec" and value in CODECS:
+            codecs.append(value)
+    return token, codecs
+
+
+_link_rates: Dict[Tuple[str, ...], float] = {}
+
+
+def measure_link(ssh_cmd: List[str], nbytes: int = 4 * 1024 * 1024) -> Optional[float]:
+    """Raw bytes/second through *ssh_cmd*, measured once per endpoint."""
+    key = tuple(ssh_cmd)
+    if key not in _link_rates:
+        payload = os.urandom(nbytes)  # incompressible, like the worst case
+        started = time.monotonic()
+        try:
+            result = subprocess.run(ssh_cmd + ["cat >/dev/null"], input=payload,
+                                    capture_output=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        _link_rates[key] = nbytes / max(time.monotonic() - started, 1e-6)
+    return _link_rates[key]
+
+
+def _payload_sample(deltas: List[PathDelta], limit: int = 4 * 1024 * 1024) -> bytes:
+    """Leading bytes of the largest changed files, as a compressibility sample."""
+    files = sorted(
+        ((d.state[rel][0], d.host_file(rel)) for d in deltas for rel in d.changed
+         if d.state.get(rel) and d.state[rel][2] != _DIR and not d.state[rel][2].startswith("link:")),
+        reverse=True,
+    )
+    chunks: List[bytes] = []
+    left = limit
+    for _, path in files:
+        if left <= 0:
+            break
+        try:
+            with open(path, "rb") as f:
+                chunk = f.read(min(left, 1024 * 1024))
+        except OSError:
+            continue
+        chunks.append(chunk)
+        left -= len(chunk)
+    return b"".join(chunks)
+
+
+def _payload_size(deltas: List[PathDelta]) -> int:
+    return sum(
+        d.state[rel][0] for d in deltas for rel in d.changed
+        if d.state.get(rel) and d.state[rel][2] != _DIR
+    )
+
+
+def sync_paths(
+    copy_paths: Dict[str, str],
+    ssh_cmd: List[str],
+    manifest: Optional[SyncManifest],
+    username: str,
+    guest_token: Optional[str],
+    guest_codecs: Sequence[str] = ("none",),
+    exclude_dirs: AbstractSet[str] = frozenset(),
+    read_from: Optional[Dict[str, Path]] = None,
+) -> SyncResult:
+    """Ship the delta of *copy_paths* to the guest reached by *ssh_cmd*.
+
+    *ssh_cmd* is a complete ``ssh ... user@host`` base command; *guest_token*
+    and *guest_codecs* come from :func:`parse_guest_probe`.  Without a
+    manifest everything is shipped and nothing is recorded.  The manifest is
+    saved only after the guest applied the stream.  *read_from* maps a guest
+    path to a point-in-time copy to read instead of its host path.
+    """
+    if manifest is None:
+        full = True
+    else:
+        full = not guest_token or guest_token != manifest.token
+        if full:
+            log.info("delta_sync_full",
+                     reason="no manifest" if not manifest.token else "guest token mismatch")
+            manifest.reset()
+
+    deltas: List[PathDelta] = []
+    ok = True
+    for host_path, guest_path in copy_paths.items():
+        src = Path(host_path).expanduser()
+        previous = manifest.previous(guest_path, src) if manifest else {}
+        known = manifest.known(guest_path) if manifest else {}
+        try:
+            deltas.append(scan_path(src, guest_path, previous, known, exclude_dirs,
+                                    (read_from or {}).get(guest_path)))
+        except OSError as exc:
+            log.warning("delta_sync_scan_failed", path=str(src), error=str(exc))
+            ok = False
+
+    deleted = sum(len(d.deleted) for d in deltas)
+    if not any(d.changed for d in deltas) and not deleted:
+        log.info("delta_sync_up_to_date", paths=len(deltas))
+        return SyncResult(ok=ok, full=full)
+
+    codec = "none"
+    if _payload_size(deltas) >= MIN_NEGOTIATE_BYTES or os.getenv("CLONEBOX_TRANSFER_COMPRESSION"):
+        codec = choose_codec(guest_codecs, _payload_sample(deltas), measure_link(ssh_cmd))
+        if codec not in guest_codecs or codec not in host_codecs():
+            codec = "none"
+
+    token = secrets.token_hex(8) if manifest is not None else None
+    deletions_member = f"/var/tmp/clonebox-sync-{secrets.token_hex(8)}.del" if deleted else None
+    proc = subprocess.Popen(
+        ssh_cmd + [remote_apply_command(deltas, username, deletions_member, token, codec)],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    compressor = None
+    sink = proc.stdin
+    if CODECS[codec].compress:
+        compressor = subprocess.Popen(CODECS[codec].compress, stdin=subprocess.PIPE,
+                                      stdout=proc.stdin)
+        proc.stdin.close()  # the compressor owns the ssh end now
+        sink = compressor.stdin
+
+    # Drain stderr concurrently so a chatty guest cannot stall the stream
+    stderr: List[bytes] = []
+    drain = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    try:
+        files, size = write_delta_tar(deltas, sink, username, deletions_member)
+        sink.close()
+    except (BrokenPipeError, OSError) as exc:
+        log.warning("delta_sync_stream_failed", error=str(exc))
+        files, size = 0, 0
+        ok = False
+    if compressor is not None and compressor.wait() != 0:
+        ok = False
+    rc = proc.wait()
+    drain.join(timeout=5)
+    if rc != 0:
+        log.warning("delta_sync_apply_failed", rc=rc,
+                    stderr=b"".join(stderr).decode(errors="replace").strip()[:400])
+        return SyncResult(ok=False, full=full)
+
+    if manifest is not None and ok:
+        for delta in deltas:
+            manifest.paths[delta.guest_path] = {"host_path": str(delta.host_path), "files": delta.state}
+        manifest.token = token
+        manifest.save()
+    log.info("delta_sync_done", files=files, bytes=size, deleted=deleted, full=full, codec=codec)
+    return SyncResult(ok=ok, files=files, bytes=size, deleted=deleted, full=full, codec=codec)
+
+
+def sync_to_guest(
+    copy_paths: Dict[str, str],
+    ssh_port: int,
+    ssh_key: Optional[Path],
+    username: str,
+    manifest_path: Optional[Path] = None,
+    exclude_dirs: AbstractSet[str] = frozenset(),
+    read_from: Optional[Dict[str, Path]] = None,
+) -> SyncResult:
+    """:func:`sync_paths` to the VM forwarded at ``127.0.0.1:<ssh_port>``."""
+    guest_token, guest_codecs = parse_guest_probe(ssh_exec(
+        port=ssh_port, key=ssh_key, command=guest_probe_command(), username=username,
+    ))
+    ssh_cmd = build_ssh_command(
+        port=ssh_port, key=ssh_key, username=username, connect_timeout=10, multiplex=True,
+    )
+    return sync_paths(
+        copy_paths,
+        ssh_cmd,
+        SyncManifest(manifest_path) if manifest_path is not None else None,
+        username,
+        guest_token,
+        guest_codecs,
+        exclude_dirs=exclude_dirs,
+        read_from=read_from,
+    )
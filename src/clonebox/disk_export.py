@@ -0,0 +1,209 @@
+"""
+qcow2-aware disk handling for VM exports.
+
+Adding a qcow2 file to a tarball reads every byte through Python and, for
+a VM created on a golden image or cloud base, ships a thin overlay whose
+backing file is not in the archive at all.  The export modes here let
+``qemu-img`` do the work instead:
+
+``flatten``
+    ``qemu-img convert -c`` the whole backing chain into one standalone,
+    compressed qcow2.  Unallocated clusters are skipped and compression
+    runs on ``-m`` parallel coroutines (qemu's thread pool), so the cost
+    scales with the data actually written in the VM.
+``overlay``
+    Convert only the clusters that differ from the backing image
+    (``-B``) and record the base by sha256.  The importer looks for a
+    local file with that digest and rebases the overlay onto it.  Disks
+    without a backing file are flattened.
+``auto``
+    The default: ``overlay`` for disks with a backing file, a plain file
+    copy otherwise.  ``file`` refuses backed disks, since the copy would
+    be unusable without its base.
+
+Base image digests are cached by path, size and mtime in
+``<images>/base-digests.json`` so a 20 GB golden image is hashed once.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import structlog
+
+from clonebox import paths as _paths
+
+log = structlog.get_logger(__name__)
+
+DISK_MODES = ("auto", "file", "flatten", "overlay")
+BASE_REF_SUFFIX = ".base.json"
+DIGEST_CACHE_FILE = "base-digests.json"
+
+_HASH_BLOCK = 4 * 1024 * 1024
+_SPARSE_BLOCK = 64 * 1024
+
+
+def convert_threads() -> int:
+    # qemu-img caps -m at 16 coroutines
+    return max(1, min(16, os.cpu_count() or 1))
+
+
+def image_info(path: Path) -> Dict[str, Any]:
+    """``qemu-img info`` of *path* (without following the chain)."""
+    result = subprocess.run(
+        ["qemu-img", "info", "-U", "--output=json", str(path)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def backing_file(path: Path) -> Optional[Path]:
+    """Resolved backing file of *path*, if it has one."""
+    info = image_info(path)
+    backing = info.get("full-backing-filename") or info.get("backing-filename")
+    if not backing:
+        return None
+    backing_path = Path(backing)
+    if not backing_path.is_absolute():
+        backing_path = path.parent / backing_path
+    return backing_path
+
+
+@contextlib.contextmanager
+def _digest_cache(user_session: bool) -> Iterator[Dict[str, Any]]:
+    path = _paths.images_dir(user_session) / DIGEST_CACHE_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            cache = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            cache = {}
+        yield cache
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache, indent=1, sort_keys=True))
+        os.replace(tmp, path)
+
+
+def file_digest(path: Path, user_session: bool = True) -> str:
+    """sha256 of *path*, cached while its size and mtime are unchanged."""
+    real = os.path.realpath(path)
+    st = os.stat(real)
+    stamp = [st.st_size, st.st_mtime_ns]
+    with _digest_cache(user_session) as cache:
+        entry = cache.get(real)
+        if entry and entry["stamp"] == stamp:
+            return entry["sha256"]
+        h = hashlib.sha256()
+        with open(real, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                h.update(block)
+        cache[real] = {"stamp": stamp, "sha256": h.hexdigest()}
+        log.info("base_image_hashed", path=real, size=st.st_size)
+        return cache[real]["sha256"]
+
+
+def convert_for_export(
+    src: Path,
+    dest: Path,
+    base: Optional[Path] = None,
+    threads: Optional[int] = None,
+    compress: bool = True,
+) -> None:
+    """Write a compacted, compressed qcow2 of *src* to *dest*.
+
+    Without *base* the whole chain is flattened; with it, only clusters
+    that differ from *base* are written and *dest* is backed by it.
+    *compress* off keeps clusters stable for chunk deduplication.
+    """
+    cmd = ["qemu-img", "convert", "-U", "-O", "qcow2"] + (["-c"] if compress else [])
+    cmd += ["-W", "-m", str(threads or convert_threads())]
+    if base is not None:
+        cmd += ["-B", str(base), "-F", image_info(base).get("format", "qcow2")]
+    cmd += [str(src), str(dest)]
+    subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+
+def base_reference(base: Path, user_session: bool = True) -> Dict[str, Any]:
+    return {
+        "name": base.name,
+        "size": base.stat().st_size,
+        "sha256": file_digest(base, user_session),
+        "format": image_info(base).get("format", "qcow2"),
+    }
+
+
+def _candidates(search_dirs: Iterable[Path]) -> Iterator[Path]:
+    # Not recursive: chunk objects, pool saves and snapshot overlays live in subdirectories
+    for directory in search_dirs:
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.iterdir()):
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+
+def find_base(
+    ref: Dict[str, Any],
+    search_dirs: Iterable[Path],
+    user_session: bool = True,
+) -> Optional[Path]:
+    """Find a local file matching the base reference *ref*.
+
+    Only the files directly in *search_dirs* are considered, and only those
+    of the right size are hashed; a file with the recorded name is tried
+    first.
+    """
+    matches: List[Path] = []
+    for path in _candidates(search_dirs):
+        try:
+            if path.stat().st_size != ref["size"]:
+                continue
+        except OSError:
+            continue
+        matches.append(path)
+    matches.sort(key=lambda p: p.name != ref["name"])
+    for path in matches:
+        if file_digest(path, user_session) == ref["sha256"]:
+            return path
+    return None
+
+
+def rebase(disk: Path, base: Path, fmt: str = "qcow2") -> None:
+    """Point *disk* at *base* without touching its data."""
+    subprocess.run(
+        ["qemu-img", "rebase", "-u", "-b", str(base), "-F", fmt, str(disk)],
+        capture_output=True, text=True, check=True,
+    )
+
+
+def sparse_write(src: BinaryIO, dest: Path, size: Optional[int] = None) -> Path:
+    """Write the stream *src* to *dest*, leaving holes for zero blocks.
+
+    With *size*, the file gets its final length up front.
+    """
+    zero = bytes(_SPARSE_BLOCK)
+    with open(dest, "wb") as fout:
+        if size is not None:
+            fout.truncate(size)
+        for block in iter(lambda: src.read(_SPARSE_BLOCK), b""):
+            if block == zero[:len(block)]:
+                fout.seek(len(block), os.SEEK_CUR)
+            else:
+                fout.write(block)
+        fout.truncate()
+    return dest
+
+
+def sparse_copy(src: Path, dest: Path) -> Path:
+    """Copy *src* to *dest*, leaving holes where *src* has zero blocks."""
+    with open(src, "rb") as fin:
+        sparse_write(fin, dest)
+    shutil.copystat(src, dest)
+    return dest
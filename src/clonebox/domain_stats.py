@@ -0,0 +1,361 @@
+"""
+Bulk libvirt domain statistics for CloneBox monitors.
+
+One ``virConnectGetAllDomainStats`` call returns state, CPU time, balloon,
+vCPU, block and interface counters for every domain, so a sampling tick
+costs one libvirt round trip however many VMs there are.  Per-VM queries
+go through ``virDomainListGetStats`` on cached domain handles.
+
+Each domain's device list (disk targets, sources and device types,
+interfaces) is parsed from its XML once and cached.  It is dropped when
+libvirt reports the domain as defined, undefined or hot-plugged.  Without
+the libvirt event loop, cached entries expire after :data:`DEVICE_TTL`
+seconds instead.  Lifecycle events are also passed on to listeners (see
+:meth:`DomainStatsCollector.add_listener`).
+"""
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from clonebox.readiness import _ensure_event_loop
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+log = structlog.get_logger(__name__)
+
+# Seconds a cached device list is trusted when no libvirt events arrive
+DEVICE_TTL = 60.0
+
+STATE_NAMES = {
+    0: "nostate",
+    1: "running",
+    2: "blocked",
+    3: "paused",
+    4: "shutdown",
+    5: "shutoff",
+    6: "crashed",
+    7: "pmsuspended",
+}
+
+_BLOCK_FIELDS = {
+    "rd.bytes": "rd_bytes",
+    "wr.bytes": "wr_bytes",
+    "rd.reqs": "rd_reqs",
+    "wr.reqs": "wr_reqs",
+    "allocation": "allocation",
+    "capacity": "capacity",
+    "physical": "physical",
+}
+_NET_FIELDS = {
+    "rx.bytes": "rx_bytes",
+    "rx.pkts": "rx_pkts",
+    "tx.bytes": "tx_bytes",
+    "tx.pkts": "tx_pkts",
+}
+
+
+@dataclass
+class DomainDevices:
+    """Devices of a domain, as defined in its XML."""
+
+    # target dev -> (device type, source file)
+    disks: Dict[str, Tuple[str, Optional[str]]] = field(default_factory=dict)
+    # target dev (or MAC when libvirt assigned none) -> MAC address
+    interfaces: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_xml(cls, domain_xml: str) -> "DomainDevices":
+        devices = cls()
+        root = ET.fromstring(domain_xml)
+        for disk in root.findall("./devices/disk"):
+            target, source = disk.find("target"), disk.find("source")
+            if target is None:
+                continue
+            path = source.get("file") or source.get("dev") if source is not None else None
+            devices.disks[target.get("dev")] = (disk.get("device", "disk"), path)
+        for iface in root.findall("./devices/interface"):
+            target, mac = iface.find("target"), iface.find("mac")
+            address = mac.get("address") if mac is not None else None
+            name = target.get("dev") if target is not None else address
+            if name:
+                devices.interfaces[name] = address
+        return devices
+
+
+@dataclass
+class DomainSample:
+    """Counters of one domain from one bulk stats call."""
+
+    name: str
+    uuid: str
+    state: str
+    timestamp: float
+    vcpus: int = 0
+    cpu_time_ns: int = 0
+    cpu_percent: float = 0.0
+    # Balloon counters are KiB, as libvirt reports them
+    memory_max_kb: int = 0
+    memory_current_kb: int = 0
+    memory_unused_kb: Optional[int] = None
+    memory_rss_kb: int = 0
+    swap_in_kb: int = 0
+    # Per device: block counters by target dev, net counters by interface
+    blocks: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    nets: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    devices: Optional[DomainDevices] = None
+
+    @property
+    def memory_used_kb(self) -> int:
+        if self.memory_unused_kb is not None:
+            return max(0, self.memory_current_kb - self.memory_unused_kb)
+        return self.memory_current_kb
+
+    def _disks(self) -> List[Dict[str, int]]:
+        """Block counters of real disks (CD-ROMs and floppies are left out)."""
+        if self.devices is None:
+            return list(self.blocks.values())
+        return [
+            counters for dev, counters in self.blocks.items()
+            if self.devices.disks.get(dev, ("disk", None))[0] == "disk"
+        ]
+
+    def block_total(self, key: str) -> int:
+        return sum(counters.get(key, 0) for counters in self._disks())
+
+    def net_total(self, key: str) -> int:
+        return sum(counters.get(key, 0) for counters in self.nets.values())
+
+
+def _stats_flags() -> int:
+    return (
+        libvirt.VIR_DOMAIN_STATS_STATE
+        | libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+        | libvirt.VIR_DOMAIN_STATS_BALLOON
+        | libvirt.VIR_DOMAIN_STATS_VCPU
+        | libvirt.VIR_DOMAIN_STATS_INTERFACE
+        | libvirt.VIR_DOMAIN_STATS_BLOCK
+    )
+
+
+def _indexed(record: Dict[str, Any], prefix: str, fields: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+    """``block.<i>.*`` / ``net.<i>.*`` entries keyed by device name."""
+    devices = {}
+    for i in range(record.get(f"{prefix}.count", 0)):
+        name = record.get(f"{prefix}.{i}.name")
+        if name is None:
+            continue
+        counters = devices.setdefault(name, {})
+        for key, attr in fields.items():
+            value = record.get(f"{prefix}.{i}.{key}")
+            if value is not None:
+                counters[attr] = counters.get(attr, 0) + value
+    return devices
+
+
+class DomainStatsCollector:
+    """Collect counters for all domains of a connection in one call.
+
+    Thread-safe; one collector is meant to be shared by the samplers of a
+    process.
+    """
+
+    def __init__(self, conn_uri: str = "qemu:///session", conn: Optional[Any] = None):
+        self.conn_uri = conn_uri
+        self._conn = conn
+        self._owns_conn = conn is None
+        self._lock = threading.Lock()
+        self._prev_cpu: Dict[str, Tuple[float, int]] = {}
+        self._devices: Dict[str, Tuple[float, DomainDevices]] = {}
+        self._handles: Dict[str, Any] = {}
+        self._events_conn: Any = None
+        self._callback_ids: List[int] = []
+        self._listeners: List[Callable[[str, int], None]] = []
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            if libvirt is None:
+                raise RuntimeError("libvirt-python not installed")
+            self._conn = libvirt.open(self.conn_uri)
+        return self._conn
+
+    @property
+    def events_live(self) -> bool:
+        return bool(self._callback_ids)
+
+    def add_listener(self, callback: Callable[[str, int], None]) -> None:
+        """Call ``callback(domain name, event)`` on domain lifecycle events.
+
+        Callbacks run on the libvirt event loop thread and must not block.
+        """
+        self._listeners.append(callback)
+
+    # ── sampling ────────────────────────────────────────────────────────────
+
+    def collect(self, names: Optional[Iterable[str]] = None) -> Dict[str, DomainSample]:
+        """Current counters by domain name: all domains, or only *names*."""
+        if libvirt is None:
+            raise RuntimeError("libvirt-python not installed")
+        self._watch_events()
+        flags = getattr(libvirt, "VIR_CONNECT_GET_ALL_DOMAINS_STATS_NOWAIT", 0)
+        if names is None:
+            records = self.conn.getAllDomainStats(_stats_flags(), flags)
+        else:
+            doms = [self._handle(name) for name in names]
+            records = self.conn.domainListGetStats(doms, _stats_flags(), flags) if doms else []
+
+        now = time.monotonic()
+        samples = {}
+        with self._lock:
+            for dom, record in records:
+                sample = self._sample(dom, record, now)
+                samples[sample.name] = sample
+                self._handles[sample.name] = dom
+            if names is None:
+                # Domains that disappeared take their state with them
+                live = {s.uuid for s in samples.values()}
+                for uuid in set(self._prev_cpu) - live:
+                    self._prev_cpu.pop(uuid, None)
+                    self._devices.pop(uuid, None)
+                self._handles = {s.name: self._handles[s.name] for s in samples.values()}
+        return samples
+
+    def sample(self, name: str) -> Optional[DomainSample]:
+        """Counters of one domain, or None if it does not exist."""
+        try:
+            return self.collect([name]).get(name)
+        except Exception as exc:
+            if libvirt is not None and isinstance(exc, libvirt.libvirtError):
+                return None
+            raise
+
+    def _handle(self, name: str) -> Any:
+        with self._lock:
+            dom = self._handles.get(name)
+        if dom is None:
+            dom = self.conn.lookupByName(name)
+        return dom
+
+    def _sample(self, dom: Any, record: Dict[str, Any], now: float) -> DomainSample:
+        uuid = dom.UUIDString()
+        state = STATE_NAMES.get(record.get("state.state", 0), "unknown")
+        cpu_time = record.get("cpu.time", 0)
+        vcpus = record.get("vcpu.current", 0)
+
+        cpu_percent = 0.0
+        prev = self._prev_cpu.get(uuid)
+        if prev is not None and now > prev[0] and cpu_time >= prev[1]:
+            # CPU time is in nanoseconds; 100% per busy vCPU
+            cpu_percent = (cpu_time - prev[1]) / ((now - prev[0]) * 1e9) * 100
+            if vcpus:
+                cpu_percent = min(cpu_percent, 100.0 * vcpus)
+        self._prev_cpu[uuid] = (now, cpu_time)
+
+        return DomainSample(
+            name=dom.name(),
+            uuid=uuid,
+            state=state,
+            timestamp=time.time(),
+            vcpus=vcpus,
+            cpu_time_ns=cpu_time,
+            cpu_percent=cpu_percent,
+            memory_max_kb=record.get("balloon.maximum", 0),
+            memory_current_kb=record.get("balloon.current", 0),
+            memory_unused_kb=record.get("balloon.unused"),
+            memory_rss_kb=record.get("balloon.rss", 0),
+            swap_in_kb=record.get("balloon.swap_in", 0),
+            blocks=_indexed(record, "block", _BLOCK_FIELDS),
+            nets=_indexed(record, "net", _NET_FIELDS),
+            devices=self._devices_of(dom, uuid, now),
+        )
+
+    # ── device cache ────────────────────────────────────────────────────────
+
+    def devices(self, name: str) -> DomainDevices:
+        """Cached device list of domain *name*."""
+        dom = self._handle(name)
+        with self._lock:
+            return self._devices_of(dom, dom.UUIDString(), time.monotonic())
+
+    def _devices_of(self, dom: Any, uuid: str, now: float) -> Optional[DomainDevices]:
+        cached = self._devices.get(uuid)
+        if cached is not None and (self.events_live or now - cached[0] < DEVICE_TTL):
+            return cached[1]
+        try:
+            devices = DomainDevices.from_xml(dom.XMLDesc(0))
+        except Exception as exc:
+            log.debug("domain_devices_unavailable", error=str(exc))
+            return cached[1] if cached else None
+        self._devices[uuid] = (now, devices)
+        return devices
+
+    def invalidate(self, uuid: Optional[str] = None) -> None:
+        """Forget cached devices (and handles) of one domain, or of all."""
+        with self._lock:
+            if uuid is None:
+                self._devices.clear()
+                self._handles.clear()
+                return
+            self._devices.pop(uuid, None)
+            self._handles = {n: d for n, d in self._handles.items() if d.UUIDString() != uuid}
+
+    def _watch_events(self) -> None:
+        if self._events_conn is not None or not _ensure_event_loop():
+            return
+        try:
+            conn = libvirt.openReadOnly(self.conn_uri)
+        except Exception as exc:
+            log.debug("domain_stats_events_unavailable", uri=self.conn_uri, error=str(exc))
+            self._events_conn = False
+            return
+        self._events_conn = conn
+
+        def _on_lifecycle(_conn: Any, dom: Any, event: int, _detail: int, _opaque: Any) -> None:
+            if event in (libvirt.VIR_DOMAIN_EVENT_DEFINED, libvirt.VIR_DOMAIN_EVENT_UNDEFINED):
+                self.invalidate(dom.UUIDString())
+            for listener in list(self._listeners):
+                try:
+                    listener(dom.name(), event)
+                except Exception as exc:
+                    log.debug("domain_stats_listener_failed", error=str(exc))
+
+        def _on_device(_conn: Any, dom: Any, _dev: str, _opaque: Any) -> None:
+            self.invalidate(dom.UUIDString())
+
+        callbacks = [
+            (libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, _on_lifecycle),
+            (getattr(libvirt, "VIR_DOMAIN_EVENT_ID_DEVICE_ADDED", None), _on_device),
+            (getattr(libvirt, "VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED", None), _on_device),
+        ]
+        for event_id, callback in callbacks:
+            if event_id is None:
+                continue
+            try:
+                self._callback_ids.append(conn.domainEventRegisterAny(None, event_id, callback, None))
+            except Exception as exc:
+                log.debug("domain_stats_event_register_failed", event=event_id, error=str(exc))
+
+    def close(self) -> None:
+        conn, self._events_conn = self._events_conn, None
+        if conn:
+            for cb_id in self._callback_ids:
+                try:
+                    conn.domainEventDeregisterAny(cb_id)
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._callback_ids = []
+        if self._conn is not None and self._owns_conn:
+            self._conn.close()
+            self._conn = None
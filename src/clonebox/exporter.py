@@ -3,21 +3,82 @@
 VM Exporter - Export VM with all data and optional AES-256 encryption.
 """
 
+import contextlib
+import io
+import json
 import os
+import subprocess
 import tarfile
 import tempfile
+import time
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Collection, Iterator, List, Optional, Set
 
 from cryptography.fernet import Fernet
 
+from clonebox.chunk_store import INDEX_SUFFIX, ChunkStore, index_stream, pack_chunk, referenced
+from clonebox.compression import DEFAULT_ARCHIVE_COMPRESSION, archive_compressor
+from clonebox.crypto_stream import EncryptingWriter
+from clonebox.disk_export import (
+    BASE_REF_SUFFIX,
+    DISK_MODES,
+    backing_file,
+    base_reference,
+    convert_for_export,
+)
+
 try:
     import libvirt
 except ImportError:
     libvirt = None
 
 
+def _add_bytes(tar: tarfile.TarFile, arcname: str, data: bytes) -> None:
+    info = tarfile.TarInfo(arcname)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _probe_backing(disk: Path) -> Optional[Path]:
+    """Backing file of *disk*, or None when it has none or qemu-img cannot tell."""
+    try:
+        return backing_file(disk)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def _disk_mode(disk: Path, disk_mode: str) -> str:
+    """Export mode for *disk*: ``auto`` picks overlay for backed disks, file otherwise."""
+    if disk_mode not in ("auto", "file"):
+        return disk_mode
+    backing = _probe_backing(disk)
+    if backing is None:
+        return "file"
+    if disk_mode == "file":
+        raise ValueError(
+            f"{disk} is an overlay on {backing}; a file copy would be unusable "
+            "without it. Use disk_mode='overlay' or 'flatten'"
+        )
+    return "overlay"
+
+
+@contextlib.contextmanager
+def _scratch_path(disk: Path) -> Iterator[Path]:
+    """Temporary path for a converted copy of *disk*, on the same filesystem if possible."""
+    try:
+        fd, name = tempfile.mkstemp(prefix=f".{disk.name}.export-", dir=disk.parent)
+    except PermissionError:
+        fd, name = tempfile.mkstemp(prefix=f"{disk.name}.export-")
+    os.close(fd)
+    try:
+        yield Path(name)
+    finally:
+        Path(name).unlink(missing_ok=True)
+
+
 class VMExporter:
     """Export VM with disks, app data, and user data."""
 
@@ -39,8 +100,67 @@ class VMExporter:
         output_path: Path,
         include_user_data: bool = False,
         include_app_data: bool = False,
+        chunk_store: Optional[ChunkStore] = None,
+        all_chunks: bool = False,
+        index_only: bool = False,
+        disk_mode: str = "auto",
+        compression: Optional[str] = None,
+        chunk_stream: bool = False,
+        known_chunks: Collection[str] = (),
     ) -> Path:
-        """Full export of VM with disks and optional data."""
+        """Full export of VM with disks and optional data.
+
+        With *chunk_store*, disks are exported as chunk indexes and the
+        archive only carries the chunks that were new to the store (all
+        referenced chunks with *all_chunks*, none with *index_only*).
+        *disk_mode* ``flatten`` or ``overlay`` exports compacted qcow2
+        images instead (see :mod:`clonebox.disk_export`); the default
+        ``auto`` uses overlay for disks with a backing file, and chunked
+        exports flatten those before chunking.  *chunk_stream* chunks the
+        disks without a store: each chunk not in *known_chunks* goes into
+        the archive as soon as it is cut (the peer side of a P2P pull).
+        *compression* is
+        one of ``none``, ``gzip`` (pigz) or ``zstd``; by default gzip, or
+        none when the disks are already compressed.
+        """
+        with open(output_path, "wb") as out:
+            self.write_archive(
+                vm_name,
+                out,
+                include_user_data=include_user_data,
+                include_app_data=include_app_data,
+                chunk_store=chunk_store,
+                all_chunks=all_chunks,
+                index_only=index_only,
+                disk_mode=disk_mode,
+                compression=compression,
+                chunk_stream=chunk_stream,
+                known_chunks=known_chunks,
+            )
+        return output_path
+
+    def write_archive(
+        self,
+        vm_name: str,
+        out: BinaryIO,
+        include_user_data: bool = False,
+        include_app_data: bool = False,
+        chunk_store: Optional[ChunkStore] = None,
+        all_chunks: bool = False,
+        index_only: bool = False,
+        disk_mode: str = "auto",
+        compression: Optional[str] = None,
+        chunk_stream: bool = False,
+        known_chunks: Collection[str] = (),
+    ) -> None:
+        """Stream the export archive of *vm_name* into the file object *out*."""
+        if disk_mode not in DISK_MODES:
+            raise ValueError(f"Unknown disk mode: {disk_mode}")
+        if chunk_stream and chunk_store is not None:
+            raise ValueError("A chunk stream is cut without a chunk store")
+        chunked = chunk_store is not None or chunk_stream
+        if chunked and disk_mode not in ("auto", "file"):
+            raise ValueError("Chunked exports store disks as files; use disk_mode='auto'")
         vm = self.conn.lookupByName(vm_name)
         vm_xml = vm.XMLDesc()
         root = ET.fromstring(vm_xml)
@@ -53,17 +173,34 @@ class VMExporter:
                 disk_path = Path(source.get("file"))
                 if disk_path.exists():
                     disks.append(disk_path)
+        modes = {disk: _disk_mode(disk, disk_mode) for disk in disks}
 
-        # Create archive
-        with tarfile.open(output_path, "w:gz") as tar:
+        # Create archive (stored chunks and converted disks are already compressed)
+        if compression is None:
+            precompressed = chunked or (
+                bool(modes) and "file" not in modes.values()
+            )
+            compression = "none" if precompressed else DEFAULT_ARCHIVE_COMPRESSION
+        with archive_compressor(out, compression) as (stream, mode), \
+                tarfile.open(fileobj=stream, mode=mode) as tar:
             # Add XML config
-            xml_tmp = Path(tempfile.gettempdir()) / f"{vm_name}.xml"
-            xml_tmp.write_text(vm_xml)
-            tar.add(xml_tmp, arcname=f"{vm_name}.xml")
-            xml_tmp.unlink()
+            _add_bytes(tar, f"{vm_name}.xml", vm_xml.encode())
 
             # Add disks
+            sent = set(known_chunks)
             for disk in disks:
+                if chunk_stream:
+                    self._stream_chunked_disk(tar, disk, sent, modes[disk] != "file")
+                    continue
+                if chunk_store is not None:
+                    flatten = modes[disk] != "file"
+                    self._add_chunked_disk(
+                        tar, disk, chunk_store, all_chunks, index_only, flatten
+                    )
+                    continue
+                if modes[disk] != "file":
+                    self._add_converted_disk(tar, disk, modes[disk])
+                    continue
                 arcname = f"disks/{disk.name}"
                 tar.add(disk, arcname=arcname)
                 print(f"   💾 Added disk: {disk}")
@@ -76,7 +213,87 @@ class VMExporter:
             if include_user_data:
                 self._export_user_data(tar)
 
-        return output_path
+    def _add_chunked_disk(
+        self,
+        tar: tarfile.TarFile,
+        disk: Path,
+        store: ChunkStore,
+        all_chunks: bool,
+        index_only: bool,
+        flatten: bool = False,
+    ) -> None:
+        """Add the chunks *disk* needs, then its chunk index.
+
+        With *flatten*, an overlay is first converted to a standalone
+        (uncompressed, so chunks still deduplicate) qcow2 of its whole chain.
+        """
+        with contextlib.ExitStack() as stack:
+            source = disk
+            if flatten:
+                source = stack.enter_context(_scratch_path(disk))
+                convert_for_export(disk, source, compress=False)
+                print(f"   🧱 Flattened overlay {disk} for chunking")
+            index, new = store.add_file(source)
+        index["name"] = disk.name
+        if index_only:
+            ship = []
+        elif all_chunks:
+            ship = referenced(index)
+        else:
+            ship = new
+        # Chunks go first so a streaming reader has them before the index
+        for digest in ship:
+            tar.add(store.object_path(digest), arcname=f"chunks/{digest}")
+        blob = json.dumps(index, separators=(",", ":")).encode()
+        _add_bytes(tar, f"disks/{disk.name}{INDEX_SUFFIX}", blob)
+        print(
+            f"   💾 Added disk: {disk} "
+            f"({len(ship)}/{len(index['chunks'])} chunks in archive)"
+        )
+
+    def _stream_chunked_disk(
+        self, tar: tarfile.TarFile, disk: Path, sent: Set[str], flatten: bool = False
+    ) -> None:
+        """Add each chunk of *disk* not in *sent* as it is cut, then its index.
+
+        Nothing is written to a chunk store; *sent* grows by the chunks added.
+        Overlays are flattened first, as in :meth:`_add_chunked_disk`.
+        """
+        shipped = 0
+
+        def send(digest: str, chunk: bytes) -> None:
+            nonlocal shipped
+            if digest not in sent:
+                sent.add(digest)
+                _add_bytes(tar, f"chunks/{digest}", pack_chunk(chunk))
+                shipped += 1
+
+        with contextlib.ExitStack() as stack:
+            source = disk
+            if flatten:
+                source = stack.enter_context(_scratch_path(disk))
+                convert_for_export(disk, source, compress=False)
+                print(f"   🧱 Flattened overlay {disk} for chunking")
+            with open(source, "rb") as f:
+                index = index_stream(f, disk.name, send)
+        blob = json.dumps(index, separators=(",", ":")).encode()
+        _add_bytes(tar, f"disks/{disk.name}{INDEX_SUFFIX}", blob)
+        print(f"   💾 Streamed disk: {disk} ({shipped}/{len(index['chunks'])} chunks sent)")
+
+    def _add_converted_disk(self, tar: tarfile.TarFile, disk: Path, disk_mode: str) -> None:
+        """Add a compacted qcow2 of *disk*, plus its base reference in overlay mode."""
+        user_session = self.conn_uri.endswith("/session")
+        base = backing_file(disk) if disk_mode == "overlay" else None
+        with _scratch_path(disk) as converted:
+            convert_for_export(disk, converted, base=base)
+            tar.add(converted, arcname=f"disks/{disk.name}")
+            size = converted.stat().st_size
+        if base is not None:
+            ref = json.dumps(base_reference(base, user_session), indent=2).encode()
+            _add_bytes(tar, f"disks/{disk.name}{BASE_REF_SUFFIX}", ref)
+            print(f"   💾 Added overlay: {disk} ({size} bytes, base {base.name})")
+        else:
+            print(f"   💾 Added disk: {disk} ({size} bytes, flattened)")
 
     def _export_app_data(self, tar: tarfile.TarFile) -> None:
         """Export common application data paths."""
@@ -150,36 +367,36 @@ class SecureExporter:
         output_path: Path,
         include_user_data: bool = False,
         include_app_data: bool = False,
+        disk_mode: str = "auto",
+        compression: Optional[str] = None,
     ) -> Path:
-        """Export VM with AES-256 encryption."""
+        """Export VM with AES-256-GCM encryption in constant memory.
+
+        The archive is compressed before it is encrypted; see
+        :meth:`VMExporter.export_vm` for *disk_mode* and *compression*.
+        """
         key = self.load_key()
         if key is None:
             raise FileNotFoundError(
                 f"No encryption key found at {self.KEY_PATH}. Run: clonebox keygen"
             )
 
-        fernet = Fernet(key)
-
-        # Create temporary unencrypted archive
-        with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=False) as tmp:
-            tmp_path = Path(tmp.name)
-
+        # Archive writer -> segment encryption -> output file, nothing buffered
+        tmp_path = output_path.with_name(f".{output_path.name}.partial")
         try:
-            # Export to temp file
-            self.exporter.export_vm(
-                vm_name=vm_name,
-                output_path=tmp_path,
-                include_user_data=include_user_data,
-                include_app_data=include_app_data,
-            )
-
-            # Encrypt
-            data = tmp_path.read_bytes()
-            encrypted = fernet.encrypt(data)
-            output_path.write_bytes(encrypted)
-
+            with open(tmp_path, "wb") as out:
+                writer = EncryptingWriter(out, key)
+                self.exporter.write_archive(
+                    vm_name,
+                    writer,
+                    include_user_data=include_user_data,
+                    include_app_data=include_app_data,
+                    disk_mode=disk_mode,
+                    compression=compression,
+                )
+                writer.close()
+            os.replace(tmp_path, output_path)
         finally:
-            # Cleanup temp file
             if tmp_path.exists():
                 tmp_path.unlink()
 
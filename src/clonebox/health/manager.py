@@ -19,6 +19,10 @@ class HealthCheckManager:
         self._config_dir.mkdir(parents=True, exist_ok=True)
         self._vm_states: Dict[str, VMHealthState] = {}
 
+    @property
+    def config_dir(self) -> Path:
+        return self._config_dir
+
     def check(
         self,
         vm_name: str,
@@ -0,0 +1,238 @@
+"""
+Golden base-image cache for CloneBox.
+
+Installing the desktop, apt packages and snaps dominates VM creation time,
+yet it only depends on a handful of inputs.  Those inputs are hashed into a
+key; the first VM with a given key provisions a throw-away builder domain,
+which is sealed (``qemu-img convert`` into a standalone, read-only qcow2)
+under ``<images>/golden/<key>.qcow2``.  Later VMs get a thin overlay on the
+golden image and a cloud-init that skips the shared provisioning steps.
+
+The cache keeps an ``index.json`` (guarded by ``flock``) with the size,
+last use and current users of each image.  Images that no existing VM disk
+is layered on are evicted least-recently-used first once the cache grows
+past its size limit.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import structlog
+
+log = structlog.get_logger(__name__)
+
+# Virtual size of builder disks; VM overlays are never smaller than this.
+GOLDEN_DISK_SIZE_GB = 20
+
+# Upper bound for a builder domain to provision and power itself off.
+GOLDEN_BUILD_TIMEOUT = 1800
+
+DEFAULT_MAX_BYTES = int(float(os.getenv("CLONEBOX_GOLDEN_CACHE_GB", "40")) * 1024**3)
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+
+def golden_inputs(
+    base_image: str,
+    packages: Sequence[str],
+    snap_packages: Sequence[str],
+    gui: bool,
+    username: str,
+    template_version: int,
+) -> Dict[str, Any]:
+    """Canonical description of everything a golden image depends on.
+
+    The base image is identified by its resolved path, size and mtime, so a
+    refreshed download with the same name yields a new key.
+    """
+    real = os.path.realpath(base_image)
+    st = os.stat(real)
+    return {
+        "base_image": real,
+        "base_size": st.st_size,
+        "base_mtime": int(st.st_mtime),
+        "packages": sorted(set(packages)),
+        # Install order matters for snaps with interface connections
+        "snap_packages": list(snap_packages),
+        "gui": bool(gui),
+        "username": username,
+        "template_version": template_version,
+    }
+
+
+def golden_key(inputs: Dict[str, Any]) -> str:
+    """Content address (sha256 hex) of :func:`golden_inputs`."""
+    blob = json.dumps(inputs, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+class GoldenImageCache:
+    """Sealed golden images under *root*, with refcounts and LRU eviction."""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    # ── paths ────────────────────────────────────────────────────────────────
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}.qcow2"
+
+    def build_path(self, key: str) -> Path:
+        """Scratch overlay the builder domain provisions."""
+        return self.root / f"{key}.build.qcow2"
+
+    # ── index ────────────────────────────────────────────────────────────────
+
+    @contextlib.contextmanager
+    def _index(self, write: bool = True) -> Iterator[Dict[str, Any]]:
+        """Load the index under an exclusive lock; save it on exit if *write*."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index_path = self.root / INDEX_FILE
+            try:
+                index = json.loads(index_path.read_text())
+            except (OSError, ValueError):
+                index = {}
+            images = index.setdefault("images", {})
+            yield images
+            if write:
+                tmp = index_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(index, indent=2, sort_keys=True))
+                os.replace(tmp, index_path)
+
+    @contextlib.contextmanager
+    def building(self, key: str) -> Iterator[None]:
+        """Serialise builders of the same *key* across processes."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f"{key}.lock", "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _live_users(entry: Dict[str, Any]) -> Dict[str, str]:
+        """Drop users whose overlay disk no longer exists (deleted outside clonebox)."""
+        users = {vm: disk for vm, disk in entry.get("users", {}).items() if os.path.exists(disk)}
+        entry["users"] = users
+        return users
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        with self._index(write=False) as images:
+            return json.loads(json.dumps(images))
+
+    def total_size(self) -> int:
+        return sum(entry.get("size", 0) for entry in self.entries().values())
+
+    # ── operations ───────────────────────────────────────────────────────────
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the sealed image for *key* and bump its last use, or ``None``."""
+        if not (self.root / INDEX_FILE).exists():
+            return None
+        with self._index() as images:
+            entry = images.get(key)
+            path = self.path_for(key)
+            if entry is None:
+                return None
+            if not path.exists():
+                images.pop(key)
+                log.warning("golden_image_missing", key=key, path=str(path))
+                return None
+            entry["last_used"] = time.time()
+            return path
+
+    def seal(self, key: str, build_disk: Path, inputs: Dict[str, Any]) -> Path:
+        """Flatten *build_disk* into the read-only golden image for *key*.
+
+        ``qemu-img convert`` drops the backing chain and unallocated clusters,
+        so the result is standalone and compact.  The scratch disk is removed.
+        """
+        final = self.path_for(key)
+        tmp = final.with_suffix(".qcow2.tmp")
+        started = time.monotonic()
+        try:
+            subprocess.run(
+                ["qemu-img", "convert", "-O", "qcow2", str(build_disk), str(tmp)],
+                check=True, capture_output=True, text=True,
+            )
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, final)
+        finally:
+            tmp.unlink(missing_ok=True)
+            Path(build_disk).unlink(missing_ok=True)
+
+        size = final.stat().st_size
+        with self._index() as images:
+            now = time.time()
+            images[key] = {
+                "size": size,
+                "created": now,
+                "last_used": now,
+                "inputs": inputs,
+                "users": images.get(key, {}).get("users", {}),
+            }
+        log.info("golden_image_sealed", key=key, size=size,
+                 duration=round(time.monotonic() - started, 1))
+        self.evict(keep=key)
+        return final
+
+    def acquire(self, key: str, vm_name: str, disk_path: str) -> None:
+        """Record that *vm_name*'s overlay *disk_path* is layered on *key*."""
+        with self._index() as images:
+            entry = images.get(key)
+            if entry is not None:
+                entry.setdefault("users", {})[vm_name] = str(disk_path)
+                entry["last_used"] = time.time()
+
+    def release(self, vm_name: str) -> None:
+        """Forget *vm_name* as a user of any golden image."""
+        if not (self.root / INDEX_FILE).exists():
+            return
+        with self._index() as images:
+            for entry in images.values():
+                entry.get("users", {}).pop(vm_name, None)
+
+    def rename_user(self, old_vm: str, new_vm: str, disk_path: str) -> None:
+        """Carry *old_vm*'s references over to *new_vm* (renamed pool VMs)."""
+        if not (self.root / INDEX_FILE).exists():
+            return
+        with self._index() as images:
+            for entry in images.values():
+                users = entry.get("users", {})
+                if users.pop(old_vm, None) is not None:
+                    users[new_vm] = str(disk_path)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Delete unused images, least recently used first, until under the limit."""
+        evicted: List[str] = []
+        with self._index() as images:
+            total = sum(entry.get("size", 0) for entry in images.values())
+            candidates = sorted(
+                (key for key, entry in images.items()
+                 if key != keep and not self._live_users(entry)),
+                key=lambda k: images[k].get("last_used", 0),
+            )
+            for key in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= images.pop(key).get("size", 0)
+                path = self.path_for(key)
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    log.warning("golden_image_evict_failed", key=key, error=str(exc))
+                evicted.append(key)
+        for key in evicted:
+            log.info("golden_image_evicted", key=key)
+        return evicted
@@ -3,21 +3,198 @@
 VM Importer - Import VM with path reconfiguration and decryption.
 """
 
+import contextlib
+import json
+import os
 import shutil
-import subprocess
 import tarfile
 import tempfile
 import xml.etree.ElementTree as ET
-from pathlib import Path
-from typing import Optional
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Optional, Tuple
 
 from cryptography.fernet import Fernet
 
+from clonebox import paths as _paths
+from clonebox.chunk_store import INDEX_SUFFIX, ChunkStore
+from clonebox.compression import archive_decompressor
+from clonebox.crypto_stream import MAGIC, DecryptingReader
+from clonebox.disk_export import BASE_REF_SUFFIX, find_base, rebase, sparse_write
+from clonebox.image_cache import GoldenImageCache
+
 try:
     import libvirt
 except ImportError:
     libvirt = None
 
+# Domain XML and disk metadata are read into memory; nothing legitimate is this big
+_MAX_METADATA = 16 * 1024 * 1024
+
+
+class UnsafeArchiveError(RuntimeError):
+    """An archive member would be written outside its destination."""
+
+
+def _member_parts(name: str) -> Tuple[str, ...]:
+    """Path components of an archive member, rejecting absolute and ``..`` names."""
+    path = PurePosixPath(name)
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        raise UnsafeArchiveError(f"Refusing archive member {name!r}")
+    return path.parts
+
+
+def _read_small(tar: tarfile.TarFile, member: tarfile.TarInfo) -> bytes:
+    if member.size > _MAX_METADATA:
+        raise UnsafeArchiveError(f"Archive member {member.name} is too large ({member.size} bytes)")
+    return tar.extractfile(member).read()
+
+
+def _app_data_destination(name: str) -> Path:
+    # Map back to original paths
+    dest_map = {
+        "projects": Path.home() / "projects",
+        ".docker": Path.home() / ".docker",
+        "myapp": Path("/opt/myapp"),
+        "www": Path("/var/www"),
+        "docker": Path("/srv/docker"),
+    }
+    return dest_map.get(name, Path.home() / name)
+
+
+class _DataRestorer:
+    """Write user-data/ and app-data/ members where they were exported from.
+
+    While the import stream is read, members are only :meth:`stage`-d in a
+    private archive; :meth:`restore_staged` writes them to their
+    destinations once the VM has been defined.
+    """
+
+    def __init__(self, user_data: bool, app_data: bool):
+        self.enabled = {"user-data": user_data, "app-data": app_data}
+        self.restored: set = set()
+        self.denied: set = set()
+        self._stage_dir: Optional[Path] = None
+        self._staged: Optional[tarfile.TarFile] = None
+
+    def _destination(self, parts: Tuple[str, ...]) -> Tuple[Path, Path]:
+        """Destination of the exported item and of the member itself."""
+        if parts[0] == "user-data":
+            item = Path.home() / parts[1]
+        else:
+            item = _app_data_destination(parts[1])
+        return item, item.joinpath(*parts[2:])
+
+    @staticmethod
+    def _inside(item: Path, path: Path) -> bool:
+        """Whether *path*, with existing symlinks resolved, stays inside *item*."""
+        root = os.path.realpath(item)
+        real = os.path.realpath(path)
+        return real == root or real.startswith(root.rstrip(os.sep) + os.sep)
+
+    @staticmethod
+    def _clear(dest: Path) -> bool:
+        """Make way for a non-directory member at *dest*.
+
+        A symlink already at *dest* is replaced, never written through.  A
+        directory in the way is left alone and the member skipped.
+        """
+        if dest.is_symlink():
+            dest.unlink()
+        elif dest.is_dir():
+            print(f"   ⚠️ Skipped {dest}: a directory is in the way")
+            return False
+        return True
+
+    def _wanted(self, parts: Tuple[str, ...]) -> bool:
+        return self.enabled[parts[0]] and len(parts) >= 2 and parts[:2] not in self.denied
+
+    def _check(self, member: tarfile.TarInfo, parts: Tuple[str, ...]) -> Tuple[Path, Path]:
+        """Destinations of *member*; raises if it would be written outside its item."""
+        item, dest = self._destination(parts)
+        if len(parts) > 2 and not self._inside(item, dest.parent):
+            raise UnsafeArchiveError(f"Refusing archive member {member.name}: it leaves {item}")
+        if member.islnk():
+            link_parts = _member_parts(member.linkname)
+            if link_parts[:2] != parts[:2] or not self._inside(item, self._destination(link_parts)[1]):
+                raise UnsafeArchiveError(f"Refusing hard link {member.name} → {member.linkname}")
+        return item, dest
+
+    def stage(self, tar: tarfile.TarFile, member: tarfile.TarInfo, parts: Tuple[str, ...],
+              stage_root: Path) -> None:
+        """Keep *member* aside in a private directory under *stage_root*."""
+        if not self._wanted(parts):
+            return
+        self._check(member, parts)
+        if self._staged is None:
+            self._stage_dir = Path(tempfile.mkdtemp(prefix=".clonebox-data-", dir=stage_root))
+            self._staged = tarfile.open(self._stage_dir / "data.tar", "w")
+        self._staged.addfile(member, tar.extractfile(member) if member.isfile() else None)
+
+    def restore_staged(self) -> None:
+        """Write the staged members to their destinations."""
+        if self._staged is None:
+            return
+        self._staged.close()
+        with tarfile.open(self._stage_dir / "data.tar") as tar:
+            for member in tar:
+                self.restore(tar, member, _member_parts(member.name))
+
+    def discard(self) -> None:
+        """Remove the staged members."""
+        if self._staged is not None:
+            self._staged.close()
+            shutil.rmtree(self._stage_dir, ignore_errors=True)
+            self._staged = self._stage_dir = None
+
+    def restore(self, tar: tarfile.TarFile, member: tarfile.TarInfo, parts: Tuple[str, ...]) -> None:
+        if not self._wanted(parts):
+            return
+        item, dest = self._check(member, parts)
+        try:
+            if member.isdir():
+                if len(parts) > 2 and dest.is_symlink():
+                    dest.unlink()
+                dest.mkdir(parents=True, exist_ok=True)
+            elif member.issym():
+                target = PurePosixPath(member.linkname)
+                if len(parts) == 2:
+                    # Later members of the item would be written through it
+                    print(f"   ⚠️ Skipped {item}: exported as a link to {member.linkname}")
+                    return
+                if target.is_absolute() or ".." in target.parts:
+                    print(f"   ⚠️ Skipped link leaving {item}: {dest} → {member.linkname}")
+                    return
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if not self._clear(dest):
+                    return
+                os.symlink(member.linkname, dest)
+            elif member.islnk():
+                source = self._destination(_member_parts(member.linkname))[1]
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if not self._clear(dest):
+                    return
+                shutil.copy2(source, dest)
+            elif member.isfile():
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if not self._clear(dest):
+                    return
+                with open(dest, "wb") as out:
+                    shutil.copyfileobj(tar.extractfile(member), out)
+                os.chmod(dest, member.mode & 0o7777)
+                os.utime(dest, (member.mtime, member.mtime))
+            else:
+                return
+        except PermissionError:
+            if parts[0] == "user-data":
+                raise
+            self.denied.add(parts[:2])
+            print(f"   ⚠️ Permission denied: {item}")
+            return
+        if parts[:2] not in self.restored:
+            self.restored.add(parts[:2])
+            icon = "👤" if parts[0] == "user-data" else "📁"
+            print(f"   {icon} Restored: {item}")
+
 
 class VMImporter:
     """Import VM with disk path reconfiguration."""
@@ -43,63 +220,168 @@ class VMImporter:
         import_app_data: bool = False,
         new_name: Optional[str] = None,
         disk_dir: Optional[Path] = None,
+        chunk_store: Optional[ChunkStore] = None,
     ) -> str:
-        """Import VM from archive with full path reconfiguration."""
-        disk_dir = disk_dir or self.DEFAULT_DISK_DIR
-
-        with tempfile.TemporaryDirectory(prefix="clonebox-import-") as tmp_dir:
-            tmp_path = Path(tmp_dir)
+        """Import VM from archive with full path reconfiguration.
+
+        Chunked disks are reassembled from *chunk_store* (the default store
+        for this connection if not given), after adding the chunks the
+        archive carries to it.
+        """
+        with open(archive_path, "rb") as src:
+            return self.import_stream(
+                src,
+                import_user_data=import_user_data,
+                import_app_data=import_app_data,
+                new_name=new_name,
+                disk_dir=disk_dir,
+                chunk_store=chunk_store,
+            )
 
-            # Extract archive
-            with tarfile.open(archive_path) as tar:
-                tar.extractall(tmp_path)
+    def import_stream(
+        self,
+        src: BinaryIO,
+        import_user_data: bool = False,
+        import_app_data: bool = False,
+        new_name: Optional[str] = None,
+        disk_dir: Optional[Path] = None,
+        chunk_store: Optional[ChunkStore] = None,
+    ) -> str:
+        """Import VM from an archive read sequentially from *src*.
+
+        The archive is processed in a single pass: disks are written
+        straight into *disk_dir* (sparse, under a hidden name until the
+        whole archive has been read), the domain XML is kept in memory and
+        user/app data are staged under a hidden directory in *disk_dir*.
+        The data only reach their destinations once the VM has been
+        defined, so a failed import leaves the user's files untouched.
+        The compression (none, gzip or zstd) is detected from the stream.
+        """
+        disk_dir = disk_dir or self.DEFAULT_DISK_DIR
+        store = chunk_store or ChunkStore.default(self.conn_uri.endswith("/session"))
 
-            # Find XML file
-            xml_files = list(tmp_path.glob("*.xml"))
-            if not xml_files:
+        xml_name = xml_text = None
+        partials = {}
+        indexes = {}
+        base_refs = {}
+        data = _DataRestorer(import_user_data, import_app_data)
+        try:
+            with archive_decompressor(src) as (stream, mode), \
+                    tarfile.open(fileobj=stream, mode=mode) as tar:
+                for member in tar:
+                    parts = _member_parts(member.name)
+                    if len(parts) == 1 and parts[0].endswith(".xml") and member.isfile():
+                        if xml_text is None:
+                            xml_name = parts[0][:-len(".xml")]
+                            xml_text = _read_small(tar, member).decode()
+                    elif parts[0] == "chunks" and len(parts) == 2 and member.isfile():
+                        store.put_object(parts[1], tar.extractfile(member).read())
+                    elif parts[0] == "disks" and len(parts) == 2 and member.isfile():
+                        name = parts[1]
+                        if name.endswith(INDEX_SUFFIX):
+                            index = json.loads(_read_small(tar, member))
+                            indexes[Path(index["name"]).name] = index
+                        elif name.endswith(BASE_REF_SUFFIX):
+                            base_refs[name[:-len(BASE_REF_SUFFIX)]] = json.loads(_read_small(tar, member))
+                        else:
+                            partial = partials[name] = disk_dir / f".{name}.importing"
+                            sparse_write(tar.extractfile(member), partial, member.size)
+                            os.utime(partial, (member.mtime, member.mtime))
+                    elif parts[0] in ("user-data", "app-data"):
+                        data.stage(tar, member, parts, disk_dir)
+
+            if xml_text is None:
                 raise FileNotFoundError("No XML configuration found in archive")
-            xml_file = xml_files[0]
-            vm_name = xml_file.stem
 
-            # Move disks to libvirt images directory
-            disks_dir = tmp_path / "disks"
+            # Chunked disks are reassembled from the store once every chunk
+            # the archive carries has been added to it
+            for disk_name, index in indexes.items():
+                partial = partials[disk_name] = disk_dir / f".{disk_name}.importing"
+                store.restore_file(index, partial)
+            final_name = new_name or xml_name
+            golden_keys = {}
+            for disk_name, ref in base_refs.items():
+                base = self._attach_base(partials[disk_name], ref, disk_dir, disk_name)
+                key = self._pin_golden_base(base, final_name, partials[disk_name])
+                if key is not None:
+                    golden_keys[disk_name] = key
+
             disk_mapping = {}
-            if disks_dir.exists():
-                for disk_file in disks_dir.iterdir():
-                    dest = disk_dir / disk_file.name
-                    shutil.copy2(disk_file, dest)
-                    disk_mapping[disk_file.name] = dest
-                    print(f"   💾 Copied disk: {dest}")
+            for disk_name, partial in partials.items():
+                dest = disk_mapping[disk_name] = disk_dir / disk_name
+                os.replace(partial, dest)
+                if disk_name in golden_keys:
+                    self._golden_cache().acquire(golden_keys[disk_name], final_name, str(dest))
+                verb = "Reassembled" if disk_name in indexes else "Imported"
+                print(f"   💾 {verb} disk: {dest}")
+        except BaseException:
+            data.discard()
+            raise
+        finally:
+            for partial in partials.values():
+                with contextlib.suppress(FileNotFoundError):
+                    partial.unlink()
 
+        try:
             # Reconfigure disk paths in XML
-            vm_xml = self._reconfigure_paths(xml_file, disk_mapping, new_name)
+            vm_xml = self._reconfigure_paths(xml_text, disk_mapping, new_name)
 
             # Define and create VM
             vm = self.conn.defineXML(vm_xml)
-            final_name = new_name or vm_name
             print(f"   ✅ VM defined: {final_name}")
+            data.restore_staged()
+        finally:
+            data.discard()
+
+        # Start VM
+        vm.create()
+        print(f"   🚀 VM started: {final_name}")
 
-            # Import user/app data
-            if import_user_data:
-                self._import_user_data(tmp_path / "user-data")
-            if import_app_data:
-                self._import_app_data(tmp_path / "app-data")
+        return final_name
 
-            # Start VM
-            vm.create()
-            print(f"   🚀 VM started: {final_name}")
+    def _golden_cache(self) -> GoldenImageCache:
+        return GoldenImageCache(_paths.images_dir(self.conn_uri.endswith("/session")) / "golden")
 
-            return final_name
+    def _attach_base(self, disk: Path, ref: dict, disk_dir: Path, disk_name: str) -> Path:
+        """Rebase an exported overlay onto the local copy of its base image."""
+        user_session = self.conn_uri.endswith("/session")
+        images_dir = _paths.images_dir(user_session)
+        search = [disk_dir, images_dir, self._golden_cache().root]
+        base = find_base(ref, list(dict.fromkeys(search)), user_session)
+        if base is None:
+            raise FileNotFoundError(
+                f"Base image {ref['name']} (sha256 {ref['sha256'][:16]}…) of {disk_name} "
+                "not found locally; copy it to the images directory or re-export with "
+                "disk_mode='flatten'"
+            )
+        rebase(disk, base, ref.get("format", "qcow2"))
+        print(f"   🔗 Rebased {disk_name} onto {base}")
+        return base
+
+    def _pin_golden_base(self, base: Path, vm_name: str, disk: Path) -> Optional[str]:
+        """Register *vm_name* as a user of *base* if it is a golden image.
+
+        Golden images without users are evicted, so an imported overlay
+        layered on one must be recorded like a VM created from the cache.
+        Returns the cache key, or ``None`` for other base images.
+        """
+        cache = self._golden_cache()
+        if base.parent != cache.root or base.name.endswith(".build.qcow2"):
+            return None
+        key = base.name[:-len(".qcow2")]
+        if cache.path_for(key) != base:
+            return None
+        cache.acquire(key, vm_name, str(disk))
+        return key
 
     def _reconfigure_paths(
         self,
-        xml_file: Path,
+        xml_text: str,
         disk_mapping: dict,
         new_name: Optional[str] = None,
     ) -> str:
         """Update disk paths and optionally rename VM."""
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
+        root = ET.fromstring(xml_text)
 
         # Update name if requested
         if new_name:
@@ -120,39 +402,6 @@ class VMImporter:
 
         return ET.tostring(root, encoding="unicode")
 
-    def _import_user_data(self, user_data_dir: Path) -> None:
-        """Restore user data."""
-        if user_data_dir.exists():
-            for item in user_data_dir.iterdir():
-                dest = Path.home() / item.name
-                if item.is_dir():
-                    shutil.copytree(item, dest, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(item, dest)
-                print(f"   👤 Restored: {dest}")
-
-    def _import_app_data(self, app_data_dir: Path) -> None:
-        """Restore application data."""
-        if app_data_dir.exists():
-            for item in app_data_dir.iterdir():
-                # Map back to original paths
-                dest_map = {
-                    "projects": Path.home() / "projects",
-                    ".docker": Path.home() / ".docker",
-                    "myapp": Path("/opt/myapp"),
-                    "www": Path("/var/www"),
-                    "docker": Path("/srv/docker"),
-                }
-                dest = dest_map.get(item.name, Path.home() / item.name)
-                try:
-                    if item.is_dir():
-                        shutil.copytree(item, dest, dirs_exist_ok=True)
-                    else:
-                        shutil.copy2(item, dest)
-                    print(f"   📁 Restored: {dest}")
-                except PermissionError:
-                    print(f"   ⚠️ Permission denied: {dest}")
-
     def close(self) -> None:
         if self._conn is not None:
             self._conn.close()
@@ -181,7 +430,7 @@ class SecureImporter:
         import_app_data: bool = False,
         new_name: Optional[str] = None,
     ) -> str:
-        """Import VM with AES-256 decryption."""
+        """Import VM with AES-256-GCM decryption in constant memory."""
         key = self.load_key()
         if key is None:
             raise FileNotFoundError(
@@ -189,6 +438,18 @@ class SecureImporter:
                 "Copy the team key to this location."
             )
 
+        with open(encrypted_path, "rb") as src:
+            if src.read(len(MAGIC)) == MAGIC:
+                # Decrypt straight into the extractor, one segment at a time
+                src.seek(0)
+                return self.importer.import_stream(
+                    DecryptingReader(src, key),
+                    import_user_data=import_user_data,
+                    import_app_data=import_app_data,
+                    new_name=new_name,
+                )
+
+        # Exports made before segmented encryption are single Fernet tokens
         fernet = Fernet(key)
 
         # Create temporary decrypted archive
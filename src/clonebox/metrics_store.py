@@ -0,0 +1,452 @@
+"""
+Embedded time-series store for VM and container metrics.
+
+Samples are appended per series (``<kind>/<name>/<metric>``, e.g.
+``vm/dev/cpu_percent``) and kept at three resolutions:
+
+========  ===========  ===================  ===================
+tier      step         in memory            on disk
+========  ===========  ===================  ===================
+``1s``    as sampled   last 600 samples     1 day
+``1m``    60 s         last 6 hours         30 days
+``1h``    3600 s       last 7 days          2 years
+========  ===========  ===================  ===================
+
+Every tier is a columnar ring buffer per series (timestamp, avg, min, max
+and sample count as ``array('d')`` columns).  The ``1m``/``1h`` rows are folded from the
+raw samples as they arrive: a bucket is closed when the first sample of
+the next one comes in.
+
+New rows are flushed every :data:`FLUSH_INTERVAL` seconds into immutable,
+zlib-compressed segments under ``<root>/<tier>/``.  Once a segment window
+has passed (an hour of ``1s`` data, a day of ``1m``, 30 days of ``1h``),
+its flush segments are merged into one.  Segments past the tier's
+retention are deleted.  Buckets still open on :meth:`MetricsStore.close`
+are written as (partial) rows, so short sessions keep their coarse tiers.
+Rows with the same timestamp (partial buckets of several sessions, or two
+processes recording the same VM) are combined by sample count on merge
+and query rather than replacing each other.
+
+:meth:`MetricsStore.query` answers from the finest tier whose retention
+covers the requested range, merging disk segments with the rows still in
+memory, and can re-bucket the result to a coarser step.
+"""
+
+import contextlib
+import fcntl
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+
+log = structlog.get_logger(__name__)
+
+FLUSH_INTERVAL = 60.0
+SEGMENT_SUFFIX = ".seg"
+COLUMNS = ("ts", "avg", "min", "max", "count")
+AGGREGATES = ("avg", "min", "max")
+
+_MAGIC = b"CBXTS001"
+_LENGTH = struct.Struct(">I")
+# Keeps segment names unique between stores of one process
+_segment_seq = itertools.count()
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    step: int  # seconds per row; 0 keeps samples as they come
+    capacity: int  # rows per series in memory
+    retention: int  # seconds kept on disk
+    window: int  # seconds of data merged into one segment
+
+
+TIERS = (
+    Tier("1s", 0, 600, 86400, 3600),
+    Tier("1m", 60, 360, 30 * 86400, 86400),
+    Tier("1h", 3600, 168, 730 * 86400, 30 * 86400),
+)
+_TIER_BY_NAME = {tier.name: tier for tier in TIERS}
+
+Row = Tuple[float, float, float, float, float]
+
+
+def default_root() -> Path:
+    return Path(os.getenv("CLONEBOX_METRICS_DIR", str(Path.home() / ".local/share/clonebox/metrics")))
+
+
+def series_key(kind: str, name: str, metric: str) -> str:
+    return f"{kind}/{name}/{metric}"
+
+
+def _combine(rows: Dict[float, Row], row: Row) -> None:
+    """Add *row* to *rows*, merging it with a row of the same timestamp."""
+    other = rows.get(row[0])
+    if other is None:
+        rows[row[0]] = row
+        return
+    count = other[4] + row[4]
+    avg = (other[1] * other[4] + row[1] * row[4]) / count
+    rows[row[0]] = (row[0], avg, min(other[2], row[2]), max(other[3], row[3]), count)
+
+
+class _Ring:
+    """Columns of rows, growing up to *capacity*, then oldest overwritten first."""
+
+    __slots__ = ("capacity", "columns", "head", "appended", "flushed")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.columns = [array("d") for _ in COLUMNS]
+        self.head = 0  # next write position once full
+        self.appended = 0  # rows ever appended
+        self.flushed = 0  # rows ever written to a segment
+
+    @property
+    def size(self) -> int:
+        return len(self.columns[0])
+
+    def append(self, row: Row) -> None:
+        if self.size < self.capacity:
+            for column, value in zip(self.columns, row):
+                column.append(value)
+        else:
+            for column, value in zip(self.columns, row):
+                column[self.head] = value
+            self.head = (self.head + 1) % self.capacity
+        self.appended += 1
+
+    def last(self, count: int) -> Iterator[Row]:
+        """The newest *count* rows (at most :attr:`size`), oldest first."""
+        size = self.size
+        end = self.head if size == self.capacity else size
+        for i in range(end - min(count, size), end):
+            yield tuple(column[i % size] for column in self.columns)
+
+    def rows(self) -> Iterator[Row]:
+        return self.last(self.size)
+
+    def pending(self) -> Iterator[Row]:
+        """Rows not yet written to a segment."""
+        return self.last(self.appended - self.flushed)
+
+    def unflushed(self) -> List[Row]:
+        rows = list(self.pending())
+        self.flushed = self.appended
+        return rows
+
+
+class _Bucket:
+    """Open downsampling bucket of one series in one tier."""
+
+    __slots__ = ("start", "total", "count", "low", "high")
+
+    def __init__(self, start: float):
+        self.start, self.total, self.count = start, 0.0, 0
+        self.low, self.high = float("inf"), float("-inf")
+
+    def add(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+
+    def row(self) -> Row:
+        return (self.start, self.total / self.count, self.low, self.high, float(self.count))
+
+
+def write_segment(path: Path, rows: Dict[str, List[Row]]) -> None:
+    """Write *rows* per series as one compressed, columnar segment."""
+    names = sorted(rows)
+    header = json.dumps(
+        {"series": names, "counts": [len(rows[n]) for n in names], "columns": len(COLUMNS)}
+    ).encode()
+    body = bytearray()
+    for name in names:
+        for i in range(len(COLUMNS)):
+            body += array("d", (row[i] for row in rows[name])).tobytes()
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(_MAGIC + _LENGTH.pack(len(header)) + header + zlib.compress(bytes(body), 6))
+    os.replace(tmp, path)
+
+
+def _read_header(src: BinaryIO, path: Path) -> Dict[str, Any]:
+    if src.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError(f"Not a metrics segment: {path}")
+    (length,) = _LENGTH.unpack(src.read(_LENGTH.size))
+    header = json.loads(src.read(length))
+    if header.get("columns") != len(COLUMNS):
+        raise ValueError(f"Unsupported metrics segment layout: {path}")
+    return header
+
+
+def read_segment_series(path: Path) -> List[str]:
+    """Series keys of a segment, from its header alone."""
+    with open(path, "rb") as src:
+        return _read_header(src, path)["series"]
+
+
+def read_segment(path: Path, wanted: Optional[str] = None) -> Dict[str, List[Row]]:
+    """Rows per series of a segment (only series *wanted*, if given)."""
+    with open(path, "rb") as src:
+        header = _read_header(src, path)
+        body = memoryview(zlib.decompress(src.read()))
+    width = len(COLUMNS)
+    result, pos = {}, 0
+    for name, count in zip(header["series"], header["counts"]):
+        size = 8 * count
+        if wanted is None or name == wanted:
+            columns = []
+            for i in range(width):
+                column = array("d")
+                column.frombytes(body[pos + i * size:pos + (i + 1) * size])
+                columns.append(column)
+            result[name] = list(zip(*columns))
+        pos += size * width
+    return result
+
+
+def _segment_range(path: Path) -> Tuple[float, float]:
+    start, end = path.name[:-len(SEGMENT_SUFFIX)].split("-")[:2]
+    return float(start), float(end)
+
+
+class MetricsStore:
+    """Append-only metrics history with 1 s / 1 min / 1 h tiers."""
+
+    def __init__(self, root: Optional[Path] = None, flush_interval: float = FLUSH_INTERVAL):
+        self.root = Path(root) if root else default_root()
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._rings: Dict[str, Dict[str, _Ring]] = {}
+        self._buckets: Dict[str, Dict[str, _Bucket]] = {}
+        self._last_flush: Optional[float] = None
+
+    @classmethod
+    def default(cls) -> "MetricsStore":
+        return cls(default_root())
+
+    # ── writing ─────────────────────────────────────────────────────────────
+
+    def record(self, kind: str, name: str, values: Dict[str, float], ts: Optional[float] = None) -> None:
+        """Append one sample of several metrics of *kind*/*name*."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for metric, value in values.items():
+                if value is None:
+                    continue
+                self._append(series_key(kind, name, metric), ts, float(value))
+            if self._last_flush is None:
+                self._last_flush = ts
+            elif ts - self._last_flush >= self.flush_interval:
+                self.flush(now=ts)
+
+    def _append(self, key: str, ts: float, value: float) -> None:
+        rings = self._rings.get(key)
+        if rings is None:
+            rings = self._rings[key] = {tier.name: _Ring(tier.capacity) for tier in TIERS}
+            self._buckets[key] = {}
+        rings[TIERS[0].name].append((ts, value, value, value, 1.0))
+        buckets = self._buckets[key]
+        for tier in TIERS[1:]:
+            start = ts - ts % tier.step
+            bucket = buckets.get(tier.name)
+            if bucket is not None and bucket.start != start:
+                rings[tier.name].append(bucket.row())
+                bucket = None
+            if bucket is None:
+                bucket = buckets[tier.name] = _Bucket(start)
+            bucket.add(value)
+
+    def flush(self, now: Optional[float] = None) -> None:
+        """Write rows appended since the last flush to new segments."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for tier in TIERS:
+                # One segment per window, so that closed windows merge cleanly
+                windows: Dict[float, Dict[str, List[Row]]] = {}
+                for key, rings in self._rings.items():
+                    for row in rings[tier.name].unflushed():
+                        windows.setdefault(row[0] - row[0] % tier.window, {}).setdefault(key, []).append(row)
+                if not windows:
+                    continue
+                directory = self.root / tier.name
+                directory.mkdir(parents=True, exist_ok=True)
+                for rows in windows.values():
+                    start = min(r[0][0] for r in rows.values())
+                    end = max(r[-1][0] for r in rows.values())
+                    name = (f"{start:.0f}-{end:.0f}-{os.getpid()}-{int(now * 1000)}"
+                            f"-{next(_segment_seq)}{SEGMENT_SUFFIX}")
+                    write_segment(directory / name, rows)
+            self._last_flush = now
+            self.compact(now)
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Merge closed segment windows and drop expired segments.
+
+        Several processes may share the store; a tier another one is
+        compacting is skipped.
+        """
+        now = time.time() if now is None else now
+        for tier in TIERS:
+            directory = self.root / tier.name
+            if not directory.is_dir():
+                continue
+            with _compacting(directory) as locked:
+                if not locked:
+                    continue
+                windows: Dict[float, List[Path]] = {}
+                for path in directory.glob(f"*{SEGMENT_SUFFIX}"):
+                    start, end = _segment_range(path)
+                    if end < now - tier.retention:
+                        path.unlink(missing_ok=True)
+                        continue
+                    window = start - start % tier.window
+                    if window + tier.window <= now:
+                        windows.setdefault(window, []).append(path)
+                for window, paths in windows.items():
+                    if len(paths) > 1:
+                        self._merge(directory, window, paths)
+
+    def _merge(self, directory: Path, window: float, paths: List[Path]) -> None:
+        merged: Dict[str, Dict[float, Row]] = {}
+        read: List[Path] = []
+        for path in paths:
+            with _ignore_bad_segment(path):
+                for key, rows in read_segment(path).items():
+                    by_ts = merged.setdefault(key, {})
+                    for row in rows:
+                        _combine(by_ts, row)
+                read.append(path)
+        if not merged:
+            return
+        rows = {key: [by_ts[t] for t in sorted(by_ts)] for key, by_ts in merged.items()}
+        start = min(r[0][0] for r in rows.values())
+        end = max(r[-1][0] for r in rows.values())
+        target = directory / f"{start:.0f}-{end:.0f}-merged{SEGMENT_SUFFIX}"
+        write_segment(target, rows)
+        # Segments that could not be read are left for a later attempt
+        for path in read:
+            if path != target:
+                path.unlink(missing_ok=True)
+        log.debug("metrics_segments_merged", directory=str(directory), window=window, count=len(read))
+
+    def close(self) -> None:
+        """Write open buckets as rows and flush everything to disk."""
+        with self._lock:
+            for key, buckets in self._buckets.items():
+                for tier_name, bucket in buckets.items():
+                    self._rings[key][tier_name].append(bucket.row())
+                buckets.clear()
+            self.flush()
+
+    # ── reading ─────────────────────────────────────────────────────────────
+
+    def series(self, kind: Optional[str] = None, name: Optional[str] = None) -> List[str]:
+        """Known series keys (in memory or on disk), optionally filtered."""
+        keys = set(self._rings)
+        for tier in TIERS:
+            for path in (self.root / tier.name).glob(f"*{SEGMENT_SUFFIX}"):
+                with _ignore_bad_segment(path):
+                    keys.update(read_segment_series(path))
+        prefix = "/".join(p for p in (kind, name) if p)
+        return sorted(k for k in keys if not prefix or k.startswith(prefix + "/"))
+
+    def pick_tier(self, start: float, now: Optional[float] = None) -> Tier:
+        """Finest tier that still holds data from *start*."""
+        age = (time.time() if now is None else now) - start
+        for tier in TIERS:
+            if age <= tier.retention:
+                return tier
+        return TIERS[-1]
+
+    def query(
+        self,
+        kind: str,
+        name: str,
+        metric: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        step: Optional[float] = None,
+        agg: str = "avg",
+        tier: Optional[str] = None,
+    ) -> List[Tuple[float, float]]:
+        """``(timestamp, value)`` points of a series between *start* and *end*.
+
+        *agg* picks the avg, min or max column of downsampled rows; with
+        *step*, points are re-bucketed (averaged, or min/max for those
+        aggregates) to that many seconds.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+        now = time.time()
+        end = now if end is None else end
+        start = end - 3600 if start is None else start
+        chosen = _TIER_BY_NAME[tier] if tier else self.pick_tier(start, now)
+        key = series_key(kind, name, metric)
+
+        rows: Dict[float, Row] = {}
+        directory = self.root / chosen.name
+        for path in sorted(directory.glob(f"*{SEGMENT_SUFFIX}")) if directory.is_dir() else []:
+            seg_start, seg_end = _segment_range(path)
+            if seg_end < start or seg_start > end:
+                continue
+            with _ignore_bad_segment(path):
+                for row in read_segment(path, key).get(key, []):
+                    _combine(rows, row)
+        with self._lock:
+            rings = self._rings.get(key)
+            if rings is not None:
+                # Flushed rows were read back from the segments above
+                for row in rings[chosen.name].pending():
+                    _combine(rows, row)
+                bucket = self._buckets[key].get(chosen.name)
+                if bucket is not None:
+                    _combine(rows, bucket.row())
+
+        column = COLUMNS.index(agg)
+        points = [(ts, rows[ts][column]) for ts in sorted(rows) if start <= ts <= end]
+        return _rebucket(points, step, agg) if step else points
+
+
+def _rebucket(points: Sequence[Tuple[float, float]], step: float, agg: str) -> List[Tuple[float, float]]:
+    buckets: Dict[float, List[float]] = {}
+    for ts, value in points:
+        buckets.setdefault(ts - ts % step, []).append(value)
+    combine = {"avg": lambda v: sum(v) / len(v), "min": min, "max": max}[agg]
+    return [(ts, combine(values)) for ts, values in sorted(buckets.items())]
+
+
+@contextlib.contextmanager
+def _compacting(directory: Path) -> Iterator[bool]:
+    """Hold the compaction lock of a tier directory; yields False if it is taken."""
+    with open(directory / ".compact.lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _ignore_bad_segment(path: Path) -> Iterator[None]:
+    """Skip (and log) a segment that cannot be read."""
+    try:
+        yield
+    except FileNotFoundError:
+        pass  # merged away by another process since it was listed
+    except (OSError, ValueError, zlib.error) as exc:
+        log.warning("metrics_segment_unreadable", path=str(path), error=str(exc))
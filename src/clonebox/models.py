@@ -22,6 +22,12 @@ class VMConfig:
     disk_size_gb: int = field(default_factory=lambda: int(os.getenv("VM_DISK_SIZE_GB", "20")))
     gui: bool = field(default_factory=lambda: os.getenv("VM_GUI", "true").lower() == "true")
     base_image: Optional[str] = field(default_factory=lambda: os.getenv("VM_BASE_IMAGE") or None)
+    golden_image: bool = field(
+        default_factory=lambda: os.getenv("VM_GOLDEN_IMAGE", "false").lower() == "true"
+    )  # Layer on a cached, pre-provisioned base image (see clonebox.image_cache)
+    memory_snapshot: bool = field(
+        default_factory=lambda: os.getenv("VM_MEMORY_SNAPSHOT", "false").lower() == "true"
+    )  # Save RAM + disk after first setup for `clonebox start --resume`
     paths: dict = field(default_factory=dict)
     packages: list = field(default_factory=list)
     snap_packages: list = field(default_factory=list)  # Snap packages to install
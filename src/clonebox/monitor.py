@@ -5,15 +5,16 @@ Real-time resource monitoring for CloneBox VMs and containers.
 
 import json
 import subprocess
-import time
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional
 
-try:
-    import libvirt
-except ImportError:
-    libvirt = None
+import structlog
+
+from clonebox import paths as _paths
+from clonebox.domain_stats import DomainSample, DomainStatsCollector
+from clonebox.metrics_store import MetricsStore
+
+log = structlog.get_logger(__name__)
 
 
 @dataclass
@@ -47,117 +48,96 @@ class ContainerStats:
 
 
 class ResourceMonitor:
-    """Monitor VM and container resources in real-time."""
-
-    def __init__(self, conn_uri: str = "qemu:///session"):
-        self.conn_uri = conn_uri
-        self._conn = None
-        self._prev_cpu: Dict[str, tuple] = {}
+    """Monitor VM and container resources in real-time.
+
+    VM counters come from one bulk libvirt stats call per sample (see
+    :class:`clonebox.domain_stats.DomainStatsCollector`).  With a *store*,
+    every sample is also recorded in the metrics history.
+    """
+
+    def __init__(
+        self,
+        conn_uri: Optional[str] = None,
+        user_session: bool = True,
+        store: Optional[MetricsStore] = None,
+    ):
+        self.conn_uri = conn_uri or _paths.conn_uri(user_session)
+        self.collector = DomainStatsCollector(self.conn_uri)
+        self.store = store
 
     @property
     def conn(self):
-        if self._conn is None:
-            if libvirt is None:
-                raise RuntimeError("libvirt-python not installed")
-            self._conn = libvirt.open(self.conn_uri)
-        return self._conn
+        return self.collector.conn
+
+    def _to_vm_stats(self, sample: DomainSample) -> VMStats:
+        memory_total_mb = sample.memory_max_kb // 1024
+        memory_used_mb = sample.memory_used_kb // 1024 if sample.memory_current_kb else memory_total_mb
+        return VMStats(
+            name=sample.name,
+            state=sample.state,
+            cpu_percent=sample.cpu_percent,
+            memory_used_mb=memory_used_mb,
+            memory_total_mb=memory_total_mb,
+            disk_used_gb=sample.block_total("allocation") / (1024**3),
+            disk_total_gb=sample.block_total("capacity") / (1024**3),
+            network_rx_bytes=sample.net_total("rx_bytes"),
+            network_tx_bytes=sample.net_total("tx_bytes"),
+            uptime_seconds=0,  # Would need guest agent for accurate uptime
+        )
+
+    def _record(self, kind: str, stats: Any) -> None:
+        if self.store is None:
+            return
+        values = {k: v for k, v in asdict(stats).items() if isinstance(v, (int, float))}
+        try:
+            self.store.record(kind, stats.name, values)
+        except (OSError, ValueError) as exc:
+            # History is best effort; never take the live view down with it
+            log.warning("metrics_record_failed", kind=kind, name=stats.name, error=str(exc))
 
     def get_vm_stats(self, vm_name: str) -> Optional[VMStats]:
         """Get resource statistics for a VM."""
         try:
-            dom = self.conn.lookupByName(vm_name)
-            info = dom.info()
-
-            state_map = {
-                libvirt.VIR_DOMAIN_RUNNING: "running",
-                libvirt.VIR_DOMAIN_PAUSED: "paused",
-                libvirt.VIR_DOMAIN_SHUTDOWN: "shutdown",
-                libvirt.VIR_DOMAIN_SHUTOFF: "shutoff",
-                libvirt.VIR_DOMAIN_CRASHED: "crashed",
-            }
-            state = state_map.get(info[0], "unknown")
-
-            # Memory
-            memory_total_mb = info[1] // 1024
-            memory_used_mb = info[2] // 1024 if info[2] > 0 else memory_total_mb
-
-            # CPU percentage (requires two samples)
-            cpu_time = info[4]
-            now = time.time()
-            cpu_percent = 0.0
-
-            if vm_name in self._prev_cpu:
-                prev_time, prev_cpu = self._prev_cpu[vm_name]
-                time_delta = now - prev_time
-                if time_delta > 0:
-                    cpu_delta = cpu_time - prev_cpu
-                    # CPU time is in nanoseconds
-                    cpu_percent = (cpu_delta / (time_delta * 1e9)) * 100
-                    cpu_percent = min(cpu_percent, 100.0 * info[3])  # Cap at vcpus * 100%
-
-            self._prev_cpu[vm_name] = (now, cpu_time)
-
-            # Disk stats (from block devices)
-            disk_used_gb = 0.0
-            disk_total_gb = 0.0
-            try:
-                xml = dom.XMLDesc()
-                import xml.etree.ElementTree as ET
-
-                root = ET.fromstring(xml)
-                for disk in root.findall(".//disk[@type='file']"):
-                    source = disk.find(".//source")
-                    if source is not None and source.get("file"):
-                        disk_path = Path(source.get("file"))
-                        if disk_path.exists():
-                            size_bytes = disk_path.stat().st_size
-                            disk_total_gb += size_bytes / (1024**3)
-                            # Actual usage requires qemu-img info
-                            disk_used_gb += size_bytes / (1024**3)
-            except Exception:
-                pass
-
-            # Network stats
-            network_rx = 0
-            network_tx = 0
-            try:
-                for iface in dom.interfaceAddresses(
-                    libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_AGENT
-                ).keys():
-                    stats = dom.interfaceStats(iface)
-                    network_rx += stats[0]
-                    network_tx += stats[4]
-            except Exception:
-                pass
-
-            return VMStats(
-                name=vm_name,
-                state=state,
-                cpu_percent=cpu_percent,
-                memory_used_mb=memory_used_mb,
-                memory_total_mb=memory_total_mb,
-                disk_used_gb=disk_used_gb,
-                disk_total_gb=disk_total_gb,
-                network_rx_bytes=network_rx,
-                network_tx_bytes=network_tx,
-                uptime_seconds=0,  # Would need guest agent for accurate uptime
-            )
-
+            sample = self.collector.sample(vm_name)
         except Exception:
             return None
+        if not sample:
+            return None
+        stats = self._to_vm_stats(sample)
+        self._record("vm", stats)
+        return stats
 
     def get_all_vm_stats(self) -> List[VMStats]:
         """Get stats for all VMs."""
-        stats = []
         try:
-            for dom in self.conn.listAllDomains():
-                vm_stats = self.get_vm_stats(dom.name())
-                if vm_stats:
-                    stats.append(vm_stats)
+            samples = self.collector.collect()
         except Exception:
-            pass
+            return []
+        return self.record_vms(samples.values())
+
+    def record_vms(self, samples: Iterable[DomainSample]) -> List[VMStats]:
+        """Stats of already collected *samples*, recorded in the store."""
+        stats = [self._to_vm_stats(sample) for sample in samples]
+        for vm in stats:
+            self._record("vm", vm)
         return stats
 
+    def get_stats(self, vm_name: str) -> Optional[Dict[str, Any]]:
+        """Current usage of a VM in bytes, for the live monitor tables."""
+        stats = self.get_vm_stats(vm_name)
+        if stats is None:
+            return None
+        return {
+            "state": stats.state,
+            "cpu_percent": round(stats.cpu_percent, 1),
+            "memory_used": stats.memory_used_mb * 1024 * 1024,
+            "memory_total": stats.memory_total_mb * 1024 * 1024,
+            "disk_used": int(stats.disk_used_gb * 1024**3),
+            "disk_total": int(stats.disk_total_gb * 1024**3),
+            "network_rx": stats.network_rx_bytes,
+            "network_tx": stats.network_tx_bytes,
+        }
+
     def get_container_stats(self, engine: str = "auto") -> List[ContainerStats]:
         """Get resource statistics for containers."""
         if engine == "auto":
@@ -209,6 +189,8 @@ class ResourceMonitor:
                     )
                 )
 
+            for container in stats:
+                self._record("container", container)
             return stats
 
         except Exception:
@@ -253,9 +235,9 @@ class ResourceMonitor:
             return 0
 
     def close(self) -> None:
-        if self._conn is not None:
-            self._conn.close()
-            self._conn = None
+        self.collector.close()
+        if self.store is not None:
+            self.store.close()
 
 
 def format_bytes(num_bytes: int) -> str:
@@ -0,0 +1,192 @@
+"""
+OpenMetrics text exposition of CloneBox state.
+
+:func:`render` writes metric families in the OpenMetrics 1.0 text format
+(``application/openmetrics-text``) that Prometheus negotiates when
+scraping.  :func:`snapshot_families` maps a :class:`clonebox.sampler.Snapshot`
+to families: VM counters, container stats, health-probe results and the
+state of compose-managed VMs.  Nothing here talks to libvirt or runs
+probes; a scrape only formats what the sampler last collected.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+from clonebox.domain_stats import STATE_NAMES
+from clonebox.health.models import HealthStatus
+
+if TYPE_CHECKING:
+    from clonebox.sampler import Snapshot
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Labels = Dict[str, str]
+
+VM_STATES = tuple(STATE_NAMES.values())
+COMPOSE_STATES = VM_STATES + ("not_found",)
+HEALTH_STATES = tuple(status.value for status in HealthStatus)
+
+
+@dataclass
+class MetricFamily:
+    """One metric family: name, type, help, unit and its samples."""
+
+    name: str
+    type: str  # counter, gauge, stateset or info
+    help: str
+    unit: str = ""
+    samples: List[Tuple[str, Labels, float]] = field(default_factory=list)
+
+    def add(self, value: float, suffix: str = "", **labels: str) -> None:
+        self.samples.append((suffix, labels, value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(families: Iterable[MetricFamily]) -> str:
+    """OpenMetrics text for *families*, ``# EOF`` terminated."""
+    lines = []
+    for family in families:
+        lines.append(f"# TYPE {family.name} {family.type}")
+        if family.unit:
+            lines.append(f"# UNIT {family.name} {family.unit}")
+        lines.append(f"# HELP {family.name} {_escape(family.help)}")
+        for suffix, labels, value in family.samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            name = family.name + suffix
+            lines.append(f"{name}{{{label_text}}} {_value(value)}" if label_text else f"{name} {_value(value)}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _stateset(family: MetricFamily, states: Sequence[str], current: str, **labels: str) -> None:
+    for state in states:
+        family.add(state == current, **labels, **{family.name: state})
+
+
+def _vm_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    state = MetricFamily("clonebox_vm_state", "stateset", "libvirt state of the VM")
+    cpu = MetricFamily("clonebox_vm_cpu_seconds", "counter", "CPU time used by the VM", "seconds")
+    vcpus = MetricFamily("clonebox_vm_vcpus", "gauge", "Online vCPUs")
+    mem_max = MetricFamily("clonebox_vm_memory_max_bytes", "gauge", "Memory assigned to the VM", "bytes")
+    mem_used = MetricFamily("clonebox_vm_memory_used_bytes", "gauge",
+                            "Memory used by the guest (balloon current - unused)", "bytes")
+    mem_rss = MetricFamily("clonebox_vm_memory_rss_bytes", "gauge", "Resident size of the QEMU process", "bytes")
+    rd = MetricFamily("clonebox_vm_disk_read_bytes", "counter", "Bytes read from VM disks", "bytes")
+    wr = MetricFamily("clonebox_vm_disk_written_bytes", "counter", "Bytes written to VM disks", "bytes")
+    alloc = MetricFamily("clonebox_vm_disk_allocation_bytes", "gauge", "Host space allocated to VM disks", "bytes")
+    cap = MetricFamily("clonebox_vm_disk_capacity_bytes", "gauge", "Virtual size of VM disks", "bytes")
+    rx = MetricFamily("clonebox_vm_network_receive_bytes", "counter", "Bytes received by the VM", "bytes")
+    tx = MetricFamily("clonebox_vm_network_transmit_bytes", "counter", "Bytes sent by the VM", "bytes")
+
+    for name in sorted(snapshot.vms):
+        sample = snapshot.vms[name]
+        _stateset(state, VM_STATES, sample.state, vm=name)
+        cpu.add(sample.cpu_time_ns / 1e9, "_total", vm=name)
+        vcpus.add(sample.vcpus, vm=name)
+        mem_max.add(sample.memory_max_kb * 1024, vm=name)
+        mem_used.add(sample.memory_used_kb * 1024, vm=name)
+        mem_rss.add(sample.memory_rss_kb * 1024, vm=name)
+        rd.add(sample.block_total("rd_bytes"), "_total", vm=name)
+        wr.add(sample.block_total("wr_bytes"), "_total", vm=name)
+        alloc.add(sample.block_total("allocation"), vm=name)
+        cap.add(sample.block_total("capacity"), vm=name)
+        rx.add(sample.net_total("rx_bytes"), "_total", vm=name)
+        tx.add(sample.net_total("tx_bytes"), "_total", vm=name)
+    return [state, cpu, vcpus, mem_max, mem_used, mem_rss, rd, wr, alloc, cap, rx, tx]
+
+
+def _container_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    cpu = MetricFamily("clonebox_container_cpu_percent", "gauge", "CPU use of the container, 100 per core")
+    mem = MetricFamily("clonebox_container_memory_used_bytes", "gauge", "Memory used by the container", "bytes")
+    limit = MetricFamily("clonebox_container_memory_limit_bytes", "gauge", "Memory limit of the container", "bytes")
+    rx = MetricFamily("clonebox_container_network_receive_bytes", "counter", "Bytes received", "bytes")
+    tx = MetricFamily("clonebox_container_network_transmit_bytes", "counter", "Bytes sent", "bytes")
+    pids = MetricFamily("clonebox_container_pids", "gauge", "Processes in the container")
+
+    for stats in sorted(snapshot.containers, key=lambda c: c.name):
+        cpu.add(stats.cpu_percent, container=stats.name)
+        mem.add(stats.memory_used_mb * 1024 * 1024, container=stats.name)
+        limit.add(stats.memory_limit_mb * 1024 * 1024, container=stats.name)
+        rx.add(stats.network_rx_bytes, "_total", container=stats.name)
+        tx.add(stats.network_tx_bytes, "_total", container=stats.name)
+        pids.add(stats.pids, container=stats.name)
+    return [cpu, mem, limit, rx, tx, pids]
+
+
+def _health_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    status = MetricFamily("clonebox_health_status", "stateset", "Overall health of the VM")
+    checks = MetricFamily("clonebox_health_checks", "counter", "Health check rounds run")
+    failures = MetricFamily("clonebox_health_failures", "counter", "Health check rounds that were not healthy")
+    consecutive = MetricFamily("clonebox_health_consecutive_failures", "gauge",
+                               "Unhealthy rounds since the last healthy one")
+    last = MetricFamily("clonebox_health_last_check_timestamp_seconds", "gauge",
+                        "When the VM was last checked", "seconds")
+    probe_status = MetricFamily("clonebox_probe_status", "stateset", "Result of the probe's last run")
+    probe_duration = MetricFamily("clonebox_probe_duration_seconds", "gauge",
+                                  "Latency of the probe's last run", "seconds")
+
+    for name in sorted(snapshot.health):
+        state = snapshot.health[name]
+        _stateset(status, HEALTH_STATES, state.overall_status.value, vm=name)
+        checks.add(state.total_checks, "_total", vm=name)
+        failures.add(state.total_failures, "_total", vm=name)
+        consecutive.add(state.consecutive_failures, vm=name)
+        last.add(state.last_check.timestamp(), vm=name)
+        for result in state.check_results:
+            _stateset(probe_status, HEALTH_STATES, result.status.value, vm=name, probe=result.probe_name)
+            probe_duration.add(result.duration_ms / 1000, vm=name, probe=result.probe_name)
+    return [status, checks, failures, consecutive, last, probe_status, probe_duration]
+
+
+def _compose_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    state = MetricFamily("clonebox_compose_vm_state", "stateset", "libvirt state of a compose-managed VM")
+    info = MetricFamily("clonebox_compose_vm", "info", "Compose-managed VM and its start group")
+    for project in sorted(snapshot.compose):
+        for vm in snapshot.compose[project]:
+            _stateset(state, COMPOSE_STATES, vm["state"], project=project, vm=vm["name"])
+            info.add(1, "_info", project=project, vm=vm["name"], start_group=str(vm["start_group"]),
+                     depends_on=",".join(vm["depends_on"]))
+    return [state, info]
+
+
+def _sampler_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    last = MetricFamily("clonebox_sampler_last_success_timestamp_seconds", "gauge",
+                        "When the source was last sampled successfully", "seconds")
+    duration = MetricFamily("clonebox_sampler_duration_seconds", "gauge",
+                            "How long the last sampling of the source took", "seconds")
+    errors = MetricFamily("clonebox_sampler_errors", "counter", "Failed samplings of the source")
+    for source in sorted(snapshot.sources):
+        status = snapshot.sources[source]
+        if status.last_success is not None:
+            last.add(status.last_success, source=source)
+        duration.add(status.duration, source=source)
+        errors.add(status.errors, "_total", source=source)
+    return [last, duration, errors]
+
+
+def snapshot_families(snapshot: "Snapshot") -> List[MetricFamily]:
+    """All CloneBox metric families for one sampler snapshot."""
+    return (
+        _vm_families(snapshot)
+        + _container_families(snapshot)
+        + _health_families(snapshot)
+        + _compose_families(snapshot)
+        + _sampler_families(snapshot)
+    )
+
@@ -13,6 +13,7 @@ import time
 import yaml
 
 from clonebox import paths as _paths
+from clonebox.qga import get_qga_executor
 
 
 class VMOrchestrationState(Enum):
@@ -307,17 +308,15 @@ class Orchestrator:
             elif check_timeout.endswith("m"):
                 timeout = int(check_timeout[:-1]) * 60
 
-        conn_uri = _paths.conn_uri(self.user_session)
+        qga = get_qga_executor(_paths.conn_uri(self.user_session))
         start = time.time()
 
         while time.time() - start < timeout:
             try:
-                from clonebox.cli import _qga_exec
-
                 if check_type == "tcp":
                     port = vm.health_check.get("port", 22)
-                    result = _qga_exec(
-                        vm_name, conn_uri,
+                    result = qga.exec_output(
+                        vm_name,
                         f"timeout 5 bash -c 'echo > /dev/tcp/localhost/{port}' 2>/dev/null && echo OK || echo FAIL",
                         timeout=10
                     )
@@ -326,8 +325,8 @@ class Orchestrator:
 
                 elif check_type == "http":
                     url = vm.health_check.get("url", "http://localhost/health")
-                    result = _qga_exec(
-                        vm_name, conn_uri,
+                    result = qga.exec_output(
+                        vm_name,
                         f"curl -s -o /dev/null -w '%{{http_code}}' '{url}' 2>/dev/null",
                         timeout=10
                     )
@@ -342,7 +341,7 @@ class Orchestrator:
                 elif check_type == "command":
                     cmd = vm.health_check.get("exec", "true")
                     expected_output = vm.health_check.get("expected_output")
-                    result = _qga_exec(vm_name, conn_uri, cmd, timeout=10)
+                    result = qga.exec_output(vm_name, cmd, timeout=10)
                     if result is not None:
                         if expected_output:
                             if expected_output in result:
@@ -535,9 +534,8 @@ class Orchestrator:
         conn_uri = _paths.conn_uri(self.user_session)
 
         try:
-            from clonebox.cli import _qga_exec
             cmd = f"journalctl -n {lines}" if not follow else "journalctl -f"
-            return _qga_exec(vm_name, conn_uri, cmd, timeout=30)
+            return get_qga_executor(conn_uri).exec_output(vm_name, cmd, timeout=30)
         except Exception:
             return None
 
@@ -549,8 +547,7 @@ class Orchestrator:
         conn_uri = _paths.conn_uri(self.user_session)
 
         try:
-            from clonebox.cli import _qga_exec
-            return _qga_exec(vm_name, conn_uri, command, timeout=timeout)
+            return get_qga_executor(conn_uri).exec_output(vm_name, command, timeout=timeout)
         except Exception:
             return None
 
@@ -1,29 +1,123 @@
 #!/usr/bin/env python3
 """
 P2P Manager - Transfer VMs between workstations via SSH/SCP.
+
+VM transfers use the chunk protocol of :mod:`clonebox.chunk_transfer`:
+content-addressed chunks, verified on arrival, streamed by the peer as it
+cuts them on a pull and split over parallel SSH streams on a push.
 """
 
+import os
+import secrets
+import shlex
+import shutil
 import subprocess
+import tarfile
 import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+from clonebox.chunk_store import ChunkStore
+from clonebox.chunk_transfer import (
+    DEFAULT_STREAMS,
+    TransferManifest,
+    assemble_archive,
+    open_private,
+    push_chunks,
+    read_index_archive,
+    split_archive,
+)
+from clonebox.crypto_stream import DecryptingReader, EncryptingWriter
+from clonebox.exporter import SecureExporter
+from clonebox.importer import SecureImporter
+from clonebox.replication import Replicator
 
 
 class P2PManager:
     """Manage P2P VM transfers between workstations."""
 
-    def __init__(self, ssh_options: Optional[list] = None):
+    def __init__(
+        self,
+        ssh_options: Optional[list] = None,
+        streams: int = DEFAULT_STREAMS,
+        chunk_store: Optional[ChunkStore] = None,
+        user_session: bool = False,
+    ):
         self.ssh_options = ssh_options or [
             "-o",
             "StrictHostKeyChecking=no",
             "-o",
             "UserKnownHostsFile=/dev/null",
         ]
+        self.streams = streams
+        # Session of the VMs on both sides
+        self.user_session = user_session
+        self.chunk_store = chunk_store or ChunkStore.default(user_session)
+
+    def _ssh_argv(self, host: str, command: str) -> List[str]:
+        return ["ssh"] + self.ssh_options + [host, command]
+
+    def _clonebox(self, command: str) -> str:
+        return f"{command} -u" if self.user_session else command
+
+    def _remote_cmd(self, host: str, chunk_store: Optional[str] = None) -> Callable[[str], List[str]]:
+        """argv builder for clonebox commands on *host*, optionally against *chunk_store*."""
+        env = f"CLONEBOX_CHUNK_STORE={chunk_store} " if chunk_store else ""
+        return lambda command: self._ssh_argv(host, env + self._clonebox(command))
+
+    @staticmethod
+    def _peer_transfer_store() -> str:
+        """Peer-side chunk store (a shell word) for the chunks of one import."""
+        return f'"$HOME/.cache/clonebox/transfers/{secrets.token_hex(8)}"'
 
     def _run_ssh(self, host: str, command: str) -> subprocess.CompletedProcess:
         """Execute command on remote host via SSH."""
-        cmd = ["ssh"] + self.ssh_options + [host, command]
-        return subprocess.run(cmd, capture_output=True, text=True)
+        return subprocess.run(self._ssh_argv(host, command), capture_output=True, text=True)
+
+    def _run_from(self, argv: List[str], src: BinaryIO) -> subprocess.CompletedProcess:
+        """Run *argv* with *src* (a file or a decrypting reader) as its stdin."""
+        if not isinstance(src, DecryptingReader):
+            return subprocess.run(argv, stdin=src, capture_output=True, text=True)
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+            try:
+                with proc.stdin:
+                    shutil.copyfileobj(src, proc.stdin)
+            except BrokenPipeError:
+                pass  # the remote side gave up; its exit status says why
+            returncode = proc.wait()
+            err.seek(0)
+            return subprocess.CompletedProcess(argv, returncode, stderr=err.read().decode(errors="replace"))
+
+    def _pull_export(self, argv: List[str], store: ChunkStore, out: BinaryIO) -> List[str]:
+        """Run the streaming export *argv*: chunks into *store*, the rest to *out*.
+
+        The peer is told which chunks *store* already has and leaves them
+        out.  Returns the chunks the index archive references.
+        """
+        known = "".join(f"{d}\n" for d in store.digests()).encode()
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=err)
+            try:
+                # The peer reads the whole list before it starts exporting
+                with proc.stdin:
+                    proc.stdin.write(known)
+                chunks = split_archive(proc.stdout, store, out)
+            except (BrokenPipeError, tarfile.TarError):
+                chunks = None  # the peer gave up or was cut off; its exit status says why
+            except BaseException:
+                proc.kill()
+                raise
+            finally:
+                proc.stdout.close()
+                returncode = proc.wait()
+            if returncode != 0 or chunks is None:
+                err.seek(0)
+                message = err.read().decode(errors="replace").strip()
+                raise RuntimeError(
+                    f"Remote export failed: {message or 'incomplete stream'}; re-run to resume"
+                )
+        return chunks
 
     def _run_scp(
         self,
@@ -49,42 +143,62 @@ class P2PManager:
     ) -> Path:
         """Export VM from remote host to local file.
 
+        The remote host cuts the VM's disks into chunks and streams each one
+        the local store lacks as soon as it is cut, then the chunk indexes;
+        nothing is written on the peer.  Chunks are verified and committed
+        as they arrive, so a re-run after a dropped connection only moves
+        the chunks still missing.  The result is a self-contained chunked
+        archive.  Encrypted exports keep the index (and its user data)
+        encrypted on disk and receive chunks into a private store removed
+        afterwards.
+
         Args:
             host: Remote host in format user@hostname
             vm_name: Name of VM to export
             output: Local output path
-            encrypted: Use encrypted export
+            encrypted: Encrypt the local archive with the team key
             include_user_data: Include user data
             include_app_data: Include app data
         """
-        remote_tmp = f"/tmp/clonebox-{vm_name}.tar.gz"
+        key = None
         if encrypted:
-            remote_tmp = f"/tmp/clonebox-{vm_name}.enc"
+            key = SecureExporter.load_key()
+            if key is None:
+                raise FileNotFoundError(f"No encryption key found at {SecureExporter.KEY_PATH}")
 
-        # Build export command
-        export_cmd = f"clonebox export {vm_name} -o {remote_tmp}"
-        if encrypted:
-            export_cmd = f"clonebox export-encrypted {vm_name} -o {remote_tmp}"
+        manifest = TransferManifest(output, key)
+        store = manifest.chunk_store(self.chunk_store)
+        export_cmd = f"clonebox export {shlex.quote(vm_name)} - --chunk-stream"
         if include_user_data:
-            export_cmd += " --user"
+            export_cmd += " --include-user-data"
         if include_app_data:
-            export_cmd += " --include-data"
-
-        print(f"📤 Exporting {vm_name} from {host}...")
-
-        # Execute remote export
-        result = self._run_ssh(host, export_cmd)
-        if result.returncode != 0:
-            raise RuntimeError(f"Remote export failed: {result.stderr}")
-
-        # Download file
-        print(f"⬇️  Downloading to {output}...")
-        result = self._run_scp(f"{host}:{remote_tmp}", str(output))
-        if result.returncode != 0:
-            raise RuntimeError(f"SCP download failed: {result.stderr}")
-
-        # Cleanup remote temp file
-        self._run_ssh(host, f"rm -f {remote_tmp}")
+            export_cmd += " --include-app-data"
+
+        print(f"📤 Streaming {vm_name} from {host}...")
+        try:
+            with manifest.write_index() as out:
+                chunks = self._pull_export(self._remote_cmd(host)(export_cmd), store, out)
+        except BaseException:
+            manifest.index_path.unlink(missing_ok=True)  # received chunks stay for the re-run
+            raise
+        missing = [d for d in chunks if not store.has(d)]
+        if missing:
+            manifest.index_path.unlink(missing_ok=True)
+            raise RuntimeError(f"{len(missing)} chunks of {vm_name} did not arrive; re-run to resume")
+
+        # Every chunk is re-verified as it is written into the archive
+        tmp = output.with_name(f".{output.name}.partial")
+        try:
+            with open_private(tmp) as out, manifest.read_index() as index:
+                if key is None:
+                    assemble_archive(index, store, chunks, out)
+                else:
+                    with EncryptingWriter(out, key) as writer:
+                        assemble_archive(index, store, chunks, writer)
+            os.replace(tmp, output)
+        finally:
+            tmp.unlink(missing_ok=True)
+        manifest.clear()
 
         print(f"✅ Downloaded: {output}")
         return output
@@ -99,45 +213,101 @@ class P2PManager:
     ) -> str:
         """Upload and import VM on remote host.
 
+        The archive is split into a chunk index and chunks locally (once;
+        a re-run reuses the split).  The chunks are pushed in parallel into a
+        chunk store of this transfer on the peer, the index is streamed into
+        ``clonebox import -`` there, and the transfer store is removed
+        whether or not the import succeeded.  An encrypted archive is
+        decrypted only in memory and into a private chunk store removed
+        afterwards; its index stays encrypted on disk.
+
         Args:
             host: Remote host in format user@hostname
             archive_path: Local archive to upload
-            encrypted: Use decrypted import
+            encrypted: Archive is encrypted with the team key
             import_user_data: Import user data
             new_name: New name for VM on remote
         """
-        remote_tmp = f"/tmp/{archive_path.name}"
-
-        print(f"⬆️  Uploading {archive_path} to {host}...")
-
-        # Upload file
-        result = self._run_scp(str(archive_path), f"{host}:{remote_tmp}")
-        if result.returncode != 0:
-            raise RuntimeError(f"SCP upload failed: {result.stderr}")
-
-        # Build import command
+        key = None
         if encrypted:
-            import_cmd = f"clonebox import-encrypted {remote_tmp}"
-        else:
-            import_cmd = f"clonebox import {remote_tmp}"
-
+            key = SecureImporter.load_key()
+            if key is None:
+                raise FileNotFoundError(f"No decryption key found at {SecureImporter.KEY_PATH}")
+
+        manifest = TransferManifest(archive_path, key)
+        st = archive_path.stat()
+        identity = {"archive": str(archive_path.resolve()), "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns, "encrypted": encrypted}
+        store = manifest.chunk_store(self.chunk_store)
+        chunks = manifest.load(**identity)
+        if chunks is None:
+            print(f"📦 Chunking {archive_path}...")
+            with open(archive_path, "rb") as src, manifest.write_index() as out:
+                stream = src if key is None else DecryptingReader(src, key)
+                chunks = split_archive(stream, store, out)
+            manifest.save(chunks, **identity)
+
+        import_cmd = "clonebox import -"
         if import_user_data:
-            import_cmd += " --user"
+            import_cmd += " --include-user-data"
         if new_name:
-            import_cmd += f" --name {new_name}"
-
-        print(f"📥 Importing on {host}...")
-
-        # Execute remote import
-        result = self._run_ssh(host, import_cmd)
+            import_cmd += f" --name {shlex.quote(new_name)}"
+
+        peer_store = self._peer_transfer_store()
+        remote_cmd = self._remote_cmd(host, peer_store)
+        try:
+            print(f"⬆️  Uploading {len(chunks)} chunks to {host} ({self.streams} streams)...")
+            push_chunks(remote_cmd, chunks, store, self.streams)
+
+            print(f"📥 Importing on {host}...")
+            with manifest.read_index() as src:
+                result = self._run_from(remote_cmd(import_cmd), src)
+        finally:
+            self._run_ssh(host, f"rm -rf {peer_store}")
         if result.returncode != 0:
             raise RuntimeError(f"Remote import failed: {result.stderr}")
 
-        # Cleanup remote temp file
-        self._run_ssh(host, f"rm -f {remote_tmp}")
-
+        if not new_name:
+            with manifest.read_index() as src:
+                new_name = read_index_archive(src)[0]
+        vm_name = new_name or archive_path.stem
+        manifest.clear()
         print(f"✅ Import complete on {host}")
-        return new_name or archive_path.stem
+        return vm_name
+
+    def replicate(
+        self,
+        host: str,
+        vm_name: str,
+        conn_uri: str = "qemu:///system",
+        full: bool = False,
+    ) -> Dict[str, int]:
+        """Update the standby replica of a local VM on a remote host.
+
+        Only the clusters written since the last sync to *host* are sent
+        (tracked with libvirt checkpoints); the first sync, or *full*,
+        sends every allocated cluster.  The replica disks live under
+        ``replicas/<vm>/`` in the remote images directory.
+
+        Args:
+            host: Remote host in format user@hostname
+            vm_name: Name of the local VM
+            conn_uri: libvirt URI of the local VM
+            full: Resend all allocated data instead of the changes
+
+        Returns:
+            Data bytes sent per disk
+        """
+        replicator = Replicator(conn_uri)
+        try:
+            print(f"🔁 Replicating {vm_name} to {host}...")
+            shipped = replicator.replicate(vm_name, host, self._remote_cmd(host), full=full)
+        finally:
+            replicator.close()
+        for disk, size in shipped.items():
+            print(f"   💾 {disk}: {size / 1024 / 1024:.1f} MiB of changes sent")
+        print(f"✅ Replica of {vm_name} on {host} is up to date")
+        return shipped
 
     def sync_key(self, host: str) -> bool:
         """Sync encryption key to remote host.
@@ -7,6 +7,7 @@ paths inline.
 """
 
 import os
+import re
 import zlib
 from pathlib import Path
 from typing import Optional
@@ -16,6 +17,16 @@ import structlog
 log = structlog.get_logger(__name__)
 
 
+# ── names used as path components ────────────────────────────────────────────
+
+_SAFE_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]*")
+
+
+def is_safe_name(name: str) -> bool:
+    """Whether *name* (a VM, disk or snapshot name) is one plain path component."""
+    return bool(_SAFE_NAME.fullmatch(name))
+
+
 # ── libvirt connection URI ───────────────────────────────────────────────────
 
 def conn_uri(user_session: bool = True) -> str:
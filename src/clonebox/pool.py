@@ -0,0 +1,378 @@
+"""
+Pre-warmed VM pool for CloneBox.
+
+Short-lived VMs created over and over from the same ``.clonebox.yaml``
+(CI jobs, onboarding) each pay a full boot plus cloud-init.  A pool keeps
+up to N VMs per config hash fully provisioned and saved to disk
+(``virDomainSave``: no RAM held while idle).  Claiming one renames the
+domain and its files to the requested name, restores the saved memory
+state and fixes up the guest hostname, which takes seconds.
+
+An explicit save file is used rather than ``managedSave`` because libvirt
+refuses to rename a domain that has a managed save image.
+
+Pool membership lives in ``<images>/pool/index.json`` (guarded by
+``flock``).  :meth:`VMPool.refill` tops pools back up, one VM at a time,
+and only while the host keeps a RAM reserve free for the builder VM.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import structlog
+
+from clonebox import paths as _paths
+from clonebox.models import VMConfig
+from clonebox.qga import get_qga_executor
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+log = structlog.get_logger(__name__)
+
+SAVE_FILE = "pool.save"
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+NAME_PREFIX = "clonebox-pool-"
+
+# Host RAM (MiB) that must stay available after booting a pool VM.
+RAM_RESERVE_MB = int(os.getenv("CLONEBOX_POOL_RAM_RESERVE_MB", "2048"))
+
+# A "warming" entry older than this belongs to a refiller that died.
+WARM_TIMEOUT = 3600
+
+# Keys of a .clonebox.yaml that do not change what gets provisioned.
+_VOLATILE_KEYS = ("generated",)
+
+
+def pool_key(config: Dict[str, Any], user_session: bool) -> str:
+    """Hash of a ``.clonebox.yaml`` dict, ignoring the VM name and timestamps."""
+    config = {k: v for k, v in config.items() if k not in _VOLATILE_KEYS}
+    config["vm"] = {k: v for k, v in (config.get("vm") or {}).items() if k != "name"}
+    config["_user_session"] = bool(user_session)
+    blob = json.dumps(config, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def host_available_mb() -> Optional[int]:
+    """``MemAvailable`` from ``/proc/meminfo`` in MiB (``None`` if unknown)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def retarget_domain_xml(xml: str, old: str, new: str, images_dir: Path) -> str:
+    """Rename domain *old* to *new* in *xml*, moving its per-VM file paths too.
+
+    Only paths clonebox derives from the VM name are rewritten:
+    ``<images>/<old>.qcow2``, ``<images>/<old>-cloud-init.iso`` and anything
+    under ``<images>/<old>/``.
+    """
+    root = ET.fromstring(xml)
+    name = root.find("name")
+    if name is not None:
+        name.text = new
+    prefix = f"{images_dir}/{old}"
+    for elem in root.iter():
+        for attr, value in elem.attrib.items():
+            if value.startswith(prefix) and value[len(prefix):len(prefix) + 1] in (".", "-", "/"):
+                elem.set(attr, f"{images_dir}/{new}{value[len(prefix):]}")
+    return ET.tostring(root, encoding="unicode")
+
+
+class VMPool:
+    """Per-config pools of saved, fully provisioned VMs."""
+
+    def __init__(self, user_session: bool = False, cloner: Any = None):
+        self.user_session = user_session
+        self._cloner = cloner
+        self.images_dir = _paths.images_dir(user_session)
+        self.root = self.images_dir / "pool"
+
+    @property
+    def cloner(self) -> Any:
+        if self._cloner is None:
+            from clonebox.cloner import SelectiveVMCloner
+
+            self._cloner = SelectiveVMCloner(user_session=self.user_session)
+        return self._cloner
+
+    # ── index ────────────────────────────────────────────────────────────────
+
+    @contextlib.contextmanager
+    def _index(self) -> Iterator[Dict[str, Any]]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index_path = self.root / INDEX_FILE
+            try:
+                index = json.loads(index_path.read_text())
+            except (OSError, ValueError):
+                index = {}
+            pools = index.setdefault("pools", {})
+            yield pools
+            tmp = index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(index, indent=2, sort_keys=True))
+            os.replace(tmp, index_path)
+
+    def pools(self) -> Dict[str, Dict[str, Any]]:
+        if not (self.root / INDEX_FILE).exists():
+            return {}
+        with self._index() as pools:
+            return json.loads(json.dumps(pools))
+
+    def register(self, config: Dict[str, Any], size: int) -> str:
+        """Create or resize the pool for *config*; returns its key."""
+        key = pool_key(config, self.user_session)
+        with self._index() as pools:
+            entry = pools.setdefault(key, {"vms": {}})
+            entry["config"] = config
+            entry["size"] = max(0, size)
+            entry["ram_mb"] = int((config.get("vm") or {}).get("ram_mb", 4096))
+        log.info("pool_registered", key=key, size=size)
+        return key
+
+    def drain(self, key: str) -> List[str]:
+        """Remove pool *key* and delete its idle VMs."""
+        with self._index() as pools:
+            entry = pools.pop(key, None)
+        names = list((entry or {}).get("vms", {}))
+        for name in names:
+            self._discard(name)
+        return names
+
+    def ready_count(self, key: str) -> int:
+        entry = self.pools().get(key)
+        if entry is None:
+            return 0
+        return sum(1 for v in entry["vms"].values() if v.get("state") == "ready")
+
+    def deficit(self, key: str) -> int:
+        entry = self.pools().get(key)
+        if entry is None:
+            return 0
+        return max(0, entry["size"] - len(entry["vms"]))
+
+    # ── warm / claim ─────────────────────────────────────────────────────────
+
+    def warm_one(self, key: str, make_config: Callable[[Dict[str, Any], str], VMConfig]) -> Optional[str]:
+        """Provision one VM for pool *key* and save it; returns its name.
+
+        Returns ``None`` if the pool is already full (counting VMs other
+        refillers are warming) or provisioning failed.
+        """
+        name = f"{NAME_PREFIX}{key[:8]}-{secrets.token_hex(3)}"
+        with self._index() as pools:
+            entry = pools.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            stale = [n for n, v in entry["vms"].items()
+                     if v.get("state") == "warming" and now - v.get("since", 0) > WARM_TIMEOUT]
+            for vm in stale:
+                entry["vms"].pop(vm)
+            full = len(entry["vms"]) >= entry["size"]
+            if not full:
+                entry["vms"][name] = {"state": "warming", "since": now}
+            config = entry["config"]
+        for vm in stale:
+            self._discard(vm)
+        if full:
+            return None
+
+        started = time.monotonic()
+        try:
+            vm_config = make_config(config, name)
+            # Pool VMs are parked in a save image already, and their files
+            # are renamed on claim, which would orphan snapshot manifests.
+            vm_config.memory_snapshot = False
+            self.cloner.create_vm(vm_config, start=True, approved=True)
+            dom = self.cloner.conn.lookupByName(name)
+            save_path = _paths.vm_dir(name, self.user_session) / SAVE_FILE
+            save_path.parent.mkdir(parents=True, exist_ok=True)
+            dom.save(str(save_path))
+        except Exception as exc:
+            log.warning("pool_warm_failed", key=key, vm=name, error=str(exc))
+            with self._index() as pools:
+                pools.get(key, {}).get("vms", {}).pop(name, None)
+            self._discard(name)
+            return None
+
+        with self._index() as pools:
+            vms = pools.get(key, {}).get("vms")
+            if vms is None:  # drained meanwhile
+                orphan = True
+            else:
+                vms[name] = {"state": "ready", "since": time.time()}
+                orphan = False
+        if orphan:
+            self._discard(name)
+            return None
+        log.info("pool_vm_ready", key=key, vm=name, duration=round(time.monotonic() - started, 1))
+        return name
+
+    def claim(self, key: str, vm_name: str) -> Optional[str]:
+        """Hand a ready VM of pool *key* over as *vm_name*, running; returns its UUID."""
+        if not (self.root / INDEX_FILE).exists():
+            return None
+        try:
+            self.cloner.conn.lookupByName(vm_name)
+        except Exception:
+            pass
+        else:
+            return None  # name taken: let create_vm report it
+        with self._index() as pools:
+            vms = pools.get(key, {}).get("vms", {})
+            ready = sorted(
+                (n for n, v in vms.items() if v.get("state") == "ready"),
+                key=lambda n: vms[n].get("since", 0),
+            )
+            if not ready:
+                return None
+            pool_name = ready[0]
+            vms.pop(pool_name)
+
+        started = time.monotonic()
+        try:
+            vm_uuid = self._adopt(pool_name, vm_name)
+        except Exception as exc:
+            log.warning("pool_claim_failed", key=key, vm=pool_name, error=str(exc))
+            self._discard(pool_name)
+            return None
+        log.info("pool_vm_claimed", key=key, vm=vm_name, pool_vm=pool_name,
+                 duration=round(time.monotonic() - started, 2))
+        return vm_uuid
+
+    def _adopt(self, old: str, new: str) -> str:
+        conn = self.cloner.conn
+        dom = conn.lookupByName(old)
+        old_save = _paths.vm_dir(old, self.user_session) / SAVE_FILE
+        save_xml = conn.saveImageGetXMLDesc(str(old_save), 0)
+        inactive = getattr(libvirt, "VIR_DOMAIN_XML_INACTIVE", 2) | getattr(
+            libvirt, "VIR_DOMAIN_XML_SECURE", 1
+        )
+        persistent_xml = dom.XMLDesc(inactive)
+
+        # Rename: undefine, move the name-derived files, define under the new name
+        dom.undefine()
+        moved = []
+        try:
+            for suffix in (".qcow2", "-cloud-init.iso", ""):
+                src = self.images_dir / f"{old}{suffix}"
+                if src.exists():
+                    dst = self.images_dir / f"{new}{suffix}"
+                    os.replace(src, dst)
+                    moved.append((src, dst))
+            dom = conn.defineXML(retarget_domain_xml(persistent_xml, old, new, self.images_dir))
+        except Exception:
+            # Put the pool VM back so the caller can discard it by its own name
+            for src, dst in reversed(moved):
+                with contextlib.suppress(OSError):
+                    os.replace(dst, src)
+            with contextlib.suppress(Exception):
+                conn.defineXML(persistent_xml)
+            raise
+        with contextlib.suppress(Exception):
+            self.cloner._golden_cache().rename_user(old, new, str(self.images_dir / f"{new}.qcow2"))
+
+        new_save = _paths.vm_dir(new, self.user_session) / SAVE_FILE
+        try:
+            try:
+                conn.restoreFlags(
+                    str(new_save), retarget_domain_xml(save_xml, old, new, self.images_dir), 0
+                )
+                dom = conn.lookupByName(new)
+                self._reconfigure_guest(dom, old, new)
+            except Exception as exc:
+                # The disk is fully provisioned; a cold boot still beats a new VM
+                log.warning("pool_restore_failed", vm=new, error=str(exc))
+                if not dom.isActive():
+                    dom.create()
+            return dom.UUIDString()
+        except Exception:
+            # Already renamed: the pool name no longer refers to anything
+            self._discard(new)
+            raise
+        finally:
+            new_save.unlink(missing_ok=True)
+
+    def _reconfigure_guest(self, dom: Any, old: str, new: str) -> None:
+        """Sync the guest clock and take over the hostname after a restore."""
+        with contextlib.suppress(Exception):
+            dom.setTime(flags=getattr(libvirt, "VIR_DOMAIN_TIME_SYNC", 1))
+        script = (
+            f"hostnamectl set-hostname {new} 2>/dev/null || hostname {new}; "
+            f"sed -i 's/\\b{old}\\b/{new}/g' /etc/hosts; "
+            "echo 'preserve_hostname: true' > /etc/cloud/cloud.cfg.d/99-clonebox-pool.cfg"
+        )
+        result = get_qga_executor(self.cloner.conn_uri).exec(new, script, timeout=15)
+        if result is None or not result.ok:
+            log.warning("pool_hostname_update_failed", vm=new)
+
+    def _discard(self, name: str) -> None:
+        with contextlib.suppress(Exception):
+            self.cloner.delete_vm(name, delete_storage=True, approved=True)
+        shutil.rmtree(_paths.vm_dir(name, self.user_session), ignore_errors=True)
+
+    # ── refill ───────────────────────────────────────────────────────────────
+
+    def refill(
+        self,
+        make_config: Callable[[Dict[str, Any], str], VMConfig],
+        key: Optional[str] = None,
+        reserve_mb: int = RAM_RESERVE_MB,
+    ) -> int:
+        """Warm VMs until every pool (or just *key*) is full; returns how many.
+
+        VMs are warmed one at a time; refilling stops early when booting
+        another one would leave less than *reserve_mb* of host RAM.
+        """
+        warmed = 0
+        for pool_id, entry in self.pools().items():
+            if key is not None and pool_id != key:
+                continue
+            while True:
+                available = host_available_mb()
+                if available is not None and available - entry["ram_mb"] < reserve_mb:
+                    log.info("pool_refill_paused_low_ram", key=pool_id,
+                             available_mb=available, needed_mb=entry["ram_mb"])
+                    break
+                if self.warm_one(pool_id, make_config) is None:
+                    break
+                warmed += 1
+        return warmed
+
+
+def spawn_refiller(user_session: bool) -> None:
+    """Refill pools in a detached ``clonebox pool refill`` process."""
+    cmd = [sys.executable, "-m", "clonebox", "pool", "refill"]
+    if user_session:
+        cmd.append("--user")
+    try:
+        subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError as exc:
+        log.warning("pool_refiller_spawn_failed", error=str(exc))
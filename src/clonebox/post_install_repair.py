@@ -7,6 +7,12 @@ to detect and fix known issues before the user touches the VM.
 
 Each repair is idempotent — safe to re-run on already-healthy VMs.
 
+Repairs are declared in ``_REPAIRS`` with a phase and the repairs they must
+run after.  Within a phase, every repair whose dependencies are done runs
+concurrently, and the read-only detection commands of that wave are fused
+into one guest script whose JSON output pre-answers the first matching
+``ctx.run`` of each repair.
+
 Usage (standalone):
     python -m clonebox.post_install_repair <vm-name>
 
@@ -15,12 +21,16 @@ Programmatic (from cloner.py):
     report = run_post_install_repairs(ssh_port, ssh_key, vm_username, browsers)
 """
 
+import json
 import logging
 import re
 import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 from clonebox.ssh import ssh_exec as _ssh_exec
 
@@ -43,6 +53,9 @@ class RepairResult:
 class RepairReport:
     """Aggregate report from all repairs."""
     results: List[RepairResult] = field(default_factory=list)
+    # Wall time per repair (seconds), keyed by repair name
+    timings: Dict[str, float] = field(default_factory=dict)
+    wall_time: float = 0.0
 
     @property
     def detected_count(self) -> int:
@@ -56,6 +69,9 @@ class RepairReport:
     def failed_count(self) -> int:
         return sum(1 for r in self.results if r.detected and not r.repaired)
 
+    def slowest(self, n: int = 3) -> List[Tuple[str, float]]:
+        return sorted(self.timings.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
     def log_summary(self) -> None:
         log.info("=" * 60)
         log.info("POST-INSTALL REPAIR REPORT")
@@ -74,13 +90,20 @@ class RepairReport:
             f"{self.repaired_count} fixed, "
             f"{self.failed_count} remaining"
         )
+        if self.timings:
+            slowest = ", ".join(f"{name} {secs:.1f}s" for name, secs in self.slowest())
+            log.info(f"  Wall time: {self.wall_time:.1f}s (slowest: {slowest})")
         log.info("=" * 60)
 
 
 # ─── repair context (SSH helper) ────────────────────────────────────────────
 
 class _RepairCtx:
-    """Thin wrapper around SSH exec with logging."""
+    """Thin wrapper around SSH exec with logging.
+
+    Safe to share between threads; concurrent commands ride the pooled
+    SSH ControlMaster connection.
+    """
 
     def __init__(
         self,
@@ -93,8 +116,17 @@ class _RepairCtx:
         self.key = ssh_key
         self.user = vm_username
         self.timeout = timeout
+        self._prefetched: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
 
     def run(self, cmd: str, timeout: int = None) -> Optional[str]:
+        with self._lock:
+            if cmd in self._prefetched:
+                # One-shot: re-checks after a repair must hit the guest again
+                return self._prefetched.pop(cmd)
+        return self._exec(cmd, timeout)
+
+    def _exec(self, cmd: str, timeout: int = None) -> Optional[str]:
         return _ssh_exec(
             port=self.port,
             key=self.key,
@@ -103,6 +135,225 @@ class _RepairCtx:
             timeout=timeout or self.timeout,
         )
 
+    def prefetch(self, commands: Sequence[str]) -> int:
+        """Run read-only *commands* in one guest round trip.
+
+        Each answer is cached exactly as :meth:`run` would have returned it
+        and consumed by the next matching call of the same wave.  Returns the number of
+        cached answers (0 if the fused script failed; callers then simply
+        fall through to per-command SSH).
+        """
+        commands = list(dict.fromkeys(c for c in commands if c))
+        if len(commands) < 2:
+            return 0
+        script = (
+            f"python3 -c {shlex.quote(_PROBE_SCRIPT)} "
+            f"{self.timeout} {shlex.quote(json.dumps(commands))}"
+        )
+        raw = self._exec(script, timeout=self.timeout + 10)
+        try:
+            answers = json.loads(raw or "")
+        except ValueError:
+            answers = None
+        if not isinstance(answers, list) or len(answers) != len(commands):
+            log.debug("Fused detection script failed, probing per command")
+            return 0
+
+        cached = {}
+        for cmd, answer in zip(commands, answers):
+            if not isinstance(answer, list) or len(answer) != 2 or answer[0] is None:
+                continue  # timed out in the guest — leave it to run()
+            rc, out = answer
+            cached[cmd] = str(out).strip() if rc == 0 else None
+        with self._lock:
+            self._prefetched.update(cached)
+        return len(cached)
+
+    def forget(self) -> None:
+        """Drop unconsumed prefetched answers; later waves must not see stale state."""
+        with self._lock:
+            self._prefetched.clear()
+
+
+# Guest side of _RepairCtx.prefetch: argv = [per-command timeout, JSON list of
+# commands]; prints a JSON list of [exit code, stdout] in the same order.
+_PROBE_SCRIPT = """\
+import json, subprocess, sys
+from concurrent.futures import ThreadPoolExecutor
+limit = int(sys.argv[1])
+def probe(cmd):
+    try:
+        p = subprocess.run(["/bin/bash", "-c", cmd], stdout=subprocess.PIPE,
+                           stderr=subprocess.DEVNULL, timeout=limit)
+    except Exception:
+        return [None, ""]
+    return [p.returncode, p.stdout.decode("utf-8", "replace")]
+with ThreadPoolExecutor(8) as pool:
+    print(json.dumps(list(pool.map(probe, json.loads(sys.argv[2])))))
+"""
+
+
+# ─── detection commands (shared by repairs and the fused probe) ─────────────
+
+_DNS_CHECK = "getent hosts archive.ubuntu.com >/dev/null 2>&1 && echo y || echo n"
+_APT_LOCK_CHECK = "fuser /var/lib/dpkg/lock-frontend 2>/dev/null && echo busy || echo idle"
+_MACHINE_ID_READ = "cat /etc/machine-id 2>/dev/null"
+_DBUS_CHECK = "dpkg -l dbus-user-session 2>/dev/null | grep -q '^ii' && echo y || echo n"
+_GDM_STATUS = "systemctl is-active gdm3 2>/dev/null"
+_SNAP_LIST_NAMES = "snap list 2>/dev/null | awk 'NR>1{print $1}'"
+_GUI_SNAPS = {"firefox", "chromium", "pycharm-community", "code",
+              "intellij-idea-community", "slack", "discord", "telegram-desktop"}
+_IDE_VERSION_CMDS = {
+    "windsurf": "windsurf --version 2>/dev/null | head -1",
+    "code": "code --version 2>/dev/null | head -1",
+    "cursor": "cursor --version 2>/dev/null | head -1",
+    "pycharm": "snap run pycharm-community --version 2>/dev/null | head -1",
+}
+
+
+def _owner_cmd(path: str) -> str:
+    return f"stat -c '%U' {shlex.quote(path)} 2>/dev/null || echo MISSING"
+
+
+def _uid_cmd(user: str) -> str:
+    return f"id -u {user} 2>/dev/null"
+
+
+def _has_cmd(name: str) -> str:
+    return f"command -v {name} >/dev/null 2>&1 && echo y || echo n"
+
+
+def _snap_installed_cmd(snap_name: str) -> str:
+    return f"snap list {snap_name} >/dev/null 2>&1 && echo y || echo n"
+
+
+def _cat_cmd(path: str) -> str:
+    return f"cat {shlex.quote(path)} 2>/dev/null"
+
+
+def _crash_count_cmd(path: str) -> str:
+    return (
+        f"find {shlex.quote(path)} -maxdepth 2 -type f "
+        f"\\( -name '*.dmp' -o -name '*.extra' \\) 2>/dev/null | wc -l"
+    )
+
+
+def _snap_ls_cmd(user: str) -> str:
+    return f"ls -1 /home/{user}/snap/ 2>/dev/null || true"
+
+
+def _fontconfig_check(user: str) -> str:
+    return (
+        f"test -d /home/{user}/.cache/fontconfig && "
+        f"[ $(ls /home/{user}/.cache/fontconfig 2>/dev/null | wc -l) -gt 0 ] && echo y || echo n"
+    )
+
+
+def _home_dirs(user: str) -> List[str]:
+    return [
+        f"/home/{user}/.config",
+        f"/home/{user}/.local",
+        f"/home/{user}/.mozilla",
+        f"/home/{user}/.vscode",
+        f"/home/{user}/.windsurf",
+        f"/home/{user}/.cursor",
+        f"/home/{user}/Windsurf",
+    ]
+
+
+def _copied_data_dirs(user: str, copy_paths: Optional[Dict[str, str]]) -> List[str]:
+    # Well-known dirs to always check (browsers + IDEs)
+    known_dirs = [
+        f"/home/{user}/.mozilla",
+        f"/home/{user}/.config/google-chrome",
+        f"/home/{user}/.config/chromium",
+        f"/home/{user}/snap/firefox/common/.mozilla",
+        f"/home/{user}/snap/chromium/common/chromium",
+        f"/home/{user}/.config/Code",
+        f"/home/{user}/.vscode",
+        f"/home/{user}/.config/Windsurf",
+        f"/home/{user}/.windsurf",
+        f"/home/{user}/Windsurf",
+        f"/home/{user}/.config/Cursor",
+        f"/home/{user}/.cursor",
+        f"/home/{user}/.config/JetBrains",
+        f"/home/{user}/.local/share/JetBrains",
+    ]
+    # Add actual copy_paths destinations
+    for guest_path in (copy_paths or {}).values():
+        if guest_path and guest_path.startswith(f"/home/{user}/"):
+            if guest_path not in known_dirs:
+                known_dirs.append(guest_path)
+    return known_dirs
+
+
+def _lock_find_cmds(user: str) -> Tuple[str, str]:
+    search_dirs = " ".join(shlex.quote(d) for d in [
+        # Browsers
+        f"/home/{user}/.mozilla",
+        f"/home/{user}/snap/firefox",
+        f"/home/{user}/.config/google-chrome",
+        f"/home/{user}/.config/chromium",
+        f"/home/{user}/snap/chromium",
+        # IDEs (Electron-based)
+        f"/home/{user}/.config/Code",
+        f"/home/{user}/.config/Windsurf",
+        f"/home/{user}/.config/Cursor",
+        # JetBrains
+        f"/home/{user}/.config/JetBrains",
+        f"/home/{user}/snap/pycharm-community",
+    ])
+    lock_cmd = (
+        f"find {search_dirs} "
+        "-maxdepth 4 -type f "
+        "\\( -name 'parent.lock' -o -name '.parentlock' -o -name 'lock' "
+        "-o -name 'lockfile' -o -name 'SingletonLock' "
+        "-o -name 'SingletonSocket' -o -name 'SingletonCookie' "
+        "-o -name 'code.lock' -o -name '*.lock' \\) "
+        "2>/dev/null"
+    )
+    # Also find stale Unix sockets that block startup
+    socket_cmd = (
+        f"find {search_dirs} "
+        "-maxdepth 4 -type s "
+        "\\( -name 'SingletonSocket' -o -name '*.sock' \\) "
+        "2>/dev/null"
+    )
+    return lock_cmd, socket_cmd
+
+
+def _crash_dirs(user: str) -> List[str]:
+    return [
+        # Browsers
+        f"/home/{user}/snap/firefox/common/.mozilla/firefox/Crash Reports",
+        f"/home/{user}/.mozilla/firefox/Crash Reports",
+        f"/home/{user}/.config/google-chrome/Crash Reports",
+        f"/home/{user}/.config/chromium/Crash Reports",
+        f"/home/{user}/snap/chromium/common/chromium/Crash Reports",
+        # Electron IDEs — Crashpad
+        f"/home/{user}/.config/Code/Crashpad",
+        f"/home/{user}/.config/Windsurf/Crashpad",
+        f"/home/{user}/.config/Cursor/Crashpad",
+    ]
+
+
+def _firefox_ini_paths(user: str) -> List[str]:
+    return [
+        f"/home/{user}/snap/firefox/common/.mozilla/firefox/profiles.ini",
+        f"/home/{user}/.mozilla/firefox/profiles.ini",
+    ]
+
+
+def _ide_config_files(user: str) -> List[str]:
+    return [
+        f"/home/{user}/.config/Code/User/settings.json",
+        f"/home/{user}/.config/Code/User/globalStorage/storage.json",
+        f"/home/{user}/.config/Windsurf/User/settings.json",
+        f"/home/{user}/.config/Windsurf/User/globalStorage/storage.json",
+        f"/home/{user}/.config/Cursor/User/settings.json",
+        f"/home/{user}/.config/Cursor/User/globalStorage/storage.json",
+    ]
+
 
 # ═════════════════════════════════════════════════════════════════════════════
 #  INDIVIDUAL REPAIRS — each returns a RepairResult
@@ -117,14 +368,12 @@ def _repair_snap_dir_ownership(ctx: _RepairCtx) -> List[RepairResult]:
     """
     results = []
     # Discover all snap app dirs that exist in the VM
-    snap_ls = ctx.run(
-        f"ls -1 /home/{ctx.user}/snap/ 2>/dev/null || true"
-    ) or ""
+    snap_ls = ctx.run(_snap_ls_cmd(ctx.user)) or ""
     snap_apps = [a.strip() for a in snap_ls.splitlines() if a.strip()]
 
     for app in snap_apps:
         snap_dir = f"/home/{ctx.user}/snap/{app}"
-        owner = ctx.run(f"stat -c '%U' {shlex.quote(snap_dir)} 2>/dev/null || echo MISSING")
+        owner = ctx.run(_owner_cmd(snap_dir))
         if owner == "MISSING" or owner is None:
             continue
 
@@ -154,32 +403,11 @@ def _repair_copied_data_ownership(ctx: _RepairCtx, copy_paths: Dict[str, str]) -
     Affects browsers AND IDEs (VSCode, Windsurf, Cursor, PyCharm, etc.).
     FIX: chown -R <user> on all destination directories under /home/<user>.
     """
-    # Well-known dirs to always check (browsers + IDEs)
-    known_dirs = [
-        f"/home/{ctx.user}/.mozilla",
-        f"/home/{ctx.user}/.config/google-chrome",
-        f"/home/{ctx.user}/.config/chromium",
-        f"/home/{ctx.user}/snap/firefox/common/.mozilla",
-        f"/home/{ctx.user}/snap/chromium/common/chromium",
-        f"/home/{ctx.user}/.config/Code",
-        f"/home/{ctx.user}/.vscode",
-        f"/home/{ctx.user}/.config/Windsurf",
-        f"/home/{ctx.user}/.windsurf",
-        f"/home/{ctx.user}/Windsurf",
-        f"/home/{ctx.user}/.config/Cursor",
-        f"/home/{ctx.user}/.cursor",
-        f"/home/{ctx.user}/.config/JetBrains",
-        f"/home/{ctx.user}/.local/share/JetBrains",
-    ]
-    # Add actual copy_paths destinations
-    for guest_path in (copy_paths or {}).values():
-        if guest_path and guest_path.startswith(f"/home/{ctx.user}/"):
-            if guest_path not in known_dirs:
-                known_dirs.append(guest_path)
+    known_dirs = _copied_data_dirs(ctx.user, copy_paths)
 
     bad = []
     for d in known_dirs:
-        owner = ctx.run(f"stat -c '%U' {shlex.quote(d)} 2>/dev/null || echo MISSING")
+        owner = ctx.run(_owner_cmd(d))
         if owner and owner != "MISSING" and owner != ctx.user:
             bad.append((d, owner))
 
@@ -215,37 +443,7 @@ def _repair_app_lock_files(ctx: _RepairCtx) -> List[RepairResult]:
     (Windsurf, VSCode, Cursor — SingletonLock, .lock, code.lock).
     FIX: Remove lock files from all known app dirs.
     """
-    search_dirs = " ".join(shlex.quote(d) for d in [
-        # Browsers
-        f"/home/{ctx.user}/.mozilla",
-        f"/home/{ctx.user}/snap/firefox",
-        f"/home/{ctx.user}/.config/google-chrome",
-        f"/home/{ctx.user}/.config/chromium",
-        f"/home/{ctx.user}/snap/chromium",
-        # IDEs (Electron-based)
-        f"/home/{ctx.user}/.config/Code",
-        f"/home/{ctx.user}/.config/Windsurf",
-        f"/home/{ctx.user}/.config/Cursor",
-        # JetBrains
-        f"/home/{ctx.user}/.config/JetBrains",
-        f"/home/{ctx.user}/snap/pycharm-community",
-    ])
-    lock_cmd = (
-        f"find {search_dirs} "
-        "-maxdepth 4 -type f "
-        "\\( -name 'parent.lock' -o -name '.parentlock' -o -name 'lock' "
-        "-o -name 'lockfile' -o -name 'SingletonLock' "
-        "-o -name 'SingletonSocket' -o -name 'SingletonCookie' "
-        "-o -name 'code.lock' -o -name '*.lock' \\) "
-        "2>/dev/null"
-    )
-    # Also find stale Unix sockets that block startup
-    socket_cmd = (
-        f"find {search_dirs} "
-        "-maxdepth 4 -type s "
-        "\\( -name 'SingletonSocket' -o -name '*.sock' \\) "
-        "2>/dev/null"
-    )
+    lock_cmd, socket_cmd = _lock_find_cmds(ctx.user)
     locks_raw = (ctx.run(lock_cmd) or "") + "\n" + (ctx.run(socket_cmd) or "")
     locks = [l for l in locks_raw.strip().splitlines() if l.strip()]
 
@@ -275,24 +473,10 @@ def _repair_crash_reports(ctx: _RepairCtx) -> List[RepairResult]:
     Affects browsers AND Electron IDEs (Windsurf, VSCode, Cursor use Crashpad).
     FIX: Remove .dmp and .extra files from Crash Reports / Crashpad dirs.
     """
-    crash_dirs = [
-        # Browsers
-        f"/home/{ctx.user}/snap/firefox/common/.mozilla/firefox/Crash Reports",
-        f"/home/{ctx.user}/.mozilla/firefox/Crash Reports",
-        f"/home/{ctx.user}/.config/google-chrome/Crash Reports",
-        f"/home/{ctx.user}/.config/chromium/Crash Reports",
-        f"/home/{ctx.user}/snap/chromium/common/chromium/Crash Reports",
-        # Electron IDEs — Crashpad
-        f"/home/{ctx.user}/.config/Code/Crashpad",
-        f"/home/{ctx.user}/.config/Windsurf/Crashpad",
-        f"/home/{ctx.user}/.config/Cursor/Crashpad",
-    ]
+    crash_dirs = _crash_dirs(ctx.user)
     count = 0
     for d in crash_dirs:
-        n = ctx.run(
-            f"find {shlex.quote(d)} -maxdepth 2 -type f "
-            f"\\( -name '*.dmp' -o -name '*.extra' \\) 2>/dev/null | wc -l"
-        )
+        n = ctx.run(_crash_count_cmd(d))
         try:
             count += int((n or "0").strip())
         except ValueError:
@@ -330,18 +514,15 @@ def _repair_snap_interfaces(ctx: _RepairCtx, snap_packages: Optional[List[str]]
     if snap_packages:
         candidates = list(snap_packages)
     else:
-        snap_ls = ctx.run("snap list 2>/dev/null | awk 'NR>1{print $1}'") or ""
+        snap_ls = ctx.run(_SNAP_LIST_NAMES) or ""
         candidates = [s.strip() for s in snap_ls.splitlines() if s.strip()]
 
-    # Only check GUI-relevant snaps
-    gui_snaps = {"firefox", "chromium", "pycharm-community", "code",
-                 "intellij-idea-community", "slack", "discord", "telegram-desktop"}
-
     for snap_name in candidates:
-        if snap_name not in gui_snaps:
+        # Only check GUI-relevant snaps
+        if snap_name not in _GUI_SNAPS:
             continue
 
-        installed = ctx.run(f"snap list {snap_name} >/dev/null 2>&1 && echo y || echo n")
+        installed = ctx.run(_snap_installed_cmd(snap_name))
         if installed != "y":
             continue
 
@@ -398,7 +579,7 @@ def _repair_xdg_runtime_dir(ctx: _RepairCtx) -> List[RepairResult]:
     Browsers and other apps need XDG_RUNTIME_DIR.
     FIX: Create the directory with correct ownership.
     """
-    uid = ctx.run(f"id -u {ctx.user} 2>/dev/null") or "1000"
+    uid = ctx.run(_uid_cmd(ctx.user)) or "1000"
     runtime_dir = f"/run/user/{uid.strip()}"
 
     exists = ctx.run(f"test -d {runtime_dir} && echo y || echo n")
@@ -427,10 +608,7 @@ def _repair_fontconfig_cache(ctx: _RepairCtx) -> List[RepairResult]:
     BUG: Missing font cache after fresh install causes slow first browser launch.
     FIX: Rebuild fontconfig cache.
     """
-    has_cache = ctx.run(
-        f"test -d /home/{ctx.user}/.cache/fontconfig && "
-        f"[ $(ls /home/{ctx.user}/.cache/fontconfig 2>/dev/null | wc -l) -gt 0 ] && echo y || echo n"
-    )
+    has_cache = ctx.run(_fontconfig_check(ctx.user))
     detected = has_cache != "y"
     repaired = False
 
@@ -458,7 +636,7 @@ def _repair_machine_id(ctx: _RepairCtx) -> List[RepairResult]:
     causing dbus, browser telemetry, and session issues.
     FIX: Regenerate machine-id if it matches a known base image pattern or is empty.
     """
-    mid = ctx.run("cat /etc/machine-id 2>/dev/null") or ""
+    mid = ctx.run(_MACHINE_ID_READ) or ""
     mid = mid.strip()
 
     # Detect: empty, all zeros, or suspiciously short
@@ -475,7 +653,7 @@ def _repair_machine_id(ctx: _RepairCtx) -> List[RepairResult]:
             "sudo systemd-machine-id-setup 2>/dev/null && "
             "sudo dbus-uuidgen --ensure=/etc/machine-id 2>/dev/null || true"
         )
-        new_mid = ctx.run("cat /etc/machine-id 2>/dev/null") or ""
+        new_mid = ctx.run(_MACHINE_ID_READ) or ""
         repaired = len(new_mid.strip()) == 32 and new_mid.strip() != "0" * 32
 
     return [RepairResult(
@@ -491,9 +669,7 @@ def _repair_dbus_session(ctx: _RepairCtx) -> List[RepairResult]:
     BUG: Snap browsers need a running dbus session. Without it they fail silently.
     FIX: Ensure dbus-user-session is installed and the socket exists.
     """
-    has_dbus = ctx.run(
-        "dpkg -l dbus-user-session 2>/dev/null | grep -q '^ii' && echo y || echo n"
-    )
+    has_dbus = ctx.run(_DBUS_CHECK)
     detected = has_dbus != "y"
     repaired = False
 
@@ -502,9 +678,7 @@ def _repair_dbus_session(ctx: _RepairCtx) -> List[RepairResult]:
             "sudo apt-get install -y dbus-user-session >/dev/null 2>&1 || true",
             timeout=60,
         )
-        has_dbus2 = ctx.run(
-            "dpkg -l dbus-user-session 2>/dev/null | grep -q '^ii' && echo y || echo n"
-        )
+        has_dbus2 = ctx.run(_DBUS_CHECK)
         repaired = has_dbus2 == "y"
 
     return [RepairResult(
@@ -520,18 +694,10 @@ def _repair_home_dir_permissions(ctx: _RepairCtx) -> List[RepairResult]:
     BUG: /home/<user> or subdirs may be owned by root after copy operations.
     FIX: Fix ownership of key directories.
     """
-    dirs_to_check = [
-        f"/home/{ctx.user}/.config",
-        f"/home/{ctx.user}/.local",
-        f"/home/{ctx.user}/.mozilla",
-        f"/home/{ctx.user}/.vscode",
-        f"/home/{ctx.user}/.windsurf",
-        f"/home/{ctx.user}/.cursor",
-        f"/home/{ctx.user}/Windsurf",
-    ]
+    dirs_to_check = _home_dirs(ctx.user)
     bad = []
     for d in dirs_to_check:
-        owner = ctx.run(f"stat -c '%U' {shlex.quote(d)} 2>/dev/null || echo MISSING")
+        owner = ctx.run(_owner_cmd(d))
         if owner and owner != "MISSING" and owner != ctx.user:
             bad.append(d)
 
@@ -564,15 +730,14 @@ def _repair_gdm_running(ctx: _RepairCtx, gui_mode: bool) -> List[RepairResult]:
     if not gui_mode:
         return []
 
-    status = ctx.run("systemctl is-active gdm3 2>/dev/null") or "inactive"
+    status = ctx.run(_GDM_STATUS) or "inactive"
     detected = status.strip() != "active"
     repaired = False
 
     if detected:
         ctx.run("sudo systemctl restart gdm3 2>/dev/null || sudo systemctl start gdm3 2>/dev/null || true")
-        import time
         time.sleep(3)
-        status2 = ctx.run("systemctl is-active gdm3 2>/dev/null") or "inactive"
+        status2 = ctx.run(_GDM_STATUS) or "inactive"
         repaired = status2.strip() == "active"
 
     return [RepairResult(
@@ -588,15 +753,14 @@ def _repair_dns_resolution(ctx: _RepairCtx) -> List[RepairResult]:
     BUG: DNS may not work right after boot (systemd-resolved not ready).
     FIX: Restart systemd-resolved and verify.
     """
-    dns_ok = ctx.run("getent hosts archive.ubuntu.com >/dev/null 2>&1 && echo y || echo n")
+    dns_ok = ctx.run(_DNS_CHECK)
     detected = dns_ok != "y"
     repaired = False
 
     if detected:
         ctx.run("sudo systemctl restart systemd-resolved 2>/dev/null || true")
-        import time
         time.sleep(2)
-        dns_ok2 = ctx.run("getent hosts archive.ubuntu.com >/dev/null 2>&1 && echo y || echo n")
+        dns_ok2 = ctx.run(_DNS_CHECK)
         repaired = dns_ok2 == "y"
 
     return [RepairResult(
@@ -612,15 +776,14 @@ def _repair_apt_lock(ctx: _RepairCtx) -> List[RepairResult]:
     BUG: dpkg/apt may still hold locks after cloud-init finishes.
     FIX: Wait for locks to release (up to 60s).
     """
-    busy = ctx.run("fuser /var/lib/dpkg/lock-frontend 2>/dev/null && echo busy || echo idle")
+    busy = ctx.run(_APT_LOCK_CHECK)
     detected = busy == "busy"
     repaired = False
 
     if detected:
-        import time
         for _ in range(12):
             time.sleep(5)
-            busy2 = ctx.run("fuser /var/lib/dpkg/lock-frontend 2>/dev/null && echo busy || echo idle")
+            busy2 = ctx.run(_APT_LOCK_CHECK)
             if busy2 != "busy":
                 repaired = True
                 break
@@ -639,13 +802,8 @@ def _repair_firefox_profiles_ini(ctx: _RepairCtx) -> List[RepairResult]:
     from host to VM (different home path or snap revision).
     FIX: Rewrite profiles.ini to use relative paths.
     """
-    ini_paths = [
-        f"/home/{ctx.user}/snap/firefox/common/.mozilla/firefox/profiles.ini",
-        f"/home/{ctx.user}/.mozilla/firefox/profiles.ini",
-    ]
-
-    for ini_path in ini_paths:
-        content = ctx.run(f"cat {shlex.quote(ini_path)} 2>/dev/null") or ""
+    for ini_path in _firefox_ini_paths(ctx.user):
+        content = ctx.run(_cat_cmd(ini_path)) or ""
         if not content or "[Profile" not in content:
             continue
 
@@ -702,18 +860,9 @@ def _repair_ide_config_paths(ctx: _RepairCtx, host_username: Optional[str] = Non
             detail="Host user same as VM user or unknown — skipped",
         )]
 
-    config_files = [
-        f"/home/{ctx.user}/.config/Code/User/settings.json",
-        f"/home/{ctx.user}/.config/Code/User/globalStorage/storage.json",
-        f"/home/{ctx.user}/.config/Windsurf/User/settings.json",
-        f"/home/{ctx.user}/.config/Windsurf/User/globalStorage/storage.json",
-        f"/home/{ctx.user}/.config/Cursor/User/settings.json",
-        f"/home/{ctx.user}/.config/Cursor/User/globalStorage/storage.json",
-    ]
-
     fixed_files = []
-    for cfg in config_files:
-        content = ctx.run(f"cat {shlex.quote(cfg)} 2>/dev/null") or ""
+    for cfg in _ide_config_files(ctx.user):
+        content = ctx.run(_cat_cmd(cfg)) or ""
         if not content or f"/home/{host_username}/" not in content:
             continue
 
@@ -739,17 +888,10 @@ def _verify_ide_launch(ctx: _RepairCtx) -> List[RepairResult]:
     VERIFY: Check if IDE executables exist and can show version info.
     """
     results = []
-    ide_checks = {
-        "windsurf": "windsurf --version 2>/dev/null | head -1",
-        "code": "code --version 2>/dev/null | head -1",
-        "cursor": "cursor --version 2>/dev/null | head -1",
-        "pycharm": "snap run pycharm-community --version 2>/dev/null | head -1",
-    }
-
-    for ide, cmd in ide_checks.items():
-        has_ide = ctx.run(f"command -v {ide} >/dev/null 2>&1 && echo y || echo n")
+    for ide, cmd in _IDE_VERSION_CMDS.items():
+        has_ide = ctx.run(_has_cmd(ide))
         if ide == "pycharm":
-            has_ide = ctx.run("snap list pycharm-community >/dev/null 2>&1 && echo y || echo n")
+            has_ide = ctx.run(_snap_installed_cmd("pycharm-community"))
         if has_ide != "y":
             continue
 
@@ -766,13 +908,17 @@ def _verify_ide_launch(ctx: _RepairCtx) -> List[RepairResult]:
     return results
 
 
+def _browser_binary(browser: str) -> str:
+    return "google-chrome" if browser == "chrome" else browser
+
+
 def _verify_headless_browsers(ctx: _RepairCtx, browsers: List[str]) -> List[RepairResult]:
     """
     VERIFY: Run headless smoke test for each browser after all repairs.
     This doesn't repair — it validates the repairs worked.
     """
     results = []
-    uid = ctx.run(f"id -u {ctx.user} 2>/dev/null") or "1000"
+    uid = ctx.run(_uid_cmd(ctx.user)) or "1000"
     runtime_dir = f"/run/user/{uid.strip()}"
     user_env = (
         f"sudo -u {ctx.user} env HOME=/home/{ctx.user} "
@@ -798,9 +944,7 @@ def _verify_headless_browsers(ctx: _RepairCtx, browsers: List[str]) -> List[Repa
         if not cmd:
             continue
 
-        has_browser = ctx.run(
-            f"command -v {browser if browser != 'chrome' else 'google-chrome'} >/dev/null 2>&1 && echo y || echo n"
-        )
+        has_browser = ctx.run(_has_cmd(_browser_binary(browser)))
         if has_browser != "y":
             continue
 
@@ -821,6 +965,131 @@ def _verify_headless_browsers(ctx: _RepairCtx, browsers: List[str]) -> List[Repa
 #  MAIN ENTRY POINT
 # ═════════════════════════════════════════════════════════════════════════════
 
+@dataclass
+class _RepairArgs:
+    """Per-run inputs shared by all repairs."""
+    browsers: List[str]
+    gui_mode: bool
+    copy_paths: Dict[str, str]
+    snap_packages: Optional[List[str]]
+    host_username: Optional[str]
+
+
+@dataclass(frozen=True)
+class _Repair:
+    """A registered repair: when it runs and what it detects with."""
+    name: str
+    phase: int
+    run: Callable[[_RepairCtx, _RepairArgs], List[RepairResult]]
+    # Read-only detection commands, identical to the repair's first ctx.run calls
+    probes: Callable[[_RepairCtx, _RepairArgs], List[str]] = lambda ctx, args: []
+    after: Tuple[str, ...] = ()
+
+
+_PHASES = {
+    1: "System checks...",
+    2: "File ownership & permissions...",
+    3: "App profile repairs (browsers + IDEs)...",
+    4: "Browser headless verification...",
+    5: "IDE verification...",
+}
+
+_REPAIRS: List[_Repair] = [
+    # Phase 1: System-level repairs
+    _Repair("dns-resolution", 1,
+            lambda ctx, a: _repair_dns_resolution(ctx),
+            lambda ctx, a: [_DNS_CHECK]),
+    _Repair("apt-lock", 1,
+            lambda ctx, a: _repair_apt_lock(ctx),
+            lambda ctx, a: [_APT_LOCK_CHECK]),
+    _Repair("xdg-runtime-dir", 1,
+            lambda ctx, a: _repair_xdg_runtime_dir(ctx),
+            lambda ctx, a: [_uid_cmd(ctx.user)]),
+    _Repair("machine-id", 1,
+            lambda ctx, a: _repair_machine_id(ctx),
+            lambda ctx, a: [_MACHINE_ID_READ]),
+    _Repair("dbus-user-session", 1,
+            lambda ctx, a: _repair_dbus_session(ctx),
+            lambda ctx, a: [_DBUS_CHECK],
+            after=("dns-resolution", "apt-lock")),
+    _Repair("gdm-running", 1,
+            lambda ctx, a: _repair_gdm_running(ctx, a.gui_mode),
+            lambda ctx, a: [_GDM_STATUS] if a.gui_mode else [],
+            after=("xdg-runtime-dir", "machine-id", "dbus-user-session")),
+    # Phase 2: File ownership and permissions (ALL apps)
+    _Repair("home-dir-permissions", 2,
+            lambda ctx, a: _repair_home_dir_permissions(ctx),
+            lambda ctx, a: [_owner_cmd(d) for d in _home_dirs(ctx.user)]),
+    _Repair("snap-dir-ownership", 2,
+            lambda ctx, a: _repair_snap_dir_ownership(ctx),
+            lambda ctx, a: [_snap_ls_cmd(ctx.user)]),
+    _Repair("copied-data-ownership", 2,
+            lambda ctx, a: _repair_copied_data_ownership(ctx, a.copy_paths),
+            lambda ctx, a: [_owner_cmd(d) for d in _copied_data_dirs(ctx.user, a.copy_paths)],
+            after=("home-dir-permissions", "snap-dir-ownership")),
+    # Phase 3: App-specific repairs (browsers + IDEs)
+    _Repair("app-lock-files", 3,
+            lambda ctx, a: _repair_app_lock_files(ctx),
+            lambda ctx, a: list(_lock_find_cmds(ctx.user))),
+    _Repair("browser-crash-reports", 3,
+            lambda ctx, a: _repair_crash_reports(ctx),
+            lambda ctx, a: [_crash_count_cmd(d) for d in _crash_dirs(ctx.user)]),
+    _Repair("firefox-profiles-ini", 3,
+            lambda ctx, a: _repair_firefox_profiles_ini(ctx),
+            lambda ctx, a: [_cat_cmd(p) for p in _firefox_ini_paths(ctx.user)]),
+    _Repair("ide-config-paths", 3,
+            lambda ctx, a: _repair_ide_config_paths(ctx, a.host_username),
+            lambda ctx, a: (
+                [_cat_cmd(p) for p in _ide_config_files(ctx.user)]
+                if a.host_username and a.host_username != ctx.user else []
+            )),
+    _Repair("snap-interfaces", 3,
+            lambda ctx, a: _repair_snap_interfaces(ctx, a.snap_packages),
+            lambda ctx, a: (
+                [_snap_installed_cmd(s) for s in a.snap_packages if s in _GUI_SNAPS]
+                if a.snap_packages else [_SNAP_LIST_NAMES]
+            )),
+    _Repair("fontconfig-cache", 3,
+            lambda ctx, a: _repair_fontconfig_cache(ctx),
+            lambda ctx, a: [_fontconfig_check(ctx.user)]),
+    # Phase 4: Browser verification
+    _Repair("headless-verify", 4,
+            lambda ctx, a: _verify_headless_browsers(ctx, a.browsers),
+            lambda ctx, a: [_uid_cmd(ctx.user)] + [_has_cmd(_browser_binary(b)) for b in a.browsers]),
+    # Phase 5: IDE verification
+    _Repair("ide-verify", 5,
+            lambda ctx, a: _verify_ide_launch(ctx),
+            lambda ctx, a: [_has_cmd(ide) for ide in _IDE_VERSION_CMDS]
+            + [_snap_installed_cmd("pycharm-community")]),
+]
+
+
+def _waves(repairs: Sequence[_Repair]) -> List[List[_Repair]]:
+    """Split one phase into waves whose members only depend on earlier waves.
+
+    Dependencies on repairs outside *repairs* are ignored (phases already
+    run in order).  Declaration order is kept inside each wave.
+    """
+    names = {r.name for r in repairs}
+    done: set = set()
+    pending = list(repairs)
+    waves: List[List[_Repair]] = []
+    while pending:
+        wave = [r for r in pending if all(d in done or d not in names for d in r.after)]
+        if not wave:  # dependency cycle — fall back to declaration order
+            wave = pending[:1]
+        waves.append(wave)
+        done.update(r.name for r in wave)
+        pending = [r for r in pending if r not in wave]
+    return waves
+
+
+def _run_timed(ctx: _RepairCtx, repair: _Repair, args: _RepairArgs) -> Tuple[List[RepairResult], float]:
+    start = time.monotonic()
+    results = repair.run(ctx, args)
+    return results, time.monotonic() - start
+
+
 def run_post_install_repairs(
     ssh_port: int,
     ssh_key: Optional[Path],
@@ -830,6 +1099,7 @@ def run_post_install_repairs(
     copy_paths: Optional[Dict[str, str]] = None,
     snap_packages: Optional[List[str]] = None,
     host_username: Optional[str] = None,
+    jobs: int = 4,
 ) -> RepairReport:
     """Run all post-install diagnostics and auto-repairs.
 
@@ -842,50 +1112,46 @@ def run_post_install_repairs(
         copy_paths: Dict of host_path → guest_path that were copied.
         snap_packages: List of snap package names installed in VM.
         host_username: Username on the host (for path rewriting).
+        jobs: Max repairs run concurrently within a phase (1 = sequential).
 
     Returns:
-        RepairReport with all results.
+        RepairReport with all results, in declaration order.
     """
-    browsers = browsers or []
-    copy_paths = copy_paths or {}
+    args = _RepairArgs(
+        browsers=browsers or [],
+        gui_mode=gui_mode,
+        copy_paths=copy_paths or {},
+        snap_packages=snap_packages,
+        host_username=host_username,
+    )
     ctx = _RepairCtx(ssh_port, ssh_key, vm_username)
     report = RepairReport()
+    outcomes: Dict[str, List[RepairResult]] = {}
+    started = time.monotonic()
 
     log.info("=" * 60)
     log.info("POST-INSTALL DIAGNOSTICS & AUTO-REPAIR")
     log.info("=" * 60)
 
-    # Phase 1: System-level repairs
-    log.info("[Phase 1/5] System checks...")
-    report.results.extend(_repair_dns_resolution(ctx))
-    report.results.extend(_repair_apt_lock(ctx))
-    report.results.extend(_repair_xdg_runtime_dir(ctx))
-    report.results.extend(_repair_machine_id(ctx))
-    report.results.extend(_repair_dbus_session(ctx))
-    report.results.extend(_repair_gdm_running(ctx, gui_mode))
-
-    # Phase 2: File ownership and permissions (ALL apps)
-    log.info("[Phase 2/5] File ownership & permissions...")
-    report.results.extend(_repair_home_dir_permissions(ctx))
-    report.results.extend(_repair_snap_dir_ownership(ctx))
-    report.results.extend(_repair_copied_data_ownership(ctx, copy_paths))
-
-    # Phase 3: App-specific repairs (browsers + IDEs)
-    log.info("[Phase 3/5] App profile repairs (browsers + IDEs)...")
-    report.results.extend(_repair_app_lock_files(ctx))
-    report.results.extend(_repair_crash_reports(ctx))
-    report.results.extend(_repair_firefox_profiles_ini(ctx))
-    report.results.extend(_repair_ide_config_paths(ctx, host_username))
-    report.results.extend(_repair_snap_interfaces(ctx, snap_packages))
-    report.results.extend(_repair_fontconfig_cache(ctx))
-
-    # Phase 4: Browser verification
-    log.info("[Phase 4/5] Browser headless verification...")
-    report.results.extend(_verify_headless_browsers(ctx, browsers))
-
-    # Phase 5: IDE verification
-    log.info("[Phase 5/5] IDE verification...")
-    report.results.extend(_verify_ide_launch(ctx))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for phase, title in _PHASES.items():
+            log.info(f"[Phase {phase}/{len(_PHASES)}] {title}")
+            for wave in _waves([r for r in _REPAIRS if r.phase == phase]):
+                ctx.prefetch([cmd for r in wave for cmd in r.probes(ctx, args)])
+                try:
+                    if jobs <= 1 or len(wave) == 1:
+                        timed = [_run_timed(ctx, r, args) for r in wave]
+                    else:
+                        timed = list(pool.map(lambda r: _run_timed(ctx, r, args), wave))
+                finally:
+                    ctx.forget()
+                for repair, (results, elapsed) in zip(wave, timed):
+                    outcomes[repair.name] = results
+                    report.timings[repair.name] = elapsed
+
+    for repair in _REPAIRS:
+        report.results.extend(outcomes.get(repair.name, []))
+    report.wall_time = time.monotonic() - started
 
     report.log_summary()
     return report
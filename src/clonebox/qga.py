@@ -0,0 +1,249 @@
+"""
+Shared QEMU Guest Agent executor for CloneBox.
+
+Replaces the per-call ``virsh qemu-agent-command`` subprocesses that were
+duplicated across validation/core.py, cli/utils.py and orchestrator.py.
+Agent commands go through ``virDomain.qemuAgentCommand`` on one libvirt
+connection per URI; ``virsh`` is only used when libvirt-python is missing
+or the connection cannot be opened.
+
+``guest-exec-status`` polling backs off adaptively (starting at a few
+milliseconds) so short commands return almost immediately while long ones
+do not hammer the agent, and agent round trips to the same VM are
+serialised through a per-VM queue.
+"""
+
+import base64
+import json
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import structlog
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+log = structlog.get_logger(__name__)
+
+# Adaptive back-off for guest-exec-status polling (seconds).
+POLL_INITIAL = 0.01
+POLL_MAX = 0.5
+POLL_FACTOR = 2.0
+
+
+class QGAError(Exception):
+    """The guest agent could not be reached or returned an error."""
+
+
+@dataclass
+class GuestExecResult:
+    """Outcome of a completed ``guest-exec``."""
+
+    exitcode: int
+    stdout: str = ""
+    stderr: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.exitcode == 0
+
+
+class QGAExecutor:
+    """Run guest agent commands for all VMs on one libvirt URI."""
+
+    def __init__(self, conn_uri: str, conn: Any = None):
+        self.conn_uri = conn_uri
+        self._conn = conn
+        # An injected connection belongs to the caller and is never closed here
+        self._owns_conn = conn is None
+        self._conn_failed = False
+        self._lock = threading.Lock()
+        self._vm_locks: Dict[str, threading.Lock] = {}
+
+    # ── transport ────────────────────────────────────────────────────────────
+
+    def _connection(self) -> Any:
+        """Return the libvirt connection, or ``None`` to use ``virsh``."""
+        if self._conn is not None:
+            return self._conn
+        if libvirt is None or self._conn_failed:
+            return None
+        with self._lock:
+            if self._conn is None and not self._conn_failed:
+                try:
+                    self._conn = libvirt.open(self.conn_uri)
+                    self._owns_conn = True
+                except Exception as exc:
+                    log.debug("qga_libvirt_open_failed", uri=self.conn_uri, error=str(exc))
+                    self._conn_failed = True
+        return self._conn
+
+    def _vm_lock(self, vm_name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._vm_locks.get(vm_name)
+            if lock is None:
+                lock = self._vm_locks[vm_name] = threading.Lock()
+            return lock
+
+    def command(self, vm_name: str, payload: Dict[str, Any], timeout: int = 5) -> Dict[str, Any]:
+        """Send one raw agent command and return the decoded JSON response.
+
+        Raises :class:`QGAError` if the agent is unreachable or replies
+        with an error.
+        """
+        request = json.dumps(payload)
+        with self._vm_lock(vm_name):
+            conn = self._connection()
+            if conn is not None:
+                raw = self._libvirt_command(conn, vm_name, request, timeout)
+            else:
+                raw = self._virsh_command(vm_name, request, timeout)
+
+        try:
+            response = json.loads(raw)
+        except (TypeError, ValueError) as exc:
+            raise QGAError(f"Invalid agent response: {str(raw)[:100]}") from exc
+        if not isinstance(response, dict) or "return" not in response:
+            raise QGAError(f"Agent error: {str(raw)[:100]}")
+        return response
+
+    def _libvirt_command(self, conn: Any, vm_name: str, request: str, timeout: int) -> str:
+        try:
+            domain = conn.lookupByName(vm_name)
+            return domain.qemuAgentCommand(request, timeout, 0)
+        except Exception as exc:
+            if not self._conn_alive(conn):
+                self.reset()
+            raise QGAError(str(exc)) from exc
+
+    def _virsh_command(self, vm_name: str, request: str, timeout: int) -> str:
+        try:
+            result = subprocess.run(
+                ["virsh", "--connect", self.conn_uri, "qemu-agent-command", vm_name, request],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired as exc:
+            raise QGAError(f"virsh timed out after {timeout}s") from exc
+        except Exception as exc:
+            raise QGAError(str(exc)) from exc
+        if result.returncode != 0:
+            raise QGAError((result.stderr or "").strip()[:200] or f"virsh exit {result.returncode}")
+        return result.stdout
+
+    @staticmethod
+    def _conn_alive(conn: Any) -> bool:
+        try:
+            return bool(conn.isAlive())
+        except Exception:
+            return False
+
+    def reset(self) -> None:
+        """Drop the libvirt connection; the next command opens its own."""
+        with self._lock:
+            conn, self._conn = self._conn, None
+            owned = self._owns_conn
+            self._conn_failed = False
+        if conn is not None and owned:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # ── high-level helpers ───────────────────────────────────────────────────
+
+    def ping(self, vm_name: str, timeout: int = 5) -> bool:
+        """Return ``True`` if the guest agent answers ``guest-ping``."""
+        try:
+            self.command(vm_name, {"execute": "guest-ping"}, timeout=timeout)
+            return True
+        except QGAError:
+            return False
+
+    def exec(
+        self,
+        vm_name: str,
+        command: str,
+        timeout: int = 10,
+        shell: str = "/bin/sh",
+    ) -> Optional[GuestExecResult]:
+        """Run *command* through ``shell -c`` in the guest.
+
+        Returns ``None`` if the command did not finish within *timeout*.
+        Raises :class:`QGAError` if the agent is unavailable.
+        """
+        response = self.command(
+            vm_name,
+            {
+                "execute": "guest-exec",
+                "arguments": {"path": shell, "arg": ["-c", command], "capture-output": True},
+            },
+            timeout=min(timeout, 10),
+        )
+        pid = (response.get("return") or {}).get("pid")
+        if pid is None:
+            raise QGAError(f"guest-exec returned no pid: {response}")
+
+        deadline = time.monotonic() + timeout
+        delay = POLL_INITIAL
+        polls = 0
+        while True:
+            polls += 1
+            status = self.command(
+                vm_name,
+                {"execute": "guest-exec-status", "arguments": {"pid": pid}},
+                timeout=5,
+            )["return"]
+            if status.get("exited", False):
+                log.debug("qga_exec_done", vm=vm_name, pid=pid, polls=polls)
+                return GuestExecResult(
+                    exitcode=status.get("exitcode", 0),
+                    stdout=_b64(status.get("out-data")),
+                    stderr=_b64(status.get("err-data")),
+                )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.debug("qga_exec_timeout", vm=vm_name, pid=pid, polls=polls)
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * POLL_FACTOR, POLL_MAX)
+
+    def exec_output(
+        self,
+        vm_name: str,
+        command: str,
+        timeout: int = 10,
+        shell: str = "/bin/sh",
+    ) -> Optional[str]:
+        """Run *command* and return its stdout, or ``None`` on any failure."""
+        try:
+            result = self.exec(vm_name, command, timeout=timeout, shell=shell)
+        except QGAError as exc:
+            log.debug("qga_exec_failed", vm=vm_name, error=str(exc))
+            return None
+        return None if result is None else result.stdout
+
+
+def _b64(data: Optional[str]) -> str:
+    if not data:
+        return ""
+    return base64.b64decode(data).decode("utf-8", errors="replace")
+
+
+_executors: Dict[str, QGAExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_qga_executor(conn_uri: str) -> QGAExecutor:
+    """Return the process-wide executor for *conn_uri*."""
+    with _executors_lock:
+        executor = _executors.get(conn_uri)
+        if executor is None:
+            executor = _executors[conn_uri] = QGAExecutor(conn_uri)
+        return executor
@@ -0,0 +1,327 @@
+"""
+Event-driven VM readiness tracking for CloneBox.
+
+Replaces the fixed sleeps between boot stages in ``create_vm`` / ``start_vm``
+with stage notifications from two sources:
+
+* libvirt domain events (lifecycle, reboot and guest-agent lifecycle),
+  delivered by the default libvirt event loop on a daemon thread;
+* the VM serial log, tailed incrementally for the ``[clonebox]`` markers
+  cloud-init writes to ``/dev/ttyS0`` plus a few well-known boot lines
+  (the same lines also feed :mod:`clonebox.serial_progress`).
+
+Callers wait on stages with a timeout.  When neither source is available
+(no libvirt-python, unreadable serial log) every wait simply times out, so
+the existing poll loops keep working unchanged.
+"""
+
+import re
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+import structlog
+
+from clonebox.serial_progress import ProgressEvent, ProgressParser, SerialLogTail
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+log = structlog.get_logger(__name__)
+
+# How often the serial log is checked for new output (seconds).
+SERIAL_POLL_INTERVAL = 0.2
+
+
+class Stage(Enum):
+    """Boot/provisioning milestones a waiter can block on."""
+
+    STARTED = "started"
+    STOPPED = "stopped"
+    REBOOTED = "rebooted"
+    AGENT_CONNECTED = "agent-connected"
+    AGENT_DISCONNECTED = "agent-disconnected"
+    KERNEL = "kernel"
+    CLOUD_INIT = "cloud-init"
+    SSH_KEYS = "ssh-keys"
+    RUNCMD = "runcmd"
+    REBOOTING = "rebooting"
+    CLOUD_INIT_DONE = "cloud-init-done"
+    LOGIN = "login"
+    PROVISION_FAILED = "provision-failed"
+    SEALED = "sealed"
+
+
+# Serial console lines that mark a stage (first match wins).
+SERIAL_MARKERS: List[Tuple[Pattern[str], Stage]] = [
+    (re.compile(r"Linux version \d"), Stage.KERNEL),
+    (re.compile(r"\[clonebox\] bootcmd"), Stage.CLOUD_INIT),
+    (re.compile(r"BEGIN SSH HOST KEY"), Stage.SSH_KEYS),
+    (re.compile(r"\[clonebox\] Starting VM setup"), Stage.RUNCMD),
+    (re.compile(r"\[clonebox\] Rebooting in"), Stage.REBOOTING),
+    (re.compile(r"\[clonebox\] (?:WARNING|ERROR):"), Stage.PROVISION_FAILED),
+    (re.compile(r"\[clonebox\] Golden image sealed"), Stage.SEALED),
+    (re.compile(r"Cloud-init v\. \S+ finished"), Stage.CLOUD_INIT_DONE),
+    (re.compile(r"\blogin:\s*$"), Stage.LOGIN),
+]
+
+
+def classify_serial_line(line: str) -> Optional[Stage]:
+    """Return the stage announced by a serial console *line*, if any."""
+    for pattern, stage in SERIAL_MARKERS:
+        if pattern.search(line):
+            return stage
+    return None
+
+
+_event_loop_lock = threading.Lock()
+_event_loop_started = False
+
+
+def _ensure_event_loop() -> bool:
+    """Start the default libvirt event loop once per process."""
+    global _event_loop_started
+    if libvirt is None:
+        return False
+    with _event_loop_lock:
+        if _event_loop_started:
+            return True
+        try:
+            libvirt.virEventRegisterDefaultImpl()
+        except Exception as exc:
+            log.debug("libvirt_event_loop_unavailable", error=str(exc))
+            return False
+
+        def _loop() -> None:
+            while True:
+                try:
+                    libvirt.virEventRunDefaultImpl()
+                except Exception as exc:
+                    log.debug("libvirt_event_loop_error", error=str(exc))
+                    time.sleep(1)
+
+        threading.Thread(target=_loop, name="clonebox-libvirt-events", daemon=True).start()
+        _event_loop_started = True
+        return True
+
+
+class ReadinessWatcher:
+    """Track boot stages of one VM from libvirt events and its serial log.
+
+    Every stage mark bumps a sequence number; waits can ask for stages
+    reached *since* a given sequence so repeated boots (GUI reboot) are
+    distinguished.  Use as a context manager around ``vm.create()``.
+    """
+
+    def __init__(self, vm_name: str, conn_uri: str, serial_log: Optional[Path] = None):
+        self.vm_name = vm_name
+        self.conn_uri = conn_uri
+        self.serial_log = serial_log
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._marks: Dict[Stage, int] = {}
+        self._cursor = 0
+        self._conn: Any = None
+        self._callback_ids: List[int] = []
+        self._tail: Optional[SerialLogTail] = None
+        self._parser = ProgressParser()
+        self._progress: Optional[ProgressEvent] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ── lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self) -> "ReadinessWatcher":
+        if self.serial_log is not None:
+            self._tail = SerialLogTail(self.serial_log)
+            self._thread = threading.Thread(
+                target=self._tail_loop, name=f"clonebox-serial-{self.vm_name}", daemon=True
+            )
+            self._thread.start()
+        self._register_events()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self._tail is not None:
+            self._tail.close()
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            for cb_id in self._callback_ids:
+                try:
+                    conn.domainEventDeregisterAny(cb_id)
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._callback_ids = []
+
+    def __enter__(self) -> "ReadinessWatcher":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @property
+    def events_live(self) -> bool:
+        """True if libvirt domain events are being delivered."""
+        return self._conn is not None
+
+    @property
+    def serial_live(self) -> bool:
+        """True if the serial log is being tailed and exists."""
+        return self._tail is not None and self._tail.path.exists()
+
+    @property
+    def live(self) -> bool:
+        """True if at least one event source is active."""
+        return self.events_live or self.serial_live
+
+    # ── stage bookkeeping ───────────────────────────────────────────────────
+
+    @property
+    def seq(self) -> int:
+        with self._cond:
+            return self._seq
+
+    def mark(self, stage: Stage) -> None:
+        with self._cond:
+            self._seq += 1
+            self._marks[stage] = self._seq
+            self._cond.notify_all()
+        log.debug("vm_stage", vm=self.vm_name, stage=stage.value)
+
+    def last(self, stage: Stage) -> int:
+        """Sequence number of the latest *stage* mark (0 if never reached)."""
+        with self._cond:
+            return self._marks.get(stage, 0)
+
+    def reached(self, *stages: Stage, since: int = 0) -> Optional[Stage]:
+        with self._cond:
+            return self._reached(stages, since)
+
+    def _reached(self, stages: Tuple[Stage, ...], since: int) -> Optional[Stage]:
+        for stage in stages:
+            if self._marks.get(stage, 0) > since:
+                return stage
+        return None
+
+    def wait_for(self, *stages: Stage, timeout: float, since: int = 0) -> Optional[Stage]:
+        """Block until one of *stages* is marked after *since*, or *timeout*."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                hit = self._reached(stages, since)
+                remaining = deadline - time.monotonic()
+                if hit is not None or remaining <= 0:
+                    return hit
+                self._cond.wait(remaining)
+
+    def pause(self, timeout: float, *stages: Stage) -> bool:
+        """Sleep up to *timeout*, waking early on a new mark.
+
+        Only marks made since the previous ``pause`` count; with *stages*
+        only those stages wake the caller.  Returns ``True`` if woken early.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            since = self._cursor
+            woken = False
+            while True:
+                if stages:
+                    woken = self._reached(stages, since) is not None
+                else:
+                    woken = self._seq > since
+                remaining = deadline - time.monotonic()
+                if woken or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._cursor = self._seq
+            return woken
+
+    # ── sources ──────────────────────────────────────────────────────────────
+
+    @property
+    def progress(self) -> Optional[ProgressEvent]:
+        """Latest cloud-init progress event parsed from the serial log."""
+        with self._cond:
+            return self._progress
+
+    def feed_line(self, line: str) -> Optional[Stage]:
+        event = self._parser.feed(line)
+        if event is not None:
+            with self._cond:
+                self._progress = event
+        stage = classify_serial_line(line)
+        if stage is not None:
+            self.mark(stage)
+        return stage
+
+    def _tail_loop(self) -> None:
+        while not self._stop.is_set():
+            for line in self._tail.read_lines():
+                self.feed_line(line)
+            self._stop.wait(SERIAL_POLL_INTERVAL)
+
+    def _register_events(self) -> None:
+        if not _ensure_event_loop():
+            return
+        try:
+            conn = libvirt.openReadOnly(self.conn_uri)
+        except Exception as exc:
+            log.debug("readiness_events_unavailable", uri=self.conn_uri, error=str(exc))
+            return
+
+        def _ours(dom: Any) -> bool:
+            try:
+                return dom.name() == self.vm_name
+            except Exception:
+                return False
+
+        def _on_lifecycle(_conn: Any, dom: Any, event: int, _detail: int, _opaque: Any) -> None:
+            if not _ours(dom):
+                return
+            if event == libvirt.VIR_DOMAIN_EVENT_STARTED:
+                self.mark(Stage.STARTED)
+            elif event == libvirt.VIR_DOMAIN_EVENT_STOPPED:
+                self.mark(Stage.STOPPED)
+
+        def _on_reboot(_conn: Any, dom: Any, _opaque: Any) -> None:
+            if _ours(dom):
+                self.mark(Stage.REBOOTED)
+
+        def _on_agent(_conn: Any, dom: Any, state: int, _reason: int, _opaque: Any) -> None:
+            if not _ours(dom):
+                return
+            if state == libvirt.VIR_CONNECT_DOMAIN_EVENT_AGENT_LIFECYCLE_STATE_CONNECTED:
+                self.mark(Stage.AGENT_CONNECTED)
+            else:
+                self.mark(Stage.AGENT_DISCONNECTED)
+
+        callbacks = [
+            (libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, _on_lifecycle),
+            (libvirt.VIR_DOMAIN_EVENT_ID_REBOOT, _on_reboot),
+            (getattr(libvirt, "VIR_DOMAIN_EVENT_ID_AGENT_LIFECYCLE", None), _on_agent),
+        ]
+        for event_id, callback in callbacks:
+            if event_id is None:
+                continue
+            try:
+                self._callback_ids.append(conn.domainEventRegisterAny(None, event_id, callback, None))
+            except Exception as exc:
+                log.debug("readiness_event_register_failed", event=event_id, error=str(exc))
+        if self._callback_ids:
+            self._conn = conn
+        else:
+            try:
+                conn.close()
+            except Exception:
+                pass
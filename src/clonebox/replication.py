@@ -0,0 +1,526 @@
+"""
+Block-level incremental replication of VM disks to a standby peer.
+
+A full export/import moves every byte of a VM.  A replica only needs the
+clusters the guest wrote since the previous sync, and qemu already tracks
+those: every sync creates a libvirt checkpoint, which puts a persistent
+dirty bitmap into each qcow2 disk.  The next sync reads the disks through
+an NBD export of that bitmap and ships just the dirty extents.
+
+* **Running VM** — a pull-mode backup (``virDomainBackupBegin``) gives a
+  point-in-time NBD export of every disk plus the ``backup-<disk>`` bitmap
+  of the changes since the previous checkpoint, and creates the next
+  checkpoint atomically.
+* **Shut-off VM** — the next checkpoint is created first, then each disk
+  is exported read-only by ``qemu-nbd -B <previous checkpoint>``.  A
+  checkpoint's bitmap stops recording once the next checkpoint exists, so
+  when newer checkpoints (kept for other peers) follow the base, their
+  bitmaps are merged with it into a temporary one that is exported instead.
+
+A first sync (or ``full=True``) ships the allocated extents only.  The
+extents go to the peer over SSH as a record stream (see :func:`send_changes`)
+into ``clonebox replica receive``. That command writes them to
+``<images>/replicas/<vm>/<disk>.qcow2`` through ``qemu-nbd``.  Next to each
+replica a ``<disk>.replica.json`` records the checkpoint it matches and
+whether an incremental sync was interrupted half-way.  An interrupted
+sync is simply re-sent from the same base checkpoint; a full sync builds a
+new replica under a temporary name and swaps it in when complete.
+
+Checkpoints are kept while some peer still needs them as a base
+(``<vm_dir>/replication.json``); older ``clonebox-*`` checkpoints are
+deleted after each successful sync.
+
+Reading and writing NBD uses the libnbd Python bindings (``python3-libnbd``).
+"""
+
+import contextlib
+import json
+import os
+import struct
+import subprocess
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+from clonebox import paths as _paths
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+try:
+    import nbd
+except ImportError:
+    nbd = None
+
+log = structlog.get_logger(__name__)
+
+MAGIC = b"CBXREPL1"
+CHECKPOINT_PREFIX = "clonebox-"
+STATE_FILE = "replication.json"
+REPLICA_STATE_SUFFIX = ".replica.json"
+
+REC_DATA = 1
+REC_ZERO = 2
+REC_END = 3
+_RECORD = struct.Struct(">BQI")
+_LENGTH = struct.Struct(">I")
+
+# NBD_STATE_* flags of the base:allocation context
+STATE_HOLE = 1
+STATE_ZERO = 2
+# A set bit in a qemu:dirty-bitmap context
+STATE_DIRTY = 1
+
+ALLOCATION_CONTEXT = "base:allocation"
+# Union of a base checkpoint's bitmap and those of the checkpoints after it
+MERGED_BITMAP = "clonebox-replication-merged"
+_IO_SIZE = 4 * 1024 * 1024
+_STATUS_SPAN = 1024 * 1024 * 1024
+_ZEROS = bytes(_IO_SIZE)
+
+
+class ReplicationError(RuntimeError):
+    """A replica cannot be brought up to date from this stream."""
+
+
+def dirty_context(bitmap: str) -> str:
+    return f"qemu:dirty-bitmap:{bitmap}"
+
+
+def _require_nbd() -> None:
+    if nbd is None:
+        raise RuntimeError("libnbd Python bindings not installed (python3-libnbd)")
+
+
+def _open_nbd(argv: Optional[List[str]] = None, socket: Optional[Path] = None,
+              export: str = "", context: Optional[str] = None):
+    """Connect to an NBD export: a ``qemu-nbd`` we start, or a unix socket."""
+    _require_nbd()
+    h = nbd.NBD()
+    if context:
+        h.add_meta_context(context)
+    h.set_export_name(export)
+    if argv is not None:
+        h.connect_systemd_socket_activation(argv)
+    else:
+        h.connect_unix(str(socket))
+    if context and not h.can_meta_context(context):
+        h.shutdown()
+        raise ReplicationError(f"NBD export does not provide {context}")
+    return h
+
+
+def _qemu_img(*args: str) -> None:
+    subprocess.run(["qemu-img", *args], capture_output=True, text=True, check=True)
+
+
+def _merge_bitmaps(image: Path, name: str, sources: List[str]) -> None:
+    """(Re)create bitmap *name* in *image* as the union of the *sources* bitmaps."""
+    with contextlib.suppress(subprocess.CalledProcessError):
+        # Left behind by an interrupted sync
+        _qemu_img("bitmap", "-f", "qcow2", "--remove", str(image), name)
+    merges = [arg for source in sources for arg in ("--merge", source)]
+    _qemu_img("bitmap", "-f", "qcow2", "--add", *merges, str(image), name)
+
+
+def _check_name(name: str) -> str:
+    if not _paths.is_safe_name(name):
+        raise ReplicationError(f"Invalid VM or disk name: {name!r}")
+    return name
+
+
+# ── sender ───────────────────────────────────────────────────────────────────
+
+def changed_extents(h, context: str, size: int) -> Iterator[Tuple[int, int]]:
+    """``(offset, length)`` of the extents to ship, from NBD block status.
+
+    For a dirty bitmap these are the dirty extents; for
+    :data:`ALLOCATION_CONTEXT` the extents that are not known to read as
+    zeros.
+    """
+    if context == ALLOCATION_CONTEXT:
+        wanted = lambda flags: not flags & STATE_ZERO  # noqa: E731
+    else:
+        wanted = lambda flags: bool(flags & STATE_DIRTY)  # noqa: E731
+    offset = 0
+    while offset < size:
+        entries: List[int] = []
+
+        def collect(metacontext, _offset, extents, _err, entries=entries):
+            if metacontext == context:
+                entries.extend(extents)
+            return 0
+
+        h.block_status(min(size - offset, _STATUS_SPAN), offset, collect)
+        if not entries:
+            raise ReplicationError(f"No block status for {context} at offset {offset}")
+        for i in range(0, len(entries), 2):
+            length = min(entries[i], size - offset)
+            if wanted(entries[i + 1]):
+                yield offset, length
+            offset += length
+            if offset >= size:
+                break
+
+
+def send_changes(h, context: str, size: int, header: Dict[str, Any], out: BinaryIO) -> int:
+    """Write the replication stream for one disk to *out*.
+
+    Stream: :data:`MAGIC`, a length-prefixed JSON *header*, then records
+    of ``kind, offset, length`` — :data:`REC_DATA` followed by the
+    zlib-compressed data, :data:`REC_ZERO` without payload — and a final
+    :data:`REC_END`, without which the receiver rejects the stream.
+    Returns the number of data bytes shipped.
+    """
+    blob = json.dumps(dict(header, size=size)).encode()
+    out.write(MAGIC + _LENGTH.pack(len(blob)) + blob)
+    shipped = 0
+    for start, length in changed_extents(h, context, size):
+        for offset in range(start, start + length, _IO_SIZE):
+            count = min(_IO_SIZE, start + length - offset)
+            data = h.pread(count, offset)
+            if data == _ZEROS[:count]:
+                out.write(_RECORD.pack(REC_ZERO, offset, count))
+                continue
+            packed = zlib.compress(data, 1)
+            out.write(_RECORD.pack(REC_DATA, offset, count) + _LENGTH.pack(len(packed)))
+            out.write(packed)
+            shipped += count
+    out.write(_RECORD.pack(REC_END, 0, 0))
+    return shipped
+
+
+def _file_disks(domain_xml: str) -> List[Tuple[str, Path]]:
+    """``(target dev, source file)`` of the disks to replicate."""
+    disks = []
+    root = ET.fromstring(domain_xml)
+    for disk in root.findall("./devices/disk"):
+        if disk.get("device", "disk") != "disk":
+            continue
+        target, source, driver = disk.find("target"), disk.find("source"), disk.find("driver")
+        name = target.get("dev") if target is not None else "?"
+        if disk.get("type") != "file" or source is None or not source.get("file"):
+            raise ReplicationError(f"Disk {name} is not file-backed and cannot be replicated")
+        if driver is None or driver.get("type") != "qcow2":
+            raise ReplicationError(f"Disk {name} is not qcow2; dirty tracking needs qcow2")
+        disks.append((name, Path(source.get("file"))))
+    if not disks:
+        raise ReplicationError("Domain has no disks to replicate")
+    return disks
+
+
+def _checkpoint_name() -> str:
+    return f"{CHECKPOINT_PREFIX}{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def _checkpoint_xml(name: str, targets: List[str]) -> str:
+    cp = ET.Element("domaincheckpoint")
+    ET.SubElement(cp, "name").text = name
+    disks = ET.SubElement(cp, "disks")
+    for target in targets:
+        ET.SubElement(disks, "disk", name=target, checkpoint="bitmap")
+    return ET.tostring(cp, encoding="unicode")
+
+
+def _backup_xml(base: Optional[str], targets: List[str], workdir: Path) -> str:
+    backup = ET.Element("domainbackup", mode="pull")
+    if base:
+        ET.SubElement(backup, "incremental").text = base
+    ET.SubElement(backup, "server", transport="unix", socket=str(workdir / "backup.sock"))
+    disks = ET.SubElement(backup, "disks")
+    for target in targets:
+        disk = ET.SubElement(disks, "disk", name=target, backup="yes", type="file")
+        ET.SubElement(disk, "scratch", file=str(workdir / f"{target}.scratch.qcow2"))
+    return ET.tostring(backup, encoding="unicode")
+
+
+class ReplicationState:
+    """Checkpoint each peer's replicas match, in ``<vm_dir>/replication.json``."""
+
+    def __init__(self, vm_name: str, user_session: bool = True):
+        self.path = _paths.vm_dir(vm_name, user_session) / STATE_FILE
+
+    def load(self) -> Dict[str, str]:
+        try:
+            return json.loads(self.path.read_text())["peers"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+
+    def save(self, peers: Dict[str, str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"peers": peers}, indent=2))
+        os.replace(tmp, self.path)
+
+
+class Replicator:
+    """Replicate the disks of a local VM to a peer's standby copy."""
+
+    def __init__(self, conn_uri: str = "qemu:///system"):
+        self.conn_uri = conn_uri
+        self.user_session = conn_uri.endswith("/session")
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            if libvirt is None:
+                raise RuntimeError("libvirt-python not installed")
+            self._conn = libvirt.open(self.conn_uri)
+        return self._conn
+
+    def replicate(
+        self,
+        vm_name: str,
+        peer: str,
+        remote_cmd: Callable[[str], List[str]],
+        full: bool = False,
+    ) -> Dict[str, int]:
+        """Bring *peer*'s replica of *vm_name* up to date.
+
+        *remote_cmd* turns a clonebox command into an argv that runs it on
+        the peer (``ssh ... host cmd``).  Returns the data bytes shipped
+        per disk.
+        """
+        _require_nbd()
+        dom = self.conn.lookupByName(vm_name)
+        disks = _file_disks(dom.XMLDesc(0))
+        targets = [target for target, _ in disks]
+        state = ReplicationState(vm_name, self.user_session)
+        peers = state.load()
+
+        base = None if full else self._usable_base(dom, peers.get(peer), vm_name, remote_cmd, targets)
+        checkpoint = _checkpoint_name()
+        header = {"vm": vm_name, "checkpoint": checkpoint, "base": base}
+        log.info("replication_started", vm=vm_name, peer=peer, base=base, checkpoint=checkpoint)
+
+        shipped: Dict[str, int] = {}
+        try:
+            with self._disk_exports(dom, disks, base, checkpoint) as exports:
+                for target, (h, context) in exports.items():
+                    shipped[target] = self._send(
+                        h, context, dict(header, disk=target), remote_cmd, vm_name
+                    )
+        except BaseException:
+            self._delete_checkpoint(dom, checkpoint)
+            raise
+
+        peers[peer] = checkpoint
+        state.save(peers)
+        self._prune(dom, set(peers.values()))
+        log.info("replication_finished", vm=vm_name, peer=peer, checkpoint=checkpoint,
+                 bytes=sum(shipped.values()))
+        return shipped
+
+    def _usable_base(self, dom, base: Optional[str], vm_name: str,
+                     remote_cmd: Callable[[str], List[str]], targets: List[str]) -> Optional[str]:
+        """The checkpoint to sync from, or None if a full sync is needed."""
+        if not base or base not in {cp.getName() for cp in dom.listAllCheckpoints()}:
+            return None
+        result = subprocess.run(remote_cmd(f"clonebox replica status {vm_name}"),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ReplicationError(f"Replica status failed: {result.stderr.strip()}")
+        replicas = json.loads(result.stdout or "{}")
+        if all(replicas.get(t, {}).get("checkpoint") == base for t in targets):
+            return base
+        return None
+
+    @contextlib.contextmanager
+    def _disk_exports(self, dom, disks: List[Tuple[str, Path]], base: Optional[str],
+                      checkpoint: str) -> Iterator[Dict[str, Tuple[Any, str]]]:
+        """NBD handle and block-status context per disk."""
+        targets = [target for target, _ in disks]
+        handles: Dict[str, Tuple[Any, str]] = {}
+        with contextlib.ExitStack() as stack:
+            if dom.isActive():
+                workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(
+                    prefix=".replication-", dir=_paths.images_dir(self.user_session)
+                )))
+                dom.backupBegin(_backup_xml(base, targets, workdir),
+                                _checkpoint_xml(checkpoint, targets), 0)
+                stack.callback(dom.abortJob)
+                for target in targets:
+                    context = dirty_context(f"backup-{target}") if base else ALLOCATION_CONTEXT
+                    handles[target] = (_open_nbd(socket=workdir / "backup.sock",
+                                                 export=target, context=context), context)
+                    stack.callback(handles[target][0].shutdown)
+            else:
+                later = self._later_checkpoints(dom, base) if base else []
+                dom.checkpointCreateXML(_checkpoint_xml(checkpoint, targets), 0)
+                for target, path in disks:
+                    argv = ["qemu-nbd", "--read-only", "--format=qcow2"]
+                    context = ALLOCATION_CONTEXT
+                    if base:
+                        bitmap = base
+                        if later:
+                            bitmap = MERGED_BITMAP
+                            _merge_bitmaps(path, bitmap, [base] + later)
+                            stack.callback(_qemu_img, "bitmap", "-f", "qcow2", "--remove",
+                                           str(path), bitmap)
+                        argv += ["--bitmap", bitmap]
+                        context = dirty_context(bitmap)
+                    handles[target] = (_open_nbd(argv + [str(path)], context=context), context)
+                    stack.callback(handles[target][0].shutdown)
+            yield handles
+
+    def _later_checkpoints(self, dom, base: str) -> List[str]:
+        """Checkpoints created after *base*, whose bitmaps hold the newer changes."""
+        flags = getattr(libvirt, "VIR_DOMAIN_CHECKPOINT_LIST_DESCENDANTS", 1)
+        return [cp.getName() for cp in dom.checkpointLookupByName(base).listAllChildren(flags)]
+
+    def _send(self, h, context: str, header: Dict[str, Any],
+              remote_cmd: Callable[[str], List[str]], vm_name: str) -> int:
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(remote_cmd("clonebox replica receive"),
+                                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                shipped = send_changes(h, context, h.get_size(), header, proc.stdin)
+            finally:
+                with contextlib.suppress(OSError):
+                    proc.stdin.close()
+                if proc.wait() != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode(errors="replace").strip()
+                    raise ReplicationError(
+                        f"Replica update of {vm_name}/{header['disk']} failed: "
+                        f"{message or f'exit code {proc.returncode}'}; re-run to retry"
+                    )
+        log.info("replica_disk_sent", vm=vm_name, disk=header["disk"],
+                 base=header["base"], bytes=shipped)
+        return shipped
+
+    def _delete_checkpoint(self, dom, name: str) -> None:
+        with contextlib.suppress(Exception):
+            dom.checkpointLookupByName(name).delete()
+
+    def _prune(self, dom, keep: set) -> None:
+        for cp in dom.listAllCheckpoints():
+            name = cp.getName()
+            if name.startswith(CHECKPOINT_PREFIX) and name not in keep:
+                cp.delete()
+                log.info("checkpoint_pruned", checkpoint=name)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ── receiver ─────────────────────────────────────────────────────────────────
+
+def replicas_dir(vm_name: str, user_session: bool = True) -> Path:
+    return _paths.images_dir(user_session) / "replicas" / _check_name(vm_name)
+
+
+def replica_status(vm_name: str, user_session: bool = True) -> Dict[str, Dict[str, Any]]:
+    """Replica state per disk of *vm_name* on this host."""
+    status = {}
+    directory = replicas_dir(vm_name, user_session)
+    for path in sorted(directory.glob(f"*{REPLICA_STATE_SUFFIX}")):
+        with contextlib.suppress(ValueError):
+            status[path.name[:-len(REPLICA_STATE_SUFFIX)]] = json.loads(path.read_text())
+    return status
+
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    data = src.read(size)
+    if len(data) != size:
+        raise ReplicationError("Replication stream ended early; the replica was not updated")
+    return data
+
+
+def apply_changes(src: BinaryIO, h) -> int:
+    """Apply the records of a replication stream to NBD handle *h*.
+
+    Returns the number of data bytes written.  Raises if the stream ends
+    before its end record.
+    """
+    written = 0
+    while True:
+        kind, offset, length = _RECORD.unpack(_read_exact(src, _RECORD.size))
+        if kind == REC_END:
+            h.flush()
+            return written
+        if kind == REC_ZERO:
+            h.zero(length, offset)
+        elif kind == REC_DATA:
+            (packed_len,) = _LENGTH.unpack(_read_exact(src, _LENGTH.size))
+            data = zlib.decompress(_read_exact(src, packed_len))
+            if len(data) != length:
+                raise ReplicationError(f"Corrupt record at offset {offset}")
+            h.pwrite(data, offset)
+            written += length
+        else:
+            raise ReplicationError(f"Unknown record type {kind}")
+
+
+def read_header(src: BinaryIO) -> Dict[str, Any]:
+    if _read_exact(src, len(MAGIC)) != MAGIC:
+        raise ReplicationError("Not a clonebox replication stream")
+    (length,) = _LENGTH.unpack(_read_exact(src, _LENGTH.size))
+    return json.loads(_read_exact(src, length))
+
+
+def _write_state(path: Path, state: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+
+def receive_replica(src: BinaryIO, user_session: bool = True) -> Dict[str, Any]:
+    """Update the local replica disk from the replication stream on *src*."""
+    header = read_header(src)
+    directory = replicas_dir(header["vm"], user_session)
+    disk = _check_name(header["disk"])
+    directory.mkdir(parents=True, exist_ok=True)
+    replica = directory / f"{disk}.qcow2"
+    state_path = directory / f"{disk}{REPLICA_STATE_SUFFIX}"
+    size = header["size"]
+
+    if header["base"] is None:
+        target = directory / f".{disk}.qcow2.partial"
+        target.unlink(missing_ok=True)
+        _qemu_img("create", "-q", "-f", "qcow2", str(target), str(size))
+    else:
+        try:
+            state = json.loads(state_path.read_text())
+        except FileNotFoundError:
+            raise ReplicationError(f"No replica of {header['vm']}/{disk}; run a full sync") from None
+        if state["checkpoint"] != header["base"]:
+            raise ReplicationError(
+                f"Replica of {header['vm']}/{disk} is at {state['checkpoint']}, "
+                f"not {header['base']}; run a full sync"
+            )
+        # Until the stream is applied completely the replica is only
+        # good as a base for re-sending the same changes
+        _write_state(state_path, dict(state, consistent=False))
+        if state.get("size") != size:
+            _qemu_img("resize", "-q", "-f", "qcow2", str(replica), str(size))
+        target = replica
+
+    try:
+        h = _open_nbd(["qemu-nbd", "--format=qcow2", "--discard=unmap", str(target)])
+        try:
+            written = apply_changes(src, h)
+        finally:
+            h.shutdown()
+        if target != replica:
+            os.replace(target, replica)
+    finally:
+        if target != replica:
+            target.unlink(missing_ok=True)
+
+    state = {"checkpoint": header["checkpoint"], "consistent": True, "size": size,
+             "synced_at": time.time()}
+    _write_state(state_path, state)
+    log.info("replica_updated", vm=header["vm"], disk=disk, checkpoint=header["checkpoint"],
+             base=header["base"], bytes=written)
+    return state
@@ -0,0 +1,299 @@
+"""
+Background sampler of VM, container, health and compose state.
+
+Long-running services (the dashboard and its ``/metrics`` endpoint) read
+CloneBox state from a :class:`Sampler` instead of querying libvirt or the
+container engine per request.  Each source is polled by its own thread on
+its own interval:
+
+* ``vms`` — one bulk libvirt stats call over a persistent connection
+  (:class:`clonebox.domain_stats.DomainStatsCollector`);
+* ``containers`` — ``podman/docker ps -a`` and ``stats``;
+* ``health`` — the probes in ``<health dir>/<vm>.yaml`` (the
+  ``health_checks`` list of ``.clonebox.yaml``), run for VMs that are up;
+* ``compose`` — the VMs of the given compose files and their libvirt state.
+
+A source replaces its part of the state as a whole, so :meth:`Sampler.snapshot`
+is a cheap, consistent read that never waits for a slow source.  Every
+publication bumps :attr:`Sampler.version`, which readers use to reuse
+whatever they derived from the previous snapshot, and calls the listeners
+registered with :meth:`Sampler.add_listener`.  A libvirt lifecycle event
+(start, stop, define, ...) wakes the ``vms`` source right away instead of
+at its next interval.
+
+Every VM and container sample is also recorded in the metrics history
+(:class:`clonebox.metrics_store.MetricsStore`, the default one unless
+another is given).
+"""
+
+import copy
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from clonebox.container import ContainerCloner
+from clonebox.domain_stats import DomainSample
+from clonebox.health.manager import HealthCheckManager
+from clonebox.health.models import VMHealthState
+from clonebox.metrics_store import MetricsStore
+from clonebox.monitor import ContainerStats, ResourceMonitor
+
+log = structlog.get_logger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+HEALTH_INTERVAL = 30.0
+# CPU samples kept per VM for dashboard sparklines
+SPARKLINE_POINTS = 60
+
+
+@dataclass
+class SourceStatus:
+    """Outcome of the latest runs of one source."""
+
+    last_success: Optional[float] = None
+    duration: float = 0.0
+    errors: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class Snapshot:
+    """Everything the sampler knows, as of *taken_at*."""
+
+    vms: Dict[str, DomainSample] = field(default_factory=dict)
+    containers: List[ContainerStats] = field(default_factory=list)
+    # ``ContainerCloner.list_containers`` entries, stopped containers included
+    container_list: List[Dict[str, Any]] = field(default_factory=list)
+    health: Dict[str, VMHealthState] = field(default_factory=dict)
+    # project -> [{"name", "state", "start_group", "depends_on"}]
+    compose: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    # vm -> last SPARKLINE_POINTS CPU percentages, oldest first
+    sparklines: Dict[str, List[float]] = field(default_factory=dict)
+    # vm -> CPU percentages appended to its sparkline so far
+    sparkline_counts: Dict[str, int] = field(default_factory=dict)
+    sources: Dict[str, SourceStatus] = field(default_factory=dict)
+    taken_at: float = 0.0
+    version: int = 0
+
+
+class Sampler:
+    """Poll CloneBox state in background threads and keep the latest values."""
+
+    def __init__(
+        self,
+        conn_uri: str = "qemu:///system",
+        interval: float = DEFAULT_INTERVAL,
+        health_interval: float = HEALTH_INTERVAL,
+        health_dir: Optional[Path] = None,
+        compose_files: Sequence[Path] = (),
+        engine: str = "auto",
+        store: Optional[MetricsStore] = None,
+    ):
+        self.conn_uri = conn_uri
+        self.user_session = conn_uri.endswith("/session")
+        self.interval = interval
+        self.health_interval = health_interval
+        self.compose_files = [Path(p) for p in compose_files]
+        self.engine = engine
+        self.monitor = ResourceMonitor(conn_uri, store=store if store is not None else MetricsStore.default())
+        self._containers: Optional[ContainerCloner] = None
+        self.health_manager = HealthCheckManager(health_dir)
+        self._lock = threading.Lock()
+        self._state = Snapshot()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._wakeups: Dict[str, threading.Event] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._cpu_history: Dict[str, Deque[float]] = {}
+        self._cpu_counts: Dict[str, int] = {}
+        self.collector.add_listener(lambda _name, _event: self.wake("vms"))
+
+    @property
+    def collector(self):
+        return self.monitor.collector
+
+    @property
+    def version(self) -> int:
+        return self._state.version
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call *callback* (from a sampler thread) whenever the state changes."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _changed(self) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as exc:
+                log.debug("sampler_listener_failed", error=str(exc))
+
+    def wake(self, source: str) -> None:
+        """Poll *source* now rather than at its next interval."""
+        event = self._wakeups.get(source)
+        if event is not None:
+            event.set()
+
+    def sources(self) -> Dict[str, Tuple[Callable[[], None], float]]:
+        """Source name -> (poll function, interval)."""
+        sources = {
+            "vms": (self.sample_vms, self.interval),
+            "containers": (self.sample_containers, self.interval),
+            "health": (self.sample_health, self.health_interval),
+        }
+        if self.compose_files:
+            sources["compose"] = (self.sample_compose, self.interval)
+        return sources
+
+    # ── lifecycle ───────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for name, (poll, interval) in self.sources().items():
+            self._wakeups[name] = threading.Event()
+            thread = threading.Thread(
+                target=self._loop, args=(name, poll, interval), name=f"clonebox-sampler-{name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        log.info("sampler_started", uri=self.conn_uri, sources=list(self.sources()))
+
+    def stop(self) -> None:
+        self._stop.set()
+        for event in self._wakeups.values():
+            event.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self.monitor.close()
+
+    def _loop(self, name: str, poll: Callable[[], None], interval: float) -> None:
+        wakeup = self._wakeups[name]
+        while not self._stop.is_set():
+            wakeup.clear()
+            self.run_source(name, poll)
+            wakeup.wait(interval)
+
+    def run_source(self, name: str, poll: Callable[[], None]) -> None:
+        """Poll one source once, recording how it went."""
+        started = time.monotonic()
+        try:
+            poll()
+        except Exception as exc:
+            with self._lock:
+                status = self._status(name)
+                status.errors += 1
+                status.error = str(exc)
+                status.duration = time.monotonic() - started
+                self._state.version += 1
+            log.warning("sampler_source_failed", source=name, error=str(exc))
+            self._changed()
+            return
+        with self._lock:
+            status = self._status(name)
+            # Readers show "not sampled yet" or the error until then
+            recovered = status.last_success is None or status.error is not None
+            if recovered:
+                self._state.version += 1
+            status.last_success = time.time()
+            status.duration = time.monotonic() - started
+            status.error = None
+        if recovered:
+            self._changed()
+
+    def refresh(self) -> Snapshot:
+        """Poll every source once, in this thread."""
+        for name, (poll, _interval) in self.sources().items():
+            self.run_source(name, poll)
+        return self.snapshot()
+
+    def _status(self, name: str) -> SourceStatus:
+        return self._state.sources.setdefault(name, SourceStatus())
+
+    def _publish(self, **parts: Any) -> None:
+        with self._lock:
+            for key, value in parts.items():
+                setattr(self._state, key, value)
+            self._state.taken_at = time.time()
+            self._state.version += 1
+        self._changed()
+
+    def snapshot(self) -> Snapshot:
+        """The latest state of all sources."""
+        with self._lock:
+            state = copy.copy(self._state)
+            state.sources = {name: copy.copy(s) for name, s in self._state.sources.items()}
+        return state
+
+    # ── sources ─────────────────────────────────────────────────────────────
+
+    def sample_vms(self) -> None:
+        vms = self.collector.collect()
+        self.monitor.record_vms(vms.values())
+        history = {name: self._cpu_history.get(name) or deque(maxlen=SPARKLINE_POINTS) for name in vms}
+        counts = {name: self._cpu_counts.get(name, 0) + 1 for name in vms}
+        for name, sample in vms.items():
+            history[name].append(round(sample.cpu_percent, 1))
+        self._cpu_history, self._cpu_counts = history, counts
+        self._publish(
+            vms=vms,
+            sparklines={name: list(points) for name, points in history.items()},
+            sparkline_counts=dict(counts),
+        )
+
+    def sample_containers(self) -> None:
+        if self._containers is None:
+            self._containers = ContainerCloner(self.engine)
+        self._publish(
+            container_list=self._containers.list_containers(all=True),
+            containers=self.monitor.get_container_stats(self._containers.engine),
+        )
+
+    def sample_health(self) -> None:
+        with self._lock:
+            vms = self._state.vms
+        health = {}
+        for path in sorted(self.health_manager.config_dir.glob("*.yaml")):
+            vm_name = path.stem
+            sample = vms.get(vm_name)
+            if sample is None or sample.state != "running":
+                continue
+            state = self.health_manager.check_from_config(vm_name, path)
+            # The manager keeps updating its own state object in place
+            health[vm_name] = copy.deepcopy(state)
+        self._publish(health=health)
+
+    def sample_compose(self) -> None:
+        from clonebox.orchestrator import Orchestrator
+
+        with self._lock:
+            vms = self._state.vms
+        compose = {}
+        for path in self.compose_files:
+            orch = Orchestrator.from_file(path, user_session=self.user_session)
+            project = orch.config.get("name") or path.resolve().parent.name
+            groups = {name: i for i, group in enumerate(orch.plan.start_order) for name in group}
+            compose[project] = [
+                {
+                    "name": name,
+                    "state": vms[name].state if name in vms else "not_found",
+                    "start_group": groups.get(name, 0),
+                    "depends_on": list(vm.depends_on),
+                }
+                for name, vm in orch.plan.vms.items()
+            ]
+        self._publish(compose=compose)
@@ -0,0 +1,260 @@
+"""
+Cloud-init progress from the VM serial console.
+
+``generate_cloud_init_config`` echoes ``[clonebox] ...`` lines to
+``/dev/ttyS0`` and the domain XML logs that port to ``serial_log_path()``.
+This module tails that file incrementally and turns the lines into typed
+:class:`ProgressEvent` objects, so progress can be shown without any guest
+round trips (no SSH, no guest agent).
+
+The tail survives log rotation (inode change) and truncation, and the
+parser resets on the kernel banner so a reboot starts a fresh boot.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+KERNEL_RE = re.compile(r"Linux version \d")
+FINISHED_RE = re.compile(r"Cloud-init v\. (\S+) finished")
+STEP_RE = re.compile(r"\[clonebox\] Step (\d+)/(\d+): (.*?)\.*$")
+PKG_COUNT_RE = re.compile(r"\[clonebox\] Installing (\d+) packages")
+APT_RE = re.compile(r"\[clonebox\] \[apt[\w-]*\] (Setting up|Unpacking) ([^\s:]+)")
+APT_PROGRESS_RE = re.compile(r"Progress: \[\s*(\d+)%\]")
+SNAP_RE = re.compile(r"\[clonebox\] \[(\d+)/(\d+)\] Installing snap: (\S+?)\.*$")
+MOUNT_RE = re.compile(r"\[clonebox\] \[(\d+)/(\d+)\] Mount: (.*)$")
+WARNING_RE = re.compile(r"\[clonebox\] (WARNING|\[WARN\]|SKIP)")
+REBOOTING_RE = re.compile(r"\[clonebox\] Rebooting in")
+MARKER = "[clonebox] "
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """One step of guest provisioning as seen on the serial console.
+
+    ``kind`` is one of ``boot``, ``step``, ``package``, ``snap``,
+    ``mount``, ``warning``, ``rebooting``, ``info`` or ``done``.
+    ``percent`` is the progress within the current ``stage`` when known.
+    """
+
+    kind: str
+    message: str
+    stage: Optional[str] = None
+    package: Optional[str] = None
+    percent: Optional[int] = None
+
+
+class ProgressParser:
+    """Stateful serial-line → :class:`ProgressEvent` parser for one VM."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.stage: Optional[str] = None
+        self.percent: Optional[int] = None
+        self.done = False
+        self.warnings = 0
+        self._expected_packages = 0
+        self._packages_set_up = 0
+
+    def _event(self, kind: str, message: str, **kwargs) -> ProgressEvent:
+        if "stage" in kwargs:
+            self.stage = kwargs["stage"]
+        else:
+            kwargs["stage"] = self.stage
+        if "percent" in kwargs:
+            self.percent = kwargs["percent"]
+        else:
+            kwargs["percent"] = self.percent
+        return ProgressEvent(kind=kind, message=message, **kwargs)
+
+    def feed(self, line: str) -> Optional[ProgressEvent]:
+        """Parse one console line; returns ``None`` for unrelated output."""
+        line = line.strip()
+        if not line:
+            return None
+
+        if KERNEL_RE.search(line):
+            self.reset()
+            return self._event("boot", "Guest kernel booting", stage="Booting", percent=None)
+
+        m = FINISHED_RE.search(line)
+        if m:
+            self.done = True
+            return self._event("done", f"cloud-init {m.group(1)} finished", stage="Done", percent=100)
+
+        idx = line.find(MARKER)
+        if idx < 0:
+            return None
+        line = line[idx:]
+        message = line[len(MARKER):].strip()
+
+        m = STEP_RE.search(line)
+        if m:
+            n, total = int(m.group(1)), int(m.group(2))
+            return self._event(
+                "step", message, stage=m.group(3),
+                percent=min(100, (n - 1) * 100 // max(total, 1)),
+            )
+
+        m = APT_RE.search(line)
+        if m:
+            action, package = m.group(1), m.group(2)
+            m_pct = APT_PROGRESS_RE.search(line)
+            if m_pct:
+                return self._event("package", message, package=package, percent=int(m_pct.group(1)))
+            if action == "Setting up":
+                self._packages_set_up += 1
+                if self._expected_packages:
+                    pct = min(100, self._packages_set_up * 100 // self._expected_packages)
+                    return self._event("package", message, package=package, percent=pct)
+            return self._event("package", message, package=package)
+
+        m = APT_PROGRESS_RE.search(line)
+        if m:
+            return self._event("package", message, percent=int(m.group(1)))
+
+        m = PKG_COUNT_RE.search(line)
+        if m:
+            self._expected_packages = int(m.group(1))
+            self._packages_set_up = 0
+            return self._event("step", message, stage="Installing packages", percent=0)
+
+        m = SNAP_RE.search(line)
+        if m:
+            n, total = int(m.group(1)), int(m.group(2))
+            return self._event(
+                "snap", message, stage="Installing snaps", package=m.group(3),
+                percent=(n - 1) * 100 // max(total, 1),
+            )
+
+        m = MOUNT_RE.search(line)
+        if m:
+            n, total = int(m.group(1)), int(m.group(2))
+            return self._event(
+                "mount", message, stage="Mounting paths",
+                percent=(n - 1) * 100 // max(total, 1),
+            )
+
+        if WARNING_RE.search(line):
+            self.warnings += 1
+            return self._event("warning", message)
+
+        if REBOOTING_RE.search(line):
+            return self._event("rebooting", message, stage="Rebooting", percent=None)
+
+        if message.endswith("..."):
+            return self._event("info", message, stage=message.rstrip("."), percent=None)
+        return self._event("info", message)
+
+
+class SerialLogTail:
+    """Incremental, offset-tracking reader of complete lines in a log file.
+
+    Follows the path across rotation (the old file is drained first) and
+    restarts from the top when the file is truncated.
+    """
+
+    def __init__(self, path: Path, from_end: bool = True, offset: Optional[int] = None):
+        self.path = Path(path)
+        self._fh = None
+        self._ino: Optional[int] = None
+        self._partial = ""
+        # A file that does not exist yet is new and is read from the top
+        self._open(from_end, offset)
+
+    def _open(self, from_end: bool, offset: Optional[int] = None) -> bool:
+        try:
+            fh = open(self.path, "rb")
+        except OSError:
+            return False
+        st = os.fstat(fh.fileno())
+        if offset is not None:
+            # Shorter than *offset*: truncated since, so everything is new
+            fh.seek(offset if offset <= st.st_size else 0)
+        elif from_end:
+            fh.seek(st.st_size)
+        self._fh, self._ino, self._partial = fh, st.st_ino, ""
+        return True
+
+    def _drain(self) -> str:
+        try:
+            return self._fh.read().decode("utf-8", errors="replace")
+        except OSError:
+            return ""
+
+    def read_lines(self) -> List[str]:
+        """Return lines completed since the previous call (ANSI/CR stripped)."""
+        if self._fh is None and not self._open(from_end=False):
+            return []
+
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None  # rotated away and not recreated yet: keep the old file
+        if st is not None and st.st_ino != self._ino:
+            # Rotated: finish the old file, then follow the new one from the top
+            rest = self._partial + self._drain()
+            self.close()
+            lines = rest.split("\n") if rest else []
+            if lines and not lines[-1]:
+                lines.pop()
+            if self._open(from_end=False):
+                return self._clean(lines) + self.read_lines()
+            return self._clean(lines)
+        if st is not None and st.st_size < self._fh.tell():
+            self._fh.seek(0)  # truncated in place
+            self._partial = ""
+
+        text = self._partial + self._drain()
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return self._clean(lines)
+
+    @staticmethod
+    def _clean(lines: List[str]) -> List[str]:
+        return [_ANSI_RE.sub("", line).rstrip("\r") for line in lines]
+
+    def close(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except OSError:
+                pass
+        self._fh = None
+
+
+def follow_progress(
+    path: Path,
+    timeout: float,
+    poll_interval: float = 0.5,
+    from_end: bool = False,
+    offset: Optional[int] = None,
+) -> Iterator[ProgressEvent]:
+    """Yield progress events from *path* until cloud-init finishes or *timeout*.
+
+    The log is appended to across boots, so a caller that starts the VM
+    passes the log size from before the start as *offset*; earlier boots'
+    lines (and their ``finished`` line) are then never seen.
+    """
+    tail = SerialLogTail(path, from_end=from_end, offset=offset)
+    parser = ProgressParser()
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            for line in tail.read_lines():
+                event = parser.feed(line)
+                if event is not None:
+                    yield event
+            # Checked per batch: a later reboot in the same batch resets it
+            if parser.done:
+                return
+            time.sleep(poll_interval)
+    finally:
+        tail.close()
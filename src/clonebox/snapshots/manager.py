@@ -3,10 +3,20 @@
 
 import json
 import subprocess
+import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from clonebox import paths as _paths
+
+from .memory import (
+    DOMAIN_FILE,
+    MemorySnapshotStore,
+    SnapshotNotFoundError,
+    default_compression,
+    sha256_file,
+)
 from .models import Snapshot, SnapshotPolicy, SnapshotState, SnapshotType
 
 try:
@@ -15,6 +25,36 @@ except ImportError:
     libvirt = None
 
 
+def _root_disk(domain_xml: str) -> Tuple[str, str]:
+    """Return ``(target dev, source file)`` of the first file-backed disk."""
+    root = ET.fromstring(domain_xml)
+    for disk in root.findall("./devices/disk"):
+        source = disk.find("source")
+        target = disk.find("target")
+        if disk.get("device", "disk") != "disk" or source is None or target is None:
+            continue
+        if source.get("file"):
+            return target.get("dev"), source.get("file")
+    raise RuntimeError("Domain has no file-backed disk to snapshot")
+
+
+def _retarget_disk(domain_xml: str, target_dev: str, source_file: str) -> str:
+    """Point disk *target_dev* of *domain_xml* at a qcow2 overlay."""
+    root = ET.fromstring(domain_xml)
+    for disk in root.findall("./devices/disk"):
+        target = disk.find("target")
+        if target is None or target.get("dev") != target_dev:
+            continue
+        disk.find("source").set("file", source_file)
+        driver = disk.find("driver")
+        if driver is not None:
+            driver.set("type", "qcow2")
+        # libvirt re-probes the chain from the overlay's header
+        for backing in disk.findall("backingStore"):
+            disk.remove(backing)
+    return ET.tostring(root, encoding="unicode")
+
+
 class SnapshotManager:
     """Manage VM snapshots via libvirt."""
 
@@ -55,6 +95,11 @@ class SnapshotManager:
         """
         domain = self.conn.lookupByName(vm_name)
 
+        if snapshot_type == SnapshotType.EXTERNAL:
+            return self._create_memory_snapshot(
+                domain, vm_name, name, description, tags, auto_policy, expires_in_days
+            )
+
         # Generate snapshot XML
         snapshot_xml = self._generate_snapshot_xml(
             name=name,
@@ -108,6 +153,11 @@ class SnapshotManager:
             name: Snapshot name to restore
             force: Force restore even if VM is running
         """
+        manifest = self._memory_store(vm_name).load(name)
+        if manifest is not None:
+            self._restore_memory_snapshot(vm_name, manifest, force)
+            return True
+
         domain = self.conn.lookupByName(vm_name)
 
         # Check if VM is running
@@ -141,6 +191,13 @@ class SnapshotManager:
             name: Snapshot name to delete
             delete_children: Also delete child snapshots
         """
+        store = self._memory_store(vm_name)
+        if store.load(name) is not None:
+            # The disk overlays stay: the VM's current disk is chained on them
+            store.remove(name)
+            self._delete_snapshot_metadata(vm_name, name)
+            return True
+
         domain = self.conn.lookupByName(vm_name)
 
         try:
@@ -165,12 +222,15 @@ class SnapshotManager:
     def list(self, vm_name: str) -> List[Snapshot]:
         """List all snapshots for a VM."""
         domain = self.conn.lookupByName(vm_name)
-        snapshots = []
+        snapshots = [
+            self._memory_snapshot_from_manifest(vm_name, m)
+            for m in self._memory_store(vm_name).manifests()
+        ]
 
         try:
             snap_names = domain.snapshotListNames()
         except libvirt.libvirtError:
-            return []
+            snap_names = []
 
         for snap_name in snap_names:
             try:
@@ -178,8 +238,6 @@ class SnapshotManager:
                 snap_xml = snap.getXMLDesc()
 
                 # Parse XML for details
-                import xml.etree.ElementTree as ET
-
                 root = ET.fromstring(snap_xml)
 
                 name = root.findtext("name", snap_name)
@@ -277,6 +335,199 @@ class SnapshotManager:
 
         return deleted
 
+    def resume(self, vm_name: str, name: Optional[str] = None) -> Snapshot:
+        """Resume a stopped VM from a memory-state snapshot.
+
+        Args:
+            vm_name: Name of VM
+            name: Snapshot name (default: the most recent memory snapshot)
+        """
+        store = self._memory_store(vm_name)
+        if name is None:
+            manifests = store.manifests()
+            if not manifests:
+                raise SnapshotNotFoundError(f"No memory snapshot found for VM '{vm_name}'")
+            manifest = manifests[-1]
+        else:
+            manifest = store.load(name)
+            if manifest is None:
+                raise SnapshotNotFoundError(
+                    f"Memory snapshot '{name}' not found for VM '{vm_name}'"
+                )
+
+        self._restore_memory_snapshot(vm_name, manifest, force=False)
+        return self._memory_snapshot_from_manifest(vm_name, manifest)
+
+    def _memory_store(self, vm_name: str) -> MemorySnapshotStore:
+        user_session = self.conn_uri.endswith("/session")
+        return MemorySnapshotStore(_paths.vm_dir(vm_name, user_session))
+
+    def _create_memory_snapshot(
+        self,
+        domain,
+        vm_name: str,
+        name: str,
+        description: Optional[str],
+        tags: Optional[List[str]],
+        auto_policy: Optional[str],
+        expires_in_days: Optional[int],
+    ) -> Snapshot:
+        """Save guest RAM and freeze the root disk under a new overlay."""
+        if not domain.isActive():
+            raise RuntimeError(f"VM '{vm_name}' must be running for a memory snapshot")
+
+        store = self._memory_store(vm_name)
+        if store.snapshot_dir(name).exists():
+            raise RuntimeError(f"Snapshot '{name}' already exists for VM '{vm_name}'")
+
+        inactive = getattr(libvirt, "VIR_DOMAIN_XML_INACTIVE", 2)
+        domain_xml = domain.XMLDesc(inactive)
+        target_dev, base_disk = _root_disk(domain.XMLDesc(0))
+        other_disks = [
+            t.get("dev")
+            for t in ET.fromstring(domain.XMLDesc(0)).findall("./devices/disk/target")
+            if t.get("dev") != target_dev
+        ]
+
+        store.snapshot_dir(name).mkdir(parents=True)
+        store.disks_dir.mkdir(parents=True, exist_ok=True)
+        overlay = store.overlay_path(name)
+        snapshot_xml = self._generate_snapshot_xml(
+            name=name,
+            description=description,
+            snapshot_type=SnapshotType.EXTERNAL,
+            memory_file=store.raw_memory_path(name),
+            disk_overlays={target_dev: overlay},
+            skip_disks=other_disks,
+        )
+
+        # Metadata lives in the manifest; libvirt cannot revert external
+        # snapshots itself anyway.
+        flags = getattr(libvirt, "VIR_DOMAIN_SNAPSHOT_CREATE_ATOMIC", 128) | getattr(
+            libvirt, "VIR_DOMAIN_SNAPSHOT_CREATE_NO_METADATA", 4
+        )
+        try:
+            domain.snapshotCreateXML(snapshot_xml, flags)
+        except Exception as e:
+            store.remove(name)
+            raise RuntimeError(f"Failed to create memory snapshot: {e}") from e
+
+        try:
+            (store.snapshot_dir(name) / DOMAIN_FILE).write_text(domain_xml)
+            raw_size = store.raw_memory_path(name).stat().st_size
+            compression = default_compression()
+            try:
+                memory = store.compress(name, compression)
+            except (OSError, subprocess.CalledProcessError):
+                compression = "gzip"
+                memory = store.compress(name, compression)
+            base_stat = Path(base_disk).stat()
+        except Exception as e:
+            store.remove(name)
+            raise RuntimeError(f"Failed to store memory snapshot: {e}") from e
+
+        created_at = datetime.now()
+        manifest = {
+            "name": name,
+            "vm_name": vm_name,
+            "created_at": created_at.isoformat(),
+            "description": description,
+            "disk_target": target_dev,
+            "base_disk": base_disk,
+            "base_disk_size": base_stat.st_size,
+            "base_disk_mtime": int(base_stat.st_mtime),
+            "overlay": str(overlay),
+            "memory_file": memory.name,
+            "memory_sha256": sha256_file(memory),
+            "memory_raw_size": raw_size,
+            "compression": compression,
+        }
+        store.save(name, manifest)
+
+        snapshot = self._memory_snapshot_from_manifest(vm_name, manifest)
+        snapshot.tags = tags or []
+        snapshot.auto_created = auto_policy is not None
+        snapshot.auto_policy = auto_policy
+        if expires_in_days:
+            snapshot.expires_at = created_at + timedelta(days=expires_in_days)
+        self._save_snapshot_metadata(snapshot)
+        return snapshot
+
+    def _restore_memory_snapshot(
+        self, vm_name: str, manifest: Dict[str, Any], force: bool
+    ) -> None:
+        """Restore guest RAM onto a fresh overlay of the frozen disk."""
+        store = self._memory_store(vm_name)
+        store.verify(manifest)
+
+        domain = self.conn.lookupByName(vm_name)
+        if domain.isActive():
+            if not force:
+                raise RuntimeError(f"VM '{vm_name}' is running. Stop it first or use --force")
+            domain.destroy()
+
+        inactive = getattr(libvirt, "VIR_DOMAIN_XML_INACTIVE", 2)
+        _, discarded = _root_disk(domain.XMLDesc(inactive))
+
+        name = manifest["name"]
+        overlay = store.restored_overlay_path(name)
+        subprocess.run(
+            [
+                "qemu-img", "create", "-f", "qcow2",
+                "-F", "qcow2", "-b", manifest["base_disk"], str(overlay),
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+        saved_xml = (store.snapshot_dir(name) / DOMAIN_FILE).read_text()
+        xml = _retarget_disk(saved_xml, manifest["disk_target"], str(overlay))
+        memory = store.expand(manifest)
+        try:
+            self.conn.defineXML(xml)
+            self.conn.restoreFlags(str(memory), xml, 0)
+        except Exception as e:
+            raise RuntimeError(f"Failed to restore memory snapshot: {e}") from e
+        finally:
+            store.cleanup_expanded(manifest)
+
+        # Drop the overlay we switched away from unless a snapshot froze it
+        discarded_path = Path(discarded)
+        if (
+            discarded_path.parent == store.disks_dir
+            and discarded_path != overlay
+            and discarded not in store.referenced_disks()
+        ):
+            discarded_path.unlink(missing_ok=True)
+
+    def _memory_snapshot_from_manifest(
+        self, vm_name: str, manifest: Dict[str, Any]
+    ) -> Snapshot:
+        store = self._memory_store(vm_name)
+        name = manifest["name"]
+        metadata = self._load_snapshot_metadata(vm_name, name) or {}
+        memory = store.snapshot_dir(name) / manifest["memory_file"]
+        return Snapshot(
+            name=name,
+            vm_name=vm_name,
+            snapshot_type=SnapshotType.EXTERNAL,
+            state=SnapshotState.READY,
+            created_at=datetime.fromisoformat(manifest["created_at"]),
+            description=manifest.get("description"),
+            disk_path=Path(manifest["base_disk"]),
+            memory_path=memory,
+            size_bytes=memory.stat().st_size if memory.exists() else 0,
+            metadata={"compression": manifest.get("compression")},
+            tags=metadata.get("tags", []),
+            auto_created=metadata.get("auto_created", False),
+            auto_policy=metadata.get("auto_policy"),
+            expires_at=(
+                datetime.fromisoformat(metadata["expires_at"])
+                if metadata.get("expires_at")
+                else None
+            ),
+        )
+
     def create_auto_snapshot(
         self,
         vm_name: str,
@@ -302,12 +553,26 @@ class SnapshotManager:
         name: str,
         description: Optional[str],
         snapshot_type: SnapshotType,
+        memory_file: Optional[Path] = None,
+        disk_overlays: Optional[Dict[str, Path]] = None,
+        skip_disks: Optional[List[str]] = None,
     ) -> str:
         """Generate libvirt snapshot XML."""
         desc_xml = f"<description>{description}</description>" if description else ""
 
         if snapshot_type == SnapshotType.DISK_ONLY:
             disks_xml = "<disks><disk name='vda' snapshot='internal'/></disks>"
+        elif snapshot_type == SnapshotType.EXTERNAL:
+            disks = [
+                f"<disk name='{dev}' snapshot='external'>"
+                f"<driver type='qcow2'/><source file='{path}'/></disk>"
+                for dev, path in (disk_overlays or {}).items()
+            ]
+            disks += [f"<disk name='{dev}' snapshot='no'/>" for dev in skip_disks or []]
+            disks_xml = (
+                f"<memory snapshot='external' file='{memory_file}'/>"
+                f"<disks>{''.join(disks)}</disks>"
+            )
         else:
             disks_xml = ""
 
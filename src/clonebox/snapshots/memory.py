@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""On-disk layout, compression and integrity checks for memory-state snapshots.
+
+A memory-state (``SnapshotType.EXTERNAL``) snapshot is a libvirt external
+snapshot: guest RAM goes to a save image and the root disk is frozen, with
+a fresh qcow2 overlay taking further writes.  Restoring creates a new
+overlay on the frozen disk and restores the save image onto it, so the VM
+resumes with its applications already running.
+
+Layout under the VM directory::
+
+    snapshots/
+        disks/<name>.qcow2          overlay the VM switched to when <name> was taken
+        disks/<name>-r<ts>.qcow2    overlay created by restoring <name>
+        <name>/manifest.json        frozen disk, checksums, compression
+        <name>/memory.save[.zst|.gz]
+        <name>/domain.xml           domain definition at snapshot time
+
+Disk overlays outlive their snapshot: later layers are chained on them.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from clonebox import paths as _paths
+
+MANIFEST_FILE = "manifest.json"
+MEMORY_FILE = "memory.save"
+DOMAIN_FILE = "domain.xml"
+DISKS_DIR = "disks"
+
+# Taken by ``create_vm`` once the VM is first fully set up
+SETUP_SNAPSHOT_NAME = "setup"
+
+_SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+
+
+class SnapshotNotFoundError(RuntimeError):
+    """No memory snapshot by that name (or none at all) exists for the VM."""
+
+
+class SnapshotIntegrityError(RuntimeError):
+    """A memory snapshot no longer matches its manifest."""
+
+
+def _check_name(name: str) -> str:
+    """Reject snapshot names that are not a single plain path component."""
+    if not _paths.is_safe_name(name):
+        raise ValueError(f"Invalid snapshot name: {name!r}")
+    return name
+
+
+def sha256_file(path: Path, chunk_size: int = 4 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_compression() -> str:
+    """``CLONEBOX_SNAPSHOT_COMPRESSION`` or the best available codec."""
+    choice = os.getenv("CLONEBOX_SNAPSHOT_COMPRESSION")
+    if choice in _SUFFIXES:
+        return choice
+    return "zstd" if shutil.which("zstd") else "gzip"
+
+
+class MemorySnapshotStore:
+    """Files of the memory-state snapshots of one VM."""
+
+    def __init__(self, vm_dir: Path):
+        self.root = Path(vm_dir) / "snapshots"
+
+    @property
+    def disks_dir(self) -> Path:
+        return self.root / DISKS_DIR
+
+    def snapshot_dir(self, name: str) -> Path:
+        return self.root / _check_name(name)
+
+    def raw_memory_path(self, name: str) -> Path:
+        return self.snapshot_dir(name) / MEMORY_FILE
+
+    def overlay_path(self, name: str) -> Path:
+        return self.disks_dir / f"{_check_name(name)}.qcow2"
+
+    def restored_overlay_path(self, name: str) -> Path:
+        return self.disks_dir / f"{_check_name(name)}-r{int(time.time())}.qcow2"
+
+    # ── manifests ────────────────────────────────────────────────────────────
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        path = self.snapshot_dir(name) / MANIFEST_FILE
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name: str, manifest: Dict[str, Any]) -> None:
+        path = self.snapshot_dir(name) / MANIFEST_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, path)
+
+    def manifests(self) -> List[Dict[str, Any]]:
+        """All manifests, oldest first."""
+        if not self.root.exists():
+            return []
+        found = []
+        for child in self.root.iterdir():
+            if child.name != DISKS_DIR and child.is_dir() and _paths.is_safe_name(child.name):
+                manifest = self.load(child.name)
+                if manifest is not None:
+                    found.append(manifest)
+        return sorted(found, key=lambda m: m.get("created_at", ""))
+
+    def referenced_disks(self) -> List[str]:
+        return [m["base_disk"] for m in self.manifests()]
+
+    def remove(self, name: str) -> None:
+        shutil.rmtree(self.snapshot_dir(name), ignore_errors=True)
+
+    # ── memory image ─────────────────────────────────────────────────────────
+
+    def compress(self, name: str, algorithm: str) -> Path:
+        """Compress the raw save image in place; returns the stored file."""
+        raw = self.raw_memory_path(name)
+        if algorithm == "none":
+            return raw
+        out = raw.with_name(raw.name + _SUFFIXES[algorithm])
+        if algorithm == "zstd":
+            subprocess.run(
+                ["zstd", "-q", "-f", "-T0", "-3", "--rm", str(raw), "-o", str(out)],
+                check=True, capture_output=True,
+            )
+        else:
+            with open(raw, "rb") as src, gzip.open(out, "wb", compresslevel=1) as dst:
+                shutil.copyfileobj(src, dst, 4 * 1024 * 1024)
+            raw.unlink()
+        return out
+
+    def expand(self, manifest: Dict[str, Any]) -> Path:
+        """Return a raw save image for *manifest*, decompressing if needed.
+
+        Compressed snapshots are expanded to a temporary file next to the
+        stored one; the caller removes it (see :meth:`cleanup_expanded`).
+        """
+        name = manifest["name"]
+        stored = self.snapshot_dir(name) / manifest["memory_file"]
+        algorithm = manifest.get("compression", "none")
+        if algorithm == "none":
+            return stored
+        out = self.snapshot_dir(name) / f"{MEMORY_FILE}.restore"
+        if algorithm == "zstd":
+            subprocess.run(
+                ["zstd", "-q", "-d", "-f", "-T0", str(stored), "-o", str(out)],
+                check=True, capture_output=True,
+            )
+        else:
+            with gzip.open(stored, "rb") as src, open(out, "wb") as dst:
+                shutil.copyfileobj(src, dst, 4 * 1024 * 1024)
+        return out
+
+    def cleanup_expanded(self, manifest: Dict[str, Any]) -> None:
+        (self.snapshot_dir(manifest["name"]) / f"{MEMORY_FILE}.restore").unlink(missing_ok=True)
+
+    # ── integrity ────────────────────────────────────────────────────────────
+
+    def verify(self, manifest: Dict[str, Any]) -> None:
+        """Raise :class:`SnapshotIntegrityError` unless the snapshot is intact.
+
+        Checks the memory image checksum and that the frozen disk still
+        exists unmodified (same size and mtime as when it was frozen).
+        """
+        name = manifest["name"]
+        memory = self.snapshot_dir(name) / manifest["memory_file"]
+        if not memory.exists():
+            raise SnapshotIntegrityError(f"Memory image missing for snapshot '{name}': {memory}")
+        if sha256_file(memory) != manifest["memory_sha256"]:
+            raise SnapshotIntegrityError(f"Memory image checksum mismatch for snapshot '{name}'")
+
+        disk = Path(manifest["base_disk"])
+        try:
+            st = disk.stat()
+        except OSError as exc:
+            raise SnapshotIntegrityError(
+                f"Frozen disk missing for snapshot '{name}': {disk}"
+            ) from exc
+        if st.st_size != manifest["base_disk_size"] or int(st.st_mtime) != manifest["base_disk_mtime"]:
+            raise SnapshotIntegrityError(
+                f"Frozen disk of snapshot '{name}' was modified after the snapshot: {disk}"
+            )
@@ -4,12 +4,23 @@ Shared SSH helpers for CloneBox.
 Consolidates the SSH command building, execution, and connectivity
 testing that was previously duplicated across cloner.py, validation/core.py,
 browser_profiles.py, and cli/misc_commands.py.
+
+Guest commands are multiplexed over persistent OpenSSH ControlMaster
+connections (one per ``user@host:port``) managed by :class:`SSHSessionPool`,
+so only the first command to a VM pays for the TCP connect and key exchange.
+Set ``CLONEBOX_SSH_MULTIPLEX=0`` to disable.
 """
 
+import atexit
+import hashlib
+import os
 import shutil
 import subprocess
+import threading
+import time
+import weakref
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import structlog
 
@@ -26,6 +37,224 @@ DEFAULT_SSH_OPTS: List[str] = [
 ]
 
 
+# ── connection multiplexing ──────────────────────────────────────────────────
+
+Endpoint = Tuple[str, int, str]  # (host, port, username)
+
+
+def _multiplex_enabled() -> bool:
+    return os.getenv("CLONEBOX_SSH_MULTIPLEX", "1").lower() not in ("0", "false", "no")
+
+
+class SSHSessionPool:
+    """Pool of persistent OpenSSH ControlMaster connections, one per endpoint.
+
+    The master for an endpoint is started lazily on first use with
+    ``ssh -M -N -f`` and kept alive for ``persist`` seconds of idleness.
+    Commands then attach with ``ControlMaster=no``; if the master socket
+    is gone, OpenSSH transparently falls back to a direct connection, so a
+    dead master never turns into a failed command.
+
+    Owners registered with :meth:`watch` claim every master used while
+    they are alive; :meth:`release` drops an owner's claims and stops only
+    the masters no other live owner still claims.  Owners are held weakly.
+    """
+
+    def __init__(
+        self,
+        control_dir: Optional[Path] = None,
+        persist: int = 300,
+        retry_after: float = 10.0,
+    ):
+        self.control_dir = Path(
+            control_dir
+            or os.getenv("CLONEBOX_SSH_CONTROL_DIR", str(Path.home() / ".cache/clonebox/ssh"))
+        )
+        self.persist = persist
+        self.retry_after = retry_after
+        # _lock guards the dicts; starting a master holds only its endpoint's lock
+        self._lock = threading.Lock()
+        self._starting: Dict[Endpoint, threading.Lock] = {}
+        self._masters: Dict[Endpoint, Path] = {}
+        self._failed: Dict[Endpoint, float] = {}
+        self._owners: "weakref.WeakSet[object]" = weakref.WeakSet()
+        self._claims: Dict[Endpoint, "weakref.WeakSet[object]"] = {}
+
+    def control_path(self, port: int, username: str = "ubuntu", host: str = "127.0.0.1") -> Path:
+        """Socket path for an endpoint (hashed to stay under the sun_path limit)."""
+        digest = hashlib.sha1(f"{username}@{host}:{port}".encode()).hexdigest()[:16]
+        return self.control_dir / f"cm-{digest}"
+
+    def client_opts(self, port: int, username: str = "ubuntu", host: str = "127.0.0.1") -> List[str]:
+        """SSH options that attach a command to the endpoint's master."""
+        return [
+            "-o", "ControlMaster=no",
+            "-o", f"ControlPath={self.control_path(port, username, host)}",
+        ]
+
+    def watch(self, owner: object) -> None:
+        """Have *owner* claim every endpoint used from now on, by any caller.
+
+        Lets an owner (a cloner) tear down the masters its helpers started
+        without threading a tracker through each of them.
+        """
+        with self._lock:
+            self._owners.add(owner)
+
+    def release(self, owner: object) -> None:
+        """Drop *owner*'s claims and stop masters no other live owner claims."""
+        orphaned: List[Tuple[Endpoint, Path]] = []
+        with self._lock:
+            self._owners.discard(owner)
+            for endpoint, claimants in list(self._claims.items()):
+                if owner not in claimants:
+                    continue
+                claimants.discard(owner)
+                if len(claimants) == 0:
+                    del self._claims[endpoint]
+                    sock = self._masters.pop(endpoint, None)
+                    self._failed.pop(endpoint, None)
+                    if sock is not None:
+                        orphaned.append((endpoint, sock))
+        for endpoint, sock in orphaned:
+            self._stop_master(endpoint, sock)
+
+    def _record(self, endpoint: Endpoint) -> None:
+        # Caller holds _lock
+        if len(self._owners) == 0:
+            return
+        claimants = self._claims.setdefault(endpoint, weakref.WeakSet())
+        for owner in list(self._owners):
+            claimants.add(owner)
+
+    def ensure(
+        self,
+        port: int,
+        key: Optional[Path] = None,
+        username: str = "ubuntu",
+        host: str = "127.0.0.1",
+        connect_timeout: int = 10,
+    ) -> bool:
+        """Make sure a master connection is running for the endpoint.
+
+        Returns ``True`` if commands can be multiplexed over it.  Failed
+        attempts are not retried for ``retry_after`` seconds so that
+        polling an unreachable VM does not double its connect cost.
+        """
+        endpoint: Endpoint = (host, port, username)
+        sock = self.control_path(port, username, host)
+        with self._lock:
+            starting = self._starting.setdefault(endpoint, threading.Lock())
+        # A slow or unreachable VM only holds up callers of the same endpoint
+        with starting:
+            with self._lock:
+                if endpoint in self._masters and sock.exists():
+                    self._record(endpoint)
+                    return True
+                failed_at = self._failed.get(endpoint)
+                if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+                    return False
+
+            cmd = build_ssh_command(
+                port=port, key=key, username=username, host=host,
+                connect_timeout=connect_timeout,
+                extra_opts=[
+                    "-M", "-N", "-f",
+                    "-o", f"ControlPath={sock}",
+                    "-o", f"ControlPersist={self.persist}",
+                ],
+            )
+            try:
+                self.control_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+                result = subprocess.run(
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=connect_timeout + 5,
+                )
+                ok = result.returncode == 0 and sock.exists()
+            except Exception as exc:
+                log.debug("ssh_master_error", port=port, error=str(exc))
+                ok = False
+
+            with self._lock:
+                if ok:
+                    self._masters[endpoint] = sock
+                    self._failed.pop(endpoint, None)
+                    self._record(endpoint)
+                else:
+                    self._masters.pop(endpoint, None)
+                    self._failed[endpoint] = time.monotonic()
+            if ok:
+                log.debug("ssh_master_started", host=host, port=port, user=username)
+            return ok
+
+    def close(self, port: int, username: str = "ubuntu", host: str = "127.0.0.1") -> None:
+        """Tear down the master connection for one endpoint."""
+        endpoint: Endpoint = (host, port, username)
+        with self._lock:
+            sock = self._masters.pop(endpoint, None)
+            self._failed.pop(endpoint, None)
+            self._claims.pop(endpoint, None)
+        if sock is not None:
+            self._stop_master(endpoint, sock)
+
+    def close_all(self) -> None:
+        """Tear down every master connection opened by this pool."""
+        with self._lock:
+            masters = list(self._masters.items())
+            self._masters.clear()
+            self._failed.clear()
+            self._claims.clear()
+        for endpoint, sock in masters:
+            self._stop_master(endpoint, sock)
+
+    def _stop_master(self, endpoint: Endpoint, sock: Path) -> None:
+        host, port, username = endpoint
+        if not sock.exists():
+            return
+        cmd = [
+            "ssh", "-o", f"ControlPath={sock}", "-p", str(port),
+            "-O", "exit", f"{username}@{host}",
+        ]
+        try:
+            subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+            log.debug("ssh_master_stopped", host=host, port=port, user=username)
+        except Exception as exc:
+            log.debug("ssh_master_stop_error", port=port, error=str(exc))
+
+
+_session_pool: Optional[SSHSessionPool] = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SSHSessionPool:
+    """Return the process-wide SSH session pool."""
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SSHSessionPool()
+            atexit.register(_session_pool.close_all)
+        return _session_pool
+
+
+def multiplex_opts(
+    port: int,
+    key: Optional[Path] = None,
+    username: str = "ubuntu",
+    host: str = "127.0.0.1",
+    connect_timeout: int = 10,
+) -> List[str]:
+    """Return extra SSH options to reuse a pooled connection, or ``[]``."""
+    if not _multiplex_enabled():
+        return []
+    pool = get_session_pool()
+    if not pool.ensure(port, key, username, host, connect_timeout):
+        return []
+    return pool.client_opts(port, username, host)
+
+
 # ── command builder ──────────────────────────────────────────────────────────
 
 def build_ssh_command(
@@ -36,9 +265,13 @@ def build_ssh_command(
     connect_timeout: int = 10,
     log_level: Optional[str] = None,
     extra_opts: Optional[List[str]] = None,
+    multiplex: bool = False,
 ) -> List[str]:
     """Build a reusable SSH base command list.
 
+    With ``multiplex=True`` the command attaches to the pooled master
+    connection for the endpoint (starting it if needed).
+
     >>> cmd = build_ssh_command(22196, Path("/tmp/key"))
     >>> cmd[:2]
     ['ssh', '-o']
@@ -52,6 +285,8 @@ def build_ssh_command(
     cmd.extend(["-p", str(port)])
     if extra_opts:
         cmd.extend(extra_opts)
+    if multiplex:
+        cmd.extend(multiplex_opts(port, key, username, host, connect_timeout))
     cmd.append(f"{username}@{host}")
     return cmd
 
@@ -78,6 +313,7 @@ def ssh_exec(
     cmd = build_ssh_command(
         port=port, key=key, username=username, host=host,
         connect_timeout=connect_timeout,
+        multiplex=True,
     )
     cmd.append(command)
 
@@ -109,6 +345,7 @@ def ssh_run(
     cmd = build_ssh_command(
         port=port, key=key, username=username, host=host,
         connect_timeout=connect_timeout,
+        multiplex=True,
     )
     cmd.append(command)
     return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
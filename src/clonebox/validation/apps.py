@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from rich.panel import Panel
 from rich.table import Table
@@ -218,14 +218,12 @@ class AppValidationMixin:
             )
             return out == "yes"
 
-        for app in expected:
-            self.results["apps"]["total"] += 1
+        def _inspect(app: str) -> Tuple[bool, bool, Optional[bool], Optional[str], str]:
             installed = False
             profile_ok = False
             running: Optional[bool] = None
             pid: Optional[str] = None
             note = ""
-            pending = False
 
             if app == "firefox":
                 installed = (
@@ -310,6 +308,14 @@ class AppValidationMixin:
                         _find_first_pid(["google-chrome", "google-chrome-stable"]) if running else ""
                     )
 
+            return installed, profile_ok, running, pid, note
+
+        inspected = self._map_items(_inspect, expected)
+
+        for app, (installed, profile_ok, running, pid, note) in zip(expected, inspected):
+            self.results["apps"]["total"] += 1
+            pending = False
+
             if self.require_running_apps and installed and profile_ok and running is None:
                 note = note or "running unknown"
 
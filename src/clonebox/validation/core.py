@@ -1,15 +1,14 @@
-import base64
-import json
 import logging
-import subprocess
-import time
+import threading
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from rich.console import Console
 
 from clonebox.paths import ssh_key_path as _ssh_key_path, resolve_ssh_port
+from clonebox.qga import QGAError, get_qga_executor
 from clonebox.ssh import ssh_exec as _shared_ssh_exec
+from clonebox.validation.parallel import PhaseConsole, map_ordered, run_phases
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +22,8 @@ class VMValidatorCore:
         console: Console = None,
         require_running_apps: bool = False,
         smoke_test: bool = False,
+        batch_probes: bool = True,
+        jobs: int = 1,
     ):
         self.config = config
         self.vm_name = vm_name
@@ -30,6 +31,10 @@ class VMValidatorCore:
         self.console = console or Console()
         self.require_running_apps = require_running_apps
         self.smoke_test = smoke_test
+        self.batch_probes = batch_probes
+        self.jobs = max(1, int(jobs or 1))
+        # Bounds concurrent guest execs across phases and items
+        self._exec_slots = threading.BoundedSemaphore(self.jobs)
         self.results = {
             "mounts": {"passed": 0, "failed": 0, "skipped": 0, "total": 0, "details": []},
             "packages": {"passed": 0, "failed": 0, "skipped": 0, "total": 0, "details": []},
@@ -49,6 +54,7 @@ class VMValidatorCore:
 
         self._setup_in_progress_cache: Optional[bool] = None
         self._exec_transport: str = "qga"  # qga|ssh
+        self._qga = get_qga_executor(conn_uri)
 
     @property
     def _user_session(self) -> bool:
@@ -76,6 +82,10 @@ class VMValidatorCore:
 
     def _exec_in_vm(self, command: str, timeout: int = 10) -> Optional[str]:
         """Execute command in VM using QEMU guest agent, with SSH fallback."""
+        with self._exec_slots:
+            return self._exec_in_vm_direct(command, timeout=timeout)
+
+    def _exec_in_vm_direct(self, command: str, timeout: int = 10) -> Optional[str]:
         log.debug(f"Exec in VM: {command[:50]}..." if len(command) > 50 else f"Exec in VM: {command}")
         
         if self._exec_transport == "ssh":
@@ -83,93 +93,54 @@ class VMValidatorCore:
             return self._ssh_exec(command, timeout=timeout)
 
         log.debug("Using QEMU guest agent transport")
-        
-        try:
-            result = subprocess.run(
-                [
-                    "virsh",
-                    "--connect",
-                    self.conn_uri,
-                    "qemu-agent-command",
-                    self.vm_name,
-                    f'{{"execute":"guest-exec","arguments":{{"path":"/bin/sh","arg":["-c","{command}"],"capture-output":true}}}}',
-                ],
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
-
-            if result.returncode != 0:
-                log.debug(f"QGA guest-exec failed (exit {result.returncode}): {result.stderr.strip()[:100]}")
-                # Fallback to SSH
-                log.debug("Falling back to SSH transport")
-                ssh_result = self._ssh_exec(command, timeout=timeout)
-                if ssh_result is not None:
-                    self._exec_transport = "ssh"  # Switch to SSH for future calls
-                    log.debug("Switched to SSH transport for future calls")
-                return ssh_result
-
-            response = json.loads(result.stdout)
-            if "return" not in response or "pid" not in response["return"]:
-                log.debug(f"Invalid QGA response: {result.stdout[:100]}")
-                return None
-
-            pid = response["return"]["pid"]
-            log.debug(f"QGA command started with PID {pid}")
-
-            deadline = time.time() + timeout
-            poll_count = 0
-            while time.time() < deadline:
-                poll_count += 1
-                status_result = subprocess.run(
-                    [
-                        "virsh",
-                        "--connect",
-                        self.conn_uri,
-                        "qemu-agent-command",
-                        self.vm_name,
-                        f'{{"execute":"guest-exec-status","arguments":{{"pid":{pid}}}}}',
-                    ],
-                    capture_output=True,
-                    text=True,
-                    timeout=5,
-                )
-
-                if status_result.returncode != 0:
-                    log.debug(f"QGA status check failed after {poll_count} polls")
-                    return None
-
-                status_resp = json.loads(status_result.stdout)
-                if "return" not in status_resp:
-                    log.debug(f"Invalid QGA status response: {status_result.stdout[:100]}")
-                    return None
-
-                ret = status_resp["return"]
-                if ret.get("exited", False):
-                    exit_code = ret.get("exitcode", 0)
-                    log.debug(f"QGA command completed (exit {exit_code}) after {poll_count} polls")
-                    if "out-data" in ret:
-                        output = base64.b64decode(ret["out-data"]).decode().strip()
-                        log.debug(f"QGA output: {output[:50]}..." if len(output) > 50 else f"QGA output: {output}")
-                        return output
-                    return ""
-
-                time.sleep(0.2)
-
-            log.debug(f"QGA command timed out after {poll_count} polls")
-            return None
 
-        except json.JSONDecodeError as e:
-            log.debug(f"Failed to parse QGA response: {e}")
+        try:
+            result = self._qga.exec(self.vm_name, command, timeout=timeout)
+        except QGAError as e:
+            log.debug(f"QGA guest-exec failed: {e}")
             # Fallback to SSH
-            return self._ssh_exec(command, timeout=timeout)
-        except subprocess.TimeoutExpired:
+            log.debug("Falling back to SSH transport")
+            ssh_result = self._ssh_exec(command, timeout=timeout)
+            if ssh_result is not None:
+                self._exec_transport = "ssh"  # Switch to SSH for future calls
+                log.debug("Switched to SSH transport for future calls")
+            return ssh_result
+
+        if result is None:
             log.debug(f"QGA command timed out after {timeout}s")
             return None
-        except Exception as e:
-            log.debug(f"QGA exec failed: {e}")
-            # Fallback to SSH
-            return self._ssh_exec(command, timeout=timeout)
+
+        output = result.stdout.strip()
+        log.debug(f"QGA command completed (exit {result.exitcode}): {output[:50]}")
+        return output
+
+    def _map_items(self, fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Apply *fn* to independent items on up to ``jobs`` workers, in order."""
+        return map_ordered(fn, items, self.jobs)
+
+    def _map_exec(self, commands: List[str], timeout: int = 10) -> List[Optional[str]]:
+        """Run independent guest *commands* on up to ``jobs`` workers, in order."""
+        return self._map_items(lambda cmd: self._exec_in_vm(cmd, timeout=timeout), commands)
+
+    def _run_phases(self, phases: List[Callable[[], Any]]) -> None:
+        """Run validation phases, concurrently when ``jobs > 1``."""
+        if self.jobs <= 1:
+            for phase in phases:
+                phase()
+            return
+
+        console = self.console
+        self.console = PhaseConsole(console)
+        try:
+            run_phases(phases, self.console, self.jobs)
+        finally:
+            self.console = console
+
+    def _probe(self, command: str, timeout: int = 30) -> Optional[str]:
+        """Run a batched probe; ``None`` means fall back to per-item checks."""
+        if not self.batch_probes:
+            return None
+        return self._exec_in_vm(command, timeout=timeout) or None
 
     def _setup_in_progress(self) -> Optional[bool]:
         if self._setup_in_progress_cache is not None:
@@ -188,20 +159,4 @@ class VMValidatorCore:
 
     def _check_qga_ready(self) -> bool:
         """Check if QEMU guest agent is responding."""
-        try:
-            result = subprocess.run(
-                [
-                    "virsh",
-                    "--connect",
-                    self.conn_uri,
-                    "qemu-agent-command",
-                    self.vm_name,
-                    '{"execute":"guest-ping"}',
-                ],
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-            return result.returncode == 0
-        except Exception:
-            return False
+        return self._qga.ping(self.vm_name)
@@ -1,7 +1,9 @@
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 from rich.table import Table
 
+from clonebox.validation.probes import path_probe_cmd, per_item_script, split_sections
+
 
 class MountValidationMixin:
     def validate_mounts(self) -> Dict:
@@ -35,6 +37,14 @@ class MountValidationMixin:
         mount_table.add_column("Status", justify="center")
         mount_table.add_column("Files", justify="right")
 
+        mounted_guest_paths = [
+            gp for gp in paths.values() if any(gp in mp for mp in mounted_paths)
+        ]
+        probed = self._probe_paths(list(paths.values()) + list(copy_paths.values()))
+        if probed is None:
+            fallback = list(dict.fromkeys(mounted_guest_paths + list(copy_paths.values())))
+            probed = dict(zip(fallback, self._map_items(self._check_path, fallback)))
+
         for host_path, guest_path in paths.items():
             self.results["mounts"]["total"] += 1
 
@@ -44,13 +54,7 @@ class MountValidationMixin:
             file_count = "?"
 
             if is_mounted:
-                test_result = self._exec_in_vm(f"test -d {guest_path} && echo 'yes' || echo 'no'")
-                accessible = test_result == "yes"
-
-                if accessible:
-                    count_str = self._exec_in_vm(f"ls -A {guest_path} 2>/dev/null | wc -l")
-                    if count_str and count_str.isdigit():
-                        file_count = count_str
+                accessible, file_count = self._path_state(guest_path, probed)
 
             if is_mounted and accessible:
                 status_icon = "[green]✅ Mounted[/]"
@@ -84,16 +88,7 @@ class MountValidationMixin:
         for host_path, guest_path in copy_paths.items():
             self.results["mounts"]["total"] += 1
 
-            exists = False
-            file_count = "?"
-
-            test_result = self._exec_in_vm(f"test -d {guest_path} && echo 'yes' || echo 'no'")
-            exists = test_result == "yes"
-
-            if exists:
-                count_str = self._exec_in_vm(f"ls -A {guest_path} 2>/dev/null | wc -l")
-                if count_str and count_str.isdigit():
-                    file_count = count_str
+            exists, file_count = self._path_state(guest_path, probed)
 
             if exists:
                 status_icon = "[green]✅ Copied[/]"
@@ -126,3 +121,40 @@ class MountValidationMixin:
         )
 
         return self.results["mounts"]
+
+    def _probe_paths(self, guest_paths: List[str]) -> Optional[Dict[str, Tuple[bool, str]]]:
+        """Check existence and entry count of all *guest_paths* in one exec."""
+        guest_paths = list(dict.fromkeys(guest_paths))
+        if not guest_paths:
+            return None
+        probe = self._probe(per_item_script([path_probe_cmd(p) for p in guest_paths]))
+        sections = split_sections(probe, len(guest_paths)) if probe else None
+        if sections is None:
+            return None
+
+        probed: Dict[str, Tuple[bool, str]] = {}
+        for guest_path, section in zip(guest_paths, sections):
+            lines = section.splitlines()
+            exists = bool(lines) and lines[0].strip() == "yes"
+            count = lines[1].strip() if exists and len(lines) > 1 else ""
+            probed[guest_path] = (exists, count if count.isdigit() else "?")
+        return probed
+
+    def _path_state(
+        self, guest_path: str, probed: Optional[Dict[str, Tuple[bool, str]]]
+    ) -> Tuple[bool, str]:
+        """Return ``(is_dir, file_count)`` from the probe results or a direct check."""
+        if probed is not None and guest_path in probed:
+            return probed[guest_path]
+        return self._check_path(guest_path)
+
+    def _check_path(self, guest_path: str) -> Tuple[bool, str]:
+        """Check one path with up to two guest execs (unbatched)."""
+        file_count = "?"
+        test_result = self._exec_in_vm(f"test -d {guest_path} && echo 'yes' || echo 'no'")
+        exists = test_result == "yes"
+        if exists:
+            count_str = self._exec_in_vm(f"ls -A {guest_path} 2>/dev/null | wc -l")
+            if count_str and count_str.isdigit():
+                file_count = count_str
+        return exists, file_count
@@ -99,14 +99,17 @@ class OverallValidationMixin:
                 "[yellow]⚠️  CloneBox ready marker not found - provisioning may not have completed[/]"
             )
 
-        self.validate_disk_space()
-        self.validate_mounts()
-        self.validate_packages()
-        self.validate_snap_packages()
-        self.validate_services()
-        self.validate_apps()
+        phases = [
+            self.validate_disk_space,
+            self.validate_mounts,
+            self.validate_packages,
+            self.validate_snap_packages,
+            self.validate_services,
+            self.validate_apps,
+        ]
         if self.smoke_test:
-            self.validate_smoke_tests()
+            phases.append(self.validate_smoke_tests)
+        self._run_phases(phases)
 
         recent_err = self._exec_in_vm("journalctl -p err -n 30 --no-pager 2>/dev/null || true", timeout=20)
         if recent_err:
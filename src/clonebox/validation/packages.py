@@ -2,6 +2,13 @@ from typing import Dict
 
 from rich.table import Table
 
+from clonebox.validation.probes import (
+    DPKG_QUERY_CMD,
+    SNAP_LIST_CMD,
+    parse_dpkg_query,
+    parse_snap_list,
+)
+
 
 class PackageValidationMixin:
     def validate_packages(self) -> Dict:
@@ -22,14 +29,20 @@ class PackageValidationMixin:
         pkg_table.add_column("Status", justify="center")
         pkg_table.add_column("Version", style="dim")
 
-        for idx, package in enumerate(packages, 1):
+        probe = self._probe(DPKG_QUERY_CMD)
+        if probe:
+            installed = parse_dpkg_query(probe)
+            versions = [installed.get(package) for package in packages]
+        else:
+            versions = self._map_exec(
+                [f"dpkg -l | grep -E '^ii  {package}' | awk '{{print $3}}'" for package in packages]
+            )
+
+        for idx, (package, version) in enumerate(zip(packages, versions), 1):
             if idx == 1 or idx % 25 == 0 or idx == total_pkgs:
                 self.console.print(f"[dim]   ...packages progress: {idx}/{total_pkgs}[/]")
             self.results["packages"]["total"] += 1
 
-            check_cmd = f"dpkg -l | grep -E '^ii  {package}' | awk '{{print $3}}'"
-            version = self._exec_in_vm(check_cmd)
-
             if version:
                 pkg_table.add_row(package, "[green]✅ Installed[/]", version[:40])
                 self.results["packages"]["passed"] += 1
@@ -75,14 +88,20 @@ class PackageValidationMixin:
         snap_table.add_column("Status", justify="center")
         snap_table.add_column("Version", style="dim")
 
-        for idx, package in enumerate(snap_packages, 1):
+        probe = self._probe(SNAP_LIST_CMD)
+        if probe:
+            installed = parse_snap_list(probe)
+            versions = [installed.get(package) for package in snap_packages]
+        else:
+            versions = self._map_exec(
+                [f"snap list | grep '^{package}' | awk '{{print $2}}'" for package in snap_packages]
+            )
+
+        for idx, (package, version) in enumerate(zip(snap_packages, versions), 1):
             if idx == 1 or idx % 25 == 0 or idx == total_snaps:
                 self.console.print(f"[dim]   ...snap progress: {idx}/{total_snaps}[/]")
             self.results["snap_packages"]["total"] += 1
 
-            check_cmd = f"snap list | grep '^{package}' | awk '{{print $2}}'"
-            version = self._exec_in_vm(check_cmd)
-
             if version:
                 snap_table.add_row(package, "[green]✅ Installed[/]", version[:40])
                 self.results["snap_packages"]["passed"] += 1
@@ -0,0 +1,94 @@
+"""Bounded concurrency helpers for the validator.
+
+Independent validation phases run on a small thread pool against the VM.
+Each phase prints into its own buffer (see :class:`PhaseConsole`); buffers
+are replayed on the real console in the canonical phase order, so tables
+and the JSON results come out exactly as in a sequential run.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class PhaseConsole:
+    """Console proxy that buffers ``print`` calls per worker thread.
+
+    Calls made outside a phase (no active buffer) go straight to the
+    wrapped console.  Everything else is delegated unchanged.
+    """
+
+    def __init__(self, console: Any):
+        self._console = console
+        self._local = threading.local()
+
+    @property
+    def wrapped(self) -> Any:
+        return self._console
+
+    def begin(self) -> None:
+        self._local.buffer = []
+
+    def end(self) -> List[Tuple[tuple, dict]]:
+        buffer = getattr(self._local, "buffer", None) or []
+        self._local.buffer = None
+        return buffer
+
+    def print(self, *args: Any, **kwargs: Any) -> None:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            self._console.print(*args, **kwargs)
+        else:
+            buffer.append((args, kwargs))
+
+    def replay(self, buffer: List[Tuple[tuple, dict]]) -> None:
+        for args, kwargs in buffer:
+            self._console.print(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._console, name)
+
+
+def map_ordered(fn: Callable[[T], R], items: Iterable[T], jobs: int) -> List[R]:
+    """``list(map(fn, items))`` on up to *jobs* threads, preserving order."""
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+def run_phases(
+    phases: Sequence[Callable[[], Any]],
+    console: PhaseConsole,
+    jobs: int,
+) -> None:
+    """Run *phases* concurrently and replay their output in declaration order.
+
+    Output of phase *n* is flushed as soon as phases ``0..n`` have finished.
+    The first exception raised by a phase is re-raised after all phases
+    have been waited for.
+    """
+
+    def _run(phase: Callable[[], Any]) -> Tuple[List[Tuple[tuple, dict]], Optional[BaseException]]:
+        console.begin()
+        try:
+            phase()
+            error = None
+        except Exception as exc:  # replayed after the phase's output
+            error = exc
+        return console.end(), error
+
+    first_error: Optional[BaseException] = None
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(phases)))) as pool:
+        futures = [pool.submit(_run, phase) for phase in phases]
+        for future in futures:
+            buffer, error = future.result()
+            console.replay(buffer)
+            if error is not None and first_error is None:
+                first_error = error
+    if first_error is not None:
+        raise first_error
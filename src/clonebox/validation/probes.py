@@ -0,0 +1,103 @@
+"""Batched guest probes for the validator.
+
+Each probe collects the state of every configured item with a single guest
+exec and parses the result host-side, instead of one to three round trips
+per package, service or path.
+"""
+
+import shlex
+from typing import Dict, List, Optional, Sequence
+
+# Prefix for the per-item section markers emitted by batched scripts.
+SECTION_MARK = "@@clonebox-probe:"
+
+DPKG_QUERY_CMD = "dpkg-query -W -f='${db:Status-Abbrev}\\t${binary:Package}\\t${Version}\\n' 2>/dev/null"
+SNAP_LIST_CMD = "snap list 2>/dev/null"
+SYSTEMCTL_SHOW_PROPS = ("Id", "UnitFileState", "ActiveState", "MainPID")
+
+
+def per_item_script(commands: Sequence[str]) -> str:
+    """Join *commands* into one script whose output is split by section markers."""
+    lines: List[str] = []
+    for idx, cmd in enumerate(commands):
+        lines.append(f"echo '{SECTION_MARK}{idx}'")
+        lines.append(f"{{ {cmd} ; }} 2>/dev/null")
+    return "\n".join(lines)
+
+
+def split_sections(output: str, count: int) -> Optional[List[str]]:
+    """Split :func:`per_item_script` output back into *count* chunks.
+
+    Returns ``None`` if any section is missing (e.g. truncated output).
+    """
+    sections: Dict[int, List[str]] = {}
+    current: Optional[int] = None
+    for line in output.splitlines():
+        if line.startswith(SECTION_MARK):
+            try:
+                current = int(line[len(SECTION_MARK):])
+            except ValueError:
+                return None
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    if len(sections) != count:
+        return None
+    return ["\n".join(sections[i]).strip() for i in range(count)]
+
+
+def parse_dpkg_query(output: str) -> Dict[str, str]:
+    """Map installed package names (with and without ``:arch``) to versions."""
+    installed: Dict[str, str] = {}
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) < 3 or not parts[0].startswith("ii"):
+            continue
+        name, version = parts[1].strip(), parts[2].strip()
+        installed[name] = version
+        installed.setdefault(name.split(":", 1)[0], version)
+    return installed
+
+
+def parse_snap_list(output: str) -> Dict[str, str]:
+    """Map installed snap names to versions from ``snap list`` output."""
+    snaps: Dict[str, str] = {}
+    for line in output.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 2:
+            snaps[parts[0]] = parts[1]
+    return snaps
+
+
+def systemctl_show_cmd(units: Sequence[str]) -> str:
+    props = " ".join(f"-p {p}" for p in SYSTEMCTL_SHOW_PROPS)
+    quoted = " ".join(shlex.quote(u) for u in units)
+    return f"systemctl show {props} {quoted} 2>/dev/null"
+
+
+def parse_systemctl_show(output: str, units: Sequence[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """Parse multi-unit ``systemctl show`` output into ``{unit: {prop: value}}``.
+
+    systemctl prints one blank-line separated block per unit, in argument
+    order.  Returns ``None`` if the block count does not match.
+    """
+    blocks: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for line in output.splitlines():
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = {}
+            continue
+        key, _, value = line.partition("=")
+        current[key.strip()] = value.strip()
+    if current:
+        blocks.append(current)
+    if len(blocks) != len(units):
+        return None
+    return dict(zip(units, blocks))
+
+
+def path_probe_cmd(path: str) -> str:
+    q = shlex.quote(path)
+    return f"if test -d {q}; then echo yes; ls -A {q} | wc -l; else echo no; fi"
@@ -1,7 +1,9 @@
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from rich.table import Table
 
+from clonebox.validation.probes import parse_systemctl_show, systemctl_show_cmd
+
 
 class ServiceValidationMixin:
     # Services that should NOT be validated in VM (host-specific)
@@ -52,6 +54,21 @@ class ServiceValidationMixin:
         svc_table.add_column("PID", justify="right", style="dim")
         svc_table.add_column("Note", style="dim")
 
+        units = [svc for svc in services if svc not in self.VM_EXCLUDED_SERVICES]
+        probe = self._probe(systemctl_show_cmd(units)) if units else None
+        shown = parse_systemctl_show(probe, units) if probe else None
+        if shown is not None:
+            states = {
+                unit: (
+                    props.get("UnitFileState") == "enabled",
+                    props.get("ActiveState") == "active",
+                    props.get("MainPID", ""),
+                )
+                for unit, props in shown.items()
+            }
+        else:
+            states = dict(zip(units, self._map_items(self._query_service, units)))
+
         for idx, service in enumerate(services, 1):
             if idx == 1 or idx % 25 == 0 or idx == total_svcs:
                 self.console.print(f"[dim]   ...services progress: {idx}/{total_svcs}[/]")
@@ -71,17 +88,10 @@ class ServiceValidationMixin:
 
             self.results["services"]["total"] += 1
 
-            enabled_cmd = f"systemctl is-enabled {service} 2>/dev/null"
-            enabled_status = self._exec_in_vm(enabled_cmd)
-            is_enabled = enabled_status == "enabled"
-
-            running_cmd = f"systemctl is-active {service} 2>/dev/null"
-            running_status = self._exec_in_vm(running_cmd)
-            is_running = running_status == "active"
+            is_enabled, is_running, pid_out = states[service]
 
             pid_value = ""
             if is_running:
-                pid_out = self._exec_in_vm(f"systemctl show -p MainPID --value {service} 2>/dev/null")
                 if pid_out is None:
                     pid_value = "?"
                 else:
@@ -123,3 +133,13 @@ class ServiceValidationMixin:
         self.console.print(f"[dim]{msg}[/]")
 
         return self.results["services"]
+
+    def _query_service(self, service: str) -> Tuple[bool, bool, Optional[str]]:
+        """Return ``(enabled, running, main_pid)`` for one unit (unbatched)."""
+        enabled_status = self._exec_in_vm(f"systemctl is-enabled {service} 2>/dev/null")
+        running_status = self._exec_in_vm(f"systemctl is-active {service} 2>/dev/null")
+        is_running = running_status == "active"
+        pid_out = None
+        if is_running:
+            pid_out = self._exec_in_vm(f"systemctl show -p MainPID --value {service} 2>/dev/null")
+        return enabled_status == "enabled", is_running, pid_out
@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 from rich.table import Table
 
@@ -115,15 +115,19 @@ class SmokeValidationMixin:
         table.add_column("Launch", justify="center")
         table.add_column("Note", style="dim")
 
-        for app in expected:
-            self.results["smoke"]["total"] += 1
+        def _probe_app(app: str) -> Tuple[Optional[bool], Optional[bool]]:
             installed = _installed(app)
-            launched: Optional[bool] = None
+            launched = _run_test(app) if installed is True else None
+            return installed, launched
+
+        probes = self._map_items(_probe_app, expected)
+
+        for app, (installed, launched) in zip(expected, probes):
+            self.results["smoke"]["total"] += 1
             note = ""
             pending = False
 
             if installed is True:
-                launched = _run_test(app)
                 if launched is None:
                     note = "test failed to execute"
                 elif launched is False and setup_in_progress:
@@ -79,7 +79,7 @@ class TestSecureExporter:
                 output_path=tmp_path / "test.enc",
             )
 
-    @patch.object(VMExporter, "export_vm")
+    @patch.object(VMExporter, "write_archive")
     def test_export_encrypted_creates_encrypted_file(self, mock_export, tmp_path, monkeypatch):
         """Test encrypted export creates .enc file."""
         key_path = tmp_path / ".clonebox.key"
@@ -88,10 +88,9 @@ class TestSecureExporter:
         # Generate key
         SecureExporter.generate_key()
 
-        # Mock the VM export to create a simple tar.gz
-        def mock_export_vm(vm_name, output_path, **kwargs):
-            output_path.write_bytes(b"fake tar.gz content for testing")
-            return output_path
+        # Mock the VM export to stream a simple tar.gz
+        def mock_export_vm(vm_name, out, **kwargs):
+            out.write(b"fake tar.gz content for testing")
 
         mock_export.side_effect = mock_export_vm
 
@@ -225,10 +224,13 @@ class TestP2PManager:
             # but we can test the subprocess calls
             pass
 
+    @patch("clonebox.p2p.assemble_archive")
+    @patch("clonebox.p2p.split_archive", return_value=[])
     @patch("subprocess.run")
-    def test_export_remote_success(self, mock_run, tmp_path):
-        """Test export_remote executes correct commands."""
-        mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
+    @patch("subprocess.Popen")
+    def test_export_remote_success(self, mock_popen, mock_run, mock_split, mock_assemble, tmp_path):
+        """Test export_remote streams the remote export and assembles locally."""
+        mock_popen.return_value.wait.return_value = 0
 
         p2p = P2PManager()
         output = tmp_path / "export.tar.gz"
@@ -239,13 +241,18 @@ class TestP2PManager:
             output=output,
         )
 
-        # Should have called SSH and SCP
-        assert mock_run.call_count >= 2
+        # One streamed export over SSH, chunked on the fly: nothing to clean up on the peer
+        export_cmd = mock_popen.call_args[0][0][-1]
+        assert export_cmd.startswith("clonebox export test-vm - --chunk-stream")
+        assert "CLONEBOX_CHUNK_STORE" not in export_cmd
+        assert not mock_run.called
+        assert mock_split.called and mock_assemble.called
 
-    @patch("subprocess.run")
-    def test_export_remote_failure_raises(self, mock_run, tmp_path):
+    @patch("subprocess.Popen")
+    def test_export_remote_failure_raises(self, mock_popen, tmp_path):
         """Test export_remote raises on failure."""
-        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="Connection refused")
+        mock_popen.return_value.wait.return_value = 255
+        mock_popen.return_value.stdin.write.side_effect = BrokenPipeError
 
         p2p = P2PManager()
         output = tmp_path / "export.tar.gz"
@@ -257,8 +264,10 @@ class TestP2PManager:
                 output=output,
             )
 
+    @patch("clonebox.p2p.read_index_archive", return_value=("test-vm", []))
+    @patch("clonebox.p2p.split_archive", return_value=[])
     @patch("subprocess.run")
-    def test_import_remote_success(self, mock_run, tmp_path):
+    def test_import_remote_success(self, mock_run, mock_split, mock_index, tmp_path):
         """Test import_remote executes correct commands."""
         mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
 
@@ -271,8 +280,10 @@ class TestP2PManager:
             archive_path=archive,
         )
 
-        # Should have called SCP and SSH
-        assert mock_run.call_count >= 2
+        # Chunk query and the streamed import into a transfer store, removed afterwards
+        import_cmd, cleanup_cmd = (c[0][0][-1] for c in mock_run.call_args_list[-2:])
+        assert "clonebox import -" in import_cmd and import_cmd.startswith("CLONEBOX_CHUNK_STORE=")
+        assert cleanup_cmd.startswith("rm -rf ") and cleanup_cmd[len("rm -rf "):] in import_cmd
 
 
 class TestCLICommands:
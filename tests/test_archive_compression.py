@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Tests for the export archive compression stage."""
+
+import io
+import os
+import shutil
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import compression
+from clonebox.compression import archive_compressor, archive_decompressor
+from clonebox.crypto_stream import DecryptingReader, DecryptionError
+from clonebox.exporter import SecureExporter, VMExporter
+
+needs_zstd = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd not installed")
+
+
+@pytest.fixture
+def vm(tmp_path):
+    disk = tmp_path / "vm.qcow2"
+    disk.write_bytes(os.urandom(1024 * 1024) + bytes(2 * 1024 * 1024))
+    conn = MagicMock()
+    conn.lookupByName.return_value.XMLDesc.return_value = (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+    return disk, conn
+
+
+def _members(src):
+    with archive_decompressor(src) as (stream, mode), tarfile.open(fileobj=stream, mode=mode) as tar:
+        return {m.name: tar.extractfile(m).read() for m in tar if m.isfile()}
+
+
+@pytest.mark.parametrize("name, magic", [
+    ("none", None),
+    ("gzip", b"\x1f\x8b"),
+    pytest.param("zstd", b"\x28\xb5\x2f\xfd", marks=needs_zstd),
+])
+def test_export_is_detected_on_import(vm, tmp_path, monkeypatch, name, magic):
+    monkeypatch.setattr(compression.shutil, "which",
+                        lambda b, _which=shutil.which: None if b == "pigz" else _which(b))
+    disk, conn = vm
+    exporter = VMExporter()
+    exporter._conn = conn
+    archive = exporter.export_vm("vm", tmp_path / "vm.tar", compression=name)
+    head = archive.read_bytes()[:4]
+    if magic:
+        assert head.startswith(magic)
+    with open(archive, "rb") as src:
+        assert _members(src)["disks/vm.qcow2"] == disk.read_bytes()
+
+
+@needs_zstd
+def test_zstd_through_encryption(vm, tmp_path, monkeypatch):
+    key_path = tmp_path / ".clonebox.key"
+    monkeypatch.setattr(SecureExporter, "KEY_PATH", key_path)
+    SecureExporter.generate_key()
+    disk, conn = vm
+    exporter = SecureExporter()
+    exporter.exporter._conn = conn
+    output = exporter.export_encrypted("vm", tmp_path / "vm.enc", compression="zstd")
+    key = key_path.read_bytes()
+
+    with open(output, "rb") as src:
+        assert _members(DecryptingReader(src, key))["disks/vm.qcow2"] == disk.read_bytes()
+
+    blob = bytearray(output.read_bytes())
+    blob[len(blob) // 2] ^= 1
+    with pytest.raises(DecryptionError):
+        _members(DecryptingReader(io.BytesIO(bytes(blob)), key))
+
+
+@needs_zstd
+def test_compressor_failure_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(compression, "_archive_command", lambda name, decompress: ["false"])
+    with pytest.raises(RuntimeError, match="exit code"):
+        with open(tmp_path / "out", "wb") as out, archive_compressor(out, "zstd") as (stream, _):
+            pass
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Tests for streaming browser profiles into the VM."""
+
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from clonebox import browser_profiles
+from clonebox.browser_profiles import (
+    PROFILE_CACHE_DIRS,
+    point_in_time_view,
+    stream_profiles_to_vm_via_ssh,
+)
+from clonebox.delta_sync import SyncResult, scan_path
+
+
+def _profile(tmp_path):
+    profile = tmp_path / "google-chrome"
+    (profile / "Default" / "Cache").mkdir(parents=True)
+    (profile / "Default" / "Cache" / "data_0").write_bytes(b"cached")
+    (profile / "Default" / "Bookmarks").write_text("{}")
+    (profile / "SingletonLock").write_text("")
+    return profile
+
+
+def test_point_in_time_view_falls_back_to_live_directory(tmp_path, monkeypatch):
+    profile = _profile(tmp_path)
+    clones = tmp_path / "clones"
+    monkeypatch.setattr(browser_profiles, "PROFILE_CLONE_DIR", clones)
+
+    def no_reflink(cmd, **kwargs):
+        Path(cmd[-1]).mkdir()
+        raise subprocess.CalledProcessError(1, cmd)
+
+    monkeypatch.setattr(browser_profiles.subprocess, "run", no_reflink)
+    with point_in_time_view(profile) as view:
+        assert view == profile
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["clones", "google-chrome"]
+    assert not list(clones.iterdir())
+
+
+def test_point_in_time_view_clones_outside_the_profile_dir(tmp_path, monkeypatch):
+    profile = _profile(tmp_path)
+    clones = tmp_path / "clones"
+    monkeypatch.setattr(browser_profiles, "PROFILE_CLONE_DIR", clones)
+
+    def reflink(cmd, **kwargs):
+        shutil.copytree(cmd[-2], cmd[-1], symlinks=True)
+
+    monkeypatch.setattr(browser_profiles.subprocess, "run", reflink)
+    with point_in_time_view(profile) as view:
+        assert view != profile and clones in view.parents
+        assert (view / "Default" / "Bookmarks").exists()
+    assert not list(clones.iterdir())
+
+
+def test_point_in_time_view_removes_clones_of_dead_processes(tmp_path, monkeypatch):
+    profile = _profile(tmp_path)
+    clones = tmp_path / "clones"
+    monkeypatch.setattr(browser_profiles, "PROFILE_CLONE_DIR", clones)
+    monkeypatch.setattr(browser_profiles.subprocess, "run",
+                        MagicMock(side_effect=subprocess.CalledProcessError(1, "cp")))
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    stale = clones / f"google-chrome.x.clonebox-{dead.pid}"
+    live = clones / f"firefox.y.clonebox-{os.getpid()}"
+    # Never touched: it sits in the user's browser config directory
+    foreign = tmp_path / f".google-chrome.clonebox-{dead.pid}"
+    for path in (stale, live, foreign):
+        path.mkdir(parents=True)
+
+    with point_in_time_view(profile):
+        pass
+    assert not stale.exists() and live.exists() and foreign.exists()
+
+
+def test_stream_reads_live_profile_and_skips_caches(tmp_path, monkeypatch):
+    profile = _profile(tmp_path)
+    monkeypatch.setattr(browser_profiles, "PROFILE_CLONE_DIR", tmp_path / "clones")
+    monkeypatch.setattr(browser_profiles, "_ssh_run",
+                        MagicMock(return_value=MagicMock(stdout="NOSNAP")))
+    calls = {}
+
+    def fake_sync(copy_paths, port, key, username, **kwargs):
+        calls.update(kwargs, copy_paths=copy_paths)
+        view = kwargs["read_from"]["/home/dev/.config/google-chrome"]
+        calls["files"] = sorted(scan_path(profile, "/g", {}, {}, kwargs["exclude_dirs"], view).state)
+        return SyncResult(ok=True, files=1, bytes=2)
+
+    monkeypatch.setattr(browser_profiles, "sync_to_guest", fake_sync)
+    assert stream_profiles_to_vm_via_ssh({"chrome": profile}, 2222, None, "dev")
+
+    assert calls["copy_paths"] == {str(profile): "/home/dev/.config/google-chrome"}
+    assert calls["exclude_dirs"] == PROFILE_CACHE_DIRS
+    assert calls["files"] == ["", "Default", "Default/Bookmarks"]
+    assert not (tmp_path / "browser_profiles").exists()
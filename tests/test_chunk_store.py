@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Tests for the deduplicating chunk store and chunked exports."""
+
+import io
+import os
+import random
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox.chunk_store import (
+    MAX_CHUNK,
+    MIN_CHUNK,
+    ChunkMissingError,
+    ChunkStore,
+    iter_chunks,
+    referenced,
+)
+from clonebox.chunk_transfer import archive_indexes
+from clonebox.exporter import VMExporter
+from clonebox.importer import VMImporter
+
+
+def _disk(path, blocks):
+    path.write_bytes(b"".join(blocks))
+    return path
+
+
+def _random_blocks(n, seed):
+    rnd = random.Random(seed)
+    return [rnd.getrandbits(4096 * 8).to_bytes(4096, "little") for _ in range(n)]
+
+
+def test_chunks_cover_input_and_respect_bounds():
+    data = b"".join(_random_blocks(700, 1)) + b"tail"
+    chunks = list(iter_chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(MIN_CHUNK <= len(c) <= MAX_CHUNK for c in chunks[:-1])
+
+
+def test_boundaries_resynchronise_after_an_edit():
+    blocks = _random_blocks(1000, 2)
+    before = set(iter_chunks(io.BytesIO(b"".join(blocks))))
+    blocks[10] = b"\xff" * 4096
+    after = list(iter_chunks(io.BytesIO(b"".join(blocks))))
+    # Only the chunk around the edited block differs
+    assert len([c for c in after if c not in before]) == 1
+
+
+def test_store_dedupes_and_restores_sparse(tmp_path):
+    store = ChunkStore(tmp_path / "store")
+    blocks = _random_blocks(300, 3) + [bytes(4096)] * 2048
+    disk = _disk(tmp_path / "a.qcow2", blocks)
+
+    index, new = store.add_file(disk)
+    assert new and store.missing(index) == []
+    assert store.add_file(disk)[1] == []
+
+    out = store.restore_file(index, tmp_path / "restored")
+    assert out.read_bytes() == disk.read_bytes()
+    assert os.stat(out).st_blocks * 512 < out.stat().st_size
+
+    store.object_path(new[0]).unlink()
+    with pytest.raises(ChunkMissingError):
+        store.restore_file(index, tmp_path / "again")
+
+
+def test_repeat_export_ships_only_new_chunks(tmp_path):
+    blocks = _random_blocks(600, 4)
+    disk = _disk(tmp_path / "vm.qcow2", blocks)
+    xml = f"<domain><name>vm</name><devices><disk type='file'><source file='{disk}'/></disk></devices></domain>"
+    exporter = VMExporter()
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = xml
+    src_store = ChunkStore(tmp_path / "src")
+
+    first = exporter.export_vm("vm", tmp_path / "1.tar", chunk_store=src_store)
+    blocks[5] = b"\x01" * 4096
+    _disk(disk, blocks)
+    second = exporter.export_vm("vm", tmp_path / "2.tar", chunk_store=src_store)
+
+    def chunk_members(archive):
+        with tarfile.open(archive) as tar:
+            return [m for m in tar.getnames() if m.startswith("chunks/")]
+
+    assert len(chunk_members(second)) == 1 < len(chunk_members(first))
+
+    importer = VMImporter()
+    importer._conn = MagicMock()
+    dst_store = ChunkStore(tmp_path / "dst")
+    images = tmp_path / "images"
+    images.mkdir()
+    for archive in (first, second):
+        importer.import_vm(archive, disk_dir=images, chunk_store=dst_store)
+    assert (images / "vm.qcow2").read_bytes() == disk.read_bytes()
+    defined = importer._conn.defineXML.call_args[0][0]
+    assert str(images / "vm.qcow2") in defined
+
+
+def test_gc_keeps_only_referenced_chunks(tmp_path):
+    blocks = _random_blocks(600, 5)
+    disk = _disk(tmp_path / "vm.qcow2", blocks)
+    xml = f"<domain><name>vm</name><devices><disk type='file'><source file='{disk}'/></disk></devices></domain>"
+    exporter = VMExporter()
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = xml
+    store = ChunkStore(tmp_path / "store")
+
+    first = exporter.export_vm("vm", tmp_path / "1.tar", chunk_store=store)
+    old_index = store.add_file(disk)[0]
+    blocks[5] = b"\x01" * 4096
+    _disk(disk, blocks)
+    second = exporter.export_vm("vm", tmp_path / "2.tar", chunk_store=store)
+    (new_index,) = archive_indexes(second)
+    stale = set(referenced(old_index)) - set(referenced(new_index))
+    assert stale and len(archive_indexes(first)) == 1
+
+    # Just-written objects are within the grace period
+    assert store.gc([new_index]) == (0, 0)
+
+    sizes = sum(store.object_path(d).stat().st_size for d in stale)
+    assert store.gc([new_index], grace=0, dry_run=True) == (len(stale), sizes)
+    assert store.missing(old_index) == []
+    assert store.gc([new_index], grace=0) == (len(stale), sizes)
+    assert sorted(store.missing(old_index)) == sorted(stale)
+    assert store.restore_file(new_index, tmp_path / "restored").read_bytes() == disk.read_bytes()
+
+    assert store.gc([], grace=0)[0] == len(set(referenced(new_index)))
+    assert not list(store.objects_dir.glob("*/*"))
+
+
+def test_reused_chunks_survive_gc_grace(tmp_path):
+    store = ChunkStore(tmp_path / "store")
+    chunk = random.Random(3).randbytes(8192)
+    digest, added = store.put(chunk)
+    assert added
+    os.utime(store.object_path(digest), (0, 0))
+
+    # An export re-referencing an old chunk protects it until its index is recorded
+    assert store.put(chunk) == (digest, False)
+    assert store.gc([]) == (0, 0)
+    os.utime(store.object_path(digest), (0, 0))
+    assert not store.put_object(digest, store.read_object(digest))
+    assert store.gc([]) == (0, 0)
+
+
+def test_chunks_gc_command_needs_exports_or_all(tmp_path, monkeypatch):
+    from argparse import Namespace
+
+    from clonebox.cli.import_export_commands import cmd_chunks
+
+    monkeypatch.setenv("CLONEBOX_CHUNK_STORE", str(tmp_path / "store"))
+    store = ChunkStore(tmp_path / "store")
+    store.add_file(_disk(tmp_path / "a.qcow2", _random_blocks(50, 6)))
+
+    with pytest.raises(ValueError):
+        cmd_chunks(Namespace(action="gc", keep=[], all=False, dry_run=False))
+    cmd_chunks(Namespace(action="gc", keep=[], all=True, dry_run=False))
+    assert list(store.objects_dir.glob("*/*"))  # too recent to collect
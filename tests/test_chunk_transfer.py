@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Tests for resumable chunk transfers between workstations."""
+
+import os
+import random
+import sys
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox.chunk_store import ChunkStore
+from clonebox.chunk_transfer import TransferManifest, read_index_archive
+from clonebox.exporter import VMExporter
+from clonebox.importer import VMImporter
+from clonebox.p2p import P2PManager
+
+
+# The peer's ``clonebox export VM - --chunk-stream``, for a VM described by remote-vm.xml
+REMOTE_EXPORT = """
+import contextlib, io, os, sys
+from unittest.mock import MagicMock
+from clonebox.exporter import VMExporter
+
+exporter = VMExporter()
+exporter._conn = MagicMock()
+exporter._conn.lookupByName.return_value.XMLDesc.return_value = open("{tmp}/remote-vm.xml").read()
+archive = io.BytesIO()
+with contextlib.redirect_stdout(sys.stderr):
+    exporter.write_archive("vm", archive, chunk_stream=True, known_chunks=set(sys.stdin.read().split()))
+data = archive.getvalue()
+if os.path.exists("{tmp}/drop-stream"):
+    sys.stdout.buffer.write(data[:len(data) // 2])
+    sys.exit("connection reset")
+sys.stdout.buffer.write(data)
+"""
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """A 'remote host': a clonebox shim on PATH with its own home and chunk store.
+
+    ``export`` streams the VM of ``remote-vm.xml`` (cut off halfway while
+    ``drop-stream`` exists); ``import`` keeps the index archive and a copy
+    of the chunk store it ran against, or fails while ``fail-import`` exists.
+    """
+    store = tmp_path / "remote-store"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (tmp_path / "remote_export.py").write_text(REMOTE_EXPORT.format(tmp=tmp_path))
+    shim = bin_dir / "clonebox"
+    shim.write_text(
+        "#!/bin/sh\n"
+        f'export CLONEBOX_CHUNK_STORE="${{CLONEBOX_CHUNK_STORE:-{store}}}"\n'
+        'case "$1" in\n'
+        f"  export) exec {sys.executable} {tmp_path}/remote_export.py ;;\n"
+        f"  import) [ ! -e {tmp_path}/fail-import ] && cat > {tmp_path}/remote-imported.tar"
+        f' && cp -r "$CLONEBOX_CHUNK_STORE" {tmp_path}/remote-landed ;;\n'
+        f'  *) exec {sys.executable} -m clonebox "$@" ;;\n'
+        "esac\n"
+    )
+    shim.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.setenv("HOME", str(tmp_path / "peer-home"))
+    monkeypatch.setattr(P2PManager, "_ssh_argv", lambda self, host, command: ["sh", "-c", command])
+    return ChunkStore(store)
+
+
+def _vm_xml(disk):
+    return (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+
+
+def _disk(tmp_path):
+    rnd = random.Random(7)
+    disk = tmp_path / "vm.qcow2"
+    disk.write_bytes(rnd.getrandbits(8 * 3 * 1024 * 1024).to_bytes(3 * 1024 * 1024, "little"))
+    (tmp_path / "remote-vm.xml").write_text(_vm_xml(disk))
+    return disk
+
+
+def _export(tmp_path, store, **kwargs):
+    disk = _disk(tmp_path)
+    exporter = VMExporter()
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = _vm_xml(disk)
+    return disk, exporter.export_vm("vm", tmp_path / "vm-export.tar", chunk_store=store, **kwargs)
+
+
+def _transfer_stores(tmp_path):
+    transfers = tmp_path / "peer-home/.cache/clonebox/transfers"
+    return list(transfers.iterdir()) if transfers.exists() else []
+
+
+def test_export_remote_resumes_after_a_dropped_stream(tmp_path, remote):
+    disk = _disk(tmp_path)
+    local = ChunkStore(tmp_path / "local-store")
+    p2p = P2PManager(chunk_store=local)
+    output = tmp_path / "vm.tar"
+
+    # First attempt: the stream dies halfway; the chunks that made it are kept
+    (tmp_path / "drop-stream").touch()
+    with pytest.raises(RuntimeError, match="connection reset.*re-run to resume"):
+        p2p.export_remote("peer", "vm", output)
+    assert not output.exists() and not TransferManifest(output).index_path.exists()
+    received = set(local.digests())
+    assert received
+
+    # Second attempt: the peer leaves out what already arrived
+    (tmp_path / "drop-stream").unlink()
+    stored = []
+    real_put = local.put_object
+    local.put_object = lambda digest, blob: stored.append(digest) or real_put(digest, blob)
+    p2p.export_remote("peer", "vm", output)
+    digests = read_index_archive(output)[1]
+    assert stored and not received & set(stored)
+    assert sorted(stored) == sorted(set(digests) - received)
+
+    # Nothing was written on the peer
+    assert not remote.root.exists() and not _transfer_stores(tmp_path)
+
+    restored = ChunkStore(tmp_path / "fresh")
+    importer = VMImporter()
+    importer._conn = MagicMock()
+    (tmp_path / "images").mkdir()
+    importer.import_vm(output, disk_dir=tmp_path / "images", chunk_store=restored)
+    assert (tmp_path / "images" / "vm.qcow2").read_bytes() == disk.read_bytes()
+
+
+def test_import_remote_lands_chunks_in_a_transfer_store(tmp_path, remote):
+    disk, archive = _export(tmp_path, ChunkStore(tmp_path / "exporter-store"), all_chunks=True)
+    p2p = P2PManager(streams=2, chunk_store=ChunkStore(tmp_path / "local-store"))
+
+    assert p2p.import_remote("peer", archive) == "vm"
+    _, digests = read_index_archive(tmp_path / "remote-imported.tar")
+    assert digests and all(ChunkStore(tmp_path / "remote-landed").has(d) for d in digests)
+    with tarfile.open(tmp_path / "remote-imported.tar") as tar:
+        assert not [n for n in tar.getnames() if n.startswith("chunks/")]
+
+    # The peer's own store was never touched and the transfer store is gone
+    assert not remote.root.exists() and not _transfer_stores(tmp_path)
+
+
+def test_import_remote_removes_the_transfer_store_when_the_import_fails(tmp_path, remote):
+    _, archive = _export(tmp_path, ChunkStore(tmp_path / "exporter-store"), all_chunks=True)
+    p2p = P2PManager(streams=2, chunk_store=ChunkStore(tmp_path / "local-store"))
+    (tmp_path / "fail-import").touch()
+
+    with pytest.raises(RuntimeError, match="Remote import failed"):
+        p2p.import_remote("peer", archive)
+    assert (tmp_path / "peer-home/.cache/clonebox/transfers").is_dir()
+    assert not _transfer_stores(tmp_path)
+    # The local split is kept for the re-run
+    assert TransferManifest(archive).path.exists()
+
+
+def test_encrypted_transfers_keep_plaintext_out_of_shared_store(tmp_path, remote, monkeypatch):
+    from cryptography.fernet import Fernet
+
+    from clonebox import p2p as p2p_mod
+    from clonebox.crypto_stream import MAGIC, DecryptingReader, EncryptingWriter
+    from clonebox.exporter import SecureExporter
+    from clonebox.importer import SecureImporter
+
+    key_path = tmp_path / "team.key"
+    key_path.write_bytes(Fernet.generate_key())
+    monkeypatch.setattr(SecureExporter, "KEY_PATH", key_path)
+    monkeypatch.setattr(SecureImporter, "KEY_PATH", key_path)
+    key = key_path.read_bytes()
+    local = ChunkStore(tmp_path / "local-store")
+    p2p = P2PManager(streams=2, chunk_store=local)
+
+    def staged_privately(store):
+        manifest = TransferManifest(staging["output"])
+        assert manifest.index_path.read_bytes().startswith(MAGIC)
+        assert manifest.index_path.stat().st_mode & 0o777 == 0o600
+        assert store.root == manifest.chunks_dir
+
+    def push(real):
+        return lambda remote_cmd, chunks, store, streams: (
+            staged_privately(store), real(remote_cmd, chunks, store, streams))[1]
+
+    def assemble(real):
+        return lambda index, store, chunks, out: (
+            staged_privately(store), real(index, store, chunks, out))[1]
+
+    staging = {}
+    monkeypatch.setattr(p2p_mod, "push_chunks", push(p2p_mod.push_chunks))
+    monkeypatch.setattr(p2p_mod, "assemble_archive", assemble(p2p_mod.assemble_archive))
+
+    _, archive = _export(tmp_path, ChunkStore(tmp_path / "exporter-store"), all_chunks=True)
+    encrypted = tmp_path / "vm.tar.enc"
+    with open(archive, "rb") as src, open(encrypted, "wb") as out, EncryptingWriter(out, key) as writer:
+        writer.write(src.read())
+    staging["output"] = encrypted
+    assert p2p.import_remote("peer", encrypted, encrypted=True) == "vm"
+    digests = read_index_archive(tmp_path / "remote-imported.tar")[1]
+    assert digests and all(ChunkStore(tmp_path / "remote-landed").has(d) for d in digests)
+
+    output = tmp_path / "pulled.tar.enc"
+    staging["output"] = output
+    p2p.export_remote("peer", "vm", output, encrypted=True)
+    with open(output, "rb") as src:
+        assert read_index_archive(DecryptingReader(src, key))[1] == digests
+
+    assert not list(local.objects_dir.glob("*/*"))
+    assert not list(tmp_path.glob(".*.chunks"))
+
+
+def test_remote_cli_commands_use_the_chunk_transfer(tmp_path, monkeypatch):
+    from clonebox.cli import parsers
+
+    calls = []
+    monkeypatch.setattr(P2PManager, "export_remote", lambda self, *a, **kw: calls.append((self, a, kw)) or a[2])
+    monkeypatch.setattr(P2PManager, "import_remote", lambda self, *a, **kw: calls.append((self, a, kw)) or "vm")
+    archive = tmp_path / "vm.tar"
+    archive.write_bytes(b"")
+    for argv in (
+        ["export-remote", "peer", "vm", "-o", str(archive), "--encrypted"],
+        ["import-remote", str(archive), "peer", "--streams", "2", "-u", "--name", "copy"],
+    ):
+        monkeypatch.setattr(sys, "argv", ["clonebox"] + argv)
+        parsers.main()
+
+    (export, args, kwargs), (imp, iargs, ikwargs) = calls
+    assert not export.user_session and args == ("peer", "vm", archive) and kwargs["encrypted"]
+    assert imp.streams == 2 and imp.user_session and iargs == ("peer", archive)
+    assert ikwargs["new_name"] == "copy" and not ikwargs["encrypted"]
@@ -248,6 +248,34 @@ class TestSelectiveVMClonerMethods:
 
         mock_conn.close.assert_called_once()
 
+    @patch("clonebox.ssh.subprocess.run")
+    @patch("clonebox.cloner.libvirt")
+    def test_close_stops_only_its_own_ssh_masters(self, mock_libvirt, mock_run, tmp_path, monkeypatch):
+        from clonebox import ssh as ssh_mod
+
+        pool = ssh_mod.SSHSessionPool(control_dir=tmp_path / "cm")
+        monkeypatch.setattr(ssh_mod, "_session_pool", pool)
+
+        def _run(cmd, **kwargs):
+            if "-M" in cmd:
+                port = int(cmd[cmd.index("-p") + 1])
+                pool.control_path(port).parent.mkdir(parents=True, exist_ok=True)
+                pool.control_path(port).touch()
+            return MagicMock(returncode=0, stdout="", stderr="")
+
+        mock_run.side_effect = _run
+        pool.ensure(22100)  # someone else's master
+        cloner = SelectiveVMCloner()
+        # Masters started by helpers (delta sync, repairs) count as the cloner's too
+        ssh_mod.build_ssh_command(22196, multiplex=True)
+        ssh_mod.build_ssh_command(22197, multiplex=True)
+        mock_run.reset_mock()
+        cloner.close()
+
+        stopped = sorted(c[0][0][c[0][0].index("-p") + 1] for c in mock_run.call_args_list)
+        assert stopped == ["22196", "22197"]
+        assert pool.ensure(22100) and mock_run.call_count == 2
+
 
 class TestVMXMLGeneration:
     """Test VM XML generation."""
@@ -251,8 +251,22 @@ def test_cloner_create_vm_branches():
 # --- Dashboard Mocking ---
 
 
+def _dashboard_sampler(monkeypatch, dashboard):
+    from clonebox.domain_stats import DomainSample
+
+    sampler = MagicMock(version=1, user_session=False)
+    snapshot = MagicMock(version=1, sources={})
+    snapshot.vms = {"vm1": DomainSample(name="vm1", uuid="u1", state="running", timestamp=0.0)}
+    snapshot.container_list = [{"name": "c1", "image": "img1", "status": "up", "ports": "80"}]
+    sampler.snapshot.return_value = snapshot
+    monkeypatch.setattr(dashboard, "_sampler", sampler)
+    monkeypatch.setattr(dashboard, "_views", {})
+    return snapshot
+
+
 def test_dashboard_endpoints(monkeypatch):
     try:
+        import clonebox.dashboard as dashboard
         from clonebox.dashboard import (
             api_vms,
             api_containers,
@@ -260,45 +274,28 @@ def test_dashboard_endpoints(monkeypatch):
             api_containers_json,
             dashboard as dashboard_view,
         )
-        from fastapi.responses import JSONResponse
+        from starlette.requests import Request
         import asyncio
     except ImportError:
         pytest.skip("FastAPI not available")
 
-    # Check if any required dashboard symbols are missing even if import didn't fail
-    import sys
-
-    if "clonebox.dashboard" not in sys.modules:
-        pytest.skip("clonebox.dashboard not loaded")
-
     import json
 
-    # Mock _run_clonebox
-    def mock_run(args):
-        mock_proc = MagicMock()
-        mock_proc.returncode = 0
-        if "list" in args:
-            mock_proc.stdout = json.dumps([{"name": "vm1", "state": "running", "uuid": "u1"}])
-        else:
-            mock_proc.stdout = json.dumps(
-                [{"name": "c1", "image": "img1", "status": "up", "ports": "80"}]
-            )
-        return mock_proc
-
-    monkeypatch.setattr("clonebox.dashboard._run_clonebox", mock_run)
+    snapshot = _dashboard_sampler(monkeypatch, dashboard)
+    snapshot.sources = {"vms": MagicMock(last_success=1.0), "containers": MagicMock(last_success=1.0)}
+    request = Request({"type": "http", "headers": []})
 
-    # Call async endpoints using asyncio.run
-    res_vms = asyncio.run(api_vms())
-    assert "vm1" in res_vms
+    res_vms = asyncio.run(api_vms(request))
+    assert "vm1" in res_vms.body.decode()
 
-    res_containers = asyncio.run(api_containers())
-    assert "c1" in res_containers
+    res_containers = asyncio.run(api_containers(request))
+    assert "c1" in res_containers.body.decode()
 
-    res_vms_json = asyncio.run(api_vms_json())
-    assert isinstance(res_vms_json, JSONResponse)
+    res_vms_json = asyncio.run(api_vms_json(request))
+    assert json.loads(res_vms_json.body)[0]["uuid"] == "u1"
 
-    res_containers_json = asyncio.run(api_containers_json())
-    assert isinstance(res_containers_json, JSONResponse)
+    res_containers_json = asyncio.run(api_containers_json(request))
+    assert json.loads(res_containers_json.body)[0]["image"] == "img1"
 
     res_dash = asyncio.run(dashboard_view())
     assert "CloneBox Dashboard" in res_dash
@@ -306,24 +303,21 @@ def test_dashboard_endpoints(monkeypatch):
 
 def test_dashboard_error_paths(monkeypatch):
     try:
-        from clonebox.dashboard import api_vms, _run_clonebox
+        import clonebox.dashboard as dashboard
+        from clonebox.dashboard import api_vms, api_vms_json
+        from starlette.requests import Request
     except ImportError:
         pytest.skip("Dashboard dependencies not available")
-    import json
-
-    def mock_run_fail(args):
-        mock_proc = MagicMock()
-        mock_proc.returncode = 1
-        mock_proc.stderr = "error"
-        mock_proc.stdout = ""
-        return mock_proc
 
-    monkeypatch.setattr("clonebox.dashboard._run_clonebox", mock_run_fail)
+    snapshot = _dashboard_sampler(monkeypatch, dashboard)
+    snapshot.sources = {"vms": MagicMock(last_success=None, error="error")}
 
     import asyncio
 
-    res = asyncio.run(api_vms())
-    assert "clonebox list failed" in res
+    request = Request({"type": "http", "headers": []})
+    res = asyncio.run(api_vms(request))
+    assert "VM list unavailable" in res.body.decode()
+    assert asyncio.run(api_vms_json(request)).status_code == 503
 
 
 def test_dashboard_run(monkeypatch):
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Tests for the dashboard's in-memory data layer."""
+
+import asyncio
+import json
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+dashboard = pytest.importorskip("clonebox.dashboard")
+from starlette.requests import Request  # noqa: E402
+
+from clonebox.domain_stats import DomainSample  # noqa: E402
+from clonebox.metrics_store import MetricsStore  # noqa: E402
+from clonebox.sampler import Sampler  # noqa: E402
+
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture
+def sampler(monkeypatch, tmp_path):
+    sampler = Sampler("qemu:///session", health_dir=tmp_path, store=MetricsStore(tmp_path / "metrics"))
+    sampler.monitor.collector.collect = MagicMock(return_value={
+        "dev": DomainSample(name="dev", uuid="u1", state="running", timestamp=0.0,
+                            vcpus=2, memory_max_kb=4 * 1024 * 1024),
+    })
+    monkeypatch.setattr(dashboard, "_sampler", sampler)
+    monkeypatch.setattr(dashboard, "_views", {})
+    return sampler
+
+
+def test_views_come_from_memory_with_etags(sampler, monkeypatch):
+    pending = asyncio.run(dashboard.api_vms_json(_request()))
+    assert pending.status_code == 503  # nothing sampled yet
+
+    sampler.run_source("vms", sampler.sample_vms)
+    first = asyncio.run(dashboard.api_vms_json(_request()))
+    assert first.status_code == 200
+    assert json.loads(first.body) == [
+        {"name": "dev", "state": "running", "uuid": "u1", "memory": 4096, "vcpus": 2, "session": "user"}
+    ]
+    etag = first.headers["etag"]
+
+    # Rendered once per sampler publication, not per request
+    snapshot = MagicMock(wraps=sampler.snapshot)
+    monkeypatch.setattr(sampler, "snapshot", snapshot)
+    cached = asyncio.run(dashboard.api_vms_json(_request(etag)))
+    assert cached.status_code == 304 and cached.headers["etag"] == etag
+    snapshot.assert_not_called()
+
+    # New counters, same rows: re-rendered, same ETag
+    sampler.run_source("vms", sampler.sample_vms)
+    assert asyncio.run(dashboard.api_vms_json(_request(etag))).status_code == 304
+    assert snapshot.call_count == 1
+
+    sampler.monitor.collector.collect.return_value["dev"].state = "paused"
+    sampler.run_source("vms", sampler.sample_vms)
+    changed = asyncio.run(dashboard.api_vms_json(_request(etag)))
+    assert changed.status_code == 200 and json.loads(changed.body)[0]["state"] == "paused"
+    assert "paused" in asyncio.run(dashboard.api_vms(_request())).body.decode()
+
+
+class _Client:
+    """Request stand-in that stays connected until told otherwise."""
+
+    connected = True
+
+    async def is_disconnected(self):
+        return not self.connected
+
+
+def test_event_stream_pushes_changed_rows_only(sampler):
+    sampler._containers = MagicMock(engine="podman")
+    sampler._containers.list_containers.return_value = []
+    sampler.monitor.get_container_stats = MagicMock(return_value=[])
+    vms = sampler.monitor.collector.collect.return_value
+    vms["db"] = DomainSample(name="db", uuid="u2", state="shutoff", timestamp=0.0)
+    sampler.refresh()
+
+    async def scenario():
+        client = _Client()
+        stream = dashboard._event_stream(client, sampler)
+        first = [await stream.__anext__(), await stream.__anext__()]
+        assert first[0].startswith("id: ") and "event: vms\n" in first[0]
+        reset = json.loads(first[0].split("data: ", 1)[1])
+        assert reset["reset"] and [r["id"] for r in reset["upsert"]] == ["db", "dev"]
+        assert reset["error"] is None and reset["spark"] == {"dev": [0.0]}
+        assert json.loads(first[1].split("data: ", 1)[1])["upsert"] == []
+
+        # A lifecycle event wakes the VM source; only the changed row is sent
+        waiting = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        vms["db"].state = "running"
+        sampler._wakeups["vms"] = threading.Event()
+        sampler.collector._listeners[0]("db", 2)  # VIR_DOMAIN_EVENT_STARTED
+        assert sampler._wakeups["vms"].is_set()
+        sampler.run_source("vms", sampler.sample_vms)
+        diff = json.loads((await asyncio.wait_for(waiting, 1)).split("data: ", 1)[1])
+        assert [r["id"] for r in diff["upsert"]] == ["db"]
+        assert diff["upsert"][0]["state"] == "running" and diff["remove"] == []
+        # db's history so far (it was not running before), one new point for dev
+        assert diff["spark"] == {"db": [0.0, 0.0], "dev": [0.0]}
+
+        # Unchanged rows: only the appended sparkline points are sent
+        sampler.run_source("vms", sampler.sample_vms)
+        diff = json.loads((await asyncio.wait_for(stream.__anext__(), 1)).split("data: ", 1)[1])
+        assert diff == {"upsert": [], "remove": [], "spark": {"db": [0.0], "dev": [0.0]}}
+
+        del vms["dev"]
+        sampler.run_source("vms", sampler.sample_vms)
+        diff = json.loads((await asyncio.wait_for(stream.__anext__(), 1)).split("data: ", 1)[1])
+        assert diff["remove"] == ["dev"] and diff["upsert"] == []
+        assert diff["spark"] == {"db": [0.0]}
+
+        client.connected = False
+        await stream.aclose()
+        assert sampler._listeners == []
+
+    asyncio.run(scenario())
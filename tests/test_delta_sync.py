@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Tests for incremental copy_paths sync."""
+
+import io
+import os
+import shutil
+import sys
+import tarfile
+
+import pytest
+
+from clonebox import compression
+from clonebox.compression import choose_codec
+from clonebox.delta_sync import (
+    SyncManifest,
+    parse_guest_probe,
+    remote_apply_command,
+    scan_path,
+    sync_paths,
+    write_delta_tar,
+)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "profile"
+    (root / "sub" / "deep").mkdir(parents=True)
+    (root / "a.txt").write_text("a")
+    (root / "sub" / "b.txt").write_text("b")
+    (root / "sub" / "deep" / "c.txt").write_text("c")
+    (root / "SingletonLock").write_text("")
+    return root
+
+
+def _states(delta):
+    return {rel: list(entry) for rel, entry in delta.state.items()}
+
+
+def _ship(delta):
+    """Stream *delta* and return its manifest state (digests filled in)."""
+    write_delta_tar([delta], io.BytesIO(), "ubuntu", None)
+    return _states(delta)
+
+
+class TestScan:
+    def test_first_scan_ships_everything_but_excluded_names(self, tree):
+        delta = scan_path(tree, "/home/ubuntu/p", {}, {})
+        assert delta.changed == ["", "a.txt", "sub", "sub/b.txt", "sub/deep", "sub/deep/c.txt"]
+        assert delta.deleted == []
+
+    def test_rescan_ships_only_content_changes_and_deletions(self, tree):
+        known = _ship(scan_path(tree, "/g", {}, {}))
+
+        assert scan_path(tree, "/g", known, known).changed == []
+
+        os.utime(tree / "a.txt", (1, 1))  # touched, same content
+        (tree / "sub" / "b.txt").write_text("changed")
+        (tree / "sub" / "deep" / "c.txt").unlink()
+        (tree / "sub" / "deep").rmdir()
+        delta = scan_path(tree, "/g", known, known)
+        assert delta.changed == ["sub/b.txt"]
+        assert delta.deleted == ["sub/deep"]
+
+    def test_symlinked_root_ships_target_contents(self, tree, tmp_path):
+        link = tmp_path / "link"
+        link.symlink_to(tree)
+        (tree / "inner").symlink_to("a.txt")
+        delta = scan_path(link, "/g", {}, {})
+        assert "sub/deep/c.txt" in delta.changed
+        assert delta.state["inner"][2] == "link:a.txt"
+        out = io.BytesIO()
+        write_delta_tar([delta], out, "ubuntu", None)
+        out.seek(0)
+        with tarfile.open(fileobj=out) as tar:
+            assert tar.getmember("g").isdir()
+
+
+def test_tar_members_use_guest_paths_and_owner(tree):
+    delta = scan_path(tree, "/home/ubuntu/.config/p", {}, {})
+    out = io.BytesIO()
+    files, size = write_delta_tar([delta], out, "ubuntu", "/var/tmp/x.del")
+    out.seek(0)
+    with tarfile.open(fileobj=out) as tar:
+        members = {m.name: m for m in tar.getmembers()}
+    assert files == 3 and size == 3
+    assert "home/ubuntu/.config/p/sub/deep/c.txt" in members
+    assert members["home/ubuntu/.config/p/a.txt"].uname == "ubuntu"
+    assert members["var/tmp/x.del"].uname != "ubuntu"
+
+    cmd = remote_apply_command([delta], "ubuntu", "/var/tmp/x.del", "tok")
+    assert cmd.startswith("sudo tar -C / -xpf -")
+    assert "(sudo chown ubuntu:ubuntu /home/ubuntu/.config || true)" in cmd
+    assert cmd.endswith("echo tok | sudo tee /var/lib/clonebox/sync-id >/dev/null")
+
+
+def test_sync_paths_applies_and_then_is_a_noop(tree, tmp_path):
+    guest = tmp_path / "guest"
+    # Stand-in for ssh: extract the stream below `guest`, ignore the command
+    fake_ssh = [
+        sys.executable, "-c",
+        "import sys, tarfile; tarfile.open(fileobj=sys.stdin.buffer, mode='r|')"
+        f".extractall({str(guest)!r})",
+    ]
+    manifest = SyncManifest(tmp_path / "sync-manifest.json")
+
+    result = sync_paths({str(tree): "/srv/p"}, fake_ssh, manifest, "ubuntu", None)
+    assert result.ok and result.full and result.files == 3
+    assert (guest / "srv/p/sub/deep/c.txt").read_text() == "c"
+    assert not (guest / "srv/p/SingletonLock").exists()
+
+    manifest = SyncManifest(tmp_path / "sync-manifest.json")
+    result = sync_paths({str(tree): "/srv/p"}, fake_ssh, manifest, "ubuntu", manifest.token)
+    assert result.ok and not result.full and result.files == 0
+
+    # A guest whose token differs (e.g. restored from a snapshot) gets everything again
+    result = sync_paths({str(tree): "/srv/p"}, fake_ssh, manifest, "ubuntu", "stale")
+    assert result.full and result.files == 3
+
+
+def test_truncated_stream_keeps_manifest(tree, tmp_path):
+    (tree / "big.bin").write_bytes(os.urandom(4 * 1024 * 1024))
+    manifest = SyncManifest(tmp_path / "sync-manifest.json")
+    # The "guest" exits without reading: the stream breaks part way
+    result = sync_paths({str(tree): "/srv/p"}, [sys.executable, "-c", "pass"], manifest, "ubuntu", None)
+    assert not result.ok
+    assert not (tmp_path / "sync-manifest.json").exists()
+
+
+class TestCompressionNegotiation:
+    def test_guest_probe_parsing(self):
+        assert parse_guest_probe("token=abc\ncodec=zstd\ncodec=bogus\n") == ("abc", ["none", "zstd"])
+        assert parse_guest_probe(None) == (None, ["none"])
+        assert parse_guest_probe("token=\n") == (None, ["none"])
+
+    def test_picks_best_effective_throughput(self, monkeypatch):
+        monkeypatch.delenv("CLONEBOX_TRANSFER_COMPRESSION", raising=False)
+        monkeypatch.setattr(compression, "host_codecs", lambda: ["none", "lz4", "zstd"])
+        rates = {"lz4": (800e6, 2.0), "zstd": (300e6, 3.0)}
+        monkeypatch.setattr(compression, "measure_codec", lambda name, sample: rates[name])
+
+        # Fast link: compression would only slow the stream down
+        assert choose_codec(["none", "lz4", "zstd"], b"x", 2e9) == "none"
+        # Slow link: zstd's ratio wins
+        assert choose_codec(["none", "lz4", "zstd"], b"x", 50e6) == "zstd"
+        # Guest without zstd
+        assert choose_codec(["none", "lz4"], b"x", 50e6) == "lz4"
+        assert choose_codec(["none", "lz4"], b"x", None) == "none"
+
+        monkeypatch.setenv("CLONEBOX_TRANSFER_COMPRESSION", "lz4")
+        assert choose_codec(["none"], b"x", None) == "lz4"
+
+    def test_remote_command_decompresses_before_tar(self, tree):
+        delta = scan_path(tree, "/srv/p", {}, {})
+        cmd = remote_apply_command([delta], "ubuntu", None, None, "zstd")
+        assert cmd == "set -o pipefail; zstd -d -q -c | sudo tar -C / -xpf -"
+
+    @pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd not installed")
+    def test_compressed_stream_roundtrip(self, tree, tmp_path, monkeypatch):
+        monkeypatch.setenv("CLONEBOX_TRANSFER_COMPRESSION", "zstd")
+        guest = tmp_path / "guest"
+        fake_ssh = [
+            "sh", "-c",
+            'zstd -d -q -c | tar -C "$1" -xf -', "sh", str(guest),
+        ]
+        guest.mkdir()
+        result = sync_paths({str(tree): "/srv/p"}, fake_ssh, None, "ubuntu", None, ["none", "zstd"])
+        assert result.ok and result.codec == "zstd"
+        assert (guest / "srv/p/sub/b.txt").read_text() == "b"
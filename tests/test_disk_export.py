@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Tests for qcow2-aware disk export and import."""
+
+import json
+import os
+import shutil
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import disk_export
+from clonebox.chunk_store import ChunkStore
+from clonebox.disk_export import find_base, sparse_copy
+from clonebox.exporter import VMExporter
+from clonebox.importer import VMImporter
+
+
+@pytest.fixture(autouse=True)
+def images(tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    images.mkdir()
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(images))
+    return images
+
+
+class FakeQemuImg:
+    """Records qemu-img calls; convert copies the source, info reports backing files."""
+
+    def __init__(self, backing=None):
+        self.backing = backing or {}
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        self.calls.append(cmd)
+        result = MagicMock(returncode=0, stdout="")
+        if cmd[1] == "info":
+            info = {"format": "qcow2"}
+            if cmd[-1] in self.backing:
+                info["full-backing-filename"] = self.backing[cmd[-1]]
+            result.stdout = json.dumps(info)
+        elif cmd[1] == "convert":
+            shutil.copyfile(cmd[-2], cmd[-1])
+        return result
+
+
+def test_sparse_copy_leaves_holes(tmp_path):
+    src = tmp_path / "disk.raw"
+    with open(src, "wb") as f:
+        f.write(b"x" * 4096)
+        f.write(bytes(8 * 1024 * 1024))
+        f.write(b"y")
+    dest = sparse_copy(src, tmp_path / "copy.raw")
+    assert dest.read_bytes() == src.read_bytes()
+    assert os.stat(dest).st_blocks * 512 < 1024 * 1024
+
+
+def test_find_base_matches_by_digest_and_caches(images, monkeypatch):
+    base = images / "golden" / "abc.qcow2"
+    base.parent.mkdir()
+    base.write_bytes(b"base image")
+    (images / "decoy.qcow2").write_bytes(b"other data")  # same size, other content
+    ref = {"name": "ubuntu.qcow2", "size": base.stat().st_size,
+           "sha256": disk_export.file_digest(base)}
+
+    assert find_base(ref, [images, images / "golden"]) == base
+    # Subdirectories (chunk objects, pool saves, snapshot overlays) are never searched
+    assert find_base(ref, [images]) is None
+    monkeypatch.setattr(disk_export.hashlib, "sha256", None)  # cached now
+    assert disk_export.file_digest(base) == ref["sha256"]
+
+
+def test_overlay_export_ships_base_reference_and_import_rebases(images, tmp_path, monkeypatch):
+    base = images / "golden.qcow2"
+    base.write_bytes(b"B" * 1000)
+    disk = tmp_path / "vm" / "root.qcow2"
+    disk.parent.mkdir()
+    disk.write_bytes(b"overlay data")
+    fake = FakeQemuImg({str(disk): str(base)})
+    monkeypatch.setattr(disk_export.subprocess, "run", fake)
+
+    exporter = VMExporter("qemu:///session")
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+    archive = exporter.export_vm("vm", tmp_path / "vm.tar", disk_mode="overlay")
+
+    convert = next(c for c in fake.calls if c[1] == "convert")
+    assert "-c" in convert and "-W" in convert and "-m" in convert
+    assert convert[convert.index("-B") + 1] == str(base)
+    with tarfile.open(archive) as tar:
+        names = tar.getnames()
+        ref = json.load(tar.extractfile("disks/root.qcow2.base.json"))
+    assert "disks/root.qcow2" in names and ref["name"] == "golden.qcow2"
+    assert not list(disk.parent.glob(".root.qcow2.export-*"))
+
+    importer = VMImporter("qemu:///session")
+    importer._conn = MagicMock()
+    dest_dir = tmp_path / "imported"
+    dest_dir.mkdir()
+    importer.import_vm(archive, disk_dir=dest_dir)
+    rebase = next(c for c in fake.calls if c[1] == "rebase")
+    # The overlay is rebased before it is moved into place
+    assert rebase[-1] == str(dest_dir / ".root.qcow2.importing")
+    assert rebase[rebase.index("-b") + 1] == str(base)
+    assert [p.name for p in dest_dir.iterdir()] == ["root.qcow2"]
+
+    base.unlink()
+    (dest_dir / "root.qcow2").unlink()
+    with pytest.raises(FileNotFoundError, match="golden.qcow2"):
+        importer.import_vm(archive, disk_dir=dest_dir)
+    assert not list(dest_dir.iterdir())
+
+
+def test_import_onto_a_golden_image_registers_the_vm_as_its_user(images, tmp_path, monkeypatch):
+    from clonebox.image_cache import GoldenImageCache
+
+    cache = GoldenImageCache(images / "golden", max_bytes=0)
+    base = cache.path_for("k" * 64)
+    base.parent.mkdir()
+    base.write_bytes(b"G" * 1000)
+    with cache._index() as entries:
+        entries["k" * 64] = {"size": 1000, "last_used": 0, "users": {}}
+    disk = tmp_path / "vm" / "root.qcow2"
+    disk.parent.mkdir()
+    disk.write_bytes(b"overlay data")
+    monkeypatch.setattr(disk_export.subprocess, "run", FakeQemuImg({str(disk): str(base)}))
+    exporter = VMExporter("qemu:///session")
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+    archive = exporter.export_vm("vm", tmp_path / "vm.tar", disk_mode="overlay")
+
+    importer = VMImporter("qemu:///session")
+    importer._conn = MagicMock()
+    importer.import_vm(archive, new_name="copy", disk_dir=images)
+    assert cache.entries()["k" * 64]["users"] == {"copy": str(images / "root.qcow2")}
+    assert cache.evict() == [] and base.exists()
+
+
+def _backed_vm(images, tmp_path, monkeypatch):
+    base = images / "golden.qcow2"
+    base.write_bytes(b"B" * 1000)
+    disk = tmp_path / "vm" / "root.qcow2"
+    disk.parent.mkdir()
+    disk.write_bytes(b"overlay data")
+    fake = FakeQemuImg({str(disk): str(base)})
+    monkeypatch.setattr(disk_export.subprocess, "run", fake)
+    exporter = VMExporter("qemu:///session")
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+    return exporter, fake
+
+
+def test_backed_disks_are_never_exported_without_their_base(images, tmp_path, monkeypatch):
+    exporter, fake = _backed_vm(images, tmp_path, monkeypatch)
+
+    archive = exporter.export_vm("vm", tmp_path / "vm.tar")
+    with tarfile.open(archive) as tar:
+        assert "disks/root.qcow2.base.json" in tar.getnames()
+
+    with pytest.raises(ValueError, match="overlay on .*golden.qcow2"):
+        exporter.export_vm("vm", tmp_path / "file.tar", disk_mode="file")
+
+    store = ChunkStore(tmp_path / "store")
+    archive = exporter.export_vm("vm", tmp_path / "chunked.tar", chunk_store=store)
+    convert = [c for c in fake.calls if c[1] == "convert"][-1]
+    assert "-B" not in convert and "-c" not in convert
+    with tarfile.open(archive) as tar:
+        index = json.load(tar.extractfile("disks/root.qcow2.chunks.json"))
+    assert index["name"] == "root.qcow2"
+    assert not list(tmp_path.glob("vm/.root.qcow2.export-*"))
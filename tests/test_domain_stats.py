@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Tests for the bulk libvirt domain stats collector."""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import domain_stats
+from clonebox.domain_stats import DomainStatsCollector
+from clonebox.monitor import ResourceMonitor
+
+FAKE_LIBVIRT = SimpleNamespace(
+    VIR_DOMAIN_STATS_STATE=1,
+    VIR_DOMAIN_STATS_CPU_TOTAL=2,
+    VIR_DOMAIN_STATS_BALLOON=4,
+    VIR_DOMAIN_STATS_VCPU=8,
+    VIR_DOMAIN_STATS_INTERFACE=16,
+    VIR_DOMAIN_STATS_BLOCK=32,
+    VIR_DOMAIN_EVENT_ID_LIFECYCLE=0,
+    VIR_DOMAIN_EVENT_DEFINED=0,
+    VIR_DOMAIN_EVENT_UNDEFINED=1,
+    libvirtError=Exception,
+)
+
+DOMAIN_XML = """<domain><devices>
+  <disk type='file' device='disk'><source file='/images/{0}.qcow2'/><target dev='vda'/></disk>
+  <disk type='file' device='cdrom'><source file='/images/{0}-init.iso'/><target dev='sda'/></disk>
+  <interface type='user'><mac address='52:54:00:00:00:01'/><target dev='tap0'/></interface>
+</devices></domain>"""
+
+
+def _domain(name):
+    dom = MagicMock()
+    dom.name.return_value = name
+    dom.UUIDString.return_value = f"uuid-{name}"
+    dom.XMLDesc.return_value = DOMAIN_XML.format(name)
+    return dom
+
+
+def _record(cpu_time):
+    return {
+        "state.state": 1,
+        "cpu.time": cpu_time,
+        "vcpu.current": 2,
+        "balloon.maximum": 4 * 1024 * 1024,
+        "balloon.current": 4 * 1024 * 1024,
+        "balloon.unused": 3 * 1024 * 1024,
+        "block.count": 2,
+        "block.0.name": "vda", "block.0.rd.bytes": 100, "block.0.wr.bytes": 200,
+        "block.0.allocation": 2 * 1024**3, "block.0.capacity": 20 * 1024**3,
+        "block.1.name": "sda", "block.1.rd.bytes": 5, "block.1.capacity": 1024**2,
+        "net.count": 1,
+        "net.0.name": "tap0", "net.0.rx.bytes": 1000, "net.0.tx.bytes": 2000,
+    }
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(domain_stats, "libvirt", FAKE_LIBVIRT)
+    monkeypatch.setattr(domain_stats, "_ensure_event_loop", lambda: False)
+    doms = [_domain(f"vm{i}") for i in range(50)]
+    cpu = {"t": 0}
+    conn = MagicMock()
+
+    def all_stats(stats, flags):
+        cpu["t"] += 10**9
+        return [(dom, _record(cpu["t"])) for dom in doms]
+
+    conn.getAllDomainStats.side_effect = all_stats
+    conn.domains = doms
+    return conn
+
+
+def test_one_call_per_tick_for_all_domains(conn, monkeypatch):
+    clock = iter([100.0, 101.0, 102.0])
+    monkeypatch.setattr(domain_stats.time, "monotonic", lambda: next(clock))
+    collector = DomainStatsCollector(conn=conn)
+
+    first = collector.collect()
+    second = collector.collect()
+    assert conn.getAllDomainStats.call_count == 2
+    conn.lookupByName.assert_not_called()
+    assert all(dom.XMLDesc.call_count == 1 for dom in conn.domains)  # cached device lists
+
+    sample = second["vm7"]
+    assert len(second) == 50 and first["vm7"].cpu_percent == 0.0
+    assert sample.cpu_percent == pytest.approx(100.0)
+    assert sample.memory_used_kb == 1024 * 1024
+    # The cloud-init ISO is not a disk
+    assert sample.block_total("capacity") == 20 * 1024**3
+    assert sample.block_total("rd_bytes") == 100
+    assert sample.net_total("tx_bytes") == 2000
+
+
+def test_define_event_refreshes_device_list(conn, monkeypatch):
+    collector = DomainStatsCollector(conn=conn)
+    collector.collect()
+    dom = conn.domains[3]
+    dom.XMLDesc.return_value = DOMAIN_XML.format("vm3").replace("device='cdrom'", "device='disk'")
+    collector.collect()
+    assert collector.collect()["vm3"].block_total("capacity") == 20 * 1024**3
+
+    # What the lifecycle callback does for VIR_DOMAIN_EVENT_DEFINED
+    collector.invalidate(dom.UUIDString())
+    assert collector.collect()["vm3"].block_total("capacity") == 20 * 1024**3 + 1024**2
+    assert dom.XMLDesc.call_count == 2
+
+
+def test_resource_monitor_uses_bulk_stats(conn):
+    monitor = ResourceMonitor("qemu:///session")
+    monitor.collector._conn = conn
+    stats = {s.name: s for s in monitor.get_all_vm_stats()}
+    assert len(stats) == 50 and conn.getAllDomainStats.call_count == 1
+    vm = stats["vm0"]
+    assert vm.state == "running" and vm.memory_total_mb == 4096 and vm.memory_used_mb == 1024
+    assert vm.disk_used_gb == pytest.approx(2.0) and vm.network_rx_bytes == 1000
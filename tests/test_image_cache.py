@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Tests for the golden base-image cache."""
+
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import yaml
+
+from clonebox.cloud_init import MODE_GOLDEN, MODE_GOLDEN_BUILD, generate_cloud_init_config
+from clonebox.image_cache import GoldenImageCache, golden_inputs, golden_key
+from clonebox.models import VMConfig
+
+
+@pytest.fixture
+def base_image(tmp_path):
+    path = tmp_path / "base.qcow2"
+    path.write_bytes(b"base")
+    return str(path)
+
+
+def _seed(cache, key, size, last_used, users=None):
+    cache.root.mkdir(parents=True, exist_ok=True)
+    cache.path_for(key).write_bytes(b"x" * size)
+    with cache._index() as images:
+        images[key] = {"size": size, "last_used": last_used, "users": users or {}}
+
+
+class TestGoldenKey:
+    def test_key_is_stable_and_order_insensitive_for_packages(self, base_image):
+        a = golden_inputs(base_image, ["vim", "git"], ["code"], True, "ubuntu", 1)
+        b = golden_inputs(base_image, ["git", "vim", "git"], ["code"], True, "ubuntu", 1)
+        assert golden_key(a) == golden_key(b)
+
+    def test_key_changes_with_inputs(self, base_image):
+        key = golden_key(golden_inputs(base_image, ["git"], [], True, "ubuntu", 1))
+        assert key != golden_key(golden_inputs(base_image, ["git"], [], False, "ubuntu", 1))
+        assert key != golden_key(golden_inputs(base_image, ["git"], [], True, "ubuntu", 2))
+        assert key != golden_key(golden_inputs(base_image, ["git"], ["code"], True, "ubuntu", 1))
+        os.utime(base_image, (time.time() + 100, time.time() + 100))
+        assert key != golden_key(golden_inputs(base_image, ["git"], [], True, "ubuntu", 1))
+
+
+class TestGoldenImageCache:
+    def test_lookup_hit_and_stale_entry(self, tmp_path):
+        cache = GoldenImageCache(tmp_path / "golden")
+        assert cache.lookup("k") is None
+        _seed(cache, "k", 10, 1.0)
+        assert cache.lookup("k") == cache.path_for("k")
+        assert cache.entries()["k"]["last_used"] > 1.0
+        cache.path_for("k").unlink()
+        assert cache.lookup("k") is None
+        assert "k" not in cache.entries()
+
+    def test_evicts_lru_first_and_skips_images_in_use(self, tmp_path):
+        cache = GoldenImageCache(tmp_path / "golden", max_bytes=25)
+        disk = tmp_path / "vm.qcow2"
+        disk.write_bytes(b"")
+        _seed(cache, "oldest", 10, 1.0, users={"vm": str(disk)})
+        _seed(cache, "older", 10, 2.0)
+        _seed(cache, "newest", 10, 3.0)
+
+        assert cache.evict() == ["older"]
+        assert cache.path_for("oldest").exists()
+        assert not cache.path_for("older").exists()
+        assert cache.total_size() == 20
+
+    def test_release_and_vanished_disks_free_images(self, tmp_path):
+        cache = GoldenImageCache(tmp_path / "golden", max_bytes=0)
+        disk_a, disk_b = tmp_path / "a.qcow2", tmp_path / "b.qcow2"
+        disk_a.write_bytes(b"")
+        disk_b.write_bytes(b"")
+        _seed(cache, "k", 10, 1.0, users={"a": str(disk_a), "b": str(disk_b)})
+
+        cache.release("a")
+        assert cache.evict() == []
+        disk_b.unlink()  # VM removed outside clonebox
+        assert cache.evict() == ["k"]
+
+    def test_seal_converts_registers_and_removes_build_disk(self, tmp_path):
+        cache = GoldenImageCache(tmp_path / "golden")
+        build = cache.build_path("k")
+        cache.root.mkdir(parents=True)
+        build.write_bytes(b"build")
+
+        def fake_convert(cmd, **kwargs):
+            assert cmd[:4] == ["qemu-img", "convert", "-O", "qcow2"]
+            open(cmd[-1], "wb").write(b"sealed")
+
+        with patch("clonebox.image_cache.subprocess.run", side_effect=fake_convert):
+            path = cache.seal("k", build, {"gui": True})
+
+        assert path.read_bytes() == b"sealed"
+        assert path.stat().st_mode & 0o777 == 0o444
+        assert not build.exists()
+        assert cache.entries()["k"]["inputs"] == {"gui": True}
+
+
+class TestGoldenCloudInit:
+    def _config(self, **kwargs):
+        return VMConfig(name="vm", gui=True, packages=["git"], snap_packages=["code"],
+                        services=["docker"], **kwargs)
+
+    def _runcmd(self, mode):
+        user_data, _, _ = generate_cloud_init_config(self._config(), mode=mode)
+        cloud_config = yaml.safe_load(user_data)
+        return cloud_config, "\n".join(cloud_config["runcmd"])
+
+    def test_golden_mode_skips_shared_provisioning(self):
+        cloud_config, runcmd = self._runcmd(MODE_GOLDEN)
+        assert "ubuntu-desktop-minimal" not in runcmd
+        assert "snap install code" not in runcmd
+        assert "Installing 1 packages" not in runcmd
+        assert "systemctl enable docker" in runcmd
+        assert "reboot" not in runcmd
+        assert "power_state" not in cloud_config
+
+    def test_build_mode_provisions_seals_and_powers_off(self):
+        cloud_config, runcmd = self._runcmd(MODE_GOLDEN_BUILD)
+        assert "ubuntu-desktop-minimal" in runcmd
+        assert "snap install code" in runcmd
+        assert "truncate -s 0 /etc/machine-id" in runcmd
+        assert "systemctl enable docker" not in runcmd
+        assert cloud_config["power_state"]["mode"] == "poweroff"
+        assert "dpkg -s git ubuntu-desktop-minimal gdm3" in runcmd
+        assert "snap list code" in runcmd
+
+
+class TestGoldenBuild:
+    @pytest.fixture
+    def build(self, tmp_path, monkeypatch, base_image):
+        from clonebox import cloner as cloner_mod
+        from clonebox import readiness as readiness_mod
+        from clonebox.readiness import ReadinessWatcher
+
+        monkeypatch.setattr(readiness_mod, "libvirt", None)
+        monkeypatch.setattr(cloner_mod.subprocess, "run", lambda cmd, **kw: open(cmd[-2], "wb").close())
+        monkeypatch.setattr(cloner_mod, "generate_vm_xml", lambda **kw: "<domain/>")
+        cloner = cloner_mod.SelectiveVMCloner.__new__(cloner_mod.SelectiveVMCloner)
+        cloner.user_session = True
+        cloner.conn = MagicMock()
+        cloner.conn.createXML.return_value.isActive.return_value = False
+        cloner.get_images_dir = lambda: tmp_path / "images"
+        (tmp_path / "images" / "golden").mkdir(parents=True)
+        cloner._generate_cloud_init = MagicMock(return_value=None)
+        watcher = ReadinessWatcher("builder", "qemu:///session")
+        cloner._readiness_watcher = lambda name: watcher
+        config = VMConfig(name="vm", packages=["git"])
+
+        def run(*lines):
+            for line in lines:
+                watcher.feed_line(line)
+            with patch.object(GoldenImageCache, "seal") as seal:
+                cloner._build_golden_image(config, "k" * 64, base_image, {})
+            return seal, cloner._golden_cache().build_path("k" * 64)
+
+        return run
+
+    def test_seals_only_after_clean_marker(self, build):
+        seal, _ = build("[clonebox] Golden image sealed")
+        seal.assert_called_once()
+
+    @pytest.mark.parametrize("lines", [
+        (),  # crashed or destroyed: powered off without the marker
+        ("[clonebox] ERROR: golden image packages missing", "[clonebox] Golden image sealed"),
+    ])
+    def test_unsealed_or_failed_build_is_discarded(self, build, lines, monkeypatch, tmp_path):
+        from clonebox.readiness import ReadinessWatcher
+
+        monkeypatch.setattr(ReadinessWatcher, "wait_for",
+                            lambda self, *stages, timeout, since=0: self.reached(*stages, since=since))
+        with pytest.raises(RuntimeError):
+            build(*lines)
+        assert not list((tmp_path / "images" / "golden").iterdir())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Tests for the single-pass streaming importer."""
+
+import io
+import os
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import importer as importer_module
+from clonebox.exporter import VMExporter
+from clonebox.importer import UnsafeArchiveError, VMImporter
+
+
+def _tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for info, data in members:
+            tar.addfile(info, io.BytesIO(data) if data is not None else None)
+    buf.seek(0)
+    return buf
+
+
+def _file(name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    return info, data
+
+
+def _importer():
+    importer = VMImporter()
+    importer._conn = MagicMock()
+    return importer
+
+
+def test_disks_are_written_in_place_without_a_temp_dir(tmp_path, monkeypatch):
+    disk = tmp_path / "vm" / "root.qcow2"
+    disk.parent.mkdir()
+    disk.write_bytes(os.urandom(256 * 1024) + bytes(4 * 1024 * 1024) + b"tail")
+    exporter = VMExporter()
+    exporter._conn = MagicMock()
+    exporter._conn.lookupByName.return_value.XMLDesc.return_value = (
+        f"<domain><name>vm</name><devices><disk type='file'>"
+        f"<source file='{disk}'/></disk></devices></domain>"
+    )
+    archive = exporter.export_vm("vm", tmp_path / "vm.tar.gz", compression="gzip")
+
+    def no_temp_dir(*args, **kwargs):
+        raise AssertionError("import extracted to a temporary directory")
+
+    monkeypatch.setattr(importer_module.tempfile, "TemporaryDirectory", no_temp_dir)
+    images = tmp_path / "images"
+    images.mkdir()
+    importer = _importer()
+    assert importer.import_vm(archive, disk_dir=images, new_name="copy") == "copy"
+
+    restored = images / "root.qcow2"
+    assert restored.read_bytes() == disk.read_bytes()
+    assert restored.stat().st_blocks * 512 < restored.stat().st_size
+    assert [p.name for p in images.iterdir()] == ["root.qcow2"]
+    xml = importer._conn.defineXML.call_args[0][0]
+    assert f"file=\"{restored}\"" in xml and "<name>copy</name>" in xml
+
+
+@pytest.mark.parametrize("name", ["../escape", "/tmp/escape", "disks/../../escape"])
+def test_path_traversal_members_are_rejected(tmp_path, name):
+    images = tmp_path / "images"
+    images.mkdir()
+    archive = _tar([
+        _file("vm.xml", b"<domain><name>vm</name></domain>"),
+        _file("disks/root.qcow2", b"disk data"),
+        _file(name, b"payload"),
+    ])
+
+    importer = _importer()
+    with pytest.raises(UnsafeArchiveError):
+        importer.import_stream(archive, disk_dir=images)
+    assert not list(images.iterdir())
+    assert not (tmp_path / "escape").exists()
+    importer._conn.defineXML.assert_not_called()
+
+
+def test_user_data_is_restored_without_escaping_links(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    escape = tarfile.TarInfo("user-data/.ssh/evil")
+    escape.type, escape.linkname = tarfile.SYMTYPE, "/etc"
+    local = tarfile.TarInfo("user-data/.ssh/current")
+    local.type, local.linkname = tarfile.SYMTYPE, "config"
+    archive = _tar([
+        _file("vm.xml", b"<domain><name>vm</name></domain>"),
+        _file("user-data/.ssh/config", b"Host *\n"),
+        (escape, None),
+        (local, None),
+    ])
+
+    _importer().import_stream(archive, import_user_data=True, disk_dir=tmp_path)
+    assert (home / ".ssh" / "config").read_bytes() == b"Host *\n"
+    assert os.readlink(home / ".ssh" / "current") == "config"
+    assert not os.path.lexists(home / ".ssh" / "evil")
+
+
+def test_user_data_is_never_written_through_links(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    (home / "app" / "conf").mkdir(parents=True)
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    (home / "app" / "linked").symlink_to(outside)
+    (home / "app" / "settings").symlink_to(outside / "settings")
+
+    item_link = tarfile.TarInfo("user-data/www")
+    item_link.type, item_link.linkname = tarfile.SYMTYPE, "html"
+    archive = _tar([
+        _file("vm.xml", b"<domain><name>vm</name></domain>"),
+        (item_link, None),
+        _file("user-data/www/index.html", b"<html/>"),
+        _file("user-data/app/settings", b"mine"),
+        _file("user-data/app/conf", b"not a dir"),
+    ])
+    _importer().import_stream(archive, import_user_data=True, disk_dir=tmp_path)
+    assert not (home / "www").is_symlink()
+    assert (home / "www" / "index.html").read_bytes() == b"<html/>"
+    assert not (home / "app" / "settings").is_symlink()
+    assert (home / "app" / "settings").read_bytes() == b"mine"
+    assert not (outside / "settings").exists()
+    assert (home / "app" / "conf").is_dir()
+
+    archive = _tar([
+        _file("vm.xml", b"<domain><name>vm</name></domain>"),
+        _file("user-data/app/linked/evil", b"payload"),
+    ])
+    with pytest.raises(UnsafeArchiveError):
+        _importer().import_stream(archive, import_user_data=True, disk_dir=tmp_path)
+    assert not list(outside.iterdir())
+
+
+def test_user_data_waits_for_the_vm_to_be_defined(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    (home / ".ssh").mkdir(parents=True)
+    (home / ".ssh" / "config").write_bytes(b"mine")
+    monkeypatch.setenv("HOME", str(home))
+    images = tmp_path / "images"
+    images.mkdir()
+
+    def archive():
+        return _tar([
+            _file("vm.xml", b"<domain><name>vm</name></domain>"),
+            _file("user-data/.ssh/config", b"theirs"),
+            _file("disks/root.qcow2", b"disk data"),
+        ])
+
+    importer = _importer()
+    importer._conn.defineXML.side_effect = RuntimeError("domain 'vm' already exists")
+    with pytest.raises(RuntimeError):
+        importer.import_stream(archive(), import_user_data=True, disk_dir=images)
+    assert (home / ".ssh" / "config").read_bytes() == b"mine"
+
+    importer._conn.defineXML.side_effect = None
+    importer.import_stream(archive(), import_user_data=True, disk_dir=images)
+    assert (home / ".ssh" / "config").read_bytes() == b"theirs"
+    assert sorted(p.name for p in images.iterdir()) == ["root.qcow2"]
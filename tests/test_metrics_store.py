@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Tests for the embedded time-series metrics store."""
+
+import pytest
+
+from clonebox import metrics_store
+from clonebox.metrics_store import MetricsStore, read_segment
+
+T0 = 1_700_000_000.0 - 1_700_000_000.0 % 86400  # midnight UTC
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetricsStore(tmp_path / "metrics", flush_interval=60)
+
+
+def _feed(store, seconds, start=T0, name="dev"):
+    for i in range(seconds):
+        store.record("vm", name, {"cpu_percent": i % 60, "memory_used_mb": 1024}, ts=start + i)
+
+
+def test_downsampling_tiers(store, monkeypatch):
+    monkeypatch.setattr(metrics_store.time, "time", lambda: T0 + 3 * 3600)
+    _feed(store, 3 * 3600)
+
+    minutes = store.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 3600, tier="1m")
+    assert len(minutes) == 61 and minutes[0] == (T0, 29.5)
+    assert store.query("vm", "dev", "cpu_percent", start=T0, end=T0, tier="1m", agg="max") == [(T0, 59)]
+
+    hours = store.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 3 * 3600, tier="1h")
+    assert [ts for ts, _ in hours] == [T0, T0 + 3600, T0 + 7200]
+    assert all(value == 29.5 for _, value in hours)
+
+    # Raw samples older than the in-memory ring come back from segments
+    raw = store.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 59)
+    assert raw == [(T0 + i, float(i)) for i in range(60)]
+    assert store.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 599, step=300) == [
+        (T0, 29.5), (T0 + 300, 29.5)
+    ]
+
+
+def test_flush_compact_and_retention(store, monkeypatch):
+    clock = {"now": T0 + 7200}
+    monkeypatch.setattr(metrics_store.time, "time", lambda: clock["now"])
+    _feed(store, 7200)
+    store.flush(now=T0 + 7200)
+
+    segments = sorted((store.root / "1s").glob("*.seg"))
+    # The first hour is closed and merged into a single segment
+    first_hour = [p for p in segments if metrics_store._segment_range(p)[1] < T0 + 3600]
+    assert len(first_hour) == 1 and first_hour[0].name.endswith("-merged.seg")
+    rows = read_segment(first_hour[0], "vm/dev/cpu_percent")["vm/dev/cpu_percent"]
+    assert len(rows) == 3600 and rows[0][0] == T0
+
+    # A new process reads the history back from disk
+    reopened = MetricsStore(store.root)
+    assert len(reopened.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 7199)) == 7200
+    assert reopened.series("vm") == ["vm/dev/cpu_percent", "vm/dev/memory_used_mb"]
+
+    # Raw samples expire after a day; the minute tier still answers
+    clock["now"] = T0 + 3 * 86400
+    reopened.compact()
+    assert not list((store.root / "1s").glob("*.seg"))
+    assert reopened.pick_tier(T0).name == "1m"
+    assert len(reopened.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 3599)) == 60
+
+
+def test_unreadable_segment_is_skipped(store, monkeypatch):
+    monkeypatch.setattr(metrics_store.time, "time", lambda: T0 + 120)
+    _feed(store, 120)
+    store.flush(now=T0 + 120)
+    (store.root / "1s" / f"{T0:.0f}-{T0 + 10:.0f}-1-1.seg").write_bytes(b"garbage")
+    reopened = MetricsStore(store.root)
+    assert len(reopened.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 119)) == 120
+
+
+def test_close_writes_open_buckets(store, monkeypatch):
+    monkeypatch.setattr(metrics_store.time, "time", lambda: T0 + 45 * 60)
+    _feed(store, 45 * 60)
+    store.close()
+    reopened = MetricsStore(store.root)
+    assert len(reopened.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 2700, tier="1m")) == 45
+    assert reopened.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 2700, tier="1h") == [(T0, 29.5)]
+
+
+def test_partial_buckets_of_several_sessions_combine(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_store.time, "time", lambda: T0 + 7200)
+    root = tmp_path / "metrics"
+    for start, value in ((T0, 10), (T0 + 30, 30)):
+        session = MetricsStore(root)
+        for i in range(10):
+            session.record("vm", "dev", {"cpu_percent": value}, ts=start + i)
+        session.close()
+    # A third writer still has its bucket open
+    live = MetricsStore(root)
+    for i in range(20):
+        live.record("vm", "dev", {"cpu_percent": 60}, ts=T0 + 40 + i)
+
+    assert live.query("vm", "dev", "cpu_percent", start=T0, end=T0, tier="1m") == [(T0, 40.0)]
+    assert live.query("vm", "dev", "cpu_percent", start=T0, end=T0, tier="1h", agg="min") == [(T0, 10)]
+    live.close()
+    live.compact(now=T0 + 2 * 86400)
+    (merged,) = (root / "1m").glob("*.seg")
+    assert read_segment(merged)["vm/dev/cpu_percent"] == [(T0, 40.0, 10, 60, 40)]
+
+
+def test_compaction_tolerates_other_processes(store, monkeypatch):
+    monkeypatch.setattr(metrics_store.time, "time", lambda: T0 + 7200)
+    _feed(store, 3600)
+    store.flush(now=T0 + 3600)
+    tier_dir = store.root / "1s"
+    (merged,) = tier_dir.glob("*.seg")
+    stray = tier_dir / f"{T0:.0f}-{T0 + 59:.0f}-2-2.seg"
+    stray.write_bytes(merged.read_bytes())
+
+    # Another process is compacting this tier: it is left alone
+    other = MetricsStore(store.root)
+    with metrics_store._compacting(tier_dir) as locked:
+        assert locked
+        other.compact(now=T0 + 7200)
+    assert stray.exists()
+
+    # A segment merged away under us is skipped, not raised
+    read_segment = metrics_store.read_segment
+
+    def vanishing(path, wanted=None):
+        if path == stray:
+            raise FileNotFoundError(path)
+        return read_segment(path, wanted)
+
+    monkeypatch.setattr(metrics_store, "read_segment", vanishing)
+    other.compact(now=T0 + 7200)
+    assert stray.exists()  # unread, so not deleted
+    assert len(other.query("vm", "dev", "cpu_percent", start=T0, end=T0 + 3599)) == 3600
+
+
+def test_series_reads_headers_only_and_segments_need_a_layout(store, tmp_path, monkeypatch):
+    _feed(store, 120)
+    store.flush(now=T0 + 120)
+    monkeypatch.setattr(metrics_store.zlib, "decompress", pytest.fail)
+    assert MetricsStore(store.root).series("vm") == ["vm/dev/cpu_percent", "vm/dev/memory_used_mb"]
+    monkeypatch.undo()
+
+    header = b'{"series": ["vm/old/cpu_percent"], "counts": [0]}'
+    old = MetricsStore(tmp_path / "old")
+    (old.root / "1s").mkdir(parents=True)
+    segment = old.root / "1s" / f"{T0:.0f}-{T0:.0f}.seg"
+    segment.write_bytes(
+        metrics_store._MAGIC + metrics_store._LENGTH.pack(len(header)) + header
+        + metrics_store.zlib.compress(b"")
+    )
+    with pytest.raises(ValueError, match="layout"):
+        read_segment(segment)
+    assert old.series() == []
+
+
+def test_monitor_survives_store_errors():
+    from unittest.mock import MagicMock
+
+    from clonebox.domain_stats import DomainSample
+    from clonebox.monitor import ResourceMonitor
+
+    monitor = ResourceMonitor("qemu:///session", store=MagicMock())
+    monitor.store.record.side_effect = FileNotFoundError("segment merged away")
+    monitor.collector.sample = MagicMock(return_value=DomainSample(
+        name="dev", uuid="u1", state="running", timestamp=0.0))
+    assert monitor.get_vm_stats("dev").name == "dev"
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Tests for the background sampler and the OpenMetrics exposition."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox.domain_stats import DomainSample
+from clonebox.metrics_store import MetricsStore
+from clonebox.monitor import ContainerStats
+from clonebox.openmetrics import CONTENT_TYPE, MetricFamily, render, snapshot_families
+from clonebox.sampler import Sampler
+
+
+def test_render_follows_openmetrics_text_format():
+    family = MetricFamily("clonebox_vm_cpu_seconds", "counter", "CPU time", "seconds")
+    family.add(1.5, "_total", vm='we"ird\nvm')
+    state = MetricFamily("clonebox_vm_state", "stateset", "State")
+    state.add(True, vm="a", clonebox_vm_state="running")
+
+    assert render([family, state]).splitlines() == [
+        "# TYPE clonebox_vm_cpu_seconds counter",
+        "# UNIT clonebox_vm_cpu_seconds seconds",
+        "# HELP clonebox_vm_cpu_seconds CPU time",
+        'clonebox_vm_cpu_seconds_total{vm="we\\"ird\\nvm"} 1.5',
+        "# TYPE clonebox_vm_state stateset",
+        "# HELP clonebox_vm_state State",
+        'clonebox_vm_state{vm="a",clonebox_vm_state="running"} 1',
+        "# EOF",
+    ]
+
+
+@pytest.fixture
+def sampler(tmp_path):
+    compose = tmp_path / "proj" / "clonebox-compose.yaml"
+    compose.parent.mkdir()
+    compose.write_text("vms:\n  db: {template: base}\n  web: {template: base, depends_on: [db]}\n")
+    (tmp_path / "health").mkdir()
+    (tmp_path / "health" / "web.yaml").write_text(
+        "health_checks:\n  - {name: alive, type: command, command: 'true', retries: 1}\n"
+    )
+    sampler = Sampler("qemu:///session", health_dir=tmp_path / "health", compose_files=[compose],
+                      store=MetricsStore(tmp_path / "metrics"))
+    sampler.monitor.collector._conn = MagicMock()
+    sampler.monitor.collector.collect = MagicMock(return_value={
+        "web": DomainSample(name="web", uuid="u1", state="running", timestamp=0.0, vcpus=2,
+                            cpu_time_ns=3 * 10**9, memory_max_kb=2048, memory_current_kb=2048,
+                            memory_unused_kb=1024, blocks={"vda": {"rd_bytes": 10, "capacity": 100}}),
+    })
+    sampler.monitor.get_container_stats = MagicMock(return_value=[
+        ContainerStats("cache", "running", 12.5, 64, 512, 1, 2, 3),
+    ])
+    sampler._containers = MagicMock(engine="podman")
+    sampler._containers.list_containers.return_value = [
+        {"name": "cache", "image": "redis", "status": "running", "ports": []},
+    ]
+    return sampler
+
+
+def test_sampler_snapshot_to_metrics(sampler):
+    sampler.refresh()
+    snapshot = sampler.refresh()  # health checks only VMs seen running
+    assert set(snapshot.sources) == {"vms", "containers", "health", "compose"}
+    assert all(s.errors == 0 for s in snapshot.sources.values())
+
+    # Every tick is also kept in the metrics history
+    assert sampler.monitor.store.series() == [
+        f"vm/web/{metric}" for metric in sorted((
+            "cpu_percent", "memory_used_mb", "memory_total_mb", "disk_used_gb", "disk_total_gb",
+            "network_rx_bytes", "network_tx_bytes", "uptime_seconds",
+        ))
+    ]
+
+    text = render(snapshot_families(snapshot))
+    lines = set(text.splitlines())
+    assert 'clonebox_vm_state{vm="web",clonebox_vm_state="running"} 1' in lines
+    assert 'clonebox_vm_state{vm="web",clonebox_vm_state="shutoff"} 0' in lines
+    assert 'clonebox_vm_cpu_seconds_total{vm="web"} 3.0' in lines
+    assert 'clonebox_vm_memory_used_bytes{vm="web"} 1048576' in lines
+    assert 'clonebox_vm_disk_read_bytes_total{vm="web"} 10' in lines
+    assert 'clonebox_container_memory_used_bytes{container="cache"} 67108864' in lines
+    assert 'clonebox_health_status{vm="web",clonebox_health_status="healthy"} 1' in lines
+    assert any(line.startswith('clonebox_probe_duration_seconds{vm="web",probe="alive"}') for line in lines)
+    assert 'clonebox_compose_vm_state{project="proj",vm="db",clonebox_compose_vm_state="not_found"} 1' in lines
+    assert 'clonebox_compose_vm_info{project="proj",vm="web",start_group="1",depends_on="db"} 1' in lines
+    assert text.endswith("# EOF\n")
+
+
+def test_metrics_endpoint_serves_last_snapshot(sampler, monkeypatch):
+    dashboard = pytest.importorskip("clonebox.dashboard")
+    from starlette.requests import Request
+
+    monkeypatch.setattr(dashboard, "_sampler", sampler)
+    monkeypatch.setattr(dashboard, "_views", {})
+    sampler.run_source("vms", MagicMock(side_effect=RuntimeError("libvirt down")))
+
+    response = asyncio.run(dashboard.metrics(Request({"type": "http", "headers": []})))
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert 'clonebox_sampler_errors_total{source="vms"} 1' in response.body.decode()
+    sampler.monitor.collector.collect.assert_not_called()
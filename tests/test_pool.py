@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Tests for the pre-warmed VM pool."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import pool as pool_mod
+from clonebox.pool import VMPool, pool_key, retarget_domain_xml
+
+CONFIG = {"version": "1", "generated": "now", "vm": {"name": "dev", "ram_mb": 1024}, "packages": ["git"]}
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def cloner(images):
+    cloner = MagicMock()
+    domains = {}
+
+    def lookup(name):
+        if name not in domains:
+            raise Exception("no domain with matching name")
+        return domains[name]
+
+    def create_vm(config, **kwargs):
+        (images / f"{config.name}.qcow2").write_bytes(b"disk")
+        (images / config.name).mkdir()
+        (images / config.name / "ssh_port").write_text("22001")
+        domains[config.name] = MagicMock()
+
+    cloner.conn.lookupByName.side_effect = lookup
+    cloner.create_vm.side_effect = create_vm
+    cloner.domains = domains
+    return cloner
+
+
+def _make_config(config, name):
+    vm = MagicMock()
+    vm.name = name
+    return vm
+
+
+class TestPoolKey:
+    def test_ignores_vm_name_and_timestamp(self):
+        other = dict(CONFIG, generated="later", vm={"name": "ci-42", "ram_mb": 1024})
+        assert pool_key(CONFIG, True) == pool_key(other, True)
+        assert pool_key(CONFIG, True) != pool_key(CONFIG, False)
+        assert pool_key(CONFIG, True) != pool_key(dict(CONFIG, packages=["vim"]), True)
+
+
+def test_retarget_domain_xml_renames_name_derived_paths(tmp_path):
+    xml = (
+        f"<domain><name>old</name><devices>"
+        f"<disk><source file='{tmp_path}/old.qcow2'/></disk>"
+        f"<disk><source file='{tmp_path}/old-cloud-init.iso'/></disk>"
+        f"<serial><log file='{tmp_path}/old/serial.log'/></serial>"
+        f"<disk><source file='{tmp_path}/older.qcow2'/></disk>"
+        f"</devices></domain>"
+    )
+    out = retarget_domain_xml(xml, "old", "new", tmp_path)
+    assert "<name>new</name>" in out
+    assert f"{tmp_path}/new.qcow2" in out
+    assert f"{tmp_path}/new-cloud-init.iso" in out
+    assert f"{tmp_path}/new/serial.log" in out
+    assert f"{tmp_path}/older.qcow2" in out
+
+
+class TestVMPool:
+    def test_warm_until_full_then_claim(self, images, cloner, monkeypatch):
+        monkeypatch.setattr(pool_mod, "host_available_mb", lambda: 64 * 1024)
+        pool = VMPool(user_session=True, cloner=cloner)
+        key = pool.register(CONFIG, 2)
+
+        assert pool.refill(_make_config) == 2
+        assert pool.ready_count(key) == 2
+        assert pool.refill(_make_config) == 0
+        for name, dom in list(cloner.domains.items()):
+            dom.XMLDesc.return_value = f"<domain><name>{name}</name></domain>"
+            dom.UUIDString.return_value = "uuid-1"
+        cloner.conn.saveImageGetXMLDesc.return_value = "<domain><name>pool</name></domain>"
+        cloner.conn.defineXML.side_effect = lambda xml: cloner.domains.setdefault("dev", MagicMock(
+            UUIDString=MagicMock(return_value="uuid-1")))
+        monkeypatch.setattr(pool_mod, "get_qga_executor", MagicMock())
+
+        assert pool.claim(key, "dev") == "uuid-1"
+        assert (images / "dev.qcow2").exists()
+        assert (images / "dev" / "ssh_port").read_text() == "22001"
+        assert "<name>dev</name>" in cloner.conn.restoreFlags.call_args[0][1]
+        assert pool.ready_count(key) == 1
+
+    def test_refill_respects_host_ram(self, images, cloner, monkeypatch):
+        monkeypatch.setattr(pool_mod, "host_available_mb", lambda: 2048)
+        pool = VMPool(user_session=True, cloner=cloner)
+        pool.register(CONFIG, 2)
+        assert pool.refill(_make_config, reserve_mb=1536) == 0
+        cloner.create_vm.assert_not_called()
+
+    def test_failed_warm_is_discarded(self, images, cloner, monkeypatch):
+        monkeypatch.setattr(pool_mod, "host_available_mb", lambda: None)
+        cloner.create_vm.side_effect = RuntimeError("cloud-init failed")
+        pool = VMPool(user_session=True, cloner=cloner)
+        key = pool.register(CONFIG, 1)
+        assert pool.refill(_make_config) == 0
+        assert pool.pools()[key]["vms"] == {}
+        cloner.delete_vm.assert_called_once()
+
+    def test_claim_skips_existing_name(self, images, cloner):
+        pool = VMPool(user_session=True, cloner=cloner)
+        key = pool.register(CONFIG, 1)
+        with pool._index() as pools:
+            pools[key]["vms"]["clonebox-pool-x"] = {"state": "ready", "since": 0}
+        cloner.domains["dev"] = MagicMock()
+        assert pool.claim(key, "dev") is None
+        assert pool.ready_count(key) == 1
+
+    def test_failed_claim_is_cleaned_up_under_the_right_name(self, images, cloner, monkeypatch):
+        monkeypatch.setattr(pool_mod, "host_available_mb", lambda: None)
+        pool = VMPool(user_session=True, cloner=cloner)
+        key = pool.register(CONFIG, 2)
+        assert pool.refill(_make_config) == 2
+        first = next(iter(cloner.domains))  # claimed oldest first
+        for name, dom in cloner.domains.items():
+            dom.XMLDesc.return_value = f"<domain><name>{name}</name></domain>"
+        cloner.conn.saveImageGetXMLDesc.return_value = "<domain><name>pool</name></domain>"
+        monkeypatch.setattr(pool_mod, "get_qga_executor", MagicMock())
+
+        # Define under the new name fails: the pool VM is put back, then discarded
+        cloner.conn.defineXML.side_effect = [RuntimeError("define failed"), None]
+        assert pool.claim(key, "dev") is None
+        assert (images / f"{first}.qcow2").exists() and not (images / "dev.qcow2").exists()
+        assert cloner.conn.defineXML.call_args[0][0] == f"<domain><name>{first}</name></domain>"
+        cloner.delete_vm.assert_called_with(first, delete_storage=True, approved=True)
+
+        # Renamed, but neither restore nor cold boot works: discarded as the new name
+        renamed = MagicMock()
+        renamed.isActive.return_value = False
+        renamed.create.side_effect = RuntimeError("no boot")
+        cloner.conn.defineXML.side_effect = None
+        cloner.conn.defineXML.return_value = renamed
+        cloner.conn.restoreFlags.side_effect = RuntimeError("bad save image")
+        assert pool.claim(key, "dev") is None
+        assert (images / "dev.qcow2").exists()
+        cloner.delete_vm.assert_any_call("dev", delete_storage=True, approved=True)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """Tests for the post_install_repair module."""
 
+import json
+import shlex
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
@@ -9,6 +11,7 @@ import pytest
 from clonebox.post_install_repair import (
     RepairResult,
     RepairReport,
+    _Repair,
     _RepairCtx,
     _repair_snap_dir_ownership,
     _repair_copied_data_ownership,
@@ -27,6 +30,8 @@ from clonebox.post_install_repair import (
     _repair_ide_config_paths,
     _verify_headless_browsers,
     _verify_ide_launch,
+    _REPAIRS,
+    _waves,
     run_post_install_repairs,
 )
 
@@ -487,3 +492,88 @@ class TestRunPostInstallRepairs:
         assert "home-dir-permissions" in names
         assert "app-lock-files" in names
         assert "fontconfig-cache" in names
+
+
+# ── Fused detection and parallel phases ───────────────────────────────────────
+
+
+class TestPrefetch:
+    @patch("clonebox.post_install_repair._ssh_exec")
+    def test_answers_are_served_once(self, mock_ssh):
+        mock_ssh.side_effect = [json.dumps([[0, "ubuntu\n"], [1, ""]]), "live"]
+        ctx = _RepairCtx(22000, None)
+        assert ctx.prefetch(["stat a", "stat b"]) == 2
+        assert mock_ssh.call_args.kwargs["command"].startswith("python3 -c ")
+        assert ctx.run("stat a") == "ubuntu"
+        assert ctx.run("stat b") is None
+        # Consumed: a re-check after a repair goes to the guest again
+        assert ctx.run("stat a") == "live"
+        assert mock_ssh.call_count == 2
+
+    @patch("clonebox.post_install_repair._ssh_exec")
+    def test_bad_output_falls_back_to_ssh(self, mock_ssh):
+        mock_ssh.side_effect = ["not json", "y"]
+        ctx = _RepairCtx(22000, None)
+        assert ctx.prefetch(["cmd1", "cmd2"]) == 0
+        assert ctx.run("cmd1") == "y"
+
+    @patch("clonebox.post_install_repair._ssh_exec")
+    def test_guest_timeouts_are_not_cached(self, mock_ssh):
+        mock_ssh.side_effect = [json.dumps([[None, ""], [0, "n"]]), "y"]
+        ctx = _RepairCtx(22000, None)
+        assert ctx.prefetch(["slow", "fast"]) == 1
+        assert ctx.run("slow") == "y"
+
+
+    @patch("clonebox.post_install_repair._ssh_exec")
+    def test_unused_answers_do_not_outlive_their_wave(self, mock_ssh):
+        probes = {"command -v firefox": "n"}  # guest state before the first wave
+
+        def _probes(ctx, args):
+            return list(probes)
+
+        def _later(ctx, args):
+            return [RepairResult("later", True, False, detail=str(ctx.run("command -v firefox")))]
+
+        def _exec(command, **kwargs):
+            if command.startswith("python3 -c "):
+                cmds = json.loads(shlex.split(command)[-1])
+                return json.dumps([[0, probes.get(c, "")] for c in cmds])
+            return "y"  # the guest changed since the prefetch
+
+        mock_ssh.side_effect = _exec
+        repairs = [
+            _Repair("first", 1, lambda ctx, args: [], probes=_probes),
+            _Repair("dummy", 1, lambda ctx, args: [], probes=lambda ctx, args: ["true"]),
+            _Repair("later", 1, _later, after=("first",)),
+        ]
+        with patch("clonebox.post_install_repair._REPAIRS", repairs):
+            report = run_post_install_repairs(22000, None, jobs=1)
+        assert [r.detail for r in report.results] == ["y"]
+
+
+class TestRepairScheduling:
+    def test_dependencies_run_in_later_waves(self):
+        phase2 = [r for r in _REPAIRS if r.phase == 2]
+        waves = [[r.name for r in wave] for wave in _waves(phase2)]
+        assert waves == [
+            ["home-dir-permissions", "snap-dir-ownership"],
+            ["copied-data-ownership"],
+        ]
+
+    def test_dependencies_are_declared(self):
+        names = {r.name for r in _REPAIRS}
+        for repair in _REPAIRS:
+            assert set(repair.after) <= names
+
+    @pytest.mark.parametrize("jobs", [1, 4])
+    @patch("clonebox.post_install_repair._ssh_exec")
+    def test_results_order_and_timings(self, mock_ssh, jobs):
+        mock_ssh.return_value = "y"
+        report = run_post_install_repairs(22000, None, jobs=jobs)
+        names = [r.name for r in report.results]
+        assert names.index("dns-resolution") < names.index("home-dir-permissions")
+        assert names.index("home-dir-permissions") < names.index("fontconfig-cache")
+        assert set(report.timings) == {r.name for r in _REPAIRS}
+        assert report.wall_time >= max(report.timings.values())
+        assert len(report.slowest(2)) == 2
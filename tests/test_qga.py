@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Tests for the shared QEMU Guest Agent executor."""
+
+import base64
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox.qga import QGAError, QGAExecutor
+
+
+def _b64(text: str) -> str:
+    return base64.b64encode(text.encode()).decode()
+
+
+@pytest.fixture
+def domain():
+    return MagicMock()
+
+
+@pytest.fixture
+def executor(domain, monkeypatch):
+    monkeypatch.setattr("clonebox.qga.POLL_INITIAL", 0)
+    conn = MagicMock()
+    conn.lookupByName.return_value = domain
+    return QGAExecutor("qemu:///session", conn=conn)
+
+
+class TestQGAExecutor:
+    def test_exec_uses_libvirt_and_polls_until_exit(self, executor, domain):
+        domain.qemuAgentCommand.side_effect = [
+            json.dumps({"return": {"pid": 42}}),
+            json.dumps({"return": {"exited": False}}),
+            json.dumps({"return": {"exited": True, "exitcode": 3, "out-data": _b64("hi\n")}}),
+        ]
+        result = executor.exec("vm", "echo hi")
+        assert result.exitcode == 3
+        assert result.stdout == "hi\n"
+        assert not result.ok
+        request = json.loads(domain.qemuAgentCommand.call_args_list[0][0][0])
+        assert request["arguments"]["arg"] == ["-c", "echo hi"]
+
+    def test_exec_raises_when_agent_unavailable(self, executor, domain):
+        domain.qemuAgentCommand.side_effect = Exception("agent not responding")
+        with pytest.raises(QGAError):
+            executor.exec("vm", "true")
+        assert executor.exec_output("vm", "true") is None
+
+    def test_exec_times_out(self, executor, domain):
+        domain.qemuAgentCommand.side_effect = [
+            json.dumps({"return": {"pid": 1}}),
+        ] + [json.dumps({"return": {"exited": False}})] * 50
+        assert executor.exec("vm", "sleep 100", timeout=0) is None
+
+    def test_ping(self, executor, domain):
+        domain.qemuAgentCommand.return_value = json.dumps({"return": {}})
+        assert executor.ping("vm")
+        domain.qemuAgentCommand.side_effect = Exception("down")
+        assert not executor.ping("vm")
+
+    def test_virsh_fallback_without_libvirt(self, monkeypatch):
+        monkeypatch.setattr("clonebox.qga.libvirt", None)
+        run = MagicMock(return_value=MagicMock(returncode=0, stdout='{"return": {}}', stderr=""))
+        monkeypatch.setattr("clonebox.qga.subprocess.run", run)
+        assert QGAExecutor("qemu:///system").ping("vm")
+        assert run.call_args[0][0][:4] == ["virsh", "--connect", "qemu:///system", "qemu-agent-command"]
+
+    def test_reset_leaves_injected_connection_open(self, executor, domain, monkeypatch):
+        injected = executor._conn
+        injected.isAlive.return_value = False
+        domain.qemuAgentCommand.side_effect = Exception("connection dropped")
+        assert not executor.ping("vm")
+        injected.close.assert_not_called()
+
+        owned = MagicMock()
+        monkeypatch.setattr("clonebox.qga.libvirt", MagicMock(open=MagicMock(return_value=owned)))
+        assert executor._connection() is owned
+        executor.reset()
+        owned.close.assert_called_once()
+
+
+def test_backend_uses_shared_executor(monkeypatch):
+    from clonebox.backends.libvirt_backend import LibvirtBackend
+    from clonebox.qga import get_qga_executor
+
+    shared = get_qga_executor("qemu:///session")
+    monkeypatch.setattr(shared, "exec_output", MagicMock(return_value="ok"))
+    assert LibvirtBackend("qemu:///session").execute_command("vm", "true") == "ok"
+    shared.exec_output.assert_called_once_with("vm", "true", timeout=30, shell="/bin/bash")
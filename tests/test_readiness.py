@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Tests for event-driven VM readiness tracking."""
+
+import threading
+import time
+
+import pytest
+
+from clonebox import readiness as readiness_mod
+from clonebox.readiness import ReadinessWatcher, Stage, classify_serial_line
+from clonebox.serial_progress import SerialLogTail
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(readiness_mod, "libvirt", None)
+    monkeypatch.setattr(readiness_mod, "SERIAL_POLL_INTERVAL", 0.01)
+    log = tmp_path / "serial.log"
+    log.write_text("old boot\n[clonebox] Rebooting in 10 seconds to start GUI...\n")
+    with ReadinessWatcher("vm", "qemu:///session", serial_log=log) as w:
+        yield w, log
+
+
+def _append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+class TestSerialMarkers:
+    @pytest.mark.parametrize("line,stage", [
+        ("[    0.000000] Linux version 6.8.0-31-generic", Stage.KERNEL),
+        ("[clonebox] bootcmd - starting configuration", Stage.CLOUD_INIT),
+        ("-----BEGIN SSH HOST KEY FINGERPRINTS-----", Stage.SSH_KEYS),
+        ("Cloud-init v. 24.1.3 finished at Mon, 01 Jan 2024. Up 42.1 seconds", Stage.CLOUD_INIT_DONE),
+        ("clonebox-vm login: ", Stage.LOGIN),
+        ("[clonebox] WARNING: Failed to install code", Stage.PROVISION_FAILED),
+        ("[clonebox] Golden image sealed", Stage.SEALED),
+        ("[clonebox] Step 1/10: Updating package lists...", None),
+    ])
+    def test_classify(self, line, stage):
+        assert classify_serial_line(line) is stage
+
+    def test_tail_handles_partial_lines_and_truncation(self, tmp_path):
+        path = tmp_path / "serial.log"
+        path.write_text("before\n")
+        tail = SerialLogTail(path)
+        _append(path, "one\ntw")
+        assert tail.read_lines() == ["one"]
+        _append(path, "o\r\n\x1b[32mthree\x1b[0m\n")
+        assert tail.read_lines() == ["two", "three"]
+        path.write_text("new\n")
+        assert tail.read_lines() == ["new"]
+
+
+class TestReadinessWatcher:
+    def test_existing_log_content_is_ignored(self, watcher):
+        w, _ = watcher
+        time.sleep(0.05)
+        assert w.last(Stage.REBOOTING) == 0
+
+    def test_wait_returns_as_soon_as_marker_appears(self, watcher):
+        w, log = watcher
+        threading.Timer(0.05, _append, (log, "Cloud-init v. 24.1 finished at now\n")).start()
+        start = time.monotonic()
+        assert w.wait_for(Stage.CLOUD_INIT_DONE, timeout=5) is Stage.CLOUD_INIT_DONE
+        assert time.monotonic() - start < 2
+
+    def test_since_distinguishes_boots(self, watcher):
+        w, _ = watcher
+        w.mark(Stage.KERNEL)
+        first_boot = w.seq
+        w.mark(Stage.REBOOTING)
+        assert w.wait_for(Stage.KERNEL, timeout=0, since=w.last(Stage.REBOOTING)) is None
+        w.mark(Stage.KERNEL)
+        assert w.wait_for(Stage.KERNEL, timeout=0, since=first_boot) is Stage.KERNEL
+
+    def test_pause_wakes_only_on_new_marks(self, watcher):
+        w, _ = watcher
+        w.mark(Stage.STARTED)
+        assert w.pause(0)          # consumes the STARTED mark
+        assert not w.pause(0.01)
+        threading.Timer(0.05, w.mark, (Stage.SSH_KEYS,)).start()
+        assert w.pause(5, Stage.SSH_KEYS)
+
+    def test_without_sources_waits_time_out(self, monkeypatch):
+        monkeypatch.setattr(readiness_mod, "libvirt", None)
+        with ReadinessWatcher("vm", "qemu:///session") as w:
+            assert not w.live
+            assert w.wait_for(Stage.STARTED, timeout=0.01) is None
+
+    def test_user_session_ip_wait_blocks_on_agent(self, watcher):
+        from unittest.mock import MagicMock
+
+        from clonebox.cloner import SelectiveVMCloner
+
+        w, _ = watcher
+        w._conn = MagicMock()  # libvirt events "live"
+        cloner = SelectiveVMCloner.__new__(SelectiveVMCloner)
+        cloner.user_session = True
+        ips = iter([None, "10.0.2.15"])
+        cloner._get_vm_ip = MagicMock(side_effect=lambda vm: next(ips))
+        threading.Timer(0.05, w.mark, (Stage.AGENT_CONNECTED,)).start()
+        started = time.monotonic()
+        assert cloner._wait_for_ip(MagicMock(), timeout=5, readiness=w) == "10.0.2.15"
+        assert time.monotonic() - started < 2
+        w._conn = None
+
+    def test_serial_wait_falls_back_to_ssh_status(self, watcher, monkeypatch):
+        from unittest.mock import MagicMock
+
+        from clonebox import cloner as cloner_mod
+
+        w, _ = watcher
+        monkeypatch.setattr(cloner_mod, "CLOUD_INIT_SSH_FALLBACK_INTERVAL", 0)
+        cloner = cloner_mod.SelectiveVMCloner.__new__(cloner_mod.SelectiveVMCloner)
+        cloner._ssh_cloud_init_status = MagicMock(return_value="status: done")
+        # No progress markers ever appear on this console
+        assert cloner._follow_cloud_init_serial("vm", 2222, 30, False, None, w)
+        cloner._ssh_cloud_init_status.assert_called_once_with(2222)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Tests for block-level incremental replication."""
+
+import io
+import json
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from clonebox import replication
+from clonebox.replication import (
+    ALLOCATION_CONTEXT,
+    ReplicationError,
+    Replicator,
+    apply_changes,
+    dirty_context,
+    receive_replica,
+    send_changes,
+)
+
+MiB = 1024 * 1024
+
+
+class FakeNBD:
+    """In-memory NBD export with a fixed block-status map."""
+
+    def __init__(self, data, extents=(), context=ALLOCATION_CONTEXT):
+        self.data = bytearray(data)
+        self.extents = list(extents)
+        self.context = context
+
+    def get_size(self):
+        return len(self.data)
+
+    def block_status(self, count, offset, callback):
+        entries, pos = [], 0
+        for length, flags in self.extents:
+            end = pos + length
+            if end > offset and pos < offset + count:
+                entries += [min(end, offset + count) - max(pos, offset), flags]
+            pos = end
+        callback(self.context, offset, entries, 0)
+
+    def pread(self, count, offset):
+        return bytes(self.data[offset:offset + count])
+
+    def pwrite(self, buf, offset):
+        self.data[offset:offset + len(buf)] = buf
+
+    def zero(self, count, offset):
+        self.data[offset:offset + count] = bytes(count)
+
+    def flush(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def _source():
+    data = bytearray(os.urandom(8 * MiB))
+    data[2 * MiB:3 * MiB] = bytes(MiB)
+    # Dirty: [1, 2) MiB, [2, 3) MiB (now zeros) and [6, 7) MiB
+    extents = [(MiB, 0), (MiB, 1), (MiB, 1), (3 * MiB, 0), (MiB, 1), (MiB, 0)]
+    return FakeNBD(data, extents, dirty_context("backup-vda"))
+
+
+def test_only_dirty_extents_are_shipped_and_applied():
+    source = _source()
+    replica = FakeNBD(os.urandom(8 * MiB))
+    before = bytes(replica.data)
+    out = io.BytesIO()
+
+    shipped = send_changes(source, source.context, source.get_size(), {"disk": "vda"}, out)
+    assert shipped == 2 * MiB  # the zeroed MiB travels as a zero record
+
+    stream = io.BytesIO(out.getvalue())
+    assert replication.read_header(stream)["size"] == 8 * MiB
+    apply_changes(stream, replica)
+    for start, end in ((1, 3), (6, 7)):
+        assert replica.data[start * MiB:end * MiB] == source.data[start * MiB:end * MiB]
+    for start, end in ((0, 1), (3, 6), (7, 8)):
+        assert replica.data[start * MiB:end * MiB] == before[start * MiB:end * MiB]
+
+    truncated = io.BytesIO(out.getvalue()[:-replication._RECORD.size])
+    replication.read_header(truncated)
+    with pytest.raises(ReplicationError, match="ended early"):
+        apply_changes(truncated, FakeNBD(bytes(8 * MiB)))
+
+
+@pytest.fixture
+def peer(tmp_path, monkeypatch):
+    """Receiver side with qemu-img/qemu-nbd replaced by in-memory disks."""
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(tmp_path / "peer-images"))
+    disks = {}
+
+    def qemu_img(*args):
+        if args[0] == "create":
+            disks[args[-2]] = FakeNBD(bytes(int(args[-1])))
+            open(args[-2], "wb").close()
+
+    def open_nbd(argv=None, **kwargs):
+        return disks[argv[-1]]
+
+    monkeypatch.setattr(replication, "_qemu_img", qemu_img)
+    monkeypatch.setattr(replication, "_open_nbd", open_nbd)
+    # The replica is renamed into place once complete
+    real_replace = os.replace
+    monkeypatch.setattr(replication.os, "replace", lambda a, b: (
+        disks.__setitem__(str(b), disks.pop(str(a))) if str(a) in disks else None,
+        real_replace(a, b),
+    ))
+    return tmp_path / "peer-images" / "replicas" / "vm", disks
+
+
+def _stream(source, context, **header):
+    out = io.BytesIO()
+    send_changes(source, context, source.get_size(), dict({"vm": "vm", "disk": "vda"}, **header), out)
+    return out.getvalue()
+
+
+def test_receiver_applies_full_then_incremental_syncs(peer):
+    directory, disks = peer
+    source = _source()
+    source.extents, source.context = [(8 * MiB, 0)], ALLOCATION_CONTEXT
+    receive_replica(io.BytesIO(_stream(source, ALLOCATION_CONTEXT, checkpoint="cp1", base=None)))
+    assert disks[str(directory / "vda.qcow2")].data == source.data
+    assert not list(directory.glob(".*partial"))
+
+    # An incremental from a base the replica is not at is refused
+    with pytest.raises(ReplicationError, match="run a full sync"):
+        receive_replica(io.BytesIO(_stream(source, ALLOCATION_CONTEXT, checkpoint="cp3", base="cp2")))
+
+    source.data[6 * MiB:7 * MiB] = os.urandom(MiB)
+    source.extents, source.context = [(6 * MiB, 0), (MiB, 1), (MiB, 0)], dirty_context("cp1")
+    blob = _stream(source, source.context, checkpoint="cp2", base="cp1")
+    with pytest.raises(ReplicationError):
+        receive_replica(io.BytesIO(blob[:-1]))
+    state = json.loads((directory / "vda.replica.json").read_text())
+    assert state["checkpoint"] == "cp1" and state["consistent"] is False
+
+    # The retry resends the same changes from the same base
+    state = receive_replica(io.BytesIO(blob))
+    assert state["checkpoint"] == "cp2" and state["consistent"] is True
+    assert disks[str(directory / "vda.qcow2")].data == source.data
+
+
+def test_replicator_chains_checkpoints_and_prunes(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(replication, "nbd", object())
+    monkeypatch.setattr(replication, "_open_nbd", lambda argv=None, **kw: MagicMock(argv=argv))
+    checkpoints = {}
+    dom = MagicMock()
+    dom.isActive.return_value = False
+    dom.XMLDesc.return_value = (
+        "<domain><devices><disk type='file' device='disk'><driver type='qcow2'/>"
+        "<source file='/images/vm.qcow2'/><target dev='vda'/></disk>"
+        "<disk type='file' device='cdrom'><target dev='sda'/></disk></devices></domain>"
+    )
+
+    def create(xml, flags):
+        name = xml.split("<name>")[1].split("</name>")[0]
+        checkpoints[name] = MagicMock(getName=lambda n=name: n,
+                                      delete=lambda n=name: checkpoints.pop(n))
+
+    dom.checkpointCreateXML.side_effect = create
+    dom.listAllCheckpoints.side_effect = lambda: list(checkpoints.values())
+    dom.checkpointLookupByName.side_effect = lambda name: checkpoints[name]
+    replicator = Replicator("qemu:///session")
+    replicator._conn = MagicMock()
+    replicator._conn.lookupByName.return_value = dom
+
+    sent = []
+
+    def send(self, h, context, header, remote_cmd, vm):
+        sent.append((h.argv, context, header))
+        return 1
+
+    monkeypatch.setattr(Replicator, "_send", send)
+    stamps = iter(["clonebox-20260101000000", "clonebox-20260102000000", "clonebox-20260103000000"])
+    monkeypatch.setattr(replication, "_checkpoint_name", lambda: next(stamps))
+    status = {}
+    remote_cmd = lambda command: ["printf", "%s", json.dumps(status)]  # noqa: E731
+
+    replicator.replicate("vm", "peer", remote_cmd)
+    argv, context, header = sent[-1]
+    assert header["base"] is None and context == ALLOCATION_CONTEXT and "--bitmap" not in argv
+
+    status["vda"] = {"checkpoint": "clonebox-20260101000000"}
+    replicator.replicate("vm", "peer", remote_cmd)
+    argv, context, header = sent[-1]
+    assert header["base"] == "clonebox-20260101000000"
+    assert argv[argv.index("--bitmap") + 1] == header["base"]
+    assert context == dirty_context(header["base"])
+    assert list(checkpoints) == ["clonebox-20260102000000"]
+
+    # A failed sync drops its new checkpoint and keeps the base
+    monkeypatch.setattr(Replicator, "_send", lambda *a: (_ for _ in ()).throw(ReplicationError("x")))
+    status["vda"] = {"checkpoint": "clonebox-20260102000000"}
+    with pytest.raises(ReplicationError):
+        replicator.replicate("vm", "peer", remote_cmd)
+    assert list(checkpoints) == ["clonebox-20260102000000"]
+
+
+def test_shut_off_sync_merges_bitmaps_of_later_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(replication, "nbd", object())
+    monkeypatch.setattr(replication, "_open_nbd", lambda argv=None, **kw: MagicMock(argv=argv))
+    qemu_img = []
+    monkeypatch.setattr(replication, "_qemu_img", lambda *args: qemu_img.append(args))
+    checkpoints = {}
+    dom = MagicMock()
+    dom.isActive.return_value = False
+    dom.XMLDesc.return_value = (
+        "<domain><devices><disk type='file' device='disk'><driver type='qcow2'/>"
+        "<source file='/images/vm.qcow2'/><target dev='vda'/></disk></devices></domain>"
+    )
+
+    def create(xml, flags):
+        name = xml.split("<name>")[1].split("</name>")[0]
+        checkpoints[name] = MagicMock(
+            getName=lambda n=name: n,
+            delete=lambda n=name: checkpoints.pop(n),
+            listAllChildren=lambda flags, n=name: [
+                cp for other, cp in checkpoints.items() if other > n
+            ],
+        )
+
+    dom.checkpointCreateXML.side_effect = create
+    dom.listAllCheckpoints.side_effect = lambda: list(checkpoints.values())
+    dom.checkpointLookupByName.side_effect = lambda name: checkpoints[name]
+    replicator = Replicator("qemu:///session")
+    replicator._conn = MagicMock()
+    replicator._conn.lookupByName.return_value = dom
+    sent = []
+    monkeypatch.setattr(Replicator, "_send",
+                        lambda self, h, context, header, *a: sent.append((h.argv, context)) or 1)
+    stamps = iter(f"clonebox-2026010{i}000000" for i in range(1, 5))
+    monkeypatch.setattr(replication, "_checkpoint_name", lambda: next(stamps))
+    status = {}
+    remote_cmd = lambda command: ["printf", "%s", json.dumps(status)]  # noqa: E731
+
+    replicator.replicate("vm", "a", remote_cmd)  # cp1
+    replicator.replicate("vm", "b", remote_cmd)  # cp2, cp1 kept for a
+    status["vda"] = {"checkpoint": "clonebox-20260101000000"}
+    replicator.replicate("vm", "a", remote_cmd)  # from cp1, with cp2 after it
+
+    argv, context = sent[-1]
+    merged = replication.MERGED_BITMAP
+    assert argv[argv.index("--bitmap") + 1] == merged and context == dirty_context(merged)
+    assert ("bitmap", "-f", "qcow2", "--add", "--merge", "clonebox-20260101000000",
+            "--merge", "clonebox-20260102000000", "/images/vm.qcow2", merged) in qemu_img
+    assert qemu_img[-1] == ("bitmap", "-f", "qcow2", "--remove", "/images/vm.qcow2", merged)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Tests for the serial-console cloud-init progress parser."""
+
+import os
+
+import pytest
+
+from clonebox.serial_progress import ProgressParser, SerialLogTail, follow_progress
+
+BOOT = "[    0.000000] Linux version 6.8.0-31-generic (buildd@lcy02) #31-Ubuntu SMP\n"
+FINISHED = "Cloud-init v. 24.1.3-0ubuntu3 finished at Mon, 01 Jan 2024 10:00:00 +0000. Up 95.2 seconds\n"
+
+
+def _append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+class TestProgressParser:
+    def test_steps_and_packages(self):
+        parser = ProgressParser()
+        event = parser.feed("[clonebox] Step 2/10: Installing qemu-guest-agent...")
+        assert (event.kind, event.stage, event.percent) == ("step", "Installing qemu-guest-agent", 10)
+
+        parser.feed("[clonebox] Installing 4 packages...")
+        parser.feed("[clonebox] [apt] Unpacking git (1:2.43.0-1ubuntu7) ...")
+        event = parser.feed("[clonebox] [apt] Setting up git:amd64 (1:2.43.0-1ubuntu7) ...")
+        assert event.kind == "package"
+        assert event.package == "git"
+        assert event.stage == "Installing packages"
+        assert event.percent == 25
+
+    def test_snaps_warnings_and_done(self):
+        parser = ProgressParser()
+        event = parser.feed("[clonebox] [2/4] Installing snap: firefox...")
+        assert (event.kind, event.package, event.percent) == ("snap", "firefox", 25)
+        assert parser.feed("[clonebox] WARNING: Failed to install firefox").kind == "warning"
+        assert parser.warnings == 1
+        assert parser.feed("random kernel noise") is None
+        assert parser.feed(FINISHED).kind == "done"
+        assert parser.done
+
+    def test_reboot_resets_state(self):
+        parser = ProgressParser()
+        parser.feed(FINISHED)
+        event = parser.feed(BOOT)
+        assert event.kind == "boot"
+        assert not parser.done
+
+
+class TestSerialLogTail:
+    def test_follows_rotation(self, tmp_path):
+        path = tmp_path / "serial.log"
+        path.write_text("old\n")
+        tail = SerialLogTail(path)
+        _append(path, "one\ntwo")
+        os.rename(path, tmp_path / "serial.log.1")
+        path.write_text("three\n")
+        assert tail.read_lines() == ["one", "two", "three"]
+        tail.close()
+
+    def test_missing_file_is_read_from_top_once_created(self, tmp_path):
+        path = tmp_path / "serial.log"
+        tail = SerialLogTail(path)
+        assert tail.read_lines() == []
+        path.write_text("first\n")
+        assert tail.read_lines() == ["first"]
+
+
+class TestFollowProgress:
+    def test_done_only_for_latest_boot(self, tmp_path):
+        path = tmp_path / "serial.log"
+        path.write_text(BOOT + FINISHED + BOOT + "[clonebox] Starting VM setup (runcmd phase)...\n")
+        events = follow_progress(path, timeout=5, poll_interval=0.01)
+        kinds = [next(events).kind for _ in range(4)]
+        assert kinds == ["boot", "done", "boot", "info"]
+        _append(path, FINISHED)
+        assert [e.kind for e in events] == ["done"]
+
+    def test_times_out_without_completion(self, tmp_path):
+        path = tmp_path / "serial.log"
+        path.write_text(BOOT)
+        assert [e.kind for e in follow_progress(path, timeout=0.05, poll_interval=0.01)] == ["boot"]
+
+
+class TestMonitorCloudInit:
+    @pytest.fixture
+    def serial_log(self, tmp_path, monkeypatch):
+        path = tmp_path / "serial.log"
+        monkeypatch.setattr("clonebox.paths.serial_log_path", lambda name, user_session=True: path)
+        return path
+
+    def test_uses_serial_log_without_guest_calls(self, serial_log, monkeypatch):
+        from clonebox.cli import utils
+
+        def _no_qga(*args, **kwargs):
+            raise AssertionError("guest agent must not be polled")
+
+        monkeypatch.setattr(utils, "_qga_exec", _no_qga)
+        serial_log.write_text(BOOT + "[clonebox] Step 1/10: Updating package lists...\n" + FINISHED)
+        assert utils.monitor_cloud_init_status("vm", user_session=True, timeout=5, log_offset=0)
+
+    def test_earlier_boots_do_not_count(self, serial_log, monkeypatch):
+        from clonebox.cli import utils
+
+        serial_log.write_text(BOOT + FINISHED)
+        offset = serial_log.stat().st_size
+        assert not utils.monitor_cloud_init_status("vm", user_session=True, timeout=0.2, log_offset=offset)
+        assert not utils.monitor_cloud_init_status("vm", user_session=True, timeout=0.2)
+        _append(serial_log, BOOT + FINISHED)
+        assert utils.monitor_cloud_init_status("vm", user_session=True, timeout=5, log_offset=offset)
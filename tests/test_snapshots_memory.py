@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Tests for memory-state (external) snapshots."""
+
+import os
+import re
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from clonebox.snapshots import SnapshotManager, SnapshotType
+from clonebox.snapshots.memory import (
+    MemorySnapshotStore,
+    SnapshotIntegrityError,
+    SnapshotNotFoundError,
+)
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    monkeypatch.setenv("CLONEBOX_USER_IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setenv("CLONEBOX_SNAPSHOT_COMPRESSION", "gzip")
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    (tmp_path / "images" / "dev").mkdir(parents=True)
+    return tmp_path / "images"
+
+
+def _domain_xml(disk):
+    return (
+        "<domain><name>dev</name><devices>"
+        f"<disk type='file' device='disk'><driver name='qemu' type='qcow2'/>"
+        f"<source file='{disk}'/><target dev='vda'/></disk>"
+        "<disk type='file' device='cdrom'><source file='/x/dev-cloud-init.iso'/>"
+        "<target dev='sda'/></disk>"
+        "</devices></domain>"
+    )
+
+
+@pytest.fixture
+def manager(images):
+    base = images / "dev.qcow2"
+    base.write_bytes(b"base disk")
+    domain = MagicMock()
+    domain.isActive.return_value = True
+    domain.XMLDesc.return_value = _domain_xml(base)
+
+    def snapshot_create(xml, flags):
+        memory = re.search(r"<memory snapshot='external' file='([^']+)'", xml).group(1)
+        open(memory, "wb").write(b"guest ram" * 1000)
+        overlay = re.search(r"<disk name='vda' snapshot='external'>.*?file='([^']+)'", xml).group(1)
+        open(overlay, "wb").write(b"overlay")
+
+    domain.snapshotCreateXML.side_effect = snapshot_create
+    manager = SnapshotManager("qemu:///session")
+    manager._conn = MagicMock()
+    manager._conn.lookupByName.return_value = domain
+    return manager
+
+
+class TestMemorySnapshotStore:
+    def test_compression_roundtrip_and_integrity(self, tmp_path):
+        store = MemorySnapshotStore(tmp_path)
+        store.snapshot_dir("s").mkdir(parents=True)
+        store.raw_memory_path("s").write_bytes(b"ram" * 100)
+        stored = store.compress("s", "gzip")
+        assert stored.name == "memory.save.gz"
+        assert not store.raw_memory_path("s").exists()
+
+        manifest = {"name": "s", "memory_file": stored.name, "compression": "gzip"}
+        assert store.expand(manifest).read_bytes() == b"ram" * 100
+        store.cleanup_expanded(manifest)
+        assert sorted(p.name for p in store.snapshot_dir("s").iterdir()) == ["memory.save.gz"]
+
+
+class TestMemorySnapshots:
+    def test_create_writes_manifest_and_external_snapshot_xml(self, manager, images):
+        snapshot = manager.create("dev", "setup", snapshot_type=SnapshotType.EXTERNAL)
+
+        xml, flags = manager.conn.lookupByName("dev").snapshotCreateXML.call_args[0]
+        assert "<disk name='sda' snapshot='no'/>" in xml
+        store = MemorySnapshotStore(images / "dev")
+        manifest = store.load("setup")
+        assert manifest["base_disk"] == str(images / "dev.qcow2")
+        assert manifest["compression"] == "gzip"
+        assert manifest["memory_raw_size"] == 9000
+        assert snapshot.memory_path == store.snapshot_dir("setup") / "memory.save.gz"
+        assert [s.name for s in manager.list("dev")] == ["setup"]
+
+    @pytest.mark.parametrize("name", ["../escape", "a/b", "..", ".hidden", ""])
+    def test_rejects_names_that_are_not_a_path_component(self, manager, images, name):
+        with pytest.raises(ValueError, match="Invalid snapshot name"):
+            manager.create("dev", name, snapshot_type=SnapshotType.EXTERNAL)
+        with pytest.raises(ValueError, match="Invalid snapshot name"):
+            manager.resume("dev", name)
+        manager.conn.lookupByName("dev").snapshotCreateXML.assert_not_called()
+        assert not (images / "escape").exists()
+
+    def test_restore_rebuilds_overlay_and_restores_memory(self, manager, images):
+        manager.create("dev", "setup", snapshot_type=SnapshotType.EXTERNAL)
+        store = MemorySnapshotStore(images / "dev")
+        domain = manager.conn.lookupByName("dev")
+        domain.isActive.return_value = False
+        domain.XMLDesc.return_value = _domain_xml(store.overlay_path("setup"))
+        restored = {}
+
+        def restore(path, xml, flags):
+            restored["memory"] = open(path, "rb").read()
+            restored["xml"] = xml
+
+        manager.conn.restoreFlags.side_effect = restore
+
+        def qemu_img(cmd, **kwargs):
+            assert cmd[:2] == ["qemu-img", "create"]
+            assert cmd[cmd.index("-b") + 1] == str(images / "dev.qcow2")
+            open(cmd[-1], "wb").write(b"new overlay")
+
+        with patch("clonebox.snapshots.manager.subprocess.run", side_effect=qemu_img):
+            snapshot = manager.resume("dev")
+
+        assert snapshot.name == "setup"
+        assert restored["memory"] == b"guest ram" * 1000
+        overlays = [p.name for p in store.disks_dir.iterdir()]
+        assert len(overlays) == 1 and overlays[0].startswith("setup-r")
+        assert f"{store.disks_dir / overlays[0]}" in restored["xml"]
+        assert not (store.snapshot_dir("setup") / "memory.save.restore").exists()
+
+    def test_restore_refuses_modified_base_disk(self, manager, images):
+        manager.create("dev", "setup", snapshot_type=SnapshotType.EXTERNAL)
+        manager.conn.lookupByName("dev").isActive.return_value = False
+        os.utime(images / "dev.qcow2", (1, 1))
+
+        with pytest.raises(SnapshotIntegrityError):
+            manager.restore("dev", "setup")
+        manager.conn.restoreFlags.assert_not_called()
+
+    def test_resume_without_snapshot(self, manager):
+        with pytest.raises(SnapshotNotFoundError):
+            manager.resume("dev")
+
+    def test_delete_keeps_disk_overlays(self, manager, images):
+        manager.create("dev", "setup", snapshot_type=SnapshotType.EXTERNAL)
+        store = MemorySnapshotStore(images / "dev")
+        assert manager.delete("dev", "setup")
+        assert store.load("setup") is None
+        assert store.overlay_path("setup").exists()
+
+    def test_delete_vm_removes_frozen_disk_and_snapshots(self, manager, images, tmp_path):
+        from clonebox.cloner import SelectiveVMCloner
+        from clonebox.image_cache import GoldenImageCache
+
+        golden = GoldenImageCache(images / "golden")
+        golden.root.mkdir()
+        golden_disk = golden.path_for("k1")
+        golden_disk.write_bytes(b"golden")
+        with golden._index() as entries:
+            entries["k1"] = {"size": 6, "last_used": 0, "users": {}}
+        golden.acquire("k1", "dev", str(images / "dev.qcow2"))
+
+        manager.create("dev", "setup", snapshot_type=SnapshotType.EXTERNAL)
+        store = MemorySnapshotStore(images / "dev")
+        overlay = store.overlay_path("setup")
+        chain = {overlay: images / "dev.qcow2", images / "dev.qcow2": golden_disk}
+
+        domain = MagicMock()
+        domain.isActive.return_value = False
+        domain.XMLDesc.return_value = _domain_xml(overlay)
+        with patch("clonebox.cloner.libvirt") as libvirt:
+            libvirt.open.return_value.lookupByName.return_value = domain
+            cloner = SelectiveVMCloner(user_session=True)
+        with patch.object(cloner, "get_images_dir", return_value=images), \
+                patch("clonebox.cloner.backing_file", side_effect=lambda p: chain.get(p)):
+            cloner.delete_vm("dev", delete_storage=True)
+
+        assert not overlay.exists() and not (images / "dev.qcow2").exists()
+        assert not store.root.exists()
+        assert golden_disk.exists()
+        assert golden.entries()["k1"]["users"] == {}
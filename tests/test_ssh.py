@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Tests for the shared SSH helpers and the session pool."""
+
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from clonebox import ssh as ssh_mod
+from clonebox.ssh import SSHSessionPool, build_ssh_command, ssh_exec
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return SSHSessionPool(control_dir=tmp_path / "cm", retry_after=60)
+
+
+def _fake_master(pool, port=22196, username="ubuntu"):
+    """Return a subprocess.run side effect that 'starts' a master socket."""
+    def _run(cmd, **kwargs):
+        if "-M" in cmd:
+            sock = pool.control_path(port, username)
+            sock.parent.mkdir(parents=True, exist_ok=True)
+            sock.touch()
+        return MagicMock(returncode=0, stdout="ok\n", stderr="")
+    return _run
+
+
+class TestSSHSessionPool:
+    def test_control_path_is_short_and_stable(self, pool):
+        a = pool.control_path(22196, "ubuntu")
+        assert a == pool.control_path(22196, "ubuntu")
+        assert a != pool.control_path(22197, "ubuntu")
+        assert len(a.name) <= 20
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_ensure_starts_master_once(self, mock_run, pool):
+        mock_run.side_effect = _fake_master(pool)
+        assert pool.ensure(22196, Path("/tmp/key"))
+        assert pool.ensure(22196, Path("/tmp/key"))
+        assert mock_run.call_count == 1
+        cmd = mock_run.call_args[0][0]
+        assert "-M" in cmd and "-N" in cmd
+        assert any(o.startswith("ControlPersist=") for o in cmd)
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_failed_master_is_not_retried_immediately(self, mock_run, pool):
+        mock_run.return_value = MagicMock(returncode=255)
+        assert not pool.ensure(22196)
+        assert not pool.ensure(22196)
+        assert mock_run.call_count == 1
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_slow_endpoint_does_not_block_others(self, mock_run, pool):
+        started, release = threading.Event(), threading.Event()
+        fast = _fake_master(pool, port=22197)
+
+        def _run(cmd, **kwargs):
+            if "22196" in cmd:
+                started.set()
+                release.wait(5)
+                return MagicMock(returncode=255)
+            return fast(cmd, **kwargs)
+
+        mock_run.side_effect = _run
+        slow = threading.Thread(target=pool.ensure, args=(22196,))
+        slow.start()
+        assert started.wait(5)
+        try:
+            assert pool.ensure(22197)
+        finally:
+            release.set()
+            slow.join()
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_close_all_stops_masters(self, mock_run, pool):
+        mock_run.side_effect = _fake_master(pool)
+        pool.ensure(22196)
+        pool.close_all()
+        exit_cmd = mock_run.call_args[0][0]
+        assert exit_cmd[exit_cmd.index("-O") + 1] == "exit"
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_release_keeps_masters_other_owners_claim(self, mock_run, pool):
+        mock_run.side_effect = _fake_master(pool)
+        first, second = MagicMock(), MagicMock()
+        pool.watch(first)
+        pool.watch(second)
+        pool.ensure(22196)
+        mock_run.reset_mock()
+        pool.release(first)
+        mock_run.assert_not_called()
+        pool.release(second)
+        exit_cmd = mock_run.call_args[0][0]
+        assert exit_cmd[exit_cmd.index("-O") + 1] == "exit"
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_owners_are_held_weakly(self, mock_run, pool):
+        import gc
+
+        mock_run.side_effect = _fake_master(pool)
+        owner = MagicMock()
+        pool.watch(owner)
+        pool.ensure(22196)
+        del owner
+        gc.collect()
+        assert len(pool._owners) == 0
+        assert all(len(c) == 0 for c in pool._claims.values())
+
+
+class TestSSHExec:
+    @patch("clonebox.ssh.shutil.which", return_value="/usr/bin/ssh")
+    @patch("clonebox.ssh.subprocess.run")
+    def test_exec_attaches_to_master(self, mock_run, _which, pool, monkeypatch):
+        monkeypatch.setattr(ssh_mod, "_session_pool", pool)
+        mock_run.side_effect = _fake_master(pool)
+        assert ssh_exec(22196, None, "echo ok") == "ok"
+        cmd = mock_run.call_args[0][0]
+        assert "ControlMaster=no" in cmd
+        assert f"ControlPath={pool.control_path(22196, 'ubuntu')}" in cmd
+        assert cmd[-2:] == ["ubuntu@127.0.0.1", "echo ok"]
+
+    @patch("clonebox.ssh.subprocess.run")
+    def test_multiplex_can_be_disabled(self, mock_run, monkeypatch):
+        monkeypatch.setenv("CLONEBOX_SSH_MULTIPLEX", "0")
+        cmd = build_ssh_command(22196, multiplex=True)
+        assert not any("ControlPath" in part for part in cmd)
+        mock_run.assert_not_called()
@@ -539,3 +539,147 @@ class TestValidatorResultsCalculation:
         )
 
         assert total_failed == 3
+
+
+class TestBatchedProbes:
+    """Batched probes collect all items in one guest exec each."""
+
+    @pytest.fixture
+    def validator(self):
+        config = {
+            "vm": {"name": "test-vm"},
+            "paths": {},
+            "app_data_paths": {"/host/a": "/home/ubuntu/a", "/host/b": "/home/ubuntu/b"},
+            "packages": ["curl", "git", "vim"],
+            "snap_packages": [],
+            "services": ["libvirtd", "docker", "ssh"],
+        }
+        return VMValidator(
+            config=config, vm_name="test-vm", conn_uri="qemu:///session", console=MagicMock()
+        )
+
+    def test_packages_single_exec(self, validator):
+        calls = []
+
+        def fake_exec(cmd, timeout=10):
+            calls.append(cmd)
+            if cmd.startswith("dpkg-query"):
+                return "ii \tcurl:amd64\t7.81.0\nii \tgit\t1:2.34.1\nrc \tvim\t2:8.2\n"
+            return "no"
+
+        validator._exec_in_vm = fake_exec
+        results = validator.validate_packages()
+
+        assert results["passed"] == 2
+        assert results["failed"] == 1
+        assert results["details"][0] == {"package": "curl", "installed": True, "version": "7.81.0"}
+        assert len([c for c in calls if "dpkg" in c]) == 1
+
+    def test_services_single_exec(self, validator):
+        calls = []
+
+        def fake_exec(cmd, timeout=10):
+            calls.append(cmd)
+            if cmd.startswith("systemctl show"):
+                return (
+                    "Id=docker.service\nUnitFileState=enabled\nActiveState=active\nMainPID=123\n\n"
+                    "Id=ssh.service\nUnitFileState=disabled\nActiveState=inactive\nMainPID=0"
+                )
+            return "no"
+
+        validator._exec_in_vm = fake_exec
+        results = validator.validate_services()
+
+        assert results["total"] == 2
+        assert results["passed"] == 1
+        assert results["failed"] == 1
+        assert results["details"][1]["pid"] == "123"
+        assert len([c for c in calls if "systemctl" in c]) == 1
+        assert "libvirtd" not in calls[-1]
+
+    def test_mount_paths_single_exec(self, validator):
+        from clonebox.validation.probes import SECTION_MARK
+
+        calls = []
+
+        def fake_exec(cmd, timeout=10):
+            calls.append(cmd)
+            if SECTION_MARK in cmd:
+                return f"{SECTION_MARK}0\nyes\n4\n{SECTION_MARK}1\nno"
+            return ""
+
+        validator._exec_in_vm = fake_exec
+        results = validator.validate_mounts()
+
+        assert results["passed"] == 1
+        assert results["failed"] == 1
+        assert results["details"][0]["files"] == "4"
+        assert len(calls) == 2  # mount listing + one batched path probe
+
+    def test_batch_probes_disabled_uses_per_item(self, validator):
+        validator.batch_probes = False
+        calls = []
+
+        def fake_exec(cmd, timeout=10):
+            calls.append(cmd)
+            return "1.0"
+
+        validator._exec_in_vm = fake_exec
+        results = validator.validate_packages()
+        assert results["passed"] == 3
+        assert len([c for c in calls if "dpkg" in c]) == 3
+
+
+class TestParallelValidation:
+    """Concurrent phases keep sequential output and result ordering."""
+
+    def test_run_phases_replays_in_declaration_order(self):
+        import threading
+
+        from clonebox.validation.parallel import PhaseConsole, run_phases
+
+        real = MagicMock()
+        console = PhaseConsole(real)
+        release = threading.Event()
+
+        def slow():
+            release.wait(2)
+            console.print("first")
+
+        def fast():
+            console.print("second")
+            release.set()
+
+        run_phases([slow, fast], console, jobs=2)
+        assert [c.args[0] for c in real.print.call_args_list] == ["first", "second"]
+
+    def test_jobs_preserve_item_order(self):
+        import time
+
+        config = {
+            "vm": {"name": "test-vm"},
+            "paths": {},
+            "app_data_paths": {},
+            "packages": ["a", "b", "c", "d"],
+            "snap_packages": [],
+            "services": [],
+        }
+        validator = VMValidator(
+            config=config,
+            vm_name="test-vm",
+            conn_uri="qemu:///session",
+            console=MagicMock(),
+            batch_probes=False,
+            jobs=4,
+        )
+
+        def fake_exec(cmd, timeout=10):
+            if "dpkg -l" not in cmd:
+                return "no"
+            pkg = cmd.split("^ii  ")[1].split("'")[0]
+            time.sleep(0.01 * (4 - "abcd".index(pkg)))
+            return f"{pkg}-1.0"
+
+        validator._exec_in_vm = fake_exec
+        results = validator.validate_packages()
+        assert [d["version"] for d in results["details"]] == ["a-1.0", "b-1.0", "c-1.0", "d-1.0"]